@@ -0,0 +1,117 @@
+"""
+审单执行方式基准测试：逐条审查（每条规则一次 LLM 调用）vs 合并审查（一次调用评估全部规则）
+
+样本取自 data/sample_cases 下的报关单。对比项：
+- prompt token 数：逐条审查为各规则 system + user prompt 之和，合并审查为一次调用的 prompt
+  （离线估算，汉字 1 token、英文/数字约 4 字符 1 token，与 text_chunker.ApproxTokenCounter 相同）；
+  其中报关数据之前的稳定前缀（可命中厂商前缀缓存）单独列出
+- --live 时实际调用当前 .env 配置的 LLM：端到端耗时、调用次数（含合并审查的逐条回退）、
+  接口返回的 prompt / 前缀缓存命中（cached）/ completion token，以及两种方式判定不一致的规则
+  （--repeat 大于 1 时，后几次运行的 cached 反映厂商前缀缓存的效果）
+
+用法:
+    python benchmarks/bench_audit_modes.py
+    python benchmarks/bench_audit_modes.py --language vi
+    python benchmarks/bench_audit_modes.py --live --repeat 3
+"""
+import argparse
+import asyncio
+import io
+import json
+import sys
+import time
+from pathlib import Path
+
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.core.orchestrator import COMBINED, CONCURRENT, RiskAnalysisOrchestrator
+from src.core.prompt_builder import PromptBuilder
+from src.services.text_chunker import ApproxTokenCounter
+
+SAMPLE_DIR = PROJECT_ROOT / "data" / "sample_cases"
+
+
+def load_cases():
+    return {path.name: path.read_text(encoding="utf-8") for path in sorted(SAMPLE_DIR.glob("*.txt"))}
+
+
+def estimate_tokens(cases, language: str):
+    """离线估算两种方式的 prompt token"""
+    builder = PromptBuilder()
+    rules = [r for r in builder.config['rules'] if r.get('enabled', True)]
+    counter = ApproxTokenCounter()
+    system_prompt = builder.build_system_prompt(language=language)
+
+    print(f"\n== prompt token 估算（{len(rules)} 条规则，language={language}）==")
+    print(f"{'样本':<20}{'逐条审查':>10}{'其中前缀':>10}{'合并审查':>10}{'其中前缀':>10}{'节省':>8}")
+    for name, raw_data in cases.items():
+        per_rule = sum(
+            sum(counter.count([system_prompt, builder.build_user_prompt(raw_data, rule, language=language)]))
+            for rule in rules
+        )
+        per_rule_prefix = sum(
+            sum(counter.count([system_prompt, builder._user_prompt_frame(rule, language)[0]]))
+            for rule in rules
+        )
+        combined_prompt = builder.build_combined_user_prompt(raw_data, rules, language=language)
+        combined = sum(counter.count([system_prompt, combined_prompt]))
+        combined_prefix = sum(counter.count([system_prompt, combined_prompt.split(raw_data)[0]]))
+        print(f"{name:<20}{per_rule:>10}{per_rule_prefix:>10}{combined:>10}{combined_prefix:>10}"
+              f"{1 - combined / per_rule:>8.0%}")
+
+
+async def run_mode(orchestrator: RiskAnalysisOrchestrator, raw_data: str, language: str, mode: str):
+    """跑一次完整审单，返回 (耗时, {rule_id: status}, usage 增量)"""
+    before = orchestrator.llm_service.usage.copy()
+    statuses = {}
+    start = time.perf_counter()
+    async for event in orchestrator.analyze_stream(raw_data, language=language, mode=mode):
+        payload = json.loads(event[len("data: "):])
+        if payload["type"] == "step_result":
+            statuses[payload["rule_id"]] = payload["status"]
+    elapsed = time.perf_counter() - start
+    return elapsed, statuses, orchestrator.llm_service.usage - before
+
+
+async def live(cases, language: str, repeat: int):
+    orchestrator = RiskAnalysisOrchestrator()
+    print(f"\n== 实际调用（model={orchestrator.llm_service.model_name}，每个样本 {repeat} 次）==")
+    print(f"{'样本':<20}{'方式':<12}{'耗时(s)':>9}{'调用':>6}{'prompt':>9}{'cached':>9}{'completion':>12}")
+    for name, raw_data in cases.items():
+        statuses = {}
+        for mode in (CONCURRENT, COMBINED):
+            total_time, usage = 0.0, None
+            for _ in range(repeat):
+                elapsed, statuses[mode], delta = await run_mode(orchestrator, raw_data, language, mode)
+                total_time += elapsed
+                usage = delta if usage is None else usage + delta
+            print(f"{name:<20}{mode:<12}{total_time / repeat:>9.2f}{usage['calls'] / repeat:>6.1f}"
+                  f"{usage['prompt_tokens'] / repeat:>9.0f}{usage['cached_tokens'] / repeat:>9.0f}"
+                  f"{usage['completion_tokens'] / repeat:>12.0f}")
+        diff = [rule_id for rule_id, status in statuses[CONCURRENT].items() if statuses[COMBINED].get(rule_id) != status]
+        print(f"{'':<20}判定不一致的规则（最后一次）: {', '.join(diff) or '无'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="审单执行方式基准测试")
+    parser.add_argument("--language", default="zh", choices=["zh", "vi"], help="审单语言")
+    parser.add_argument("--live", action="store_true", help="实际调用 LLM，测量耗时与接口返回的 token 用量")
+    parser.add_argument("--repeat", type=int, default=1, help="--live 时每个样本每种方式的运行次数")
+    args = parser.parse_args()
+
+    cases = load_cases()
+    if not cases:
+        print(f"❌ 未找到样本: {SAMPLE_DIR}")
+        return
+    estimate_tokens(cases, args.language)
+    if args.live:
+        asyncio.run(live(cases, args.language, max(1, args.repeat)))
+
+
+if __name__ == "__main__":
+    main()
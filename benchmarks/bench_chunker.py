@@ -0,0 +1,183 @@
+"""
+文本切分基准测试：按字符切分（原 RecursiveCharacterTextSplitter 1500/150）vs 按 token 切分（ChineseChunker）
+
+语料为 data/knowledge 下的 txt/md 与 PDF 文本。对比项：
+- 切分耗时（全部文档，及最大的单个文档）
+- chunk 数、平均字数、token 数 p50 / 最大值
+- 超出模型输入上限（510 token）的 chunk 占比，以及因截断从未进入向量的字符占比
+- 检索召回率：从原文随机抽取句子作为查询，top-k 结果中包含该句所在位置的 chunk 即为命中
+
+用法:
+    python benchmarks/bench_chunker.py
+    python benchmarks/bench_chunker.py --queries 300 --k 6 --no-pdf
+"""
+import argparse
+import io
+import random
+import sys
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from src.services.knowledge_base import KnowledgeBase
+from src.services.pdf_service import PDFService
+from src.services.text_chunker import SENTENCE_BOUNDARY, token_counter_for
+
+# bge-small-zh 输入上限 512 token，扣除 [CLS] / [SEP]
+MODEL_MAX_TOKENS = 510
+
+
+def legacy_splitter() -> RecursiveCharacterTextSplitter:
+    """改造前 KnowledgeBase._split_documents 的配置"""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=1500,
+        chunk_overlap=150,
+        separators=["。\n", "！\n", "？\n", "\n\n\n", "\n\n", "\n", "。", "！", "？", "，", " ", ""],
+        add_start_index=True
+    )
+
+
+def split_legacy(documents):
+    """返回 [(文档序号, start, end, 文本)]，与新切分器一样过滤 50 字以下碎片"""
+    splitter = legacy_splitter()
+    spans = []
+    for doc_index, document in enumerate(documents):
+        for chunk in splitter.split_documents([document]):
+            if len(chunk.page_content) >= 50:
+                start = chunk.metadata["start_index"]
+                spans.append((doc_index, start, start + len(chunk.page_content), chunk.page_content))
+    return spans
+
+
+def split_tokens(kb: KnowledgeBase, documents):
+    spans = []
+    for doc_index, document in enumerate(documents):
+        for chunk in kb.chunker.split_documents([document])[0]:
+            spans.append((doc_index, chunk.metadata["char_start"], chunk.metadata["char_end"], chunk.page_content))
+    return spans
+
+
+def load_corpus(kb: KnowledgeBase, include_pdf: bool):
+    documents = []
+    pdf_service = PDFService() if include_pdf else None
+    for file_path in kb._scan_knowledge_files():
+        suffix = file_path.suffix.lower()
+        if suffix in (".txt", ".md"):
+            documents.extend(kb._load_text_file(file_path))
+        elif suffix == ".pdf" and pdf_service:
+            text, _ = pdf_service.extract_text(str(file_path), validate_quality=False)
+            documents.append(Document(page_content=text, metadata={"source": file_path.name}))
+    if not documents:
+        raise SystemExit("❌ data/knowledge 下没有可用的文档")
+    return documents
+
+
+def sample_queries(documents, n_queries: int, seed: int = 42):
+    """抽取 15~60 字的句子作为查询，返回 [(文档序号, 句子起点, 句子)]"""
+    rng = random.Random(seed)
+    candidates = []
+    for doc_index, document in enumerate(documents):
+        text = document.page_content
+        position = 0
+        for match in SENTENCE_BOUNDARY.finditer(text):
+            sentence = text[position:match.end()].strip()
+            if 15 <= len(sentence) <= 60:
+                candidates.append((doc_index, text.index(sentence, position), sentence))
+            position = match.end()
+    return rng.sample(candidates, min(n_queries, len(candidates)))
+
+
+def bench_split(name, split, documents, counter):
+    start = time.perf_counter()
+    spans = split(documents)
+    elapsed = time.perf_counter() - start
+
+    largest = max(documents, key=lambda d: len(d.page_content))
+    start = time.perf_counter()
+    split([largest])
+    largest_elapsed = time.perf_counter() - start
+
+    tokens = np.array(counter.count([text for _, _, _, text in spans]))
+    over = tokens > MODEL_MAX_TOKENS
+    # 超长 chunk 中超出上限部分的字符按 token 比例估算
+    lost_chars = sum(
+        len(text) * (1 - MODEL_MAX_TOKENS / n_tokens)
+        for (_, _, _, text), n_tokens in zip(spans, tokens) if n_tokens > MODEL_MAX_TOKENS
+    )
+    total_chars = sum(len(text) for _, _, _, text in spans)
+    return {
+        "name": name,
+        "spans": spans,
+        "split_s": elapsed,
+        "largest_s": largest_elapsed,
+        "chunks": len(spans),
+        "avg_chars": total_chars / max(1, len(spans)),
+        "p50_tokens": int(np.percentile(tokens, 50)) if len(tokens) else 0,
+        "max_tokens": int(tokens.max()) if len(tokens) else 0,
+        "over_ratio": float(over.mean()) if len(tokens) else 0.0,
+        "lost_ratio": lost_chars / max(1, total_chars),
+    }
+
+
+def recall_at_k(kb: KnowledgeBase, spans, queries, query_vectors, k: int) -> float:
+    vectors = np.asarray(kb.embeddings.embed_documents([text for _, _, _, text in spans]), dtype="float32")
+    index = faiss.IndexFlatIP(vectors.shape[1])
+    index.add(vectors)
+    _, labels = index.search(query_vectors, k)
+    hits = 0
+    for (doc_index, position, _), row in zip(queries, labels):
+        if any(
+            spans[label][0] == doc_index and spans[label][1] <= position < spans[label][2]
+            for label in row if label != -1
+        ):
+            hits += 1
+    return hits / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="文本切分基准测试")
+    parser.add_argument("--queries", type=int, default=200, help="召回测试的查询数量")
+    parser.add_argument("--k", type=int, default=6, help="召回率的 top-k")
+    parser.add_argument("--no-pdf", action="store_true", help="不加载 PDF 文本")
+    args = parser.parse_args()
+
+    kb = KnowledgeBase(process_pdfs=False)
+    counter = token_counter_for(kb.embedding_model)
+
+    documents = load_corpus(kb, include_pdf=not args.no_pdf)
+    queries = sample_queries(documents, args.queries)
+    query_vectors = np.asarray(kb.embedding_model.embed_documents([q for _, _, q in queries]), dtype="float32")
+
+    print("=" * 96)
+    print(f"语料: {len(documents)} 个文档, {sum(len(d.page_content) for d in documents)} 字; "
+          f"查询: {len(queries)} 条, k={args.k}; 新切分参数: {kb.chunker.signature}")
+    print("=" * 96)
+
+    results = [
+        bench_split("字符 1500/150", split_legacy, documents, counter),
+        bench_split("token " + str(kb.chunker.max_tokens), lambda docs: split_tokens(kb, docs), documents, counter),
+    ]
+
+    print(f"{'切分方式':<16}{'耗时(s)':>9}{'最大文档(s)':>12}{'chunks':>8}{'平均字数':>9}"
+          f"{'p50 tok':>9}{'max tok':>9}{'超限占比':>9}{'截断字符':>9}{'recall@' + str(args.k):>10}")
+    for result in results:
+        recall = recall_at_k(kb, result["spans"], queries, query_vectors, args.k)
+        print(f"{result['name']:<16}{result['split_s']:>9.3f}{result['largest_s']:>12.3f}{result['chunks']:>8}"
+              f"{result['avg_chars']:>9.0f}{result['p50_tokens']:>9}{result['max_tokens']:>9}"
+              f"{result['over_ratio']:>9.1%}{result['lost_ratio']:>9.1%}{recall:>10.3f}")
+    print("=" * 96)
+
+
+if __name__ == "__main__":
+    main()
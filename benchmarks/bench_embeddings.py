@@ -0,0 +1,147 @@
+"""
+Embedding 后端基准测试：HuggingFace (sentence-transformers) vs ONNX Runtime (FP32 / int8)
+
+语料取自当前索引版本的 chunks.db（即知识库中的全部 chunk），不经过向量缓存，
+每个后端都真实计算一遍。对比项：
+- 吞吐：批量向量化全部 chunk（chunks/s）
+- 延迟：单条查询向量化 p50 / p99（对话检索路径）
+- 一致性：同一 chunk 两种后端向量的余弦相似度（均值 / 最小值）
+- 检索一致性：查询 top-k 近邻与 HuggingFace 结果的重合率
+
+用法:
+    python export_onnx_model.py                      # 先导出 ONNX 模型
+    python benchmarks/bench_embeddings.py
+    python benchmarks/bench_embeddings.py --files model.onnx model_quantized.onnx --threads 1 4 8
+    python benchmarks/bench_embeddings.py --limit 2000 --queries 100 --k 6
+"""
+import argparse
+import io
+import random
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from langchain_huggingface import HuggingFaceEmbeddings
+
+from src.config.kb_loader import load_kb_config
+from src.services.chunk_store import CHUNK_DB_FILE, SQLiteDocstore
+from src.services.index_versions import IndexVersions
+from src.services.knowledge_base import EMBEDDING_MODEL_NAME
+from src.services.onnx_embeddings import OnnxEmbeddings
+
+from bench_vector_index import SAMPLE_QUERIES
+
+
+def load_corpus(limit: int):
+    version_dir = IndexVersions(BASE_DIR / "config" / "faiss_index_local").current()
+    if version_dir is None or not (version_dir / CHUNK_DB_FILE).exists():
+        raise SystemExit("❌ 当前没有可用的索引版本，请先运行 quick_rebuild.py 构建知识库索引")
+    texts = [doc.page_content for _, doc in SQLiteDocstore(version_dir / CHUNK_DB_FILE).iter_all()]
+    return texts[:limit] if limit else texts
+
+
+def build_queries(texts, n_queries: int, seed: int = 42):
+    rng = random.Random(seed)
+    queries = list(SAMPLE_QUERIES)
+    while len(queries) < n_queries:
+        text = rng.choice(texts).strip()
+        start = rng.randint(0, max(0, len(text) - 40))
+        queries.append(text[start:start + 40])
+    return queries[:n_queries]
+
+
+def bench_backend(model, texts, queries):
+    model.embed_documents(texts[:8])  # 预热
+
+    start = time.perf_counter()
+    doc_vectors = np.asarray(model.embed_documents(texts), dtype="float32")
+    elapsed = time.perf_counter() - start
+
+    latencies = []
+    query_vectors = []
+    for query in queries:
+        start = time.perf_counter()
+        query_vectors.append(model.embed_query(query))
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "throughput": len(texts) / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "doc_vectors": doc_vectors,
+        "query_vectors": np.asarray(query_vectors, dtype="float32"),
+    }
+
+
+def top_k(query_vectors: np.ndarray, doc_vectors: np.ndarray, k: int) -> np.ndarray:
+    scores = query_vectors @ doc_vectors.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def main():
+    embedding_config = load_kb_config()["embedding"]
+
+    parser = argparse.ArgumentParser(description="Embedding 后端基准测试")
+    parser.add_argument("--onnx-dir", default=embedding_config["onnx_dir"], help="ONNX 模型目录（相对项目根目录）")
+    parser.add_argument("--files", nargs="+", default=["model.onnx", "model_quantized.onnx"], help="参与测试的 ONNX 模型文件")
+    parser.add_argument("--threads", nargs="+", type=int, default=[embedding_config["threads"]], help="onnxruntime 算子内线程数")
+    parser.add_argument("--batch-size", type=int, default=embedding_config["batch_size"])
+    parser.add_argument("--limit", type=int, default=0, help="最多使用的 chunk 数（0 = 全部）")
+    parser.add_argument("--queries", type=int, default=100, help="查询数量")
+    parser.add_argument("--k", type=int, default=6, help="检索一致性的 top-k")
+    args = parser.parse_args()
+
+    texts = load_corpus(args.limit)
+    queries = build_queries(texts, args.queries)
+    k = min(args.k, len(texts))
+
+    print("=" * 92)
+    print(f"语料: {len(texts)} 个 chunk, 查询: {len(queries)} 条, k={k}")
+    print("=" * 92)
+
+    baseline_model = HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL_NAME,
+        model_kwargs={'device': 'cpu'},
+        encode_kwargs={'normalize_embeddings': True, 'batch_size': args.batch_size}
+    )
+    baseline = bench_backend(baseline_model, texts, queries)
+    baseline_top_k = top_k(baseline["query_vectors"], baseline["doc_vectors"], k)
+
+    print(f"{'后端':<40}{'chunks/s':>10}{'p50(ms)':>10}{'p99(ms)':>10}{'cos均值':>10}{'cos最小':>10}{'top-k重合':>10}")
+    print(f"{'huggingface':<40}{baseline['throughput']:>10.1f}{baseline['p50_ms']:>10.2f}{baseline['p99_ms']:>10.2f}"
+          f"{1.0:>10.4f}{1.0:>10.4f}{1.0:>10.3f}")
+
+    for model_file in args.files:
+        for threads in args.threads:
+            name = f"onnx:{model_file} (threads={threads})"
+            try:
+                model = OnnxEmbeddings(BASE_DIR / args.onnx_dir, model_file=model_file,
+                                       threads=threads, batch_size=args.batch_size)
+            except Exception as e:
+                print(f"{name:<40} ❌ {e}")
+                continue
+            result = bench_backend(model, texts, queries)
+            if result["doc_vectors"].shape != baseline["doc_vectors"].shape:
+                print(f"{name:<40} ❌ 向量维度不一致: {result['doc_vectors'].shape[1]} vs {baseline['doc_vectors'].shape[1]}")
+                continue
+            cosines = np.sum(result["doc_vectors"] * baseline["doc_vectors"], axis=1)
+            overlap = np.mean([
+                len(set(a) & set(b)) / k
+                for a, b in zip(top_k(result["query_vectors"], result["doc_vectors"], k), baseline_top_k)
+            ])
+            print(f"{name:<40}{result['throughput']:>10.1f}{result['p50_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+                  f"{cosines.mean():>10.4f}{cosines.min():>10.4f}{overlap:>10.3f}")
+    print("=" * 92)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+向量索引基准测试：对比不同 FAISS 索引类型的构建时间 / 内存 / 查询延迟 / 召回率
+
+语料取自当前知识库索引中的全部 chunk（data/knowledge，含已入库的 PDF），
+向量经 EmbeddingCache 读取，已缓存时不会重新调用模型。
+召回率以精确内积检索 (flat_ip) 的 top-k 为基准。
+
+用法:
+    python benchmarks/bench_vector_index.py
+    python benchmarks/bench_vector_index.py --k 6 --queries 200 --scale 50
+    python benchmarks/bench_vector_index.py --types flat_ip hnsw ivf_sq8
+
+--scale N 将语料向量加噪声复制 N 倍，用于估算更大规模法规库下的表现。
+"""
+import argparse
+import io
+import random
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.services.knowledge_base import KnowledgeBase
+from src.services import index_factory
+from src.services.chunk_store import iter_documents
+
+# 典型业务查询（与对话 / 报告生成中的检索语句风格一致）
+SAMPLE_QUERIES = [
+    "海关申报需要提交哪些单证",
+    "进口货物原产地证明的要求",
+    "综合保税区货物进出管理规定",
+    "HS编码归类总规则",
+    "出口退税的办理流程",
+    "申报价格明显低于市场价的处理",
+    "禁止进口的货物清单",
+    "加工贸易手册核销",
+    "跨境电商零售进口税收政策",
+    "进口关税税率查询",
+]
+
+
+def load_corpus(kb: KnowledgeBase):
+    docs = [doc for _, doc in iter_documents(kb.vector_store.docstore)]
+    if not docs:
+        raise SystemExit("❌ 当前索引为空，请先运行 quick_rebuild.py 构建知识库索引")
+    texts = [doc.page_content for doc in docs]
+    vectors = np.asarray(kb.embeddings.embed_documents(texts), dtype="float32")
+    return texts, vectors
+
+
+def scale_corpus(vectors: np.ndarray, scale: int, seed: int = 42) -> np.ndarray:
+    """加噪声复制向量并重新归一化，模拟更大的语料"""
+    if scale <= 1:
+        return vectors
+    rng = np.random.default_rng(seed)
+    copies = [vectors]
+    for _ in range(scale - 1):
+        noisy = vectors + rng.normal(0, 0.05, vectors.shape).astype("float32")
+        copies.append(noisy / np.linalg.norm(noisy, axis=1, keepdims=True))
+    return np.vstack(copies).astype("float32")
+
+
+def build_queries(kb: KnowledgeBase, texts, n_queries: int, seed: int = 42) -> np.ndarray:
+    rng = random.Random(seed)
+    queries = list(SAMPLE_QUERIES)
+    # 其余查询取随机 chunk 的开头片段，模拟针对具体条款的提问
+    while len(queries) < n_queries:
+        text = rng.choice(texts).strip()
+        start = rng.randint(0, max(0, len(text) - 40))
+        queries.append(text[start:start + 40])
+    return np.asarray(
+        [kb.embedding_model.embed_query(q) for q in queries[:n_queries]],
+        dtype="float32"
+    )
+
+
+def bench_index(index_type: str, vectors: np.ndarray, queries: np.ndarray, k: int, params: dict):
+    ids = np.arange(len(vectors), dtype="int64")
+
+    start = time.perf_counter()
+    index = index_factory.create_index(index_type, vectors, params)
+    index.add_with_ids(vectors, ids)
+    build_time = time.perf_counter() - start
+
+    # 预热
+    index.search(queries[:1], k)
+
+    latencies = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        _, labels = index.search(query.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append(labels[0])
+
+    return {
+        "build_s": build_time,
+        "memory_mb": index_factory.index_memory_bytes(index) / 1024 / 1024,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "results": np.vstack(results),
+    }
+
+
+def recall_at_k(results: np.ndarray, ground_truth: np.ndarray) -> float:
+    hits = sum(len(set(r) & set(g)) for r, g in zip(results, ground_truth))
+    return hits / ground_truth.size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FAISS 索引类型基准测试")
+    parser.add_argument("--k", type=int, default=6, help="检索 top-k（默认与 search_with_score 一致）")
+    parser.add_argument("--queries", type=int, default=100, help="查询数量")
+    parser.add_argument("--scale", type=int, default=1, help="语料放大倍数")
+    parser.add_argument("--types", nargs="+", default=list(index_factory.INDEX_TYPES), help="参与测试的索引类型")
+    args = parser.parse_args()
+
+    kb = KnowledgeBase(process_pdfs=False)
+    params = kb.index_params
+
+    print("=" * 70)
+    print("加载语料向量...")
+    texts, vectors = load_corpus(kb)
+    vectors = scale_corpus(vectors, args.scale)
+    queries = build_queries(kb, texts, args.queries)
+    print(f"语料: {len(vectors)} 条向量 (dim={vectors.shape[1]}, 放大 {args.scale} 倍), 查询: {len(queries)} 条, k={args.k}")
+    print(f"参数: nlist={params['nlist']}, nprobe={params['nprobe']}, hnsw_m={params['hnsw_m']}, "
+          f"ef_construction={params['ef_construction']}, ef_search={params['ef_search']}")
+    print("=" * 70)
+
+    ground_truth = bench_index("flat_ip", vectors, queries, args.k, params)["results"]
+
+    print(f"{'类型':<10}{'构建(s)':>10}{'内存(MB)':>10}{'p50(ms)':>10}{'p99(ms)':>10}{'recall@' + str(args.k):>12}")
+    for index_type in args.types:
+        try:
+            result = bench_index(index_type, vectors, queries, args.k, params)
+        except Exception as e:
+            print(f"{index_type:<10} ❌ {e}")
+            continue
+        recall = recall_at_k(result["results"], ground_truth)
+        print(f"{index_type:<10}{result['build_s']:>10.3f}{result['memory_mb']:>10.2f}"
+              f"{result['p50_ms']:>10.3f}{result['p99_ms']:>10.3f}{recall:>12.3f}")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+导出 bge-small-zh-v1.5 为 ONNX 模型（供 embedding.backend = "onnx" 使用）
+
+输出目录默认为 models/bge-small-zh-v1.5-onnx：
+- model.onnx            FP32 导出（输出 last_hidden_state）
+- model_quantized.onnx  int8 动态量化（权重 int8，激活运行时量化）
+- tokenizer.json        fast tokenizer
+
+用法:
+    python export_onnx_model.py
+    python export_onnx_model.py --output models/bge-small-zh-v1.5-onnx --no-quantize
+
+导出后修改 config/knowledge_base.json 中的 embedding.backend 为 "onnx"，
+下次重建索引时会因模型标识变化自动全量重建（向量缓存按模型标识分开存放）。
+"""
+import argparse
+import io
+import sys
+from pathlib import Path
+
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+
+MODEL_NAME = "BAAI/bge-small-zh-v1.5"
+BASE_DIR = Path(__file__).resolve().parent
+
+
+def export_fp32(output_dir: Path, opset: int) -> Path:
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    print(f"⚙️ 加载 {MODEL_NAME} ...")
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+    model = AutoModel.from_pretrained(MODEL_NAME)
+    model.eval()
+
+    # save_pretrained 会写出 tokenizer.json（fast tokenizer），onnx 后端只用这个文件
+    tokenizer.save_pretrained(str(output_dir))
+
+    sample = tokenizer(["海关申报需要提交哪些单证"], return_tensors="pt")
+    input_names = ["input_ids", "attention_mask", "token_type_ids"]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    model_path = output_dir / "model.onnx"
+    print(f"⚙️ 导出 FP32 ONNX (opset {opset}) → {model_path}")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (sample["input_ids"], sample["attention_mask"], sample["token_type_ids"]),
+            str(model_path),
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+            do_constant_folding=True,
+        )
+    return model_path
+
+
+def quantize_int8(model_path: Path) -> Path:
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantized_path = model_path.with_name("model_quantized.onnx")
+    print(f"⚙️ int8 动态量化 → {quantized_path}")
+    quantize_dynamic(str(model_path), str(quantized_path), weight_type=QuantType.QInt8)
+    return quantized_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导出 bge-small-zh-v1.5 ONNX 模型")
+    parser.add_argument("--output", default="models/bge-small-zh-v1.5-onnx", help="输出目录（相对项目根目录）")
+    parser.add_argument("--opset", type=int, default=14)
+    parser.add_argument("--no-quantize", action="store_true", help="只导出 FP32 模型")
+    args = parser.parse_args()
+
+    output_dir = BASE_DIR / args.output
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    model_path = export_fp32(output_dir, args.opset)
+    print(f"✅ FP32: {model_path.stat().st_size / 1024 / 1024:.1f} MB")
+    if not args.no_quantize:
+        quantized_path = quantize_int8(model_path)
+        print(f"✅ int8: {quantized_path.stat().st_size / 1024 / 1024:.1f} MB")
+
+    print("\n对比两种后端的吞吐 / 延迟 / 向量一致性：python benchmarks/bench_embeddings.py")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,15 @@
+import asyncio
 import traceback
-from fastapi import APIRouter, HTTPException, Request, UploadFile, File, Depends
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, HTTPException, Request, UploadFile, File, Depends, Query
+from fastapi.responses import StreamingResponse, JSONResponse
 from pydantic import BaseModel
 from typing import Optional
 
 # --- 核心服务导入 ---
 from src.services.data_client import DataClient
-from src.core.orchestrator import RiskAnalysisOrchestrator
+from src.core.orchestrator import RiskAnalysisOrchestrator, EXECUTION_MODES, usage_report
 from src.services.report_agent import ComplianceReporter
+from src.services.search_filter import SearchFilter
 from src.database.pdf_repository import PDFRepository
 
 # 容错导入
@@ -61,10 +63,27 @@ async def get_current_llm_config(req: Request) -> dict:
             'source': 'env'
         }
 
+# --- 辅助函数：获取已就绪的知识库 ---
+async def get_ready_kb(req: Request):
+    """
+    获取全局知识库实例；后台加载未完成时最多等待 startup.ready_wait_s 秒，
+    仍未就绪（或加载失败）返回 503
+    """
+    kb = getattr(req.app.state, "kb", None)
+    if not kb:
+        raise HTTPException(status_code=503, detail="知识库服务未就绪")
+    if not await kb.wait_ready(kb.config["startup"]["ready_wait_s"]):
+        if kb.init_state == "failed":
+            raise HTTPException(status_code=503, detail=f"知识库初始化失败: {kb.init_error}")
+        raise HTTPException(status_code=503, detail="知识库正在加载，请稍后重试", headers={"Retry-After": "5"})
+    return kb
+
 # --- 请求体定义 ---
 class AnalysisRequest(BaseModel):
     raw_data: str
     language: str = "zh"  # 新增：语言参数，默认中文
+    # 可选：规则执行方式 paced（逐条演示节奏）/ concurrent（并发执行，按完成顺序推送）/ combined（一次调用评估全部规则），默认取 risk_rules.json
+    mode: Optional[str] = None
 
 class ChatRequest(BaseModel):
     message: str
@@ -74,6 +93,8 @@ class ChatRequest(BaseModel):
 class ReportRequest(BaseModel):
     raw_data: str
     language: str = "zh"  # 新增：语言参数，默认中文
+    # 可选：限定检索范围，如 {"sources": ["凭祥"], "file_types": ["pdf"], "exclude_sources": [...], "path_prefixes": [...]}
+    filters: Optional[dict] = None
 
 # ==========================================
 # 1. 智能审单接口 (功能一)
@@ -87,12 +108,25 @@ async def analyze_customs_declaration(request: AnalysisRequest, req: Request):
     llm_config = await get_current_llm_config(req)
     print(f"[功能一] 使用配置来源: {llm_config['source']}")
 
+    if request.mode and request.mode not in EXECUTION_MODES:
+        raise HTTPException(status_code=400, detail=f"mode 可选: {', '.join(EXECUTION_MODES)}")
+
     orchestrator = RiskAnalysisOrchestrator(llm_config=llm_config)
     return StreamingResponse(
-        orchestrator.analyze_stream(request.raw_data, language=request.language),
+        orchestrator.analyze_stream(request.raw_data, language=request.language, mode=request.mode),
         media_type="text/event-stream"
     )
 
+@router.get("/analyze/usage")
+async def get_analysis_usage():
+    """
+    审单 LLM token 用量（进程启动以来，按规则统计，合并审查记在 "combined" 下）
+
+    cached_tokens 为命中厂商前缀缓存（DeepSeek / OpenAI 等）的 prompt token，
+    cache_hit_ratio = cached_tokens / prompt_tokens，用于核对前缀缓存的节省效果
+    """
+    return {"status": "success", "data": usage_report()}
+
 # ==========================================
 # 2. 法规咨询接口 (功能二)
 # ==========================================
@@ -101,8 +135,10 @@ async def chat_with_agent(body: ChatRequest, request: Request):
     # 动态获取配置并创建临时 agent
     llm_config = await get_current_llm_config(request)
 
-    # 获取全局 kb 实例（如果存在）
+    # 获取全局 kb 实例：仅在已就绪时启用法规检索，加载中或加载失败时以无知识库模式回答
     kb = getattr(request.app.state, "kb", None)
+    if kb is not None and not kb.is_ready:
+        kb = None
 
     # 使用当前配置创建临时 agent
     from src.services.chat_agent import CustomsChatAgent
@@ -118,18 +154,22 @@ async def chat_with_agent(body: ChatRequest, request: Request):
 # ==========================================
 @router.post("/generate_report")
 async def generate_compliance_report(body: ReportRequest, req: Request):
+    # 获取全局 kb 实例（后台加载中时短暂等待）
+    kb = await get_ready_kb(req)
+
     try:
         # 动态获取配置并创建临时 reporter
         llm_config = await get_current_llm_config(req)
 
-        # 获取全局 kb 实例（如果存在）
-        kb = getattr(req.app.state, "kb", None)
-
         # 使用当前配置创建临时 reporter
         reporter = ComplianceReporter(kb=kb, llm_config=llm_config)
 
         return StreamingResponse(
-            reporter.generate_stream(body.raw_data, language=body.language),
+            reporter.generate_stream(
+                body.raw_data,
+                language=body.language,
+                search_filter=SearchFilter.from_dict(body.filters)
+            ),
             media_type="text/event-stream"
         )
     except Exception as e:
@@ -159,7 +199,7 @@ async def analyze_declaration_image(
         extractor = ImageTextExtractor()
 
     try:
-        text, model = extractor.extract_text(content, file.content_type, language=language)
+        text, model = await extractor.aextract_text(content, file.content_type, language=language)
         return {"text": text, "model": model}
     except NotDeclarationError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -211,6 +251,80 @@ async def get_batch_progress(task_id: str):
 def health_check():
     return {"status": "ok", "version": "3.0.PRO"}
 
+@router.get("/health/ready")
+def readiness_check(request: Request):
+    """
+    就绪检查：各组件状态及知识库加载耗时，全部就绪返回 200，否则 503
+
+    Returns:
+        {
+            "status": "ready" | "starting",
+            "components": {
+                "knowledge_base": {state, ready, error, embedding_model, index_version, timings_s},
+                "chat_agent": {ready},
+                "reporter": {ready},
+                "llm_config": {ready, source}
+            }
+        }
+    """
+    state = request.app.state
+    kb = getattr(state, "kb", None)
+    llm_config = getattr(state, "llm_config", None)
+    components = {
+        "knowledge_base": kb.get_readiness() if kb else {"state": "failed", "ready": False, "error": "知识库服务未创建"},
+        "chat_agent": {"ready": getattr(state, "agent", None) is not None},
+        "reporter": {"ready": getattr(state, "reporter", None) is not None},
+        "llm_config": {"ready": llm_config is not None, "source": llm_config.get("source") if llm_config else None}
+    }
+    ready = all(component["ready"] for component in components.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "starting", "components": components}
+    )
+
+@router.get("/knowledge/hs_code/{code}")
+async def lookup_hs_code(code: str, req: Request, k: int = Query(10, ge=1, le=100)):
+    """
+    按 HS 编码精确查找知识库片段（不经过向量检索）
+
+    Args:
+        code: HS 编码，如 "8542.31.00"、"85423100"、"8542"
+        k: 返回条数（1-100）
+
+    Returns:
+        {"status": "success", "data": [{"content", "source", "matched_digits"}]}，
+        与编码完全一致的片段在前，其后依次为同一子目、同一税目的片段
+    """
+    kb = await get_ready_kb(req)
+    matches = await asyncio.to_thread(kb.lookup_hs_code, code, k)
+    return {
+        "status": "success",
+        "data": [
+            {
+                "content": doc.page_content,
+                "source": doc.metadata.get("file_path") or doc.metadata.get("source"),
+                "matched_digits": level
+            }
+            for doc, level in matches
+        ]
+    }
+
+@router.get("/knowledge/tariff/{code}")
+async def lookup_tariff(code: str, req: Request, limit: int = Query(20, ge=1, le=100)):
+    """
+    按 HS 编码查询涉税规范申报目录（结构化表格，不经过向量检索）
+
+    Args:
+        code: HS 编码，如 "8542.31.11"、"85423111"、"8542"
+        limit: 最多返回行数（1-100）
+
+    Returns:
+        {"status": "success", "data": [{code, code_display, name, full_name, elements, heading, level, source}]}
+    """
+    kb = await get_ready_kb(req)
+    rows = await asyncio.to_thread(kb.lookup_tariff, code, limit)
+    return {"status": "success", "data": rows}
+
 @router.get("/knowledge/content/{filename}")
 async def get_knowledge_file_content(filename: str):
     """
@@ -478,24 +592,24 @@ async def rebuild_pdf_index():
 # ==========================================
 
 @router.post("/index/rebuild")
-async def rebuild_knowledge_base_index(request: Request):
+async def rebuild_knowledge_base_index(request: Request, full: bool = False):
     """
     重建知识库索引 (流式SSE响应)
 
+    默认增量重建（只向量化新增/变更的文件），full=true 时强制全量重建。
+
     SSE事件类型：
     - init: 开始重建
     - progress: 更新进度 {current, total, current_file, percentage}
-    - step: 阶段提示 {message, step}
+    - step: 阶段提示 {message, step}；step=diff 时附带 {mode, skipped_files, added_files, changed_files, deleted_files}
     - complete: 完成统计 {message, stats}
     - error: 错误信息 {message}
     - cancelled: 取消信息 {message}
     """
-    kb = getattr(request.app.state, "kb", None)
-    if not kb:
-        raise HTTPException(status_code=503, detail="知识库服务未就绪")
+    kb = await get_ready_kb(request)
 
     return StreamingResponse(
-        kb.rebuild_index_stream(),
+        kb.rebuild_index_stream(full_rebuild=full),
         media_type="text/event-stream"
     )
 
@@ -516,7 +630,14 @@ async def get_index_status(request: Request):
                     "percentage": float
                 },
                 "file_count": int,
-                "last_rebuild_time": float | None
+                "last_rebuild_time": float | None,
+                "embedding_cache": {entries, size_bytes, hits, misses, hit_rate, evictions, ...} | None,
+                "query_cache": {entries, hits, misses, shared, hit_rate, ...} | None,
+                "lexical_index": {docs, terms, postings} | None,
+                "hs_code_index": {docs, codes, postings} | None,
+                "tariff_catalog": {files, rows, parser} | None,
+                "retrieval_batcher": {queue_depth, batches, avg_batch_size, batch_size_histogram, wait_ms, ...} | None,
+                "readiness": {state, ready, error, embedding_model, index_version, timings_s}
             }
         }
     """
@@ -533,7 +654,14 @@ async def get_index_status(request: Request):
             "is_rebuilding": kb.is_rebuilding,
             "progress": kb.progress,
             "file_count": kb.file_count,
-            "last_rebuild_time": kb.last_rebuild_time
+            "last_rebuild_time": kb.last_rebuild_time,
+            "embedding_cache": kb.get_embedding_cache_stats(),
+            "query_cache": kb.get_query_cache_stats(),
+            "lexical_index": kb.get_lexical_index_stats(),
+            "hs_code_index": kb.get_hs_code_index_stats(),
+            "tariff_catalog": kb.get_tariff_catalog_stats(),
+            "retrieval_batcher": kb.get_retrieval_batcher_stats(),
+            "readiness": kb.get_readiness()
         }
     }
 
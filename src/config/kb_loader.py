@@ -0,0 +1,124 @@
+"""
+知识库 (RAG) 配置加载器
+优先级：config/knowledge_base.json > 代码内默认值（按分组合并，缺省项使用默认值）
+"""
+import copy
+import json
+from pathlib import Path
+from typing import Dict, Any
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+KB_CONFIG_PATH = BASE_DIR / "config" / "knowledge_base.json"
+
+DEFAULT_KB_CONFIG: Dict[str, Any] = {
+    # Embedding 后端：huggingface（sentence-transformers）/ onnx（onnxruntime，需先运行 export_onnx_model.py）
+    "embedding": {
+        "backend": "huggingface",
+        "onnx_dir": "models/bge-small-zh-v1.5-onnx",   # 相对项目根目录
+        "onnx_file": "model_quantized.onnx",           # model.onnx (FP32) / model_quantized.onnx (int8)
+        "threads": 4,                                  # onnxruntime 算子内线程数，0 = 自动
+        "batch_size": 32
+    },
+    # 文本切分：按 Embedding 模型 tokenizer 的 token 数计长度（bge 输入上限 512，含 [CLS]/[SEP]），修改后下次重建自动全量重建
+    # 小 chunk 使向量更精确，LLM 所需的上下文由检索时拼接相邻 chunk 补足（见 neighbor_expansion）
+    "chunking": {
+        "max_tokens": 256,
+        "overlap_tokens": 32,
+        "min_chars": 50           # 少于该字数的碎片 chunk 丢弃
+    },
+    # 近重复 chunk 去除（MinHash + LSH，见 src/services/near_duplicates.py），修改后下次重建自动全量重建
+    "dedup": {
+        "enabled": True,
+        "threshold": 0.8,         # Jaccard 相似度下限（且所含数字须完全一致）
+        "num_perm": 64,           # MinHash 签名长度
+        "bands": 16,              # LSH 分段数（需整除 num_perm）
+        "shingle_size": 3         # 字符 n-gram 长度
+    },
+    # 变更检测：文件大小 / mtime / inode 与清单一致时直接沿用清单中的内容哈希，不一致的文件在线程池中并行计算 SHA256
+    "change_detection": {
+        "stat_fast_path": True,
+        "hash_workers": 4
+    },
+    # PDF 文本提取：缓存未命中的文件在进程池中并行提取，大文件按页段拆分
+    # ocr_fallback：文字层不合格的页（扫描页、乱码页）逐页交给 Marker 识别（需安装 marker-pdf，见 adaptive_pdf）
+    "pdf_extraction": {
+        "max_workers": 0,         # 进程数，0 = min(4, CPU 核数)
+        "pages_per_task": 40,     # 每个任务提取的页数
+        "ocr_fallback": False,
+        "ocr_batch_pages": 8      # 每次 Marker 调用处理的页数
+    },
+    # 涉税规范申报目录：文件名含任一关键词的文件解析为结构化表格行（HS 编码 -> 商品名称、申报要素）
+    "tariff_catalog": {
+        "enabled": True,
+        "db_path": "data/tariff_catalog.db",   # 相对项目根目录
+        "file_patterns": ["申报目录"]
+    },
+    # chunk 向量持久化缓存
+    "embedding_cache": {
+        "enabled": True,
+        "dir": "config/embedding_cache",   # 相对项目根目录
+        "max_entries": 200000              # 超出后按 LRU 淘汰
+    },
+    # 查询向量进程内 LRU 缓存（并发相同查询只计算一次）
+    "query_cache": {
+        "enabled": True,
+        "max_entries": 2048
+    },
+    # 向量索引类型（见 src/services/index_factory.py），修改后下次重建自动全量重建
+    "vector_index": {
+        "type": "flat_ip",
+        "nlist": 256,             # IVF 聚类中心数（数据量小时自动减少）
+        "nprobe": 16,             # IVF 检索时探查的聚类数
+        "hnsw_m": 32,             # HNSW 每个节点的邻居数
+        "ef_construction": 200,   # HNSW 建图搜索宽度
+        "ef_search": 64,          # HNSW 检索搜索宽度
+        "keep_versions": 2,       # 保留的索引版本数（含当前版本，当前版本损坏时回退）
+        # mmap: 索引只读内存映射 + chunk 文本存 SQLite；memory: 全部载入内存
+        # IVF 倒排表总是映射；flat / sq8 / hnsw 的向量需 faiss 提供 IO_FLAG_MMAP_IFC 才映射（见 index_factory.mmap_shares_pages）
+        "storage": "mmap",
+        "verify_on_load": "size"  # 启动时校验方式：size（仅比对大小）/ sha256（完整校验）
+    },
+    # 检索方式：hybrid = 向量 + BM25 关键词，按 RRF 融合；vector = 仅向量
+    "retrieval": {
+        "mode": "hybrid",
+        "candidates": 20,         # 每路召回的候选数
+        "rrf_k": 60,              # RRF 平滑常数：score = Σ 1 / (rrf_k + rank)
+        "bm25_k1": 1.2,
+        "bm25_b": 0.75,
+        "hs_code_weight": 2.0     # 查询含 HS 编码时，编码索引结果在 RRF 中的权重
+    },
+    # 相邻 chunk 拼接：命中后向两侧扩展相邻 chunk，相邻或重叠的命中合并为一段
+    "neighbor_expansion": {
+        "enabled": True,
+        "max_chars": 3000,        # 单次检索全部结果的总字数预算（命中本身总是保留）
+        "max_neighbors": 2        # 每个命中向每侧最多扩展的 chunk 数
+    },
+    # 服务启动：background = 后台并行加载 Embedding 模型与索引，不阻塞服务启动
+    "startup": {
+        "background": True,
+        "ready_wait_s": 5         # 依赖知识库的接口在未就绪时最多等待的秒数，超时返回 503
+    },
+    # 检索微批处理：并发的 search_with_score 请求在窗口内合并为一次批量检索
+    "micro_batch": {
+        "enabled": True,
+        "window_ms": 3,           # 收集窗口（毫秒）
+        "max_batch": 32           # 单批最大请求数
+    }
+}
+
+
+def load_kb_config() -> Dict[str, Any]:
+    """加载知识库配置，文件缺失或损坏时使用默认配置"""
+    config = copy.deepcopy(DEFAULT_KB_CONFIG)
+    try:
+        if KB_CONFIG_PATH.exists():
+            with open(KB_CONFIG_PATH, "r", encoding="utf-8") as f:
+                user_config = json.load(f)
+            for section, values in user_config.items():
+                if isinstance(values, dict) and isinstance(config.get(section), dict):
+                    config[section].update(values)
+                else:
+                    config[section] = values
+    except Exception as e:
+        print(f"⚠️ [KBConfig] 加载知识库配置失败: {e}, 使用默认配置")
+    return config
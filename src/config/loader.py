@@ -42,6 +42,11 @@ class ConfigLoader:
         self.HTTP_PROXY = os.getenv("HTTP_PROXY")
         self.HTTPS_PROXY = os.getenv("HTTPS_PROXY")
 
+        # LLM 调用共享连接池（见 src/services/http_pool.py）
+        self.LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+        self.LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "50"))
+        self.LLM_HTTP2 = os.getenv("LLM_HTTP2", "false").lower() in ("1", "true", "yes")
+
         # 外部服务
         self.DATA_PLATFORM_URL = os.getenv("DATA_PLATFORM_URL", "http://127.0.0.1:8088")
         
@@ -1,13 +1,47 @@
 import time
 import json
 import asyncio
+from collections import Counter, defaultdict
 from datetime import datetime
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Dict, List, Optional
 
 # 导入我们之前写好的模块
 from src.core.prompt_builder import PromptBuilder
 from src.services.llm_service import LLMService
 
+# 规则执行方式（config/risk_rules.json 的 execution.mode，可按请求覆盖）
+# paced:      逐条执行，每条至少展示 1.5 秒、步骤间停顿 1 秒（前端演示节奏）
+# concurrent: 全部规则的 LLM 调用并发执行（不超过 max_concurrency），按完成顺序推送结果
+# combined:   一次 LLM 调用评估全部规则（报关数据只发送一次），缺失或无法解析的规则再逐条并发审查
+PACED = "paced"
+CONCURRENT = "concurrent"
+COMBINED = "combined"
+EXECUTION_MODES = (PACED, CONCURRENT, COMBINED)
+
+# 进程级 token 用量（按规则；合并审查的调用记在 "combined" 下）：
+# calls / prompt_tokens / cached_tokens（命中厂商前缀缓存）/ completion_tokens
+usage_by_rule: Dict[str, Counter] = defaultdict(Counter)
+
+
+def usage_report() -> dict:
+    """按规则汇总的 token 用量与前缀缓存命中率"""
+    def summarize(counts: Counter) -> dict:
+        prompt_tokens = counts["prompt_tokens"]
+        return {
+            "calls": counts["calls"],
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": counts["cached_tokens"],
+            "completion_tokens": counts["completion_tokens"],
+            "cache_hit_ratio": round(counts["cached_tokens"] / prompt_tokens, 4) if prompt_tokens else 0.0
+        }
+
+    total = sum(usage_by_rule.values(), Counter())
+    return {
+        "rules": {rule_id: summarize(counts) for rule_id, counts in sorted(usage_by_rule.items())},
+        "total": summarize(total)
+    }
+
+
 class RiskAnalysisOrchestrator:
     def __init__(self, llm_config: dict = None):
         """
@@ -24,15 +58,33 @@ class RiskAnalysisOrchestrator:
         # 过滤掉 enabled: false 的规则
         self.active_rules = [r for r in self.prompt_builder.config['rules'] if r.get('enabled', True)]
 
-    async def analyze_stream(self, raw_data_context: str, language: str = "zh") -> AsyncGenerator[str, None]:
+        # 执行方式与并发上限
+        execution = self.prompt_builder.config.get('execution', {})
+        self.default_mode = execution.get('mode', PACED)
+        self.max_concurrency = max(1, int(execution.get('max_concurrency', 5)))
+
+    async def analyze_stream(
+        self,
+        raw_data_context: str,
+        language: str = "zh",
+        mode: Optional[str] = None
+    ) -> AsyncGenerator[str, None]:
         """
         核心流式分析函数。
         这是一个异步生成器 (Async Generator)，专门配合 FastAPI 的 StreamingResponse 使用。
 
+        Args:
+            raw_data_context: 报关单原始数据
+            language: zh / vi
+            mode: paced / concurrent / combined，默认取 risk_rules.json 的 execution.mode
+
         Yields:
             str: 符合 SSE (Server-Sent Events) 格式的字符串
             格式示例: "data: {...json...}\n\n"
         """
+        mode = mode or self.default_mode
+        if mode not in EXECUTION_MODES:
+            raise ValueError(f"不支持的执行方式: {mode}（可选: {', '.join(EXECUTION_MODES)}）")
 
         # 根据 language 选择 display 字段
         display_key = 'display_vi' if language == 'vi' else 'display'
@@ -55,94 +107,212 @@ class RiskAnalysisOrchestrator:
             ]
         }
         yield self._format_sse(init_payload)
-        
-        # 稍微停顿一下，给前端渲染初始界面的时间
-        await asyncio.sleep(0.5)
+
+        # --- 阶段 2: 执行规则 ---
+        # 各规则结果（rule_id -> step_result 事件），总结按规则顺序生成，与完成顺序无关
+        results: Dict[str, dict] = {}
+        run = {PACED: self._run_paced, CONCURRENT: self._run_concurrent, COMBINED: self._run_combined}[mode]
+        async for event in run(raw_data_context, language, display_key, results):
+            yield event
 
         # 收集最终的风险计数，用于最后生成总结报告
-        risk_count = 0
-        risk_details = []
+        risk_details = [
+            f"{rule[display_key]['title']}: {results[rule['id']]['message']}"
+            for rule in self.active_rules if results[rule['id']]['status'] == "risk"
+        ]
+        risk_count = len(risk_details)
+
+        # --- 阶段 3: 最终总结 ---
+        # 所有步骤跑完，给出一个总结论（支持多语言）
+        if language == "vi":
+            final_conclusion = "[OK] Đề xuất thông quan: Không phát hiện rủi ro rõ ràng."
+            final_status = "pass"
+
+            if risk_count > 0:
+                final_conclusion = f"[Cảnh báo] Đề xuất chuyển kiểm tra thủ công: Phát hiện {risk_count} chỉ số rủi ro.\n" + "\n".join(risk_details)
+                final_status = "risk"
+        else:
+            final_conclusion = "[OK] 建议放行：未发现明显风险点。"
+            final_status = "pass"
+
+            if risk_count > 0:
+                final_conclusion = f"[Warning] 建议转人工查验：共发现 {risk_count} 项风险指标。\n" + "\n".join(risk_details)
+                final_status = "risk"
+
+        yield self._format_sse({
+            "type": "complete",
+            "final_status": final_status,
+            "summary": final_conclusion
+        })
+
+    async def _evaluate_rule(self, raw_data_context: str, rule: dict, language: str) -> dict:
+        """
+        构建 Prompt + 调用 LLM，返回 step_result 事件
+
+        规则执行中的异常（Prompt 构建、LLM 调用）记为该规则的风险结果，不中断其余规则；
+        各执行方式共用此处理，同一批数据的审查结果与执行方式无关
+        """
+        try:
+            return await self._call_rule(raw_data_context, rule, language)
+        except Exception as e:
+            print(f"[Orchestrator] 规则 {rule['id']} 执行失败: {e}")
+            return {
+                "type": "step_result",
+                "rule_id": rule['id'],
+                "status": "risk",
+                "icon": "x",
+                "message": f"规则执行异常: {str(e)[:50]}",
+                "color": "red"
+            }
+
+    async def _call_rule(self, raw_data_context: str, rule: dict, language: str) -> dict:
+        system_prompt = self.prompt_builder.build_system_prompt(language=language)
+        user_prompt = self.prompt_builder.build_user_prompt(raw_data_context, rule, language=language)
+
+        # 异步调用（共享连接池），并发执行的规则不占用线程
+        usage = Counter()
+        llm_result = await self.llm_service.acall_llm(system_prompt, user_prompt, usage=usage)
+        usage_by_rule[rule['id']].update(usage)
+
+        # 解构结果：["符号", "理由"]
+        step_result = self._step_result(rule, llm_result[0], llm_result[1])
+        # 本次调用的 token 用量（含前缀缓存命中数 cached_tokens），接口未返回时为空
+        step_result["usage"] = dict(usage)
+        return step_result
+
+    def _step_result(self, rule: dict, status_symbol: str, message: str) -> dict:
+        """LLM 判定 -> step_result 事件"""
+        # 判断是否风险（x 为风险）
+        is_risk = "x" in status_symbol.lower() or "fail" in status_symbol.lower()
 
-        # --- 阶段 2: 逐条规则执行循环 ---
-        for index, rule in enumerate(self.active_rules):
-            rule_id = rule['id']
-            rule_name = rule[display_key]['title']
+        # 前端收到这个，步骤条停止转圈，变绿(√)或变红(x)，并展开文字
+        return {
+            "type": "step_result",
+            "rule_id": rule['id'],
+            "status": "risk" if is_risk else "pass",
+            "icon": status_symbol,  # √ 或 x
+            "message": message,
+            "color": "red" if is_risk else "green" # 覆盖默认颜色
+        }
+
+    async def _run_paced(
+        self, raw_data_context: str, language: str, display_key: str, results: Dict[str, dict]
+    ) -> AsyncGenerator[str, None]:
+        """演示节奏：逐条规则执行"""
+        # 稍微停顿一下，给前端渲染初始界面的时间
+        await asyncio.sleep(0.5)
 
+        for rule in self.active_rules:
             # 2.1 [状态推送] 开始处理当前步骤
             # 前端收到这个，对应的步骤条开始转圈圈 (Loading)
             yield self._format_sse({
                 "type": "step_start",
-                "rule_id": rule_id,
+                "rule_id": rule['id'],
                 "loading_text": rule[display_key]['loading_text']
             })
-            
+
             # --- 模拟 AI 思考的“呼吸感” ---
             # 真实请求可能很快，但为了演示效果，我们强制让它至少“思考”1秒
             # 这样领导能看清“正在比对国家禁止目录...”这几个字
             start_time = time.time()
-            
+
             # 2.2 [核心逻辑] 构建 Prompt + 调用 LLM
-            # 这里最好用 await 异步调用，防止阻塞主线程
-            # (注：requests 是同步的，如果并发高需换 httpx，但演示够用了，这里用 asyncio.to_thread 包装一下)
-            system_prompt = self.prompt_builder.build_system_prompt(language=language)
-            user_prompt = self.prompt_builder.build_user_prompt(raw_data_context, rule, language=language)
-            
-            # 在线程池中执行同步的 LLM 调用，不阻塞 Event Loop
-            llm_result = await asyncio.to_thread(
-                self.llm_service.call_llm, system_prompt, user_prompt
-            )
-            
-            # 解构结果：["符号", "理由"]
-            status_symbol, message = llm_result[0], llm_result[1]
-            
-            # 判断是否风险（x 为风险）
-            is_risk = "x" in status_symbol.lower() or "fail" in status_symbol.lower()
-            if is_risk:
-                risk_count += 1
-                risk_details.append(f"{rule_name}: {message}")
+            step_result = await self._evaluate_rule(raw_data_context, rule, language)
+            results[rule['id']] = step_result
 
             # --- 节奏控制 ---
             # 如果 LLM 响应太快(<1.5s)，强行补足剩余时间
             elapsed = time.time() - start_time
             if elapsed < 1.5:
                 await asyncio.sleep(1.5 - elapsed)
-            
+
             # 2.3 [状态推送] 推送当前步骤结果
-            # 前端收到这个，步骤条停止转圈，变绿(√)或变红(x)，并展开文字
-            yield self._format_sse({
-                "type": "step_result",
-                "rule_id": rule_id,
-                "status": "risk" if is_risk else "pass",
-                "icon": status_symbol,  # √ 或 x
-                "message": message,
-                "color": "red" if is_risk else "green" # 覆盖默认颜色
-            })
-            
+            yield self._format_sse(step_result)
+
             # 步骤之间稍微喘口气
             await asyncio.sleep(1)
 
-        # --- 阶段 3: 最终总结 ---
-        # 所有步骤跑完，给出一个总结论（支持多语言）
-        if language == "vi":
-            final_conclusion = "[OK] Đề xuất thông quan: Không phát hiện rủi ro rõ ràng."
-            final_status = "pass"
+    async def _run_concurrent(
+        self, raw_data_context: str, language: str, display_key: str, results: Dict[str, dict],
+        rules: Optional[List[dict]] = None, emit_start: bool = True
+    ) -> AsyncGenerator[str, None]:
+        """
+        吞吐模式：全部规则（或指定的 rules）并发执行（不超过 max_concurrency 个），
+        每条规则真正开始调用时推送 step_start，完成时推送 step_result
 
-            if risk_count > 0:
-                final_conclusion = f"[Cảnh báo] Đề xuất chuyển kiểm tra thủ công: Phát hiện {risk_count} chỉ số rủi ro.\n" + "\n".join(risk_details)
-                final_status = "risk"
-        else:
-            final_conclusion = "[OK] 建议放行：未发现明显风险点。"
-            final_status = "pass"
+        emit_start=False 时不推送 step_start（合并模式回退时，各规则的 step_start 已推送过）
+        """
+        rules = self.active_rules if rules is None else rules
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        events: asyncio.Queue = asyncio.Queue()
 
-            if risk_count > 0:
-                final_conclusion = f"[Warning] 建议转人工查验：共发现 {risk_count} 项风险指标。\n" + "\n".join(risk_details)
-                final_status = "risk"
+        async def evaluate(rule: dict):
+            async with semaphore:
+                if emit_start:
+                    events.put_nowait({
+                        "type": "step_start",
+                        "rule_id": rule['id'],
+                        "loading_text": rule[display_key]['loading_text']
+                    })
+                events.put_nowait(await self._evaluate_rule(raw_data_context, rule, language))
 
-        yield self._format_sse({
-            "type": "complete",
-            "final_status": final_status,
-            "summary": final_conclusion
-        })
+        tasks = [asyncio.create_task(evaluate(rule)) for rule in rules]
+        try:
+            pending = len(tasks)
+            while pending:
+                event = await events.get()
+                if event["type"] == "step_result":
+                    results[event["rule_id"]] = event
+                    pending -= 1
+                yield self._format_sse(event)
+        finally:
+            # 客户端断开时不再等待其余规则
+            for task in tasks:
+                task.cancel()
+
+    async def _run_combined(
+        self, raw_data_context: str, language: str, display_key: str, results: Dict[str, dict]
+    ) -> AsyncGenerator[str, None]:
+        """
+        合并模式：一次 LLM 调用返回全部规则的判定（按 rule_id），
+        合并结果中缺失或格式不合法的规则单独走逐条审查（并发）；合并调用本身失败时全部规则逐条审查
+        """
+        for rule in self.active_rules:
+            yield self._format_sse({
+                "type": "step_start",
+                "rule_id": rule['id'],
+                "loading_text": rule[display_key]['loading_text']
+            })
+
+        usage = Counter()
+        try:
+            system_prompt = self.prompt_builder.build_system_prompt(language=language)
+            user_prompt = self.prompt_builder.build_combined_user_prompt(raw_data_context, self.active_rules, language=language)
+            verdicts = await self.llm_service.acall_llm_verdicts(
+                system_prompt, user_prompt, [rule['id'] for rule in self.active_rules], usage=usage
+            )
+        except Exception as e:
+            print(f"[Orchestrator] 合并审查失败，全部规则逐条审查: {e}")
+            verdicts = {}
+        usage_by_rule[COMBINED].update(usage)
+
+        fallback = []
+        for rule in self.active_rules:
+            verdict = verdicts.get(rule['id'])
+            if verdict is None:
+                fallback.append(rule)
+                continue
+            step_result = self._step_result(rule, verdict[0], verdict[1])
+            results[rule['id']] = step_result
+            yield self._format_sse(step_result)
+
+        if fallback:
+            print(f"[Orchestrator] 合并审查缺少 {len(fallback)} 条规则的有效判定，逐条重新审查: "
+                  f"{', '.join(rule['id'] for rule in fallback)}")
+            async for event in self._run_concurrent(
+                raw_data_context, language, display_key, results, rules=fallback, emit_start=False
+            ):
+                yield event
 
     def _format_sse(self, data: dict) -> str:
         """
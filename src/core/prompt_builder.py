@@ -1,6 +1,65 @@
 import json
 import os
+import threading
+import time
 from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# 规则 / RAG 文件的变化检查间隔（秒）：间隔内直接使用缓存，之后 stat 一次，mtime 或大小变化才重新读取
+REVALIDATE_INTERVAL_S = 2.0
+
+
+class _RevalidatingFileCache:
+    """
+    进程级文本文件缓存（规则 json 与 RAG txt 共用）
+
+    每个请求都会新建 PromptBuilder、每条规则都要读取 RAG 文件；缓存后同一文件在
+    REVALIDATE_INTERVAL_S 内不再访问磁盘，热修改文件最多延迟一个间隔生效。
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._entries: Dict[Path, Tuple[float, tuple, Any]] = {}  # 路径 -> (检查时间, (mtime_ns, size), 解析结果)
+        self._lock = threading.Lock()
+
+    def get(self, path: Path, parse: Callable[[str], Any]) -> Tuple[Any, tuple]:
+        """
+        返回 (解析结果, 文件版本)；文件不存在或读取 / 解析失败时抛出异常（不缓存失败结果）
+
+        Args:
+            path: 文件路径
+            parse: 文件文本 -> 缓存值，仅在首次读取或文件变化时调用
+        """
+        entry = self._entries.get(path)
+        if entry is not None and time.monotonic() - entry[0] < self.interval:
+            return entry[2], entry[1]
+
+        with self._lock:
+            now = time.monotonic()
+            entry = self._entries.get(path)
+            if entry is not None and now - entry[0] < self.interval:
+                return entry[2], entry[1]
+            try:
+                stat = path.stat()
+            except OSError:
+                self._entries.pop(path, None)
+                raise
+            version = (stat.st_mtime_ns, stat.st_size)
+            if entry is not None and entry[1] == version:
+                value = entry[2]
+            else:
+                with open(path, 'r', encoding='utf-8') as f:
+                    value = parse(f.read())
+            self._entries[path] = (now, version, value)
+            return value, version
+
+
+_file_cache = _RevalidatingFileCache(REVALIDATE_INTERVAL_S)
+
+# 用户 Prompt 中报关数据之前 / 之后的部分：(规则 ID, 语言) -> ((RAG 文件名, 审核指令, RAG 文件版本), (前缀, 后缀))
+# 每条规则每种语言只保留一项，规则或 RAG 文件修改后原地替换，条目数不随修改次数增长
+_user_prompt_frames: Dict[Tuple[Optional[str], str], Tuple[tuple, Tuple[str, str]]] = {}
+
 
 class PromptBuilder:
     def __init__(self, rule_config_path=None):
@@ -35,6 +94,18 @@ class PromptBuilder:
             "vi": "Vui lòng trả về một mảng JSON bao gồm hai phần: [\"biểu tượng\", \"kết luận ngắn gọn\"].\n- Nếu rủi ro thấp/đạt, biểu tượng là \"√\"。\n- Nếu rủi ro cao/cần kiểm tra, biểu tượng là \"x\"。\nVí dụ: [\"√\", \"Các yếu tố khai báo đầy đủ\"] hoặc [\"x\", \"Logic giá bất thường, nghi ngờ khai báo thấp\"]"
         }
 
+        # 合并审查（一次调用评估全部规则）的输出要求：按规则 ID 返回判定数组
+        self.combined_output_requirements = {
+            "zh": "请严格返回一个JSON数组，每个审查项对应一个对象，按审查项顺序排列，不要输出其他内容：\n"
+                  "[{\"rule_id\": \"审查项ID\", \"symbol\": \"符号\", \"message\": \"简短结论\"}, ...]\n"
+                  "- 如果风险低/通过，符号为 \"√\"。\n- 如果风险高/存疑，符号为 \"x\"。\n"
+                  "- 每个审查项仅依据其自身的指导文件判断，不同审查项的结论不要重复。",
+            "vi": "Vui lòng trả về một mảng JSON, mỗi hạng mục kiểm tra là một đối tượng, theo đúng thứ tự, không xuất nội dung khác:\n"
+                  "[{\"rule_id\": \"ID hạng mục\", \"symbol\": \"biểu tượng\", \"message\": \"kết luận ngắn gọn\"}, ...]\n"
+                  "- Nếu rủi ro thấp/đạt, biểu tượng là \"√\"。\n- Nếu rủi ro cao/cần kiểm tra, biểu tượng là \"x\"。\n"
+                  "- Mỗi hạng mục chỉ đánh giá dựa trên tài liệu hướng dẫn của chính nó, không lặp lại kết luận giữa các hạng mục."
+        }
+
         # 默认使用中文
         self.system_role = self.system_roles["zh"]
         self.output_requirement = self.output_requirements["zh"]
@@ -43,14 +114,16 @@ class PromptBuilder:
         self._load_rule_config()
 
     def _load_rule_config(self):
-        """加载 JSON 配置文件，带容错"""
-        try:
+        """加载 JSON 配置文件（进程级缓存，文件修改后重新解析），带容错"""
+        def parse(text: str) -> dict:
             print(f" [PromptBuilder] 加载规则配置: {self.rule_path}")
-            with open(self.rule_path, 'r', encoding='utf-8') as f:
-                #加载文件规则文件内容，并赋值给实例变量config
-                self.config = json.load(f)
-                self.system_role = self.config.get('meta', {}).get('system_role_definition', self.system_role)
-                self.output_requirement = self.config.get('global_output_requirement', self.output_requirement)
+            return json.loads(text)
+
+        try:
+            # 解析结果在各 PromptBuilder 间共享，只读使用
+            self.config, _ = _file_cache.get(self.rule_path, parse)
+            self.system_role = self.config.get('meta', {}).get('system_role_definition', self.system_role)
+            self.output_requirement = self.config.get('global_output_requirement', self.output_requirement)
         except Exception as e:
             print(f"[Error] [PromptBuilder] 规则加载失败: {e}")
             # 保持默认空配置，防止崩溃
@@ -59,20 +132,23 @@ class PromptBuilder:
         """
         动态加载指定的 RAG .txt 文件
         """
+        return self._load_rag_versioned(filename)[0]
+
+    def _load_rag_versioned(self, filename: str) -> Tuple[str, Optional[tuple]]:
+        """RAG 文件内容及其版本（未配置 RAG 文件时为空元组，文件缺失或读取失败时为 None，不缓存）"""
         if not filename:
-            return "无"
-            
+            return "无", ()
+
         file_path = self.config_dir / filename
         try:
-            # 每次读取都重新打开，方便你在不重启服务的情况下热修改txt内容
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return f.read()
+            # 经进程级缓存读取：文件修改后最多 REVALIDATE_INTERVAL_S 秒生效，仍可不重启服务热修改txt内容
+            return _file_cache.get(file_path, str)
         except FileNotFoundError:
             print(f"[Warning] [PromptBuilder] 警告: 找不到 RAG 文件 -> {filename}")
-            return "无（未找到对应的参考指导文件）"
+            return "无（未找到对应的参考指导文件）", None
         except Exception as e:
             print(f"[Error] [PromptBuilder] 读取 RAG 文件出错: {e}")
-            return "无（读取文件出错）"
+            return "无（读取文件出错）", None
 
     def build_system_prompt(self, language: str = "zh"):
         """构建系统提示词，支持多语言"""
@@ -83,7 +159,17 @@ class PromptBuilder:
 
     def build_user_prompt(self, raw_data_context, rule_item, language: str = "zh"):
         """
-        组装最终的 Prompt：指令 + RAG文件内容 + 数据
+        组装最终的 Prompt：指令 + RAG文件内容 + 输出要求 + 数据
+
+        报关数据放在最后：同一规则、同一语言的 Prompt 在数据之前逐字节一致，
+        连同系统提示词构成稳定前缀，可命中 DeepSeek / OpenAI 等厂商的前缀缓存
+        """
+        prefix, suffix = self._user_prompt_frame(rule_item, language)
+        return f"{prefix}{raw_data_context}{suffix}"
+
+    def _user_prompt_frame(self, rule_item, language: str) -> Tuple[str, str]:
+        """
+        报关数据前后的 Prompt 文本，按 (规则, 语言) 组装一次后缓存，RAG 文件变化时重新组装
         """
         # 根据语言选择对应的 instruction
         if language == "vi" and 'instruction_vi' in rule_item:
@@ -94,7 +180,13 @@ class PromptBuilder:
         rag_filename = rule_item.get('rag_file')
 
         # 动态加载对应的 txt 内容
-        rag_content = self._load_specific_rag_context(rag_filename)
+        rag_content, rag_version = self._load_rag_versioned(rag_filename)
+
+        key = (rule_item.get('id'), language)
+        source = (rag_filename, instruction, rag_version)
+        cached = _user_prompt_frames.get(key)
+        if cached is not None and rag_version is not None and cached[0] == source:
+            return cached[1]
 
         # 根据语言选择对应的输出要求
         output_requirement = self.output_requirements.get(language, self.output_requirements["zh"])
@@ -104,7 +196,7 @@ class PromptBuilder:
 
         # 越南语模式下使用越南语的标签，中文模式使用中文标签
         if language == "vi":
-            prompt = f"""
+            prefix = f"""
 【Hướng dẫn审核】
 {instruction}
 
@@ -117,16 +209,17 @@ Vui lòng đánh giá nghiêm ngặt dựa trên nội dung tài liệu sau:
 {rag_content}
 ================ END REFERENCE GUIDANCE ================
 
+【Yêu cầu输出】
+{output_requirement}
+
 【Hồ sơ hải quan cần kiểm tra】
 ================ BEGIN DATA ================
-{raw_data_context}
+"""
+            suffix = """
 ================ END DATA ================
-
-【Yêu cầu输出】
-{output_requirement}
 """
         else:
-            prompt = f"""
+            prefix = f"""
 【审核指令】
 {instruction}
 
@@ -139,13 +232,85 @@ Vui lòng đánh giá nghiêm ngặt dựa trên nội dung tài liệu sau:
 {rag_content}
 ================ END REFERENCE GUIDANCE ================
 
+【输出要求】
+{output_requirement}
+
 【待审核报关案卷】
 ================ BEGIN DATA ================
+"""
+            suffix = """
+================ END DATA ================
+"""
+        frame = (prefix.lstrip(), suffix.rstrip())
+        _user_prompt_frames[key] = (source, frame)
+        return frame
+
+    def build_combined_user_prompt(self, raw_data_context, rules, language: str = "zh"):
+        """
+        合并审查的 Prompt：全部规则的指令 + RAG 文件内容各出现一次，报关数据只出现一次
+
+        语言要求已在系统提示词中，这里不再重复。要求模型按 rule_id 返回判定数组，
+        解析见 LLMService.acall_llm_verdicts。报关数据放在最后，数据之前的部分可命中前缀缓存。
+        """
+        sections = []
+        for index, rule_item in enumerate(rules, start=1):
+            if language == "vi" and 'instruction_vi' in rule_item:
+                instruction = rule_item.get('instruction_vi', '')
+            else:
+                instruction = rule_item.get('instruction', '')
+            rag_content = self._load_specific_rag_context(rule_item.get('rag_file'))
+
+            if language == "vi":
+                sections.append(f"""### Hạng mục {index}: {rule_item['id']}
+【Hướng dẫn审核】
+{instruction}
+
+【Tài liệu hướng dẫn kiểm tra hải quan cấp cao (Cơ sở tham khảo)】
+================ BEGIN REFERENCE GUIDANCE ({rule_item['id']}) ================
+{rag_content}
+================ END REFERENCE GUIDANCE ({rule_item['id']}) ================""")
+            else:
+                sections.append(f"""### 审查项 {index}：{rule_item['id']}
+【审核指令】
+{instruction}
+
+【海关高级审查指导文件 (参考依据)】
+================ BEGIN REFERENCE GUIDANCE ({rule_item['id']}) ================
+{rag_content}
+================ END REFERENCE GUIDANCE ({rule_item['id']}) ================""")
+
+        rule_sections = "\n\n".join(sections)
+        output_requirement = self.combined_output_requirements.get(language, self.combined_output_requirements["zh"])
+
+        if language == "vi":
+            prompt = f"""
+【Nhiệm vụ】
+Vui lòng thực hiện lần lượt {len(rules)} hạng mục kiểm tra độc lập dưới đây đối với cùng một hồ sơ hải quan.
+
+{rule_sections}
+
+【Yêu cầu输出】
+{output_requirement}
+
+【Hồ sơ hải quan cần kiểm tra】
+================ BEGIN DATA ================
 {raw_data_context}
 ================ END DATA ================
+"""
+        else:
+            prompt = f"""
+【审核任务】
+请对同一份报关案卷依次完成以下 {len(rules)} 项相互独立的审查，每项请严格依据该项的指导文件内容进行判断。
+
+{rule_sections}
 
 【输出要求】
 {output_requirement}
+
+【待审核报关案卷】
+================ BEGIN DATA ================
+{raw_data_context}
+================ END DATA ================
 """
         return prompt.strip()
 
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, JSON, Float
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, JSON, Float, UniqueConstraint
 from sqlalchemy.orm import DeclarativeBase, relationship
 
 # 1. 定义基类，所有模型都要继承它
@@ -132,6 +132,25 @@ class PDFDocument(Base):
             and len(self.processed_text) > 100
         )
 
+# 6.1 定义【PDF页面缓存表】
+# 逐页记录提取结果与所用后端（文本层 / OCR），混合扫描件只对文字层不合格的页做 OCR
+class PDFPageCache(Base):
+    __tablename__ = "pdf_page_cache"
+    __table_args__ = (UniqueConstraint("file_hash", "page_index", name="uq_pdf_page"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    file_hash = Column(String(64), nullable=False, index=True)  # 所属文件的 SHA256
+    page_index = Column(Integer, nullable=False)                # 页序号（从 0 开始）
+
+    text = Column(Text, nullable=False, default="")
+    backend = Column(String(20), nullable=False)                # text_layer / marker
+    needs_ocr = Column(Boolean, default=False)                  # 文字层不合格且尚未 OCR（OCR 不可用或失败），下次重试
+
+    created_at = Column(DateTime, default=datetime.now, nullable=False)
+
+    def __repr__(self):
+        return f"<PDFPageCache(file_hash={self.file_hash[:8]}, page={self.page_index}, backend={self.backend})>"
+
 # 7. 定义【用户LLM配置表】
 # 用户可自定义LLM配置，优先级高于.env配置
 class UserLLMConfig(Base):
@@ -1,10 +1,10 @@
 """
 PDF文档缓存数据库操作
 """
-from typing import Optional, List
+from typing import Dict, Iterable, Optional, List, Tuple
 from datetime import datetime
 from sqlalchemy import select, func, delete
-from src.database.models import PDFDocument
+from src.database.models import PDFDocument, PDFPageCache
 from src.database.base import async_session_maker
 
 
@@ -27,6 +27,25 @@ class PDFRepository:
             )
             return result.scalar_one_or_none()
 
+    async def get_many_by_hash(self, file_hashes: Iterable[str]) -> Dict[str, PDFDocument]:
+        """
+        批量获取缓存（一次查询）
+
+        Args:
+            file_hashes: SHA256哈希值
+
+        Returns:
+            {file_hash: PDFDocument}，无缓存的哈希不出现在结果中
+        """
+        file_hashes = list(dict.fromkeys(file_hashes))
+        if not file_hashes:
+            return {}
+        async with async_session_maker() as db:
+            result = await db.execute(
+                select(PDFDocument).where(PDFDocument.file_hash.in_(file_hashes))
+            )
+            return {doc.file_hash: doc for doc in result.scalars().all()}
+
     async def get_by_path(self, file_path: str) -> Optional[PDFDocument]:
         """
         根据文件路径获取缓存
@@ -71,14 +90,25 @@ class PDFRepository:
             保存后的PDFDocument对象
         """
         async with async_session_maker() as db:
-            # 查询是否已存在
+            # 查询是否已存在（同一路径的文件内容变化后哈希不同，按路径更新原记录，file_path 唯一）
             existing = await db.execute(
-                select(PDFDocument).where(PDFDocument.file_hash == file_hash)
+                select(PDFDocument).where(
+                    (PDFDocument.file_hash == file_hash) | (PDFDocument.file_path == file_path)
+                )
             )
-            doc = existing.scalar_one_or_none()
+            matches = existing.scalars().all()
+            doc = next((d for d in matches if d.file_hash == file_hash), None) or (matches[0] if matches else None)
+            for stale in matches:
+                if stale is not doc:
+                    await db.delete(stale)
+            await db.flush()  # 先删除再更新，避免 file_path 唯一约束冲突
 
             if doc:
                 # 更新
+                doc.file_path = file_path
+                doc.file_name = file_name
+                doc.file_hash = file_hash
+                doc.file_size = file_size
                 doc.processed_text = processed_text
                 doc.char_count = len(processed_text)
                 doc.processing_time = processing_time
@@ -106,6 +136,56 @@ class PDFRepository:
             await db.refresh(doc)
             return doc
 
+    async def get_pages(self, file_hash: str) -> Dict[int, PDFPageCache]:
+        """
+        获取一个文件的逐页缓存
+
+        Args:
+            file_hash: SHA256哈希值
+
+        Returns:
+            {页序号: PDFPageCache}
+        """
+        async with async_session_maker() as db:
+            result = await db.execute(
+                select(PDFPageCache).where(PDFPageCache.file_hash == file_hash)
+            )
+            return {page.page_index: page for page in result.scalars().all()}
+
+    async def save_pages(self, file_hash: str, pages: Iterable[Tuple[int, str, str, bool]]) -> int:
+        """
+        保存或覆盖逐页缓存
+
+        Args:
+            file_hash: SHA256哈希值
+            pages: (页序号, 文本, 后端, 是否仍需OCR)
+
+        Returns:
+            写入的页数
+        """
+        pages = {page_index: (text, backend, needs_ocr) for page_index, text, backend, needs_ocr in pages}
+        if not pages:
+            return 0
+        async with async_session_maker() as db:
+            await db.execute(
+                delete(PDFPageCache).where(
+                    PDFPageCache.file_hash == file_hash,
+                    PDFPageCache.page_index.in_(list(pages))
+                )
+            )
+            db.add_all([
+                PDFPageCache(
+                    file_hash=file_hash,
+                    page_index=page_index,
+                    text=text,
+                    backend=backend,
+                    needs_ocr=needs_ocr
+                )
+                for page_index, (text, backend, needs_ocr) in pages.items()
+            ])
+            await db.commit()
+            return len(pages)
+
     async def get_all_cached(self) -> List[PDFDocument]:
         """
         获取所有有效的缓存文档
@@ -156,6 +236,7 @@ class PDFRepository:
             count = result.scalar() or 0
 
             await db.execute(delete(PDFDocument))
+            await db.execute(delete(PDFPageCache))
             await db.commit()
             return count
 
@@ -29,6 +29,7 @@ from src.services.chat_agent import CustomsChatAgent
 from src.services.report_agent import ComplianceReporter
 from src.database.base import init_database
 from src.config.loader import settings
+from src.services import http_pool
 
 # --- 4. 生命周期管理 ---
 @asynccontextmanager
@@ -91,11 +92,19 @@ async def lifespan(app: FastAPI):
         image_config_loader.set_config(image_config)
 
     # 初始化全局KnowledgeBase（单例模式，所有Agent共享）
+    # 模型与索引在后台加载，审单 / 配置接口无需等待；依赖知识库的接口经 wait_ready 等待或返回 503
+    app.state.kb_init_task = None
     try:
         from src.services.knowledge_base import KnowledgeBase
-        print("⚙️ [System] 正在初始化知识库（单例，全局共享）...")
-        app.state.kb = KnowledgeBase()  # ← 只创建一次，所有Agent共享
-        print("✅ [System] 知识库初始化完成")
+        from src.config.kb_loader import load_kb_config
+        background = load_kb_config()["startup"].get("background", True)
+        print(f"⚙️ [System] 正在初始化知识库（单例，全局共享，{'后台加载' if background else '同步加载'}）...")
+        app.state.kb = KnowledgeBase(lazy=background)  # ← 只创建一次，所有Agent共享
+        if background:
+            app.state.kb_init_task = asyncio.create_task(app.state.kb.initialize())
+            print("✅ [System] 知识库已开始后台加载（就绪状态见 /api/v1/health/ready）")
+        else:
+            print("✅ [System] 知识库初始化完成")
     except Exception as e:
         print(f"❌ [System] 知识库初始化失败: {e}")
         app.state.kb = None
@@ -140,6 +149,10 @@ async def lifespan(app: FastAPI):
     print("="*50 + "\n")
     yield
     print("\n🛑 [System] 服务正在关闭...")
+    await http_pool.aclose_all()
+    kb = getattr(app.state, "kb", None)
+    if kb is not None and kb.pdf_service is not None:
+        kb.pdf_service.close()
 
 app = FastAPI(
     title="Customs AI Agent", 
@@ -0,0 +1,168 @@
+"""
+文字层优先的 PDF 提取（逐页 OCR 兜底）
+
+pypdfium2 读取文字层很快，但扫描页没有文字层、部分字体缺少 ToUnicode 映射时文字层为乱码；
+Marker 能识别这些页，但对整个文件运行代价很高。这里逐页判断：
+
+1. 先用 pypdfium2 读取每页文字层，按 PDFService.page_needs_ocr 打分（字数、中文比例、乱码比例）
+2. 只有不合格的页交给 Marker，每 ocr_batch_pages 页合并为一次调用
+3. 每页的文本与所用后端写入 pdf_page_cache 表（按文件哈希 + 页序号），下次直接复用；
+   OCR 不可用或失败的页记为 needs_ocr，下次重试
+
+数字版与扫描页混合的 PDF 只为扫描页付出 OCR 开销。
+"""
+import asyncio
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from src.services.pdf_service import PDFService
+
+TEXT_LAYER = "text_layer"
+MARKER = "marker"
+
+# 写入 PDF 整文件缓存的处理器标识：经过逐页 OCR 兜底的结果
+PIPELINE_VERSION = "pypdfium2+marker"
+
+
+@dataclass
+class AdaptiveExtraction:
+    """单个文件的逐页提取结果"""
+    text: str
+    page_count: int
+    backends: Counter = field(default_factory=Counter)  # 后端 -> 页数
+    cached_pages: int = 0
+    pending_ocr: int = 0  # 文字层不合格、但本次未能 OCR 的页数
+    processing_time: float = 0.0
+
+    @property
+    def complete(self) -> bool:
+        return self.pending_ocr == 0
+
+
+class AdaptivePDFExtractor:
+    """
+    逐页选择文字层 / OCR 的 PDF 提取器
+
+    Args:
+        pdf_service: 文字层提取与逐页质量判断
+        repository: PDFRepository（逐页缓存），None 时不缓存
+        ocr_batch_pages: 每次 Marker 调用处理的页数
+    """
+
+    def __init__(self, pdf_service: PDFService, repository=None, ocr_batch_pages: int = 8):
+        self.pdf_service = pdf_service
+        self.repository = repository
+        self.ocr_batch_pages = max(1, ocr_batch_pages)
+        self._ocr = None
+        self._ocr_unavailable = False
+
+    @property
+    def ocr(self):
+        """Marker 服务（首次需要 OCR 时加载，加载失败后不再重试；加载模型耗时较长，异步代码中经 _get_ocr 读取）"""
+        if self._ocr is None and not self._ocr_unavailable:
+            try:
+                from src.services.marker_service import MarkerService
+                self._ocr = MarkerService()
+            except Exception as e:
+                print(f"⚠️ [AdaptivePDF] OCR 后端不可用，文字层不合格的页保留原文: {e}")
+                self._ocr_unavailable = True
+        return self._ocr
+
+    async def _get_ocr(self):
+        """在线程中加载 Marker 模型，不阻塞事件循环（已加载或已确认不可用时直接返回）"""
+        if self._ocr is not None or self._ocr_unavailable:
+            return self._ocr
+        return await asyncio.to_thread(lambda: self.ocr)
+
+    async def extract(self, pdf_path: Path, file_hash: str) -> AdaptiveExtraction:
+        """读取文字层后按页补 OCR"""
+        page_texts = await asyncio.to_thread(self.pdf_service.extract_pages, str(pdf_path))
+        return await self.refine(pdf_path, file_hash, page_texts)
+
+    async def refine(self, pdf_path: Path, file_hash: str, page_texts: List[str]) -> AdaptiveExtraction:
+        """
+        在已提取的文字层（如 PDFService.extract_many 的 pages）上，对不合格的页补 OCR
+
+        Args:
+            pdf_path: PDF 文件
+            file_hash: 文件内容哈希（逐页缓存键）
+            page_texts: 逐页文字层文本
+        """
+        start_time = time.time()
+        result = AdaptiveExtraction(text="", page_count=len(page_texts))
+        cached = {}
+        if self.repository is not None:
+            try:
+                cached = await self.repository.get_pages(file_hash)
+            except Exception as e:
+                print(f"⚠️ [AdaptivePDF] 读取逐页缓存失败: {e}")
+
+        pages: List[str] = list(page_texts)
+        backends: List[str] = [TEXT_LAYER] * len(pages)
+        to_save: Dict[int, bool] = {}  # 页序号 -> 是否仍需 OCR
+        to_ocr: List[int] = []
+        retry: List[int] = []  # 缓存中仍待 OCR 的页：OCR 可用时重试，否则沿用缓存
+
+        for index, text in enumerate(page_texts):
+            page = cached.get(index)
+            if page is not None and page.needs_ocr:
+                retry.append(index)
+            elif page is not None:
+                pages[index], backends[index] = page.text, page.backend
+                result.cached_pages += 1
+            elif self.pdf_service.page_needs_ocr(text):
+                to_ocr.append(index)
+            else:
+                to_save[index] = False
+
+        # 只有确实有页需要 OCR 时才加载模型（在线程中加载，只读取一次）
+        ocr = await self._get_ocr() if to_ocr or retry else None
+        if ocr is not None:
+            to_ocr = sorted(to_ocr + retry)
+        else:
+            for index in retry:
+                pages[index], backends[index] = cached[index].text, cached[index].backend
+            result.pending_ocr += len(retry)
+            result.cached_pages += len(retry)
+
+        if to_ocr and ocr is not None:
+            for start in range(0, len(to_ocr), self.ocr_batch_pages):
+                batch = to_ocr[start:start + self.ocr_batch_pages]
+                try:
+                    ocr_pages = await asyncio.to_thread(ocr.extract_pages, str(pdf_path), batch)
+                except Exception as e:
+                    print(f"⚠️ [AdaptivePDF] {Path(pdf_path).name} 第 {batch[0] + 1}-{batch[-1] + 1} 页 OCR 失败: {e}")
+                    ocr_pages = None
+                for index in batch:
+                    if ocr_pages is None:
+                        to_save[index] = True
+                        result.pending_ocr += 1
+                        continue
+                    # Marker 也识别不出内容的页（空白页）保留文字层
+                    if ocr_pages.get(index):
+                        pages[index], backends[index] = ocr_pages[index], MARKER
+                    to_save[index] = False
+        else:
+            for index in to_ocr:
+                to_save[index] = True
+            result.pending_ocr += len(to_ocr)
+
+        if to_save and self.repository is not None:
+            try:
+                await self.repository.save_pages(file_hash, [
+                    (index, pages[index], backends[index], needs_ocr) for index, needs_ocr in to_save.items()
+                ])
+            except Exception as e:
+                print(f"⚠️ [AdaptivePDF] 保存逐页缓存失败: {e}")
+
+        result.text = "\n\n".join(pages)
+        result.backends = Counter(backends)
+        result.processing_time = time.time() - start_time
+        if to_ocr or result.pending_ocr:
+            print(f"📄 [AdaptivePDF] {Path(pdf_path).name}: {len(pages)} 页，"
+                  f"OCR {result.backends[MARKER]} 页，待 OCR {result.pending_ocr} 页，"
+                  f"逐页缓存命中 {result.cached_pages} 页 ({result.processing_time:.1f}秒)")
+        return result
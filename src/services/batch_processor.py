@@ -170,7 +170,8 @@ class BatchProcessor:
         }
 
         # 收集所有 SSE 事件
-        async for event in self.orchestrator.analyze_stream(raw_data):
+        # 批量任务无需演示节奏，全部规则并发执行
+        async for event in self.orchestrator.analyze_stream(raw_data, mode="concurrent"):
             # 解析 SSE 事件
             if event.startswith('data: '):
                 json_str = event[6:]  # 去掉 'data: '
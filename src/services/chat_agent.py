@@ -22,7 +22,8 @@ if sys.platform == 'win32':
 
 from langgraph.prebuilt import create_react_agent 
 from langchain_openai import ChatOpenAI
-from langchain_core.tools import Tool
+from langchain_core.tools import Tool, StructuredTool
+from pydantic import BaseModel, Field
 from langgraph.checkpoint.memory import InMemorySaver
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 
@@ -49,6 +50,8 @@ except ImportError:
 # 知识库模块容错处理
 try:
     from src.services.knowledge_base import KnowledgeBase
+    from src.services.search_filter import SearchFilter
+    from src.services.tariff_catalog import format_rows
     print("[ChatAgent] 成功加载知识库模块 (RAG System Ready)")
 except ImportError as e:
     print(f"[Warning] 知识库模块加载失败: {e}")
@@ -242,7 +245,8 @@ class CustomsChatAgent:
             orch = RiskAnalysisOrchestrator(llm_config=self.config)
             findings = []
 
-            async for event_str in orch.analyze_stream(raw_data, language="zh"):
+            # 工具调用无需演示节奏，全部规则并发执行
+            async for event_str in orch.analyze_stream(raw_data, language="zh", mode="concurrent"):
                 if not event_str.startswith("data: "): continue
                 try:
                     data = json.loads(event_str[6:])
@@ -264,24 +268,56 @@ class CustomsChatAgent:
         ))
 
         # RAG 知识库检索工具
-        if KnowledgeBase:
-            self.kb = kb if kb else KnowledgeBase()
+        # 未传入 kb（如知识库仍在加载）时不提供检索工具，不在请求中临时构建知识库
+        self.kb = None
+        self.retriever = None
+        if KnowledgeBase and kb is not None:
+            self.kb = kb
             self.retriever = self.kb.get_retriever()
 
-            def retrieve_docs(query: str) -> str:
+            class RegulationSearchArgs(BaseModel):
+                query: str = Field(description="检索内容")
+                sources: Optional[str] = Field(default=None, description="只检索文件名包含这些关键词的文件，多个用逗号分隔（如 凭祥,征税管理办法）")
+                exclude_sources: Optional[str] = Field(default=None, description="排除文件名包含这些关键词的文件，多个用逗号分隔")
+                file_type: Optional[str] = Field(default=None, description="只检索该类型的文件：pdf / txt / md")
+
+            def retrieve_docs(query: str, sources: Optional[str] = None,
+                              exclude_sources: Optional[str] = None, file_type: Optional[str] = None) -> str:
                 if not self.retriever: return "知识库未就绪。"
                 try:
-                    print(f"🔍 [Tool Call] 正在检索知识库: {query}")
-                    docs = self.retriever.invoke(query)
+                    search_filter = SearchFilter.from_dict({
+                        "sources": sources, "exclude_sources": exclude_sources, "file_types": file_type
+                    })
+                    print(f"🔍 [Tool Call] 正在检索知识库: {query}" + (f" (过滤: {search_filter.to_dict()})" if search_filter else ""))
+                    retriever = self.kb.get_retriever(search_filter=search_filter) if search_filter else self.retriever
+                    docs = retriever.invoke(query)
                     if not docs: return "本地法规库中未找到直接相关的依据。"
                     return "\n\n".join([doc.page_content for doc in docs])
                 except Exception as e:
                     return f"知识库检索异常: {str(e)}"
 
-            self.tools.append(Tool(
-                name="search_customs_regulations",
+            self.tools.append(StructuredTool.from_function(
                 func=retrieve_docs,
+                name="search_customs_regulations",
+                args_schema=RegulationSearchArgs,
                 description="查询海关相关法规、政策文件、HS编码解释。遇到专业名词或法律疑问时必须使用。"
+                            "明确只需某个文件（如某口岸的办事指南）或某类文件时，用 sources / exclude_sources / file_type 限定检索范围。"
+            ))
+
+            def lookup_declaration_elements(code: str) -> str:
+                try:
+                    print(f"📑 [Tool Call] 查询申报目录: {code}")
+                    rows = self.kb.lookup_tariff(code.strip(), limit=10)
+                    if not rows: return f"申报目录中未找到编码 {code}，可改用 search_customs_regulations 检索。"
+                    return format_rows(rows)
+                except Exception as e:
+                    return f"申报目录查询异常: {str(e)}"
+
+            self.tools.append(Tool(
+                name="lookup_declaration_elements",
+                func=lookup_declaration_elements,
+                description="按 HS 编码精确查询《涉税规范申报目录》中的商品名称与申报要素（查表，结果完整且不耗检索）。"
+                            "输入 HS 编码，如 8542.3111、85423111 或税目 8542。问某编码要申报哪些要素时优先使用。"
             ))
 
         # --- 4.5 初始化技能管理器 ---
@@ -301,9 +337,12 @@ class CustomsChatAgent:
             self.script_executor = None
 
         # --- 4.7 初始化报告生成器（功能三：深度研究工具） ---
-        if REPORTER_AVAILABLE:
+        if REPORTER_AVAILABLE and self.kb is None:
+            print("[ChatAgent] 知识库未就绪，本次对话不启用报告生成器")
+            self.reporter = None
+        elif REPORTER_AVAILABLE:
             try:
-                self.reporter = ComplianceReporter(kb=kb if KnowledgeBase else None, llm_config=self.config)
+                self.reporter = ComplianceReporter(kb=self.kb, llm_config=self.config)
                 print("[ChatAgent] ✅ 报告生成器已就绪（深度研究工具）")
             except Exception as e:
                 print(f"[ChatAgent] ❌ 报告生成器初始化失败: {e}")
@@ -863,7 +902,7 @@ L1层（技能清单）- 当前已加载以下技能：
 
 【核心工作守则】
 1. 审计：用户粘贴报关单后，主动调用 `audit_declaration`。
-2. 咨询：法律疑问调用 `search_customs_regulations`。
+2. 咨询：法律疑问调用 `search_customs_regulations`；问某个 HS 编码的申报要素时调用 `lookup_declaration_elements`。
 3. 协同：审单发现风险后，可检索法规条文来支撑你的解释。
 4. 语言：严禁跳出用户当前使用的语言（中文或越南语）。
 
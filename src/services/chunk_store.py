@@ -0,0 +1,140 @@
+"""
+Chunk 文本存储
+
+- InMemoryDocstore（LangChain 默认）：index.pkl 反序列化后全部文本常驻内存
+- SQLiteDocstore：chunk 文本与 metadata 存放在索引版本目录的 chunks.db，
+  按 chunk id 主键查询，检索时只读取 top-k 命中的文本；版本目录发布后不再修改，
+  以只读 + immutable 方式打开，多个 worker 进程共享操作系统页缓存
+
+下方的 get_documents / iter_documents / count_documents 屏蔽两种存储的差异。
+"""
+import json
+import sqlite3
+import threading
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+
+from langchain_community.docstore.base import Docstore
+from langchain_core.documents import Document
+
+CHUNK_DB_FILE = "chunks.db"
+
+
+def write_chunk_db(index_dir: Path, documents: Iterable[Tuple[int, Document]]):
+    """把 chunk 写入版本目录的 chunks.db（构建阶段调用）"""
+    db_path = Path(index_dir) / CHUNK_DB_FILE
+    conn = sqlite3.connect(str(db_path))
+    try:
+        conn.execute(
+            "CREATE TABLE chunks (chunk_id INTEGER PRIMARY KEY, page_content TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+        conn.executemany(
+            "INSERT INTO chunks (chunk_id, page_content, metadata) VALUES (?, ?, ?)",
+            (
+                (chunk_id, doc.page_content, json.dumps(doc.metadata, ensure_ascii=False))
+                for chunk_id, doc in documents
+            )
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+class SQLiteDocstore(Docstore):
+    """只读的 SQLite chunk 存储（每个线程一个连接）"""
+
+    # SQLite IN 查询的单批参数数量上限
+    QUERY_BATCH = 500
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self._local = threading.local()
+        self._count = self._connection().execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            uri = f"{self.db_path.resolve().as_uri()}?mode=ro&immutable=1"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _to_document(page_content: str, metadata: str) -> Document:
+        return Document(page_content=page_content, metadata=json.loads(metadata))
+
+    def search(self, search: Union[int, str]) -> Union[str, Document]:
+        row = self._connection().execute(
+            "SELECT page_content, metadata FROM chunks WHERE chunk_id = ?", (int(search),)
+        ).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return self._to_document(*row)
+
+    def mget(self, chunk_ids: List[int]) -> Dict[int, Document]:
+        result = {}
+        conn = self._connection()
+        for start in range(0, len(chunk_ids), self.QUERY_BATCH):
+            batch = [int(i) for i in chunk_ids[start:start + self.QUERY_BATCH]]
+            placeholders = ",".join("?" * len(batch))
+            for chunk_id, page_content, metadata in conn.execute(
+                f"SELECT chunk_id, page_content, metadata FROM chunks WHERE chunk_id IN ({placeholders})", batch
+            ):
+                result[chunk_id] = self._to_document(page_content, metadata)
+        return result
+
+    def iter_all(self) -> Iterator[Tuple[int, Document]]:
+        for chunk_id, page_content, metadata in self._connection().execute(
+            "SELECT chunk_id, page_content, metadata FROM chunks ORDER BY chunk_id"
+        ):
+            yield chunk_id, self._to_document(page_content, metadata)
+
+    def ids(self) -> List[int]:
+        return [row[0] for row in self._connection().execute("SELECT chunk_id FROM chunks ORDER BY chunk_id")]
+
+    def __len__(self) -> int:
+        return self._count
+
+
+class IdentityIdMap(Mapping):
+    """
+    FAISS id -> docstore id 的恒等映射（chunk id 同时用作 FAISS id 与存储主键），
+    代替逐条构建的 index_to_docstore_id 字典
+    """
+
+    def __init__(self, docstore: "SQLiteDocstore"):
+        self.docstore = docstore
+
+    def __getitem__(self, key):
+        return int(key)
+
+    def get(self, key, default=None):
+        return int(key) if key >= 0 else default
+
+    def __iter__(self):
+        return iter(self.docstore.ids())
+
+    def __len__(self) -> int:
+        return len(self.docstore)
+
+
+def get_documents(docstore: Docstore, chunk_ids: List) -> Dict:
+    """按 id 批量取 chunk，不存在的 id 不出现在结果中"""
+    if isinstance(docstore, SQLiteDocstore):
+        return docstore.mget(chunk_ids)
+    docs = docstore._dict
+    return {chunk_id: docs[chunk_id] for chunk_id in chunk_ids if chunk_id in docs}
+
+
+def iter_documents(docstore: Docstore) -> Iterator[Tuple]:
+    if isinstance(docstore, SQLiteDocstore):
+        return docstore.iter_all()
+    return iter(list(docstore._dict.items()))
+
+
+def count_documents(docstore: Docstore) -> int:
+    if isinstance(docstore, SQLiteDocstore):
+        return len(docstore)
+    return len(docstore._dict)
+
@@ -0,0 +1,189 @@
+"""
+检索结果的相邻 chunk 拼接 (Neighbor-chunk stitching)
+
+索引使用较小的 chunk 保证向量精确；检索命中后再沿 prev_id / next_id 向两侧扩展相邻 chunk，
+补足 LLM 需要的上下文：
+1. 同一文件中相邻或重叠的命中先合并为一个窗口（分数取最高者，排名取最靠前者）
+2. 按排名轮流为每个窗口向后、向前各扩展一个 chunk，直到达到每侧 max_neighbors 个或总字数预算 max_chars
+   （命中本身总是保留，预算只约束扩展部分）
+3. 扩展后相接的窗口再次合并；窗口内的 chunk 按 char_start / char_end 去除重叠部分后拼接
+
+每个 chunk 的 metadata 需带 chunk_id / file_path，以及 chunk_index / prev_id / next_id（见 KnowledgeBase._tag_chunks）；
+旧版索引缺少后三项时按 chunk id ±1 查找并校验所属文件（同一文件的 chunk id 连续分配）。
+"""
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+# fetch(chunk_ids) -> {chunk_id: Document}，不存在的 id 不出现在结果中
+FetchDocuments = Callable[[List[int]], Dict[int, Document]]
+
+
+@dataclass
+class _Window:
+    rank: int
+    score: float
+    hit: Document
+    docs: List[Document] = field(default_factory=list)  # 按文件内顺序排列
+    added: Dict[str, int] = field(default_factory=lambda: {"prev": 0, "next": 0})
+    closed: Dict[str, bool] = field(default_factory=lambda: {"prev": False, "next": False})
+
+    @property
+    def file_path(self):
+        return self.hit.metadata.get("file_path")
+
+    @property
+    def first(self) -> Document:
+        return self.docs[0]
+
+    @property
+    def last(self) -> Document:
+        return self.docs[-1]
+
+
+def _position(doc: Document) -> int:
+    """chunk 在文件内的序号（旧版索引退回 chunk id，同一文件内同样连续）"""
+    return doc.metadata.get("chunk_index", doc.metadata["chunk_id"])
+
+
+def _neighbor_id(doc: Document, side: str) -> Optional[int]:
+    key = "next_id" if side == "next" else "prev_id"
+    if key in doc.metadata:
+        return doc.metadata[key]
+    return doc.metadata["chunk_id"] + (1 if side == "next" else -1)
+
+
+def _is_neighbor(window: _Window, doc: Document, side: str) -> bool:
+    """校验取回的 chunk 确实与窗口相邻（索引版本切换后 id 可能指向其他文件）"""
+    if doc.metadata.get("file_path") != window.file_path:
+        return False
+    edge = window.last if side == "next" else window.first
+    return _position(doc) == _position(edge) + (1 if side == "next" else -1)
+
+
+def stitch_text(docs: List[Document]) -> str:
+    """按 char 偏移拼接同一文件中连续的 chunk，去除相邻 chunk 的重叠部分；缺少偏移时以换行连接"""
+    text = docs[0].page_content
+    previous = docs[0]
+    for doc in docs[1:]:
+        start, end = doc.metadata.get("char_start"), doc.metadata.get("char_end")
+        previous_end = previous.metadata.get("char_end")
+        same_document = doc.metadata.get("source") == previous.metadata.get("source")
+        if start is None or previous_end is None or not same_document or start >= previous_end:
+            text += "\n" + doc.page_content
+        elif end > previous_end:
+            text += doc.page_content[previous_end - start:]
+        previous = doc
+    return text
+
+
+def _stitched_length(window: _Window) -> int:
+    return len(stitch_text(window.docs))
+
+
+def _merge_windows(windows: List[_Window]) -> List[_Window]:
+    """合并同一文件中相接或重叠的窗口，结果按排名排序"""
+    by_file: Dict = {}
+    for window in windows:
+        by_file.setdefault(window.file_path, []).append(window)
+
+    merged = []
+    for file_path, group in by_file.items():
+        if file_path is None:
+            merged.extend(group)
+            continue
+        group.sort(key=lambda w: _position(w.first))
+        current = group[0]
+        for window in group[1:]:
+            if _position(window.first) <= _position(current.last) + 1:
+                seen = {_position(doc) for doc in current.docs}
+                current.docs.extend(doc for doc in window.docs if _position(doc) not in seen)
+                current.docs.sort(key=_position)
+                if window.rank < current.rank:
+                    current.rank, current.hit = window.rank, window.hit
+                current.score = max(current.score, window.score)
+                for side in ("prev", "next"):
+                    current.added[side] = max(current.added[side], window.added[side])
+                current.closed = {"prev": False, "next": False}
+            else:
+                merged.append(current)
+                current = window
+        merged.append(current)
+    return sorted(merged, key=lambda w: w.rank)
+
+
+def stitch_neighbors(
+    results: List[Tuple[Document, float]],
+    fetch: FetchDocuments,
+    max_chars: int = 3000,
+    max_neighbors: int = 2
+) -> List[Tuple[Document, float]]:
+    """
+    为检索结果拼接相邻 chunk
+
+    Args:
+        results: 检索结果 [(Document, 分数)]，按相关度排序
+        fetch: 按 id 批量读取 chunk
+        max_chars: 本次调用全部结果的总字数预算
+        max_neighbors: 每个命中向每侧最多扩展的 chunk 数
+
+    Returns:
+        [(拼接后的 Document, 分数)]，按排名排序；metadata 取排名最靠前的命中，
+        另记 chunk_ids（窗口内全部 chunk id）与窗口的 char_start / char_end
+    """
+    windows = []
+    passthrough = []
+    for rank, (doc, score) in enumerate(results):
+        if "chunk_id" in doc.metadata:
+            windows.append(_Window(rank=rank, score=score, hit=doc, docs=[doc]))
+        else:
+            passthrough.append((rank, doc, score))
+    windows = _merge_windows(windows)
+
+    total = sum(_stitched_length(window) for window in windows)
+    for _ in range(max_neighbors):
+        wanted = []
+        for window in windows:
+            for side, edge in (("next", window.last), ("prev", window.first)):
+                if window.closed[side] or window.added[side] >= max_neighbors:
+                    continue
+                neighbor_id = _neighbor_id(edge, side)
+                if neighbor_id is None or neighbor_id < 0:
+                    window.closed[side] = True
+                else:
+                    wanted.append((window, side, neighbor_id))
+        if not wanted or total >= max_chars:
+            break
+
+        fetched = fetch(list(dict.fromkeys(neighbor_id for _, _, neighbor_id in wanted)))
+        for window, side, neighbor_id in wanted:
+            doc = fetched.get(neighbor_id)
+            if doc is None or not _is_neighbor(window, doc, side):
+                window.closed[side] = True
+                continue
+            before = _stitched_length(window)
+            docs = window.docs + [doc] if side == "next" else [doc] + window.docs
+            growth = len(stitch_text(docs)) - before
+            if total + growth > max_chars:
+                window.closed[side] = True
+                continue
+            window.docs = docs
+            window.added[side] += 1
+            total += growth
+
+        windows = _merge_windows(windows)
+        total = sum(_stitched_length(window) for window in windows)
+
+    stitched = []
+    for window in windows:
+        metadata = dict(window.hit.metadata)
+        metadata["chunk_ids"] = [doc.metadata["chunk_id"] for doc in window.docs]
+        if window.first.metadata.get("char_start") is not None:
+            metadata["char_start"] = window.first.metadata["char_start"]
+        if window.last.metadata.get("char_end") is not None:
+            metadata["char_end"] = window.last.metadata["char_end"]
+        stitched.append((window.rank, Document(page_content=stitch_text(window.docs), metadata=metadata), window.score))
+    stitched.extend(passthrough)
+    stitched.sort(key=lambda item: item[0])
+    return [(doc, score) for _, doc, score in stitched]
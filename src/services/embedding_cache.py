@@ -0,0 +1,429 @@
+"""
+Chunk 向量的持久化缓存
+
+以 (模型名, 是否归一化, chunk 文本哈希) 为键缓存 embedding，所有建索引路径都先查缓存，
+只对未命中的文本调用模型。存储格式：
+- vectors.f32: float32 向量矩阵（按行追加）
+- index.db:    SQLite 索引表 (text_hash -> 行号, 最近使用时间)
+- cache.lock:  进程间文件锁（多个 uvicorn worker / 重建进程共用同一缓存目录）
+
+所有 SQLite 写入（追加、压缩、最近使用时间）都持有排他锁，读取只持有共享锁：
+命中时的最近使用时间先记在进程内，随下一次写入（或积累到 TOUCH_FLUSH 条时）一并写回。
+压缩会替换向量文件并重排行号，读取前比对向量文件的 inode 与大小，变化时重新映射；
+写入中途崩溃留下的残缺行在下一次取得排他锁时截掉，保证行号与文件偏移一致。
+
+查询向量另有进程内 LRU 缓存 (QueryEmbeddingCache)，不落盘。
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class EmbeddingCache:
+    """
+    磁盘向量缓存（按命名空间隔离，一个命名空间对应一个模型 + 归一化配置）
+
+    超过 max_entries 时按最近使用时间淘汰到 90%，并压缩向量文件。
+    """
+
+    # SQLite IN 查询的单批参数数量上限
+    QUERY_BATCH = 500
+    # 进程内积累的最近使用时间达到此数量时，取排他锁写回
+    TOUCH_FLUSH = 10_000
+
+    def __init__(self, cache_root: Path, model_name: str, normalize: bool, max_entries: int = 200_000):
+        self.model_name = model_name
+        self.normalize = normalize
+        self.max_entries = max_entries
+
+        namespace = re.sub(r"[^0-9A-Za-z_.-]+", "_", model_name) + ("_norm" if normalize else "_raw")
+        self.cache_dir = Path(cache_root) / namespace
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.vectors_path = self.cache_dir / "vectors.f32"
+        self.lock_path = self.cache_dir / "cache.lock"
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.cache_dir / "index.db"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "text_hash TEXT PRIMARY KEY, row INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings(last_used)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.commit()
+
+        self.dim: Optional[int] = None
+        self._load_dim()
+        self._matrix = None  # 只读 memmap，向量文件变化（本进程或其他进程写入）后重建
+        self._matrix_stamp = None  # 建立 memmap 时向量文件的 (inode, 大小)
+        self._touched: Dict[str, float] = {}  # 尚未写回的最近使用时间
+        with self._lock, self._file_lock(exclusive=True):
+            self._truncate_partial_row()
+
+        # 统计（进程内累计）
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _load_dim(self):
+        """向量维度（首次写入时记录，可能由其他进程写入）"""
+        if self.dim is None:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'dim'").fetchone()
+            self.dim = int(row[0]) if row else None
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool):
+        """进程间文件锁：追加 / 压缩为排他锁，读取为共享锁（Windows 下均为排他锁）"""
+        with open(self.lock_path, "a+b") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.vectors_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size
+
+    def _rows_in_file(self) -> int:
+        stamp = self._file_stamp()
+        if not self.dim or stamp is None:
+            return 0
+        return stamp[1] // (self.dim * 4)
+
+    def _truncate_partial_row(self):
+        """截掉写入中途崩溃留下的不完整行（调用方持有排他文件锁）"""
+        stamp = self._file_stamp()
+        if not self.dim or stamp is None:
+            return
+        row_bytes = self.dim * 4
+        if stamp[1] % row_bytes:
+            print(f"⚠️ [EmbeddingCache] 向量文件末尾有不完整的行（{stamp[1] % row_bytes} 字节），已截断")
+            os.truncate(self.vectors_path, stamp[1] - stamp[1] % row_bytes)
+            self._matrix = None
+
+    def _flush_touches(self):
+        """写回进程内积累的最近使用时间（调用方持有排他文件锁）"""
+        if not self._touched:
+            return
+        self._conn.executemany(
+            "UPDATE embeddings SET last_used = MAX(last_used, ?) WHERE text_hash = ?",
+            [(used, text_hash) for text_hash, used in self._touched.items()]
+        )
+        self._conn.commit()
+        self._touched.clear()
+
+    def flush(self):
+        """立即写回最近使用时间"""
+        with self._lock, self._file_lock(exclusive=True):
+            self._flush_touches()
+
+    def _get_matrix(self):
+        """当前向量文件的 memmap（调用方持有文件锁）；文件被追加或被压缩替换后重新映射"""
+        stamp = self._file_stamp()
+        if self._matrix is None or stamp != self._matrix_stamp:
+            self._matrix = None
+            rows = self._rows_in_file()
+            if rows == 0:
+                return None
+            self._matrix = np.memmap(self.vectors_path, dtype="float32", mode="r", shape=(rows, self.dim))
+            self._matrix_stamp = stamp
+        return self._matrix
+
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """批量查询，未命中的位置为 None"""
+        hashes = [self.text_hash(t) for t in texts]
+        results: List[Optional[np.ndarray]] = [None] * len(texts)
+
+        with self._lock, self._file_lock(exclusive=False):
+            self._load_dim()
+            if self.dim is None:
+                self.misses += len(texts)
+                return results
+
+            found = {}
+            unique = list(dict.fromkeys(hashes))
+            for start in range(0, len(unique), self.QUERY_BATCH):
+                batch = unique[start:start + self.QUERY_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                for text_hash, row in self._conn.execute(
+                    f"SELECT text_hash, row FROM embeddings WHERE text_hash IN ({placeholders})", batch
+                ):
+                    found[text_hash] = row
+
+            matrix = self._get_matrix()
+            if found and matrix is not None:
+                for i, text_hash in enumerate(hashes):
+                    row = found.get(text_hash)
+                    if row is not None and row < matrix.shape[0]:
+                        results[i] = np.array(matrix[row])
+
+                # 共享锁下不写 SQLite（其他进程可能同时读写），只记在进程内
+                now = time.time()
+                self._touched.update((h, now) for h in found)
+
+            hit_count = sum(1 for r in results if r is not None)
+            self.hits += hit_count
+            self.misses += len(texts) - hit_count
+
+        if len(self._touched) >= self.TOUCH_FLUSH:
+            self.flush()
+        return results
+
+    def put_many(self, texts: List[str], vectors: List[List[float]]):
+        """追加写入新向量（已存在的键忽略）"""
+        if not texts:
+            return
+        matrix = np.asarray(vectors, dtype="float32")
+
+        with self._lock, self._file_lock(exclusive=True):
+            self._load_dim()
+            if self.dim is None:
+                self.dim = matrix.shape[1]
+                self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('dim', ?)", (str(self.dim),))
+            elif matrix.shape[1] != self.dim:
+                print(f"⚠️ [EmbeddingCache] 向量维度不一致 ({matrix.shape[1]} != {self.dim})，跳过写入")
+                return
+
+            # 过滤掉已存在/本批重复的键
+            new_rows = {}
+            for text, vector in zip(texts, matrix):
+                text_hash = self.text_hash(text)
+                if text_hash not in new_rows:
+                    new_rows[text_hash] = vector
+            existing = set()
+            keys = list(new_rows)
+            for start in range(0, len(keys), self.QUERY_BATCH):
+                batch = keys[start:start + self.QUERY_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                existing.update(
+                    r[0] for r in self._conn.execute(
+                        f"SELECT text_hash FROM embeddings WHERE text_hash IN ({placeholders})", batch
+                    )
+                )
+            new_rows = {h: v for h, v in new_rows.items() if h not in existing}
+            self._flush_touches()
+            if not new_rows:
+                return
+
+            self._truncate_partial_row()
+            first_row = self._rows_in_file()
+            with open(self.vectors_path, "ab") as f:
+                f.write(np.stack(list(new_rows.values())).astype("float32").tobytes())
+
+            now = time.time()
+            self._conn.executemany(
+                "INSERT INTO embeddings (text_hash, row, last_used) VALUES (?, ?, ?)",
+                [(h, first_row + i, now) for i, h in enumerate(new_rows)]
+            )
+            self._conn.commit()
+
+            self._evict_if_needed()
+
+    def _evict_if_needed(self):
+        """超出容量时按 LRU 淘汰，并压缩向量文件（调用方持有排他文件锁）"""
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if count <= self.max_entries:
+            return
+
+        keep = int(self.max_entries * 0.9)
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE text_hash IN ("
+            "SELECT text_hash FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+            (count - keep,)
+        )
+        self.evictions += count - keep
+
+        # 压缩：按原行号顺序重写存活向量
+        survivors = self._conn.execute("SELECT text_hash, row FROM embeddings ORDER BY row").fetchall()
+        matrix = self._get_matrix()
+        compacted = np.array(matrix[[row for _, row in survivors]], dtype="float32") if survivors else np.empty((0, self.dim), dtype="float32")
+        self._matrix = None
+        del matrix
+
+        temp_path = self.vectors_path.with_suffix(".tmp")
+        with open(temp_path, "wb") as f:
+            f.write(compacted.tobytes())
+        temp_path.replace(self.vectors_path)
+
+        self._conn.executemany(
+            "UPDATE embeddings SET row = ? WHERE text_hash = ?",
+            [(new_row, text_hash) for new_row, (text_hash, _) in enumerate(survivors)]
+        )
+        self._conn.commit()
+        print(f"🧹 [EmbeddingCache] 淘汰 {count - keep} 条缓存，剩余 {len(survivors)} 条")
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "model": self.model_name,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "size_bytes": self.vectors_path.stat().st_size if self.vectors_path.exists() else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "evictions": self.evictions
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    带持久化缓存的 Embeddings 包装
+
+    embed_documents 先查 EmbeddingCache，只对未命中的文本调用底层模型；
+    embed_query 直接透传（查询文本不落盘）。
+    """
+
+    def __init__(self, base: Embeddings, cache: EmbeddingCache):
+        self.base = base
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        cached = self.cache.get_many(texts)
+        missing = list(dict.fromkeys(t for t, v in zip(texts, cached) if v is None))
+
+        computed = {}
+        if missing:
+            vectors = self.base.embed_documents(missing)
+            self.cache.put_many(missing, vectors)
+            computed = dict(zip(missing, vectors))
+
+        return [
+            v.tolist() if v is not None else list(computed[t])
+            for t, v in zip(texts, cached)
+        ]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.base.embed_query(text)
+
+
+class QueryEmbeddingCache:
+    """
+    查询向量的进程内 LRU 缓存
+
+    以归一化后的查询文本为键（NFKC、去首尾空白、合并连续空白），键只用于查找，
+    未命中时对该键首次出现的原始查询文本计算向量（与不经缓存的 embed_query 结果一致）；
+    并发请求同一查询时只计算一次，其余请求等待同一个 Future（线程安全，适用于 asyncio.to_thread）。
+    """
+
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+        # 统计（进程内累计）
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0  # 等待进行中计算的请求数（未额外调用模型）
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return " ".join(unicodedata.normalize("NFKC", text).split())
+
+    def get_or_compute(self, text: str, compute: Callable[[str], List[float]]) -> List[float]:
+        return self.get_or_compute_many([text], lambda texts: [compute(texts[0])])[0]
+
+    def get_or_compute_many(
+        self,
+        texts: List[str],
+        compute_many: Callable[[List[str]], List[List[float]]]
+    ) -> List[List[float]]:
+        """
+        批量查询：命中的直接返回，其他请求正在计算的等待其结果，其余合并为一次 compute_many 调用
+        （compute_many 收到的是原始查询文本，而非归一化后的键）
+        """
+        keys = [self.normalize(t) for t in texts]
+        originals: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            originals.setdefault(key, text)
+        results: Dict[str, List[float]] = {}
+        owned: Dict[str, Future] = {}
+        waiting: Dict[str, Future] = {}
+
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                vector = self._cache.get(key)
+                if vector is not None:
+                    self._cache.move_to_end(key)
+                    self.hits += 1
+                    results[key] = vector
+                elif key in self._inflight:
+                    self.shared += 1
+                    waiting[key] = self._inflight[key]
+                else:
+                    owned[key] = self._inflight[key] = Future()
+                    self.misses += 1
+
+        if owned:
+            try:
+                vectors = [list(v) for v in compute_many([originals[key] for key in owned])]
+            except Exception as e:
+                with self._lock:
+                    for key in owned:
+                        self._inflight.pop(key, None)
+                for future in owned.values():
+                    future.set_exception(e)
+                raise
+
+            with self._lock:
+                for key, vector in zip(owned, vectors):
+                    self._cache[key] = vector
+                    self._inflight.pop(key, None)
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+            for (key, future), vector in zip(owned.items(), vectors):
+                future.set_result(vector)
+                results[key] = vector
+
+        for key, future in waiting.items():
+            results[key] = future.result()
+        return [results[key] for key in keys]
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses + self.shared
+        return {
+            "entries": len(self._cache),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared": self.shared,
+            "hit_rate": round((self.hits + self.shared) / total, 4) if total else 0.0
+        }
@@ -0,0 +1,224 @@
+"""
+HS 编码倒排索引
+向量相似度对数字不敏感，查询 “8542.31.00” 时常召回其他编码的相邻条目；BM25 只能精确匹配完整词项，
+查不到同一税目下的其他子目。建索引时从每个 chunk 中抽取 HS 编码，按前缀层级建立倒排：
+
+- 章 (2 位) / 税目 (4 位) / 子目 (6 位) / 8 位税号 / 10 位编码，每个编码计入其全部前缀
+- 查询时从最精确的层级向上逐级取 chunk（同一税号 → 同一子目 → 同一税目），一次查询只是若干次字典查找
+
+识别的编码格式（文本先经 NFKC 归一化）：
+- 带点号：0101.2100、8542.31.00、8542.3100.10、8542.31（子目）
+- 税目：“税目03.01”“品目 85.42”，以及申报目录中行首的 “01.01 马、驴、骡”
+- 纯数字：85423100、8542310000（前后不能紧邻其他数字；形如 20250101 的日期不计入）
+章号须在 01-97 之间。
+
+存储：每个前缀一组升序 chunk id 数组，保存为索引目录下的 hs_codes.npz，与 lexical.npz 同版本搬运。
+"""
+import re
+import unicodedata
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+HS_CODE_FILE = "hs_codes.npz"
+HS_CODE_VERSION = 1
+
+# 前缀层级（位数），由精确到宽泛
+LEVELS = (10, 8, 6, 4, 2)
+
+_DOTTED_CODE = re.compile(r"(?<![\d.])(\d{4})\.(\d{2})(?:\.?(\d{2}))?(?:\.?(\d{2}))?(?![\d]|\.\d)")
+_HEADING = re.compile(r"(?:税目|品目|税号|编码|HS)\s*(\d{2})\.(\d{2})(?![\d]|\.\d)", re.IGNORECASE)
+_HEADING_LINE = re.compile(r"^\s*(\d{2})\.(\d{2})(?=\s+[\u4e00-\u9fff])", re.MULTILINE)
+_PLAIN_CODE = re.compile(r"(?<![\d.])(\d{10}|\d{8})(?![\d]|\.\d)")
+# 查询中 “税号 8542”“HS编码 854231” 一类的短编码
+_QUERY_PREFIX = re.compile(r"(?:税目|品目|税号|税则号列|编码|HS)\s*[:：]?\s*(\d{4}|\d{6})(?![\d]|\.\d)", re.IGNORECASE)
+
+
+def _valid_chapter(code: str) -> bool:
+    return 1 <= int(code[:2]) <= 97
+
+
+def _looks_like_date(code: str) -> bool:
+    """20250101 / 2025010112 一类的日期或时间戳"""
+    if code[:2] not in ("19", "20"):
+        return False
+    month, day = int(code[4:6]), int(code[6:8])
+    return 1 <= month <= 12 and 1 <= day <= 31
+
+
+def normalize_code(code: str) -> str:
+    """去除点号、空白等非数字字符（"8542.31.00" -> "85423100"）"""
+    return re.sub(r"\D", "", unicodedata.normalize("NFKC", str(code)))
+
+
+def extract_hs_codes(text: str) -> Set[str]:
+    """抽取文本中的 HS 编码（纯数字形式，4 / 6 / 8 / 10 位）"""
+    text = unicodedata.normalize("NFKC", text)
+    codes = set()
+    for match in _DOTTED_CODE.finditer(text):
+        code = "".join(part for part in match.groups() if part)
+        if _valid_chapter(code):
+            codes.add(code)
+    for match in (*_HEADING.finditer(text), *_HEADING_LINE.finditer(text)):
+        code = match.group(1) + match.group(2)
+        if _valid_chapter(code):
+            codes.add(code)
+    for match in _PLAIN_CODE.finditer(text):
+        code = match.group(1)
+        if _valid_chapter(code) and not _looks_like_date(code):
+            codes.add(code)
+    return codes
+
+
+def extract_query_codes(query: str) -> Set[str]:
+    """查询中的 HS 编码：文档规则之外，还接受 “税号 8542” 形式的税目 / 子目"""
+    codes = extract_hs_codes(query)
+    for match in _QUERY_PREFIX.finditer(unicodedata.normalize("NFKC", query)):
+        if _valid_chapter(match.group(1)):
+            codes.add(match.group(1))
+    return codes
+
+
+def _prefixes(code: str) -> List[str]:
+    return [code[:level] for level in LEVELS if level <= len(code)]
+
+
+class HSCodeIndex:
+    """
+    HS 编码前缀 -> chunk id 的倒排索引（不可变更新：apply_changes 返回新实例）
+    """
+
+    def __init__(self, postings: Dict[str, np.ndarray] = None, doc_count: int = 0):
+        self.postings = postings or {}
+        self.doc_count = doc_count  # 含 HS 编码的 chunk 数
+
+    def __len__(self) -> int:
+        return self.doc_count
+
+    @classmethod
+    def build(cls, docs: Iterable[Tuple[int, str]]) -> "HSCodeIndex":
+        return cls().apply_changes({}, docs)
+
+    def apply_changes(self, removed: Dict[int, str], added: Iterable[Tuple[int, str]]) -> "HSCodeIndex":
+        """
+        删除 / 追加文档，返回新索引（参数同 LexicalIndex.apply_changes）
+        """
+        postings = dict(self.postings)
+        doc_count = self.doc_count
+
+        if removed:
+            removed_ids = np.fromiter(removed.keys(), dtype="int64")
+            affected = set()
+            for text in removed.values():
+                codes = extract_hs_codes(text)
+                doc_count -= bool(codes)
+                for code in codes:
+                    affected.update(_prefixes(code))
+            for prefix in affected:
+                if prefix not in postings:
+                    continue
+                ids = postings[prefix]
+                keep = ~np.isin(ids, removed_ids)
+                if keep.all():
+                    continue
+                if keep.any():
+                    postings[prefix] = ids[keep]
+                else:
+                    del postings[prefix]
+
+        new_postings = defaultdict(set)
+        for chunk_id, text in added:
+            codes = extract_hs_codes(text)
+            doc_count += bool(codes)
+            for code in codes:
+                for prefix in _prefixes(code):
+                    new_postings[prefix].add(chunk_id)
+
+        for prefix, ids in new_postings.items():
+            ids = np.fromiter(ids, dtype="int64", count=len(ids))
+            if prefix in postings:
+                ids = np.concatenate([postings[prefix], ids])
+            postings[prefix] = np.unique(ids)
+
+        return HSCodeIndex(postings, max(doc_count, 0))
+
+    def lookup(
+        self,
+        code: str,
+        limit: Optional[int] = None,
+        min_level: int = 4,
+        allowed_ids: Optional[np.ndarray] = None
+    ) -> List[Tuple[int, int]]:
+        """
+        查询一个 HS 编码的相关 chunk：先取与编码完全一致的，再逐级放宽到子目、税目（不低于 min_level 位）
+
+        Args:
+            code: 任意格式的编码（"8542.31.00"、"85423100"、"8542"）
+            limit: 最多返回条数
+            min_level: 最宽放宽到的前缀位数（2 = 章）
+            allowed_ids: 只返回这些 chunk id（升序，元数据过滤）
+
+        Returns:
+            [(chunk id, 匹配的前缀位数)]，按匹配精确度降序、同级按 chunk id 升序
+        """
+        code = normalize_code(code)
+        if len(code) < 2:
+            return []
+        results: List[Tuple[int, int]] = []
+        seen = np.empty(0, dtype="int64")
+        for level in LEVELS:
+            if level > len(code) or level < min_level and level != len(code):
+                continue
+            ids = self.postings.get(code[:level])
+            if ids is None:
+                continue
+            ids = ids[~np.isin(ids, seen)]
+            if allowed_ids is not None:
+                ids = ids[np.isin(ids, allowed_ids)]
+            results.extend((int(chunk_id), level) for chunk_id in ids)
+            if limit is not None and len(results) >= limit:
+                return results[:limit]
+            seen = np.concatenate([seen, ids])
+        return results
+
+    def stats(self) -> dict:
+        by_level = defaultdict(int)
+        for prefix in self.postings:
+            by_level[len(prefix)] += 1
+        return {
+            "docs": self.doc_count,
+            "codes": {str(level): by_level[level] for level in sorted(by_level)},
+            "postings": int(sum(len(ids) for ids in self.postings.values()))
+        }
+
+    def save(self, index_dir: Path):
+        prefixes = sorted(self.postings)
+        lengths = np.array([len(self.postings[p]) for p in prefixes], dtype="int64")
+        offsets = np.concatenate([[0], np.cumsum(lengths)]).astype("int64")
+        np.savez(
+            Path(index_dir) / HS_CODE_FILE,
+            version=np.array(HS_CODE_VERSION),
+            prefixes=np.array(prefixes, dtype="U"),
+            offsets=offsets,
+            ids=np.concatenate([self.postings[p] for p in prefixes]) if prefixes else np.empty(0, dtype="int64"),
+            doc_count=np.array(self.doc_count)
+        )
+
+    @classmethod
+    def load(cls, index_dir: Path) -> Optional["HSCodeIndex"]:
+        """读取 HS 编码索引，不存在或格式不兼容时返回 None"""
+        path = Path(index_dir) / HS_CODE_FILE
+        if not path.exists():
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if int(data["version"]) != HS_CODE_VERSION:
+                    return None
+                prefixes, offsets, ids = data["prefixes"], data["offsets"], data["ids"]
+                postings = {str(prefix): ids[offsets[i]:offsets[i + 1]] for i, prefix in enumerate(prefixes)}
+                return cls(postings, int(data["doc_count"]))
+        except Exception as e:
+            print(f"⚠️ [HSCodeIndex] HS 编码索引读取失败，将重新构建: {e}")
+            return None
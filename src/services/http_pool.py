@@ -0,0 +1,108 @@
+"""
+进程级共享的异步 HTTP 连接池（LLM / 图像识别调用共用）
+
+每次请求新建客户端意味着每次调用都要重新建立 TCP + TLS 连接；同步 SDK 经 asyncio.to_thread 调用时，
+每个进行中的调用还要占用一个线程。这里为每个事件循环维护一个 httpx.AsyncClient（连接复用 keep-alive），
+AsyncOpenAI / AsyncAzureOpenAI 与 Gemini REST 调用都使用它，数百个并发调用只需少量连接、不占线程。
+
+- 连接上限与 keep-alive 由 .env 的 LLM_MAX_CONNECTIONS / LLM_MAX_KEEPALIVE 配置
+- LLM_HTTP2=true 时启用 HTTP/2（需安装 h2，未安装时回退 HTTP/1.1）
+- 代理取自 .env 的 HTTP_PROXY / HTTPS_PROXY（显式挂载到对应协议，与原先 requests.Session 的 proxies 一致）
+- 连接失败由传输层重试 CONNECT_RETRIES 次；post_with_retry 对 500/502/504 按指数退避重试，
+  对应原先 Gemini 会话的 urllib3 Retry(total=3, backoff_factor=1, status_forcelist=[500, 502, 504])
+- 客户端与创建它的事件循环绑定（连接不能跨循环使用），服务关闭时调用 aclose_all
+"""
+import asyncio
+import weakref
+from typing import Dict, Optional
+
+import httpx
+
+from src.config.loader import settings
+
+# LLM 生成可能较慢：连接超时短，读取超时与同步客户端一致
+DEFAULT_TIMEOUT = httpx.Timeout(60.0, connect=10.0)
+
+# 建立连接失败（连接被拒、DNS 等）时传输层的重试次数
+CONNECT_RETRIES = 3
+
+# 按状态码重试（post_with_retry）：第 n 次重试前等待 STATUS_BACKOFF * 2^(n-1) 秒
+RETRY_STATUSES = frozenset({500, 502, 504})
+STATUS_RETRIES = 3
+STATUS_BACKOFF = 1.0
+
+# 事件循环 -> {verify: 客户端}
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[bool, httpx.AsyncClient]]" = weakref.WeakKeyDictionary()
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def get_async_client(verify: bool = True) -> httpx.AsyncClient:
+    """
+    当前事件循环共享的 httpx.AsyncClient（需在事件循环中调用）
+
+    Args:
+        verify: 是否校验证书（Gemini REST 调用沿用原先的 verify=False）
+    """
+    loop = asyncio.get_running_loop()
+    clients = _clients.setdefault(loop, {})
+    client = clients.get(verify)
+    if client is None or client.is_closed:
+        http2 = settings.LLM_HTTP2 and _http2_available()
+        if settings.LLM_HTTP2 and not http2:
+            print("⚠️ [HTTPPool] 未安装 h2，使用 HTTP/1.1（pip install h2 启用 HTTP/2）")
+        # 传入 transport 后 httpx 不再读取代理环境变量，代理按协议显式挂载
+        mounts = {
+            scheme: _transport(verify, http2, proxy)
+            for scheme, proxy in (("http://", settings.HTTP_PROXY), ("https://", settings.HTTPS_PROXY))
+            if proxy
+        }
+        client = httpx.AsyncClient(
+            transport=_transport(verify, http2),
+            mounts=mounts or None,
+            timeout=DEFAULT_TIMEOUT
+        )
+        clients[verify] = client
+    return client
+
+
+def _transport(verify: bool, http2: bool, proxy: Optional[str] = None) -> httpx.AsyncHTTPTransport:
+    return httpx.AsyncHTTPTransport(
+        verify=verify,
+        http2=http2,
+        proxy=proxy,
+        retries=CONNECT_RETRIES,
+        limits=httpx.Limits(
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_MAX_KEEPALIVE,
+            keepalive_expiry=30.0
+        )
+    )
+
+
+async def post_with_retry(client: httpx.AsyncClient, url: str, **kwargs) -> httpx.Response:
+    """
+    POST 请求，500/502/504 时按指数退避最多重试 STATUS_RETRIES 次
+
+    重试用尽后返回最后一次的响应（与 Retry(raise_on_status=False) 一致），由调用方检查状态码
+    """
+    for attempt in range(STATUS_RETRIES + 1):
+        response = await client.post(url, **kwargs)
+        if response.status_code not in RETRY_STATUSES or attempt == STATUS_RETRIES:
+            return response
+        await response.aclose()
+        await asyncio.sleep(STATUS_BACKOFF * 2 ** attempt)
+    return response
+
+
+async def aclose_all():
+    """关闭当前事件循环的共享客户端（服务关闭时调用）"""
+    clients = _clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.aclose()
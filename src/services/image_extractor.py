@@ -1,11 +1,12 @@
+import asyncio
 import base64
 import json
-import requests
 from typing import Tuple, Optional, Dict
-from openai import AzureOpenAI, OpenAI
+from openai import AsyncAzureOpenAI, AsyncOpenAI
 from fastapi import UploadFile
 
 from src.config.loader import settings
+from src.services import http_pool
 
 # 自定义异常
 class NotDeclarationError(ValueError):
@@ -32,31 +33,10 @@ class ImageTextExtractor:
         self._api_version = self._config.get('api_version', settings.AZURE_OAI_VERSION)
         self._base_url = self._config.get('base_url')
 
-        # 初始化客户端
+        # 客户端：异步 SDK 客户端使用共享连接池（见 http_pool），在识别时于当前事件循环中创建
         self._azure_client = None
         self._openai_client = None
-
-        if self._provider == "azure" and all([self._api_key, self._endpoint]):
-            try:
-                self._azure_client = AzureOpenAI(
-                    api_key=self._api_key,
-                    api_version=self._api_version,
-                    azure_endpoint=self._endpoint
-                )
-                print(f"[ImageExtractor] Azure OpenAI 客户端初始化成功")
-            except Exception as e:
-                print(f"[Warning] Azure OpenAI 客户端初始化失败: {e}")
-
-        elif self._provider in ["deepseek", "openai", "qwen", "zhipu", "siliconflow", "custom"]:
-            if self._api_key:
-                try:
-                    self._openai_client = OpenAI(
-                        api_key=self._api_key,
-                        base_url=self._base_url
-                    )
-                    print(f"[ImageExtractor] {self._provider} OpenAI 兼容客户端初始化成功")
-                except Exception as e:
-                    print(f"[Warning] {self._provider} 客户端初始化失败: {e}")
+        self._clients_loop = None
 
         # Gemini 的特殊属性
         if self._provider == "gemini":
@@ -139,11 +119,51 @@ class ImageTextExtractor:
         # 回退到静态配置
         return cls()
 
+    def _bind_clients(self):
+        """在当前事件循环中创建 SDK 客户端（连接池与事件循环绑定）"""
+        loop = asyncio.get_running_loop()
+        if self._clients_loop is loop:
+            return
+        self._clients_loop = loop
+        self._azure_client = None
+        self._openai_client = None
+
+        if self._provider == "azure" and all([self._api_key, self._endpoint]):
+            try:
+                self._azure_client = AsyncAzureOpenAI(
+                    api_key=self._api_key,
+                    api_version=self._api_version,
+                    azure_endpoint=self._endpoint,
+                    http_client=http_pool.get_async_client()
+                )
+                print(f"[ImageExtractor] Azure OpenAI 客户端初始化成功")
+            except Exception as e:
+                print(f"[Warning] Azure OpenAI 客户端初始化失败: {e}")
+
+        elif self._provider in ["deepseek", "openai", "qwen", "zhipu", "siliconflow", "custom"]:
+            if self._api_key:
+                try:
+                    self._openai_client = AsyncOpenAI(
+                        api_key=self._api_key,
+                        base_url=self._base_url,
+                        http_client=http_pool.get_async_client()
+                    )
+                    print(f"[ImageExtractor] {self._provider} OpenAI 兼容客户端初始化成功")
+                except Exception as e:
+                    print(f"[Warning] {self._provider} 客户端初始化失败: {e}")
+
     def extract_text(self, image_bytes: bytes, mime_type: str, language: str = "zh") -> Tuple[str, str]:
+        """
+        同步入口（无事件循环的脚本使用），在异步代码中请直接 await aextract_text
+        """
+        return asyncio.run(self.aextract_text(image_bytes, mime_type, language))
+
+    async def aextract_text(self, image_bytes: bytes, mime_type: str, language: str = "zh") -> Tuple[str, str]:
         """
         核心函数：从图片中提取报关单字段
         根据配置的 provider 调用对应的图像识别 API
         """
+        self._bind_clients()
         print(f"[DEBUG] ========== 开始图片识别 ==========")
         print(f"[DEBUG] Provider: {self._provider}")
         print(f"[DEBUG] Model: {self._model}")
@@ -153,7 +173,7 @@ class ImageTextExtractor:
         # 1. 内容校验（使用 Gemini，因为最快）
         try:
             print("[DEBUG] 步骤 1: 内容校验...")
-            is_declaration, reason = self._validate_image_content(image_bytes, mime_type, language)
+            is_declaration, reason = await self._validate_image_content(image_bytes, mime_type, language)
             if not is_declaration:
                 raise NotDeclarationError(f"图片似乎不是报关单，因为：{reason}")
             print("[DEBUG] ✓ 内容校验通过")
@@ -169,19 +189,19 @@ class ImageTextExtractor:
             print(f"[INFO] 步骤 2: 使用 {self._provider} 进行识别...")
 
             if self._provider == "gemini":
-                text = self._call_gemini_vision(image_bytes, mime_type, language)
+                text = await self._call_gemini_vision(image_bytes, mime_type, language)
                 model_used = self._gemini_model
 
             elif self._provider == "azure":
                 if not self._azure_client:
                     raise RuntimeError("Azure OpenAI 客户端未初始化，请检查配置")
-                text = self._call_azure_openai_vision(image_bytes, mime_type, language)
+                text = await self._call_azure_openai_vision(image_bytes, mime_type, language)
                 model_used = self._azure_deployment
 
             elif self._provider in ["deepseek", "openai", "qwen", "zhipu", "siliconflow", "custom"]:
                 if not self._openai_client:
                     raise RuntimeError(f"{self._provider} 客户端未初始化，请检查 API Key 和 Base URL")
-                text = self._call_openai_compatible_vision(image_bytes, mime_type, language)
+                text = await self._call_openai_compatible_vision(image_bytes, mime_type, language)
                 model_used = self._model
 
             else:
@@ -189,7 +209,7 @@ class ImageTextExtractor:
 
             # 格式化检查
             print("[DEBUG] 步骤 3: 格式化检查...")
-            text = self._ensure_multi_item_format(text, language)
+            text = await self._ensure_multi_item_format(text, language)
 
             print(f"[SUCCESS] ✓ 识别成功！")
             print(f"[SUCCESS] 使用模型: {model_used}")
@@ -206,9 +226,9 @@ class ImageTextExtractor:
             if self._azure_client and self._provider != "azure":
                 print(f"[INFO] 尝试降级到 Azure OpenAI...")
                 try:
-                    text = self._call_azure_openai_vision(image_bytes, mime_type, language)
+                    text = await self._call_azure_openai_vision(image_bytes, mime_type, language)
                     model_used = f"Azure-{self._azure_deployment}"
-                    text = self._ensure_multi_item_format(text, language)
+                    text = await self._ensure_multi_item_format(text, language)
                     print(f"[SUCCESS] ✓ Azure OpenAI 降级成功！")
                     print(f"[DEBUG] ========== 识别完成 ==========\n")
                     return text, model_used
@@ -223,7 +243,7 @@ class ImageTextExtractor:
                 f"备用模型: Azure OpenAI {'未配置' if not self._azure_client else '也失败了'}"
             ) from primary_error
 
-    def _validate_image_content(self, image_bytes: bytes, mime_type: str, language: str = "zh") -> Tuple[bool, str]:
+    async def _validate_image_content(self, image_bytes: bytes, mime_type: str, language: str = "zh") -> Tuple[bool, str]:
         """
         使用 Gemini 的快速能力判断图片内容是否为报关单
         """
@@ -249,7 +269,7 @@ class ImageTextExtractor:
                 ]}],
                 "generationConfig": {"temperature": 0.0, "maxOutputTokens": 50}
             }
-            response = requests.post(api_url, json=payload, timeout=30, verify=False)
+            response = await http_pool.get_async_client(verify=False).post(api_url, json=payload, timeout=30)
             response.raise_for_status()
             data = response.json()
             result_text = data["candidates"][0]["content"]["parts"][0]["text"].strip()
@@ -271,7 +291,7 @@ class ImageTextExtractor:
             print(f"[Warning] 图片内容校验步骤失败: {e}，默认通过")
             return True, "校验异常，已跳过"
 
-    def _call_gemini_vision(self, image_bytes: bytes, mime_type: str, language: str = "zh") -> str:
+    async def _call_gemini_vision(self, image_bytes: bytes, mime_type: str, language: str = "zh") -> str:
         """调用 Gemini Vision API"""
         api_url = (
             f"https://generativelanguage.googleapis.com/v1beta/models/"
@@ -294,7 +314,7 @@ class ImageTextExtractor:
         }
 
         print(f"[DEBUG] 调用 Gemini API: {self._gemini_model}")
-        response = requests.post(api_url, json=payload, timeout=60, verify=False)
+        response = await http_pool.get_async_client(verify=False).post(api_url, json=payload)
         response.raise_for_status()
         data = response.json()
         try:
@@ -302,7 +322,7 @@ class ImageTextExtractor:
         except (KeyError, IndexError) as e:
             raise RuntimeError(f"Gemini 响应格式解析错误: {json.dumps(data)}") from e
 
-    def _call_azure_openai_vision(self, image_bytes: bytes, mime_type: str, language: str = "zh") -> str:
+    async def _call_azure_openai_vision(self, image_bytes: bytes, mime_type: str, language: str = "zh") -> str:
         """调用 Azure OpenAI GPT-4o 模型进行图片识别"""
         if not self._azure_client:
             raise RuntimeError("Azure OpenAI 客户端未初始化")
@@ -313,7 +333,7 @@ class ImageTextExtractor:
 
         print(f"[DEBUG] 调用 Azure OpenAI API: {self._azure_deployment}")
 
-        response = self._azure_client.chat.completions.create(
+        response = await self._azure_client.chat.completions.create(
             model=self._azure_deployment,
             messages=[
                 {
@@ -329,7 +349,7 @@ class ImageTextExtractor:
         )
         return response.choices[0].message.content.strip()
 
-    def _call_openai_compatible_vision(self, image_bytes: bytes, mime_type: str, language: str = "zh") -> str:
+    async def _call_openai_compatible_vision(self, image_bytes: bytes, mime_type: str, language: str = "zh") -> str:
         """
         调用 OpenAI 兼容的 Vision API
         支持: deepseek, openai, qwen, zhipu, siliconflow, custom
@@ -344,7 +364,7 @@ class ImageTextExtractor:
         print(f"[DEBUG] 调用 {self._provider} API: {self._model}")
         print(f"[DEBUG] Base URL: {self._base_url}")
 
-        response = self._openai_client.chat.completions.create(
+        response = await self._openai_client.chat.completions.create(
             model=self._model,
             messages=[
                 {
@@ -360,7 +380,7 @@ class ImageTextExtractor:
         )
         return response.choices[0].message.content.strip()
 
-    def _call_gemini_text(self, prompt: str, language: str = "zh") -> str:
+    async def _call_gemini_text(self, prompt: str, language: str = "zh") -> str:
         """调用 Gemini Text API"""
         api_url = (
             f"https://generativelanguage.googleapis.com/v1beta/models/"
@@ -373,7 +393,7 @@ class ImageTextExtractor:
                 "maxOutputTokens": self._max_tokens
             }
         }
-        response = requests.post(api_url, json=payload, timeout=60, verify=False)
+        response = await http_pool.get_async_client(verify=False).post(api_url, json=payload)
         response.raise_for_status()
         data = response.json()
         try:
@@ -506,14 +526,14 @@ class ImageTextExtractor:
                 f"原始内容：\n{raw_text}"
             )
 
-    def _ensure_multi_item_format(self, text: str, language: str = "zh") -> str:
+    async def _ensure_multi_item_format(self, text: str, language: str = "zh") -> str:
         """确保输出格式符合多商品要求"""
         format_markers = ["商品清单", "商品1", "Danh mục hàng hóa", "Hàng hóa 1"]
         if any(marker in text for marker in format_markers):
             return text
         print("INFO: 识别结果格式不完全符合要求，正在尝试自动修正...")
         prompt = self._build_reformat_prompt(text, language)
-        return self._call_gemini_text(prompt, language)
+        return await self._call_gemini_text(prompt, language)
 
     def _get_language_instruction(self, language: str) -> str:
         """生成语言输出指令"""
@@ -0,0 +1,175 @@
+"""
+FAISS 索引工厂
+根据 config/knowledge_base.json 的 vector_index 配置创建不同类型的索引，并按度量方式换算相似度
+
+支持的类型：
+- flat_ip:   精确内积检索（bge 向量已归一化，内积即余弦相似度）【默认】
+- flat_l2:   精确 L2 检索（旧版索引格式）
+- ivf_flat:  IVF 倒排 + 原始向量（需训练聚类中心，nprobe 控制召回/速度）
+- ivf_sq8:   IVF 倒排 + 8bit 标量量化
+- hnsw:      HNSW 图索引（不支持删除，增量更新时整体重建图）
+- hnsw_sq8:  HNSW 图索引 + 8bit 标量量化
+- sq8:       暴力检索 + 8bit 标量量化（内存约为 flat 的 1/4）
+"""
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+import faiss
+
+INDEX_TYPES = ("flat_ip", "flat_l2", "ivf_flat", "ivf_sq8", "hnsw", "hnsw_sq8", "sq8")
+
+# IVF 每个聚类中心建议的最少训练样本数（FAISS 经验值）
+MIN_POINTS_PER_CENTROID = 39
+
+
+def _factory_string(index_type: str, params: Dict[str, Any], n_vectors: int) -> str:
+    if index_type in ("flat_ip", "flat_l2"):
+        return "IDMap2,Flat"
+    if index_type == "sq8":
+        return "IDMap2,SQ8"
+    if index_type in ("ivf_flat", "ivf_sq8"):
+        # 数据量小时自动减少聚类中心数，避免训练样本不足
+        nlist = max(1, min(params.get("nlist", 256), n_vectors // MIN_POINTS_PER_CENTROID))
+        # IVF 原生支持 add_with_ids / remove_ids，不需要 IDMap 包装
+        return f"IVF{nlist},{'Flat' if index_type == 'ivf_flat' else 'SQ8'}"
+    if index_type in ("hnsw", "hnsw_sq8"):
+        m = params.get("hnsw_m", 32)
+        return f"IDMap2,HNSW{m}" + ("_SQ8" if index_type == "hnsw_sq8" else "")
+    raise ValueError(f"不支持的索引类型: {index_type}（可选: {', '.join(INDEX_TYPES)}）")
+
+
+def metric_for(index_type: str) -> int:
+    return faiss.METRIC_L2 if index_type == "flat_l2" else faiss.METRIC_INNER_PRODUCT
+
+
+def create_index(index_type: str, vectors: np.ndarray, params: Dict[str, Any] = None) -> faiss.Index:
+    """
+    创建（并在需要时训练）一个空索引，向量需随后通过 add_with_ids 加入
+
+    Args:
+        index_type: 索引类型，见 INDEX_TYPES
+        vectors: 本次构建的全部向量 (n, dim)，用于确定维度和训练 IVF / SQ 量化器
+        params: vector_index 配置（nlist / nprobe / hnsw_m / ef_construction / ef_search）
+    """
+    params = params or {}
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    factory = _factory_string(index_type, params, len(vectors))
+    if len(vectors) == 0:
+        # 没有训练数据（如知识库被清空）时退化为精确索引，保持度量方式不变
+        factory = "IDMap2,Flat"
+    index = faiss.index_factory(vectors.shape[1], factory, metric_for(index_type))
+
+    hnsw = _extract_hnsw(index)
+    if hnsw is not None:
+        hnsw.efConstruction = params.get("ef_construction", 200)
+
+    if not index.is_trained:
+        index.train(vectors)
+
+    apply_search_params(index, params)
+    return index
+
+
+def _extract_hnsw(index: faiss.Index):
+    sub_index = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    return getattr(sub_index, "hnsw", None)
+
+
+def apply_search_params(index: faiss.Index, params: Dict[str, Any]):
+    """设置检索期参数（加载索引后也需调用）"""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(params.get("nprobe", 16), ivf.nlist)
+        # 维护 id -> 倒排位置的映射，按 chunk id 取回向量（见 reconstruct_vectors）；Hashtable 类型支持增删
+        if ivf.direct_map.type != faiss.DirectMap.Hashtable:
+            ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+    hnsw = _extract_hnsw(index)
+    if hnsw is not None:
+        hnsw.efSearch = params.get("ef_search", 64)
+
+
+def search_parameters(index: faiss.Index, selector: faiss.IDSelector) -> faiss.SearchParameters:
+    """
+    带 id 过滤的检索参数（按 chunk id 过滤，IDMap 包装的索引由 FAISS 自动换算内部 id）
+
+    传入 SearchParameters 时 IVF / HNSW 不再读取索引上设置的 nprobe / efSearch，需一并带上
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    hnsw = _extract_hnsw(index)
+    if hnsw is not None:
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+def supports_ids(index: faiss.Index) -> bool:
+    """索引是否以 chunk id 为键（增量更新的前提）"""
+    return isinstance(index, faiss.IndexIDMap) or faiss.try_extract_index_ivf(index) is not None
+
+
+def supports_remove(index_type: str) -> bool:
+    """HNSW 图不支持删除向量"""
+    return not index_type.startswith("hnsw")
+
+
+def reconstruct_vectors(index: faiss.Index, ids: Sequence[Any]) -> Optional[np.ndarray]:
+    """
+    按 chunk id 从索引中取回已保存的向量 (n, dim)，不调用 Embedding 模型
+
+    IDMap2 包装的索引直接按外部 id 取回，IVF 依赖 apply_search_params 建立的 direct map；
+    SQ8 索引返回量化后的近似向量。id 非整数（旧版 uuid 键）或不在索引中时返回 None
+    """
+    try:
+        return index.reconstruct_batch(np.asarray(ids, dtype="int64"))
+    except (RuntimeError, TypeError, ValueError):
+        return None
+
+
+def mmap_read_flags(index_type: str) -> int:
+    """
+    只读内存映射加载索引的 read_index 标志
+
+    IVF 类型用 IO_FLAG_MMAP 映射倒排表；其余类型在 faiss 提供 IO_FLAG_MMAP_IFC 时用它映射向量编码
+    （二者不能同时使用：IFC 下 IVF 倒排表的 mmap 读取会失败），否则向量编码仍读入进程私有内存。
+    IFC 映射的索引不能 clone 后修改（faiss 直接中止进程），增量更新需重新读入文件，见 KnowledgeBase._writable_copy
+    """
+    ifc = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+    if index_type.startswith("ivf") or ifc is None:
+        return faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+    return ifc | faiss.IO_FLAG_READ_ONLY
+
+
+def mmap_shares_pages(index_type: str) -> bool:
+    """
+    mmap 加载时该类型的向量数据是否留在页缓存中、由多个 worker 共享
+
+    - ivf_flat / ivf_sq8: 倒排表始终映射
+    - flat_ip / flat_l2 / sq8: 需要 IO_FLAG_MMAP_IFC
+    - hnsw / hnsw_sq8: 有 IO_FLAG_MMAP_IFC 时只映射向量存储，图结构仍在私有内存
+    IDMap2 的 id 映射（每个向量 8 字节）总是读入私有内存
+    """
+    if index_type.startswith("ivf"):
+        return True
+    return hasattr(faiss, "IO_FLAG_MMAP_IFC")
+
+
+def is_inner_product(index: faiss.Index) -> bool:
+    return index.metric_type == faiss.METRIC_INNER_PRODUCT
+
+
+def to_similarity(raw_score: float, inner_product: bool) -> float:
+    """
+    将 FAISS 原始分数换算为余弦相似度（向量均已归一化）
+
+    - 内积索引：分数即余弦相似度
+    - L2 索引：FAISS 返回平方距离，||a-b||² = 2 - 2·cos，故 cos = 1 - d²/2
+    """
+    if inner_product:
+        return float(max(-1.0, min(1.0, raw_score)))
+    return float(max(-1.0, min(1.0, 1 - max(0.0, raw_score) / 2)))
+
+
+def index_memory_bytes(index: faiss.Index) -> int:
+    """索引序列化后的大小（近似常驻内存）"""
+    return int(faiss.serialize_index(index).nbytes)
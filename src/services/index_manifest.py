@@ -0,0 +1,297 @@
+"""
+知识库索引清单 (Manifest)
+记录每个知识文件的 大小 / 修改时间 / 内容哈希 / chunk id，用于增量重建 FAISS 索引
+
+变更检测：文件的 (大小, mtime_ns, inode) 与清单记录一致时直接沿用清单中的内容哈希，
+只有不一致的文件才读取全文计算 SHA256（在线程池中并行）。
+记录时距修改不足 RACY_WINDOW_NS 的文件（同一时间戳内可能再次被写入）不记录 mtime_ns，下次重建仍会重新计算哈希。
+内容未变、仅文件状态变化时，新的状态写入附属文件 STAT_SIDECAR_FILE（已发布版本的 manifest.json 不可修改），
+读取清单时以内容哈希一致为前提叠加到对应记录上。
+"""
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from src.services.index_versions import SIDECAR_SUFFIX
+from src.services.pdf_service import PDFService
+
+MANIFEST_FILE = "manifest.json"
+# 已发布版本中仅文件状态变化（touch / 复制）时的刷新结果：manifest.json 受 version.json 校验，不能就地修改
+STAT_SIDECAR_FILE = "manifest.stat" + SIDECAR_SUFFIX
+MANIFEST_VERSION = 1
+
+RACY_WINDOW_NS = 2_000_000_000
+
+
+@dataclass
+class FileEntry:
+    """单个知识文件的索引记录"""
+    size: int
+    mtime: float
+    content_hash: str
+    chunk_ids: List[int] = field(default_factory=list)
+    duplicate_of: List[int] = field(default_factory=list)  # 本文件近重复 chunk 并入的代表 chunk id（见 near_duplicates）
+    mtime_ns: int = 0  # 0 = 未记录（旧版清单 / 记录时刚被修改），不走快速路径
+    inode: int = 0
+
+    def matches(self, stat: os.stat_result) -> bool:
+        """文件状态与记录一致（视为内容未变化）"""
+        return bool(self.mtime_ns) and (self.size, self.mtime_ns, self.inode) == (
+            stat.st_size, stat.st_mtime_ns, stat.st_ino
+        )
+
+    def update_stat(self, stat: os.stat_result):
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+        self.mtime_ns = 0 if time.time_ns() - stat.st_mtime_ns < RACY_WINDOW_NS else stat.st_mtime_ns
+        self.inode = stat.st_ino
+
+
+@dataclass
+class ManifestDiff:
+    """本次扫描结果与清单的差异"""
+    unchanged: List[Path] = field(default_factory=list)
+    added: List[Path] = field(default_factory=list)
+    changed: List[Path] = field(default_factory=list)
+    deleted: List[str] = field(default_factory=list)  # 已不存在的文件，只剩清单中的相对路径
+    hashes: Dict[str, str] = field(default_factory=dict)  # 相对路径 -> 本次计算的内容哈希
+    stat_hits: int = 0          # 文件状态与清单一致、沿用清单哈希的文件数
+    hashed_files: int = 0       # 重新计算哈希的文件数
+    hashed_bytes: int = 0
+    hash_seconds: float = 0.0
+    touched: List[str] = field(default_factory=list)  # 状态变化但内容未变的文件（清单中的文件状态已更新）
+
+    @property
+    def to_embed(self) -> List[Path]:
+        return self.added + self.changed
+
+    def hashing_stats(self) -> dict:
+        return {
+            "stat_hits": self.stat_hits,
+            "hashed_files": self.hashed_files,
+            "hashed_mb": round(self.hashed_bytes / 1024 / 1024, 2),
+            "seconds": round(self.hash_seconds, 3)
+        }
+
+
+class IndexManifest:
+    """
+    索引清单
+
+    以 data/knowledge 下的相对路径为键，保存在索引目录的 manifest.json 中，
+    与 index.faiss / index.pkl 一同保存、一同搬运，保证三者始终对应同一版本。
+    """
+
+    def __init__(self, embedding_model: str, index_type: str, files: Dict[str, FileEntry] = None, next_id: int = 0,
+                 chunker: str = "", dedup: str = ""):
+        self.embedding_model = embedding_model
+        self.index_type = index_type
+        self.chunker = chunker  # 切分参数标识，旧版清单（按字符切分）为空
+        self.dedup = dedup      # 近重复去重参数标识，未去重为空
+        self.files: Dict[str, FileEntry] = files or {}
+        self.next_id = next_id
+        self._observed: Dict[str, os.stat_result] = {}  # diff 时（计算哈希之前）取得的文件状态，record 时写入清单
+
+    @classmethod
+    def load(cls, index_dir: Path) -> Optional["IndexManifest"]:
+        """读取清单，不存在或格式不兼容时返回 None"""
+        manifest_path = Path(index_dir) / MANIFEST_FILE
+        if not manifest_path.exists():
+            return None
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != MANIFEST_VERSION:
+                return None
+            files = {path: FileEntry(**entry) for path, entry in data.get("files", {}).items()}
+            cls._apply_stat_sidecar(Path(index_dir), files)
+            return cls(
+                embedding_model=data.get("embedding_model", ""),
+                index_type=data.get("index_type", "flat_l2"),
+                files=files,
+                next_id=data.get("next_id", 0),
+                chunker=data.get("chunker", ""),
+                dedup=data.get("dedup", "")
+            )
+        except Exception as e:
+            print(f"⚠️ [Manifest] 清单读取失败，将执行全量重建: {e}")
+            return None
+
+    @staticmethod
+    def _apply_stat_sidecar(index_dir: Path, files: Dict[str, FileEntry]):
+        """叠加附属文件中刷新过的文件状态（内容哈希不一致的条目忽略）"""
+        sidecar_path = index_dir / STAT_SIDECAR_FILE
+        if not sidecar_path.exists():
+            return
+        try:
+            with open(sidecar_path, "r", encoding="utf-8") as f:
+                stats = json.load(f).get("files", {})
+        except Exception as e:
+            print(f"⚠️ [Manifest] 文件状态缓存读取失败，忽略: {e}")
+            return
+        for path, stat in stats.items():
+            entry = files.get(path)
+            if entry is not None and entry.content_hash == stat.get("content_hash"):
+                entry.size = stat["size"]
+                entry.mtime = stat["mtime"]
+                entry.mtime_ns = stat["mtime_ns"]
+                entry.inode = stat["inode"]
+
+    def save_stat_sidecar(self, index_dir: Path):
+        """
+        只保存文件状态到附属文件（用于已发布的版本目录：manifest.json 的校验和记录在 version.json 中）
+        """
+        data = {
+            "updated_at": datetime.now().isoformat(),
+            "files": {
+                path: {
+                    "size": entry.size, "mtime": entry.mtime, "mtime_ns": entry.mtime_ns,
+                    "inode": entry.inode, "content_hash": entry.content_hash
+                } for path, entry in sorted(self.files.items())
+            }
+        }
+        sidecar_path = Path(index_dir) / STAT_SIDECAR_FILE
+        tmp_path = sidecar_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, sidecar_path)
+
+    def save(self, index_dir: Path):
+        data = {
+            "version": MANIFEST_VERSION,
+            "embedding_model": self.embedding_model,
+            "index_type": self.index_type,
+            "chunker": self.chunker,
+            "dedup": self.dedup,
+            "next_id": self.next_id,
+            "updated_at": datetime.now().isoformat(),
+            "files": {path: asdict(entry) for path, entry in sorted(self.files.items())}
+        }
+        # 先写临时文件再替换，并发读取不会看到写了一半的文件
+        manifest_path = Path(index_dir) / MANIFEST_FILE
+        tmp_path = manifest_path.with_suffix(".json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, manifest_path)
+
+    @staticmethod
+    def relative_key(file_path: Path, data_root: Path) -> str:
+        """清单键：相对知识库目录的 POSIX 路径"""
+        return Path(file_path).resolve().relative_to(Path(data_root).resolve()).as_posix()
+
+    def diff(self, files: List[Path], data_root: Path, stat_fast_path: bool = True, hash_workers: int = 4) -> ManifestDiff:
+        """
+        对比当前文件与清单
+
+        内容哈希相同即视为未变化（仅 touch 过的文件不会触发重新向量化，其清单中的文件状态就地更新）；
+        近重复 chunk 并入了变更/删除文件的未变化文件同样需要重新处理，归入 changed
+
+        Args:
+            stat_fast_path: 文件状态与清单一致时沿用清单哈希
+            hash_workers: 并行计算哈希的线程数
+        """
+        result = ManifestDiff()
+        seen = set()
+        keys = {}
+        to_hash = []
+
+        start = time.perf_counter()
+        for file_path in files:
+            key = self.relative_key(file_path, data_root)
+            keys[file_path] = key
+            seen.add(key)
+            stat = Path(file_path).stat()
+            self._observed[key] = stat
+            entry = self.files.get(key)
+            if stat_fast_path and entry is not None and entry.matches(stat):
+                result.hashes[key] = entry.content_hash
+                result.stat_hits += 1
+            else:
+                to_hash.append(file_path)
+                result.hashed_bytes += stat.st_size
+
+        if to_hash:
+            with ThreadPoolExecutor(max_workers=max(1, min(hash_workers, len(to_hash)))) as executor:
+                for file_path, content_hash in zip(
+                    to_hash, executor.map(lambda path: PDFService.calculate_file_hash(str(path)), to_hash)
+                ):
+                    result.hashes[keys[file_path]] = content_hash
+        result.hashed_files = len(to_hash)
+        result.hash_seconds = time.perf_counter() - start
+
+        for file_path in files:
+            key = keys[file_path]
+            content_hash = result.hashes[key]
+            entry = self.files.get(key)
+            if entry is None:
+                result.added.append(file_path)
+            elif entry.content_hash != content_hash:
+                result.changed.append(file_path)
+            else:
+                result.unchanged.append(file_path)
+                if not entry.matches(self._observed[key]):
+                    entry.update_stat(self._observed[key])
+                    result.touched.append(key)
+
+        result.deleted = [key for key in self.files if key not in seen]
+
+        removed_keys = {self.relative_key(file_path, data_root) for file_path in result.changed}
+        dependents = self.dependents(removed_keys | set(result.deleted))
+        if dependents:
+            result.changed.extend(
+                file_path for file_path in result.unchanged if self.relative_key(file_path, data_root) in dependents
+            )
+            result.unchanged = [
+                file_path for file_path in result.unchanged if self.relative_key(file_path, data_root) not in dependents
+            ]
+        return result
+
+    def dependents(self, removed_keys: Set[str]) -> Set[str]:
+        """近重复 chunk（直接或间接）依赖于 removed_keys 中文件的其他文件"""
+        removed_keys = set(removed_keys)
+        dependents: Set[str] = set()
+        while True:
+            removed_ids = {
+                chunk_id for key in removed_keys | dependents if key in self.files
+                for chunk_id in self.files[key].chunk_ids
+            }
+            found = {
+                key for key, entry in self.files.items()
+                if key not in removed_keys and key not in dependents and removed_ids.intersection(entry.duplicate_of)
+            }
+            if not found:
+                return dependents
+            dependents |= found
+
+    def allocate_ids(self, count: int) -> List[int]:
+        """分配连续的 chunk id（id 单调递增，删除后不复用）"""
+        ids = list(range(self.next_id, self.next_id + count))
+        self.next_id += count
+        return ids
+
+    def record(self, key: str, file_path: Path, content_hash: str, chunk_ids: List[int], duplicate_of: List[int] = ()):
+        # 使用计算哈希之前取得的文件状态：哈希期间文件若被改写，下次重建状态不一致，会重新计算
+        stat = self._observed.get(key) or Path(file_path).stat()
+        entry = FileEntry(
+            size=stat.st_size,
+            mtime=stat.st_mtime,
+            content_hash=content_hash,
+            chunk_ids=list(chunk_ids),
+            duplicate_of=sorted(set(duplicate_of))
+        )
+        entry.update_stat(stat)
+        self.files[key] = entry
+
+    def remove(self, key: str) -> List[int]:
+        """移除文件记录，返回其旧 chunk id"""
+        entry = self.files.pop(key, None)
+        return entry.chunk_ids if entry else []
+
+    @property
+    def total_chunks(self) -> int:
+        return sum(len(entry.chunk_ids) for entry in self.files.values())
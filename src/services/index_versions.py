@@ -0,0 +1,184 @@
+"""
+版本化索引目录
+
+config/faiss_index_local/
+├── CURRENT                 ← 当前版本名（原子替换的指针文件）
+└── versions/
+    ├── v20260301-101500-123456/
+    │   ├── index.faiss / index.pkl / chunks.db / manifest.json / lexical.npz
+    │   ├── version.json    ← 版本信息 + 各文件 SHA256
+    │   └── *.sidecar.json  ← 发布后仍可更新的附属文件（如清单的文件状态缓存），不参与校验
+    └── ...
+
+每次构建写入独立的新版本目录，写完并校验后再原子切换 CURRENT：
+进程在任意时刻崩溃都不会留下残缺的当前索引，其他进程也不会读到写了一半的目录。
+（指针使用文件而非符号链接，Windows 下无需额外权限。）
+
+发布后超出 keep_versions 的旧版本会被删除，多 worker 部署时其他进程须跟随 CURRENT 切换
+（KnowledgeBase 在每次检索前比对 pointer_stamp），否则会继续使用已被删除的版本。
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+POINTER_FILE = "CURRENT"
+VERSIONS_DIR = "versions"
+VERSION_INFO_FILE = "version.json"
+BUILDING_SUFFIX = ".building"
+# 附属文件：不写入 version.json 的校验列表，发布后可原子替换（已发布版本的其他文件不可修改）
+SIDECAR_SUFFIX = ".sidecar.json"
+
+
+def _file_sha256(file_path: Path) -> str:
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+class IndexVersions:
+    """
+    索引版本目录管理
+
+    Args:
+        root: 索引根目录（config/faiss_index_local）
+        keep_versions: 切换后保留的版本数（含当前版本），旧版本可用于回退
+    """
+
+    def __init__(self, root: Path, keep_versions: int = 2):
+        self.root = Path(root)
+        self.versions_dir = self.root / VERSIONS_DIR
+        self.keep_versions = max(1, keep_versions)
+        self.versions_dir.mkdir(parents=True, exist_ok=True)
+
+    def current_name(self) -> Optional[str]:
+        pointer = self.root / POINTER_FILE
+        if not pointer.exists():
+            return None
+        name = pointer.read_text(encoding="utf-8").strip()
+        return name or None
+
+    def pointer_stamp(self) -> Optional[Tuple[int, int, int]]:
+        """
+        CURRENT 指针文件的 (inode, mtime_ns, size)，供其他进程低成本地发现新发布的版本
+
+        指针总是由临时文件原子替换，inode 每次发布都会变化（mtime 精度较粗的文件系统上也能区分）
+        """
+        try:
+            stat = (self.root / POINTER_FILE).stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def current(self) -> Optional[Path]:
+        """当前版本目录；尚未发布过版本时兼容旧版平铺布局（index.faiss 直接位于根目录）"""
+        name = self.current_name()
+        if name and (self.versions_dir / name).is_dir():
+            return self.versions_dir / name
+        if (self.root / "index.faiss").exists():
+            return self.root
+        return None
+
+    def candidates(self) -> List[Path]:
+        """可加载的版本目录，当前版本优先，其余按新到旧（当前版本损坏时回退使用）"""
+        result = []
+        current = self.current()
+        if current is not None:
+            result.append(current)
+        for path in sorted(self.versions_dir.iterdir(), reverse=True):
+            if path.is_dir() and not path.name.endswith(BUILDING_SUFFIX) and path not in result:
+                result.append(path)
+        if (self.root / "index.faiss").exists() and self.root not in result:
+            result.append(self.root)
+        return result
+
+    def new_build_dir(self) -> Path:
+        """创建新版本的构建目录（发布前以 .building 结尾，不会被加载）"""
+        name = "v" + datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        build_dir = self.versions_dir / (name + BUILDING_SUFFIX)
+        build_dir.mkdir(parents=True)
+        return build_dir
+
+    def publish(self, build_dir: Path, info: dict = None) -> Path:
+        """
+        写入校验信息，把构建目录改名为正式版本，再原子切换 CURRENT 指针
+
+        Returns:
+            发布后的版本目录
+        """
+        build_dir = Path(build_dir)
+        files = {
+            path.name: {"size": path.stat().st_size, "sha256": _file_sha256(path)}
+            for path in sorted(build_dir.iterdir()) if path.is_file() and not path.name.endswith(SIDECAR_SUFFIX)
+        }
+        version_dir = build_dir.with_name(build_dir.name[:-len(BUILDING_SUFFIX)])
+        with open(build_dir / VERSION_INFO_FILE, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": version_dir.name,
+                "created_at": datetime.now().isoformat(),
+                **(info or {}),
+                "files": files
+            }, f, ensure_ascii=False, indent=2)
+
+        os.replace(build_dir, version_dir)
+
+        temp_pointer = self.root / (POINTER_FILE + ".tmp")
+        with open(temp_pointer, "w", encoding="utf-8") as f:
+            f.write(version_dir.name)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_pointer, self.root / POINTER_FILE)
+
+        self._cleanup()
+        return version_dir
+
+    def verify(self, version_dir: Path, deep: bool = True) -> bool:
+        """
+        校验版本目录内文件与 version.json 记录一致（旧版平铺布局无校验信息，视为有效）
+
+        deep=False 时只比对文件大小，不读取文件内容（避免冷启动时整读大索引）
+        """
+        info_path = Path(version_dir) / VERSION_INFO_FILE
+        if not info_path.exists():
+            return version_dir == self.root
+        try:
+            with open(info_path, "r", encoding="utf-8") as f:
+                files = json.load(f)["files"]
+            for name, expected in files.items():
+                path = Path(version_dir) / name
+                if (not path.exists() or path.stat().st_size != expected["size"]
+                        or (deep and _file_sha256(path) != expected["sha256"])):
+                    print(f"⚠️ [IndexVersions] 校验失败: {Path(version_dir).name}/{name}")
+                    return False
+            return True
+        except Exception as e:
+            print(f"⚠️ [IndexVersions] 版本信息读取失败: {e}")
+            return False
+
+    def _cleanup(self):
+        """删除超出保留数量的旧版本、中断的构建目录及旧版平铺布局文件"""
+        current = self.current_name()
+        versions = sorted(
+            (p for p in self.versions_dir.iterdir() if p.is_dir() and not p.name.endswith(BUILDING_SUFFIX)),
+            reverse=True
+        )
+        keep = {current} | {p.name for p in versions[:self.keep_versions]}
+        for path in versions:
+            if path.name not in keep:
+                shutil.rmtree(path, ignore_errors=True)
+
+        # 中断遗留的构建目录（超过 1 小时未更新，避免误删其他进程正在进行的构建）
+        for path in self.versions_dir.glob("*" + BUILDING_SUFFIX):
+            if time.time() - path.stat().st_mtime > 3600:
+                shutil.rmtree(path, ignore_errors=True)
+
+        for name in ("index.faiss", "index.pkl", "manifest.json", "lexical.npz", "chunks.db"):
+            legacy = self.root / name
+            if legacy.exists():
+                legacy.unlink()
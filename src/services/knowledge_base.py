@@ -2,21 +2,78 @@ import os
 import shutil
 import asyncio
 import json
+import threading
+import time
 import numpy as np
+from contextlib import aclosing, contextmanager
+from dataclasses import dataclass
 from pathlib import Path
-from typing import List, AsyncGenerator
-from langchain_community.document_loaders import TextLoader, DirectoryLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from typing import Any, List, Dict, Set, Tuple, Optional, AsyncGenerator, AsyncIterator
+from langchain_community.document_loaders import TextLoader
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+import faiss
 
 # PDF处理相关
 from src.services.pdf_service import PDFService, PDFProcessingError
+from src.services.adaptive_pdf import AdaptivePDFExtractor, PIPELINE_VERSION as OCR_PIPELINE_VERSION
 from src.database.pdf_repository import PDFRepository
+from src.services.index_manifest import IndexManifest, ManifestDiff
+from src.services.embedding_cache import EmbeddingCache, CachedEmbeddings, QueryEmbeddingCache
+from src.services.onnx_embeddings import OnnxEmbeddings
+from src.services.text_chunker import ChineseChunker, token_counter_for
+from src.services.context_stitcher import stitch_neighbors
+from src.services.near_duplicates import DedupStats, NearDuplicateDetector
+from src.services.search_filter import FilterIndex, SearchFilter
+from src.config.kb_loader import load_kb_config
+from src.services import index_factory
+from src.services.lexical_index import LexicalIndex
+from src.services.hs_code_index import HSCodeIndex, extract_query_codes
+from src.services.tariff_catalog import PARSER_VERSION, TariffCatalog, parse_tariff_catalog
+from src.services.retrieval_batcher import RetrievalBatcher
+from src.services.index_versions import IndexVersions
+from src.services.chunk_store import (
+    CHUNK_DB_FILE, SQLiteDocstore, IdentityIdMap, write_chunk_db,
+    get_documents, iter_documents, count_documents
+)
+
+EMBEDDING_MODEL_NAME = "BAAI/bge-small-zh-v1.5"
+
+
+@dataclass
+class IndexSnapshot:
+    """一个索引版本在内存中的完整视图（向量库与倒排索引总是成对替换）"""
+    vector_store: Optional[FAISS]
+    lexical_index: Optional[LexicalIndex]
+    version_dir: Optional[Path] = None
+    hs_code_index: Optional[HSCodeIndex] = None
+    filter_index: Optional[FilterIndex] = None  # 元数据过滤用的 文件 -> chunk id 映射，首次过滤检索时构建
+    readers: int = 0  # 正在使用该版本的检索数
+
+
+class _DeferredEmbeddings(Embeddings):
+    """
+    加载索引时交给 FAISS 的 embedding_function：调用时才转发到 KnowledgeBase.embeddings，
+    后台初始化时索引文件可以先于 Embedding 模型加载完成
+    """
+
+    def __init__(self, kb: "KnowledgeBase"):
+        self.kb = kb
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.kb.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.kb.embeddings.embed_query(text)
+
 
 class KnowledgeBase:
-    def __init__(self, process_pdfs: bool = True):
+    def __init__(self, process_pdfs: bool = True, lazy: bool = False):
         # 1. 定义绝对路径
         self.base_dir = Path(__file__).resolve().parent.parent.parent
         self.data_path = self.base_dir / "data" / "knowledge"
@@ -31,6 +88,7 @@ class KnowledgeBase:
         self.process_pdfs = process_pdfs
         self.pdf_service = None  # 延迟初始化
         self.pdf_repo = PDFRepository() if process_pdfs else None
+        self.pdf_extractor = None  # 逐页 OCR 兜底（pdf_extraction.ocr_fallback），延迟初始化
 
         # 索引状态管理
         self.is_rebuilding = False
@@ -45,10 +103,225 @@ class KnowledgeBase:
         self.file_count = 0
         self._rebuild_lock = asyncio.Lock()
 
+        self.config = load_kb_config()
+
+        # Embedding 模型与向量缓存由 _init_embeddings 加载（后台初始化时与索引文件并行加载）
+        self.embedding_model = None
+        self.embeddings = None
+        self.embedding_cache = None
+        self.chunker: Optional[ChineseChunker] = None
+        self.embedding_model_id = self._configured_model_id(self.config["embedding"])
+        self._deferred_embeddings = _DeferredEmbeddings(self)
+
+        # 查询向量 LRU 缓存（报告各章节 / 并发报告常重复检索相同关键词）
+        query_cache_config = self.config["query_cache"]
+        self.query_cache = QueryEmbeddingCache(query_cache_config["max_entries"]) if query_cache_config.get("enabled", True) else None
+
+        # 向量索引类型（flat_ip / ivf_flat / hnsw / sq8 ...）
+        self.index_params = self.config["vector_index"]
+        self.index_type = self.index_params["type"]
+
+        # 检索配置（hybrid: 向量 + BM25 关键词 RRF 融合）
+        self.retrieval_config = self.config["retrieval"]
+
+        # 命中后拼接相邻 chunk 作为上下文（见 context_stitcher）
+        self.neighbor_config = self.config["neighbor_expansion"]
+
+        # 建索引时去除近重复 chunk（见 near_duplicates）
+        self.dedup_config = self.config["dedup"]
+
+        # 重建时的变更检测（文件状态快速路径 + 并行哈希，见 IndexManifest.diff）
+        self.change_config = self.config["change_detection"]
+
+        # 涉税规范申报目录的结构化表格行（见 tariff_catalog），按 HS 编码直接查表
+        self.tariff_config = self.config["tariff_catalog"]
+        self.tariff_catalog = None
+        if self.tariff_config.get("enabled", True):
+            try:
+                self.tariff_catalog = TariffCatalog(self.base_dir / self.tariff_config["db_path"])
+            except Exception as e:
+                print(f"⚠️ [KnowledgeBase] 申报目录存储初始化失败: {e}")
+
+        # 检索微批处理：并发请求合并为一次 search_many
+        batch_config = self.config["micro_batch"]
+        self.retrieval_batcher = RetrievalBatcher(
+            self.search_many,
+            window_ms=batch_config["window_ms"],
+            max_batch=batch_config["max_batch"]
+        ) if batch_config.get("enabled", True) else None
+
+        # 版本化索引目录（每次构建写入新版本，原子切换 CURRENT 指针）
+        self.index_versions = IndexVersions(self.vector_db_path, keep_versions=self.index_params.get("keep_versions", 2))
+
+        # 检索与替换通过 _index_guard 协调；就绪前为空索引，检索返回空结果
+        self._index_guard = threading.Lock()
+        self._index = IndexSnapshot(None, None)
+        # 其他 worker 发布新版本后会清理旧版本，检索前按 CURRENT 指针的变化跟进（见 _follow_current_version）
+        self._follow_lock = threading.Lock()
+        self._pointer_stamp = None
+
+        # 初始化状态（供 /health/ready 展示）
+        self.init_state = "pending"  # pending / loading / ready / failed
+        self.init_error: Optional[str] = None
+        self.load_timings: Dict[str, float] = {}
+        self._ready_event = asyncio.Event()
+
+        # lazy=True 时由调用方 await initialize() 在后台加载（见 src/main.py），否则在此同步加载
+        if not lazy:
+            self._initialize_sync()
+
+        # ❌ 不再自动启动后台PDF处理任务，改为用户手动触发
+        # self._pdf_task = None
+        # if self.process_pdfs:
+        #     self._pdf_task = asyncio.create_task(self._process_pdfs_background())
+
+    @property
+    def is_ready(self) -> bool:
+        return self.init_state == "ready"
+
+    def _timed(self, name: str, func):
+        """执行 func 并记录耗时（秒）到 load_timings[name]"""
+        start = time.perf_counter()
+        try:
+            return func()
+        finally:
+            self.load_timings[name] = round(time.perf_counter() - start, 3)
+
+    def _initialize_sync(self):
+        start = time.perf_counter()
+        self.init_state = "loading"
+        self._timed("embedding_model", self._init_embeddings)
+        snapshot = self._timed("index_load", self._load_index)
+        if snapshot is None:
+            snapshot = self._timed("index_build", self._create_index)
+        self._index = snapshot
+        self.init_state = "ready"
+        self.load_timings["total"] = round(time.perf_counter() - start, 3)
+        self._ready_event.set()
+
+    def initialize_for_rebuild(self, load_existing: bool = True):
+        """
+        离线重建（quick_rebuild.py）前的初始化：配合 lazy=True 使用，只加载 Embedding 模型，
+        load_existing 时再加载现有索引供增量比对；本地无索引时不在此构建，由 rebuild_index_stream 完成唯一一次向量化
+        """
+        self._timed("embedding_model", self._init_embeddings)
+        if load_existing:
+            snapshot = self._timed("index_load", self._load_index)
+            if snapshot is not None:
+                self._swap_index(snapshot)
+
+    async def initialize(self):
+        """
+        后台初始化：Embedding 模型与索引文件在两个线程中并行加载，
+        本地无可用索引时再用已加载的模型构建；完成（或失败）后唤醒 wait_ready 的等待方
+        """
+        start = time.perf_counter()
+        self.init_state = "loading"
+        configured_model_id = self.embedding_model_id
+        try:
+            _, snapshot = await asyncio.gather(
+                asyncio.to_thread(self._timed, "embedding_model", self._init_embeddings),
+                asyncio.to_thread(self._timed, "index_load", self._load_index)
+            )
+            if self.embedding_model_id != configured_model_id:
+                # ONNX 加载失败回退到了 HuggingFace，按实际模型重新选择索引版本
+                snapshot = await asyncio.to_thread(self._load_index)
+            if snapshot is None:
+                snapshot = await asyncio.to_thread(self._timed, "index_build", self._create_index)
+            self._swap_index(snapshot)
+            self.init_state = "ready"
+            print(f"✅ [KnowledgeBase] 后台初始化完成，耗时 {time.perf_counter() - start:.2f}s ({self.load_timings})")
+            if self.tariff_catalog is not None:
+                # 补齐尚未入库（或解析规则已更新）的申报目录，不阻塞就绪
+                asyncio.create_task(self.refresh_tariff_catalog())
+        except Exception as e:
+            self.init_state = "failed"
+            self.init_error = str(e)
+            print(f"❌ [KnowledgeBase] 后台初始化失败: {e}")
+        finally:
+            self.load_timings["total"] = round(time.perf_counter() - start, 3)
+            self._ready_event.set()
+
+    async def wait_ready(self, timeout: float) -> bool:
+        """等待初始化完成（最多 timeout 秒），返回是否就绪"""
+        if self.init_state not in ("ready", "failed"):
+            try:
+                await asyncio.wait_for(self._ready_event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.is_ready
+
+    def get_readiness(self) -> dict:
+        """初始化状态与各阶段耗时（供 /health/ready 展示）"""
+        return {
+            "state": self.init_state,
+            "ready": self.is_ready,
+            "error": self.init_error,
+            "embedding_model": self.embedding_model_id if self.embedding_model is not None else None,
+            "index_version": self.index_version.name if self.index_version else None,
+            "timings_s": dict(self.load_timings)
+        }
+
+    def _init_embeddings(self):
+        self.embedding_model, self.embedding_model_id = self._create_embedding_model(self.config["embedding"])
+
+        # 文本切分按模型自己的 tokenizer 计长度，保证 chunk 不超过模型输入上限
+        chunking_config = self.config["chunking"]
+        self.chunker = ChineseChunker(
+            token_counter_for(self.embedding_model),
+            max_tokens=chunking_config["max_tokens"],
+            overlap_tokens=chunking_config["overlap_tokens"],
+            min_chars=chunking_config["min_chars"]
+        )
+
+        # chunk 向量持久化缓存：所有建索引路径都经由 self.embeddings.embed_documents 查缓存
+        embeddings = self.embedding_model
+        cache_config = self.config["embedding_cache"]
+        if cache_config.get("enabled", True):
+            try:
+                self.embedding_cache = EmbeddingCache(
+                    self.base_dir / cache_config["dir"],
+                    model_name=self.embedding_model_id,
+                    normalize=True,
+                    max_entries=cache_config["max_entries"]
+                )
+                embeddings = CachedEmbeddings(self.embedding_model, self.embedding_cache)
+            except Exception as e:
+                print(f"⚠️ [KnowledgeBase] 向量缓存初始化失败，将直接调用模型: {e}")
+        self.embeddings = embeddings
+
+    @staticmethod
+    def _configured_model_id(embedding_config: dict) -> str:
+        """配置的 Embedding 后端对应的模型标识（写入 manifest 与向量缓存命名空间）"""
+        if embedding_config.get("backend") == "onnx":
+            return f"{EMBEDDING_MODEL_NAME}@onnx:{embedding_config['onnx_file']}"
+        return EMBEDDING_MODEL_NAME
+
+    def _create_embedding_model(self, embedding_config: dict):
+        """
+        创建 Embedding 模型（huggingface / onnx），ONNX 加载失败时回退 HuggingFace
+
+        Returns:
+            (模型, 模型标识)；标识写入 manifest 与向量缓存命名空间，切换后端会触发全量重建
+        """
+        if embedding_config.get("backend") == "onnx":
+            onnx_file = embedding_config["onnx_file"]
+            print(f"⚙️ [KnowledgeBase] 初始化 ONNX Embedding 模型 ({onnx_file}, threads={embedding_config['threads']})...")
+            try:
+                model = OnnxEmbeddings(
+                    self.base_dir / embedding_config["onnx_dir"],
+                    model_file=onnx_file,
+                    threads=embedding_config["threads"],
+                    batch_size=embedding_config["batch_size"]
+                )
+                return model, self._configured_model_id(embedding_config)
+            except Exception as e:
+                print(f"⚠️ [KnowledgeBase] ONNX 模型加载失败，回退 HuggingFace 后端: {e}")
+
         print(f"⚙️ [KnowledgeBase] 初始化中文 Embedding 模型 (bge-small-zh-v1.5 轻量版)...")
         try:
-            self.embeddings = HuggingFaceEmbeddings(
-                model_name="BAAI/bge-small-zh-v1.5",
+            model = HuggingFaceEmbeddings(
+                model_name=EMBEDDING_MODEL_NAME,
                 model_kwargs={'device': 'cpu'},
                 encode_kwargs={'normalize_embeddings': True},
                 show_progress=True  # 显示下载进度
@@ -56,114 +329,525 @@ class KnowledgeBase:
         except Exception as e:
             print(f"❌ [KnowledgeBase] Embedding 模型加载失败: {e}")
             raise e
+        return model, EMBEDDING_MODEL_NAME
 
-        # 加载或重建索引
-        self.vector_store = self._load_or_create_index()
+    @property
+    def vector_store(self) -> Optional[FAISS]:
+        return self._index.vector_store
 
-        # ❌ 不再自动启动后台PDF处理任务，改为用户手动触发
-        # self._pdf_task = None
-        # if self.process_pdfs:
-        #     self._pdf_task = asyncio.create_task(self._process_pdfs_background())
+    @property
+    def lexical_index(self) -> Optional[LexicalIndex]:
+        return self._index.lexical_index
+
+    @property
+    def hs_code_index(self) -> Optional[HSCodeIndex]:
+        return self._index.hs_code_index
 
-    def _load_or_create_index(self):
-        # 检查索引文件是否存在
-        index_file = self.vector_db_path / "index.faiss"
-        
-        if index_file.exists():
-            print("📂 [KnowledgeBase] 加载本地向量索引 (Hit Cache)...")
+    @property
+    def index_version(self) -> Optional[Path]:
+        return self._index.version_dir
+
+    def _follow_current_version(self):
+        """
+        其他进程（多 uvicorn worker）发布新版本后切换到该版本
+
+        发布方会删除超出 keep_versions 的旧版本，本进程若继续使用旧版本，新线程打开 chunks.db 会失败。
+        每次检索前只 stat 一次 CURRENT 指针，变化时才读取版本名并加载。
+        """
+        if not self.is_ready or self.is_rebuilding:
+            return
+        stamp = self.index_versions.pointer_stamp()
+        if stamp is None or stamp == self._pointer_stamp:
+            return
+        with self._follow_lock:
+            if stamp == self._pointer_stamp or self.is_rebuilding:
+                return
+            # 先记录指针状态：加载失败时不在之后的每次检索中重试
+            self._pointer_stamp = stamp
+            current = self.index_versions.current()
+            if current is not None and current != self.index_version:
+                print(f"🔄 [KnowledgeBase] 检测到其他进程发布的新索引版本 {current.name}，正在加载...")
+                snapshot = self._load_index()
+                if snapshot is not None:
+                    self._swap_index(snapshot)
+
+    @contextmanager
+    def _reading_index(self):
+        """读锁：检索期间固定使用同一版本，替换不会打断进行中的检索"""
+        self._follow_current_version()
+        with self._index_guard:
+            snapshot = self._index
+            snapshot.readers += 1
+        try:
+            yield snapshot
+        finally:
+            with self._index_guard:
+                snapshot.readers -= 1
+
+    def _swap_index(self, snapshot: IndexSnapshot):
+        """写锁：原子替换当前版本，之后的检索使用新版本，进行中的检索在旧版本上完成"""
+        with self._index_guard:
+            previous, self._index = self._index, snapshot
+        if previous.readers:
+            print(f"🔄 [KnowledgeBase] 已切换至新索引版本，旧版本仍有 {previous.readers} 个检索进行中")
+
+    def _load_index(self) -> Optional[IndexSnapshot]:
+        """按 当前版本 → 旧版本 的顺序加载第一个可用的索引版本，均不可用时返回 None"""
+        candidates = self.index_versions.candidates()
+        for version_dir in candidates:
+            print(f"📂 [KnowledgeBase] 加载本地向量索引 (Hit Cache): {version_dir.name}")
+            if not self.index_versions.verify(version_dir, deep=self.index_params.get("verify_on_load") == "sha256"):
+                continue
+            # 不同 Embedding 后端的向量不可混用（切换回原后端时可直接复用保留的旧版本）
+            manifest = IndexManifest.load(version_dir)
+            if manifest is not None and manifest.embedding_model != self.embedding_model_id:
+                print(f"ℹ️ [KnowledgeBase] 版本 {version_dir.name} 由 {manifest.embedding_model} 构建，与当前模型不一致，跳过")
+                continue
             try:
-                return FAISS.load_local(
-                    str(self.vector_db_path), 
-                    self.embeddings,
-                    allow_dangerous_deserialization=True 
-                )
+                vector_store = self._load_vector_store(version_dir, manifest.index_type if manifest else self.index_type)
             except Exception as e:
-                print(f"⚠️ [KnowledgeBase] 索引文件损坏，正在重建: {e}")
-                return self._create_index()
+                print(f"⚠️ [KnowledgeBase] 索引文件损坏: {e}")
+                continue
+            if version_dir != candidates[0]:
+                print(f"⚠️ [KnowledgeBase] 当前版本不可用，已回退至 {version_dir.name}")
+            return IndexSnapshot(
+                vector_store,
+                self._load_lexical_index(vector_store, version_dir),
+                version_dir,
+                hs_code_index=self._load_hs_code_index(vector_store, version_dir)
+            )
+
+        print("⚙️ [KnowledgeBase] 本地无可用索引，正在重建向量数据库...")
+        return None
+
+    def _load_vector_store(self, version_dir: Path, index_type: str) -> FAISS:
+        """
+        加载一个索引版本
+
+        storage = "mmap" 且版本目录含 chunks.db 时：FAISS 索引只读内存映射，chunk 文本留在 SQLite 按需读取；
+        memory 模式整体反序列化 index.pkl，mmap 模式构建的版本没有 index.pkl，改从 chunks.db 读入内存。
+        向量数据是否真正映射（多 worker 共享页缓存）取决于索引类型与 faiss 版本，见 index_factory.mmap_shares_pages。
+
+        Args:
+            version_dir: 版本目录
+            index_type: 该版本的索引类型（取自其清单，决定内存映射方式）
+        """
+        index_path = str(version_dir / "index.faiss")
+        chunk_db = version_dir / CHUNK_DB_FILE
+        if self.index_params.get("storage") == "mmap" and chunk_db.exists():
+            if not index_factory.mmap_shares_pages(index_type):
+                print(f"ℹ️ [KnowledgeBase] 当前 faiss 不支持映射 {index_type} 索引的向量编码"
+                      f"（需 IO_FLAG_MMAP_IFC），向量仍读入进程内存，仅 chunk 文本按需读取")
+            try:
+                index = faiss.read_index(index_path, index_factory.mmap_read_flags(index_type))
+            except RuntimeError as e:
+                print(f"⚠️ [KnowledgeBase] 以内存映射方式读取索引失败，改为读入内存: {e}")
+                index = faiss.read_index(index_path)
+            docstore = SQLiteDocstore(chunk_db)
+            vector_store = FAISS(
+                embedding_function=self._deferred_embeddings,
+                index=index,
+                docstore=docstore,
+                index_to_docstore_id=IdentityIdMap(docstore)
+            )
+        elif not (version_dir / "index.pkl").exists() and chunk_db.exists():
+            docs = dict(SQLiteDocstore(chunk_db).iter_all())
+            vector_store = FAISS(
+                embedding_function=self._deferred_embeddings,
+                index=faiss.read_index(index_path),
+                docstore=InMemoryDocstore(docs),
+                index_to_docstore_id={chunk_id: chunk_id for chunk_id in docs}
+            )
         else:
-            print("⚙️ [KnowledgeBase] 本地无索引，正在重建向量数据库...")
-            return self._create_index()
+            vector_store = FAISS.load_local(
+                str(version_dir), 
+                self._deferred_embeddings,
+                allow_dangerous_deserialization=True 
+            )
+        # 按实际索引的度量方式设置距离策略（旧版索引为 L2）
+        if index_factory.is_inner_product(vector_store.index):
+            vector_store.distance_strategy = DistanceStrategy.MAX_INNER_PRODUCT
+        index_factory.apply_search_params(vector_store.index, self.index_params)
+        return vector_store
+
+    def _published_store(self, vector_store: FAISS, version_dir: Optional[Path]) -> FAISS:
+        """mmap 模式下，新版本发布后改用磁盘映射的副本，释放构建时常驻内存的文本"""
+        if self.index_params.get("storage") == "mmap" and version_dir is not None:
+            try:
+                return self._load_vector_store(version_dir, self.index_type)
+            except Exception as e:
+                print(f"⚠️ [KnowledgeBase] 以 mmap 方式加载新版本失败，继续使用内存版本: {e}")
+        return vector_store
 
     def _create_index(self):
         if not self.data_path.exists():
             print(f"⚠️ [KnowledgeBase] 数据目录不存在: {self.data_path}，将创建空索引。")
-            return FAISS.from_texts(["初始化空白文档"], self.embeddings)
+            return IndexSnapshot(FAISS.from_texts(["初始化空白文档"], self.embeddings), None)
 
-        # 1. 加载文档
-        loaders = [
-            DirectoryLoader(str(self.data_path), glob="**/*.txt", loader_cls=TextLoader, loader_kwargs={"encoding": "utf-8"}),
-            DirectoryLoader(str(self.data_path), glob="**/*.md", loader_cls=TextLoader, loader_kwargs={"encoding": "utf-8"}),
-        ]
-        
-        documents = []
-        for loader in loaders:
+        # 1. 加载文档（启动时只处理 txt/md，PDF 由手动重建增量加入）
+        text_files = [f for f in self._scan_knowledge_files() if f.suffix.lower() in ['.txt', '.md']]
+        manifest = IndexManifest(
+            embedding_model=self.embedding_model_id, index_type=self.index_type,
+            chunker=self.chunker.signature, dedup=self._dedup_signature
+        )
+
+        file_documents: Dict[str, Tuple[Path, List[Document]]] = {}
+        hashes = self._diff_files(manifest, text_files).hashes
+        for file_path in text_files:
             try:
-                documents.extend(loader.load())
+                documents = self._load_text_file(file_path)
             except Exception as e:
                 print(f"⚠️ [KnowledgeBase] 加载文件出错: {e}")
+                continue
+            key = IndexManifest.relative_key(file_path, self.data_path)
+            file_documents[key] = (file_path, documents)
+
+        # 2. 切分文档、去除近重复片段（按文件切分，便于在清单中记录每个文件的 chunk id）
+        chunks, filtered_count, dedup_stats, _ = self._chunk_files(manifest, file_documents, hashes)
 
-        if not documents:
+        if not chunks:
             print("⚠️ [KnowledgeBase] 未找到文档，创建空索引。")
-            return FAISS.from_texts(["无数据"], self.embeddings)
-
-        # 2. 切分文档（增大分块以包含更多上下文）
-        # 🔥 关键调整：避免在分号处切分，防止产生只有"；"的碎片chunk
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1500,  # 增加到 1500 字符，确保包含完整的段落
-            chunk_overlap=150,  # 增加重叠以保持上下文连贯性
-            separators=[
-                "。\n",        # 优先：句子结束+换行
-                "！\n",        # 感叹句结束+换行
-                "？\n",        # 问句结束+换行
-                "\n\n\n",      # 三个换行（章节标题后）
-                "\n\n",        # 两个换行（段落之间）
-                "\n",          # 单个换行
-                "。",          # 句号
-                "！",          # 感叹号
-                "？",          # 问号
-                "，",          # 逗号
-                " ",          # 空格
-                # ❌ 移除"；\n"和"；"，避免在分号处切分产生无意义chunk
-                ""            # 最后才按字符切分
-            ]
-        )
-        chunks = text_splitter.split_documents(documents)
+            return IndexSnapshot(FAISS.from_texts(["无数据"], self.embeddings), None)
 
-        # 🔥 过滤掉小于50字符的低质量chunk（避免"；"等无意义chunk）
-        original_count = len(chunks)
-        chunks = [c for c in chunks if len(c.page_content) >= 50]
-        filtered_count = original_count - len(chunks)
-        print(f"📄 [KnowledgeBase] 切分出 {original_count} 个片段，过滤 {filtered_count} 个小片段，保留 {len(chunks)} 个有效片段...")
+        original_count = len(chunks) + filtered_count + dedup_stats.removed
+        print(f"📄 [KnowledgeBase] 切分出 {original_count} 个片段，过滤 {filtered_count} 个小片段，"
+              f"去除 {dedup_stats.removed} 个近重复片段，保留 {len(chunks)} 个有效片段...")
 
         # 3. 创建向量库 (内存中)
-        vector_store = FAISS.from_documents(chunks, self.embeddings)
+        vectors = self.embeddings.embed_documents([c.page_content for c in chunks])
+        vector_store = self._apply_index_changes(None, [], chunks, vectors)
+
+        # 4. 保存到本地
+        lexical_index = self._build_lexical_index(vector_store)
+        hs_code_index = self._build_hs_code_index(vector_store)
+        version_dir = self._save_index(vector_store, manifest, lexical_index, hs_code_index)
+
+        return IndexSnapshot(
+            self._published_store(vector_store, version_dir), lexical_index, version_dir, hs_code_index=hs_code_index
+        )
+
+    def _load_text_file(self, file_path: Path) -> List[Document]:
+        """加载单个 txt/md 文件"""
+        return TextLoader(str(file_path), encoding="utf-8").load()
+
+    def _split_documents(self, documents: List[Document]) -> Tuple[List[Document], int]:
+        """
+        切分文档（按 Embedding 模型 token 数计长度，见 text_chunker），并过滤掉小于50字符的低质量chunk
+
+        Returns:
+            (有效chunk列表, 被过滤的chunk数量)
+        """
+        return self.chunker.split_documents(documents)
+
+    @property
+    def _dedup_signature(self) -> str:
+        detector = self._create_duplicate_detector()
+        return detector.signature if detector is not None else ""
+
+    def _create_duplicate_detector(self) -> Optional[NearDuplicateDetector]:
+        if not self.dedup_config.get("enabled", True):
+            return None
+        return NearDuplicateDetector(
+            threshold=self.dedup_config["threshold"],
+            num_perm=self.dedup_config["num_perm"],
+            bands=self.dedup_config["bands"],
+            shingle_size=self.dedup_config["shingle_size"]
+        )
+
+    def _chunk_files(
+        self,
+        manifest: IndexManifest,
+        file_documents: Dict[str, Tuple[Path, List[Document]]],
+        hashes: Dict[str, str],
+        base_store: Optional[FAISS] = None,
+        removed_ids: List[int] = ()
+    ) -> Tuple[List[Document], int, DedupStats, Dict[int, List[str]]]:
+        """
+        切分文件、去除近重复 chunk 并分配 chunk id (同步函数)
+
+        近重复 chunk 不进入索引：代表 chunk 的 metadata["aliases"] 记录其他来源文件，
+        清单中记录各文件并入的代表 chunk id（代表所在文件变更或删除时，该文件随之重新处理）。
+        增量模式下当前索引中保留的 chunk 优先作为代表。
+
+        Returns:
+            (新 chunk, 过滤的碎片数, 去重统计, 当前索引中的代表 chunk 需追加的别名 {chunk id: [文件]})
+        """
+        detector = self._create_duplicate_detector()
+        owners: Dict[Any, str] = {}          # 检测器 key -> 所属文件
+        new_chunks: List[Document] = []      # 新 chunk 以 ("new", 序号) 作为检测器 key
+        if detector is not None and base_store is not None:
+            removed = set(removed_ids)
+            for chunk_id, doc in iter_documents(base_store.docstore):
+                if chunk_id not in removed:
+                    detector.add(chunk_id, doc.page_content)
+                    owners[chunk_id] = doc.metadata.get("file_path")
+
+        chunks = []
+        filtered_count = 0
+        stats = DedupStats()
+        alias_additions: Dict[int, List[str]] = {}
+        for key, (file_path, docs) in file_documents.items():
+            file_chunks, filtered = self._split_documents(docs)
+            filtered_count += filtered
+
+            kept = []
+            representatives = []
+            for chunk in file_chunks:
+                if detector is None:
+                    kept.append(chunk)
+                    continue
+                stats.checked += 1
+                detector_key = ("new", len(new_chunks))
+                representative = detector.add(detector_key, chunk.page_content)
+                if representative is None:
+                    new_chunks.append(chunk)
+                    owners[detector_key] = key
+                    kept.append(chunk)
+                    continue
+                stats.removed += 1
+                stats.removed_chars += len(chunk.page_content)
+                if owners[representative] != key:
+                    stats.cross_file += 1
+                representatives.append(representative)
+
+            chunk_ids = manifest.allocate_ids(len(kept))
+            self._tag_chunks(kept, chunk_ids, key, file_path)
+
+            # 代表 chunk 均先于本 chunk 加入（当前索引、之前的文件或本文件靠前的位置），此时已有 id
+            representative_ids = []
+            for representative in representatives:
+                if isinstance(representative, tuple):
+                    metadata = new_chunks[representative[1]].metadata
+                    representative_ids.append(metadata["chunk_id"])
+                    aliases = metadata.setdefault("aliases", [])
+                else:
+                    representative_ids.append(representative)
+                    aliases = alias_additions.setdefault(representative, [])
+                if owners[representative] != key and key not in aliases:
+                    aliases.append(key)
+
+            manifest.record(key, file_path, hashes[key], chunk_ids, representative_ids)
+            chunks.extend(kept)
+
+        alias_additions = {chunk_id: keys for chunk_id, keys in alias_additions.items() if keys}
+        return chunks, filtered_count, stats, alias_additions
+
+    @staticmethod
+    def _update_aliases(docs: Dict[int, Document], alias_additions: Dict[int, List[str]], stale_alias_keys: Set[str]):
+        """更新保留 chunk 的别名：移除需重新处理/已删除的文件，追加新并入的文件（替换为新 Document，不修改当前版本）"""
+        for chunk_id, doc in list(docs.items()):
+            aliases = doc.metadata.get("aliases") or []
+            added = alias_additions.get(chunk_id, [])
+            if not added and not stale_alias_keys.intersection(aliases):
+                continue
+            updated = [key for key in aliases if key not in stale_alias_keys]
+            updated += [key for key in added if key not in updated]
+            metadata = dict(doc.metadata)
+            if updated:
+                metadata["aliases"] = updated
+            else:
+                metadata.pop("aliases", None)
+            docs[chunk_id] = Document(page_content=doc.page_content, metadata=metadata)
+
+    def _tag_chunks(self, chunks: List[Document], chunk_ids: List[int], key: str, file_path: Path):
+        """为 chunk 写入 id、来源元数据，以及文件内序号与前后相邻 chunk 的 id（检索时拼接上下文）"""
+        for position, (chunk_id, chunk) in enumerate(zip(chunk_ids, chunks)):
+            chunk.metadata["chunk_id"] = chunk_id
+            chunk.metadata["file_path"] = key
+            chunk.metadata["file_type"] = file_path.suffix.lower().lstrip(".")
+            chunk.metadata["chunk_index"] = position
+            chunk.metadata["prev_id"] = chunk_ids[position - 1] if position > 0 else None
+            chunk.metadata["next_id"] = chunk_ids[position + 1] if position + 1 < len(chunk_ids) else None
+
+    def _apply_index_changes(
+        self,
+        base_store: Optional[FAISS],
+        removed_ids: List[int],
+        chunks: List[Document],
+        vectors: List[List[float]],
+        alias_additions: Optional[Dict[int, List[str]]] = None,
+        stale_alias_keys: Optional[Set[str]] = None,
+        base_version_dir: Optional[Path] = None
+    ) -> FAISS:
+        """
+        基于现有向量库生成新版本 (同步函数)
+
+        索引以 chunk id 为键（IDMap2 / IVF 原生 id），可按文件删除旧向量。
+        在副本上修改，正在进行的检索不受影响。
+
+        Args:
+            base_store: 增量模式下的当前向量库；None 表示全量新建
+            removed_ids: 需要删除的 chunk id（变更或删除的文件）
+            chunks: 新增的 chunk（metadata 中已带 chunk_id）
+            vectors: 与 chunks 一一对应的向量
+            alias_additions: 保留 chunk 需追加的近重复来源文件（见 _chunk_files）
+            stale_alias_keys: 需从保留 chunk 的别名中移除的文件（变更或删除的文件）
+            base_version_dir: base_store 所属的版本目录（mmap 加载的索引无法复制时从中重新读入）
+        """
+        if base_store is not None and removed_ids and not index_factory.supports_remove(self.index_type):
+            # HNSW 不支持删除：用保留的 chunk 重新建图，向量从现有索引中取回（不调用模型，与缓存是否开启无关）
+            removed = set(removed_ids)
+            kept_items = [(chunk_id, doc) for chunk_id, doc in iter_documents(base_store.docstore) if chunk_id not in removed]
+            kept = [doc for _, doc in kept_items]
+            kept_vectors = index_factory.reconstruct_vectors(base_store.index, [chunk_id for chunk_id, _ in kept_items]) if kept else []
+            if kept_vectors is None:
+                # 取不回向量（旧版 uuid 键等）：重新计算（命中向量缓存时不调用模型）
+                kept_vectors = self.embeddings.embed_documents([doc.page_content for doc in kept])
+            all_vectors = np.array(list(kept_vectors) + list(vectors), dtype="float32").reshape(-1, base_store.index.d)
+            return self._apply_index_changes(None, [], kept + chunks, all_vectors, alias_additions, stale_alias_keys)
+
+        if base_store is not None:
+            index = self._writable_copy(base_store.index, base_version_dir)
+            index_factory.apply_search_params(index, self.index_params)
+            docs = dict(iter_documents(base_store.docstore))
+            if removed_ids:
+                index.remove_ids(np.array(removed_ids, dtype="int64"))
+                for chunk_id in removed_ids:
+                    docs.pop(chunk_id, None)
+        else:
+            index = index_factory.create_index(self.index_type, np.array(vectors, dtype="float32"), self.index_params)
+            docs = {}
+
+        if chunks:
+            chunk_ids = [c.metadata["chunk_id"] for c in chunks]
+            index.add_with_ids(
+                np.array(vectors, dtype="float32"),
+                np.array(chunk_ids, dtype="int64")
+            )
+            docs.update(zip(chunk_ids, chunks))
+
+        if alias_additions or stale_alias_keys:
+            self._update_aliases(docs, alias_additions or {}, stale_alias_keys or set())
+
+        return FAISS(
+            embedding_function=self.embeddings,
+            index=index,
+            docstore=InMemoryDocstore(docs),
+            index_to_docstore_id={chunk_id: chunk_id for chunk_id in docs},
+            distance_strategy=(
+                DistanceStrategy.MAX_INNER_PRODUCT if index_factory.is_inner_product(index)
+                else DistanceStrategy.EUCLIDEAN_DISTANCE
+            )
+        )
 
-        # 4. 保存到本地 (Windows 路径兼容性修复)
+    def _writable_copy(self, index: faiss.Index, version_dir: Optional[Path]) -> faiss.Index:
+        if self.index_params.get("storage") == "mmap" and version_dir is not None:
+            # 映射加载的索引不能 clone 后修改（IFC 映射的向量编码被修改时 faiss 直接中止进程），从版本文件重新读入内存
+            return faiss.read_index(str(version_dir / "index.faiss"))
         try:
-            # 定义临时目录
-            temp_dir_name = "temp_faiss_build"
-            temp_path = self.base_dir / temp_dir_name
-            
-            if temp_path.exists():
-                shutil.rmtree(temp_path)
-
-            # 保存到临时目录
-            vector_store.save_local(str(temp_path))
-
-            # 搬运
-            if self.vector_db_path.exists():
-                shutil.rmtree(self.vector_db_path)
-            self.vector_db_path.mkdir(parents=True, exist_ok=True)
-
-            for file_name in os.listdir(temp_path):
-                shutil.move(str(temp_path / file_name), str(self.vector_db_path / file_name))
-
-            shutil.rmtree(temp_path)
-            print(f"💾 [KnowledgeBase] 索引已保存至: {self.vector_db_path}")
-        except Exception as e:
-            print(f"❌ [KnowledgeBase] 保存索引失败: {e}")
-        
-        return vector_store
+            return faiss.clone_index(index)
+        except RuntimeError:
+            if version_dir is None:
+                raise RuntimeError("当前索引无法复制且不属于任何已发布版本，无法增量更新，请执行全量重建")
+            return faiss.read_index(str(version_dir / "index.faiss"))
+
+    def _diff_files(self, manifest: IndexManifest, files: List[Path]) -> ManifestDiff:
+        diff = manifest.diff(
+            files, self.data_path,
+            stat_fast_path=self.change_config.get("stat_fast_path", True),
+            hash_workers=self.change_config.get("hash_workers", 4)
+        )
+        print(f"🔍 [KnowledgeBase] 变更检测: {diff.stat_hits} 个文件状态未变，"
+              f"计算 {diff.hashed_files} 个文件哈希 ({diff.hashed_bytes / 1024 / 1024:.1f} MB)，耗时 {diff.hash_seconds:.2f}s")
+        return diff
+
+    def _load_manifest_for_incremental(self) -> Optional[IndexManifest]:
+        """读取清单并确认当前索引可以增量更新，否则返回 None（需全量重建）"""
+        manifest = IndexManifest.load(self.index_version) if self.index_version else None
+        if manifest is None:
+            print("ℹ️ [KnowledgeBase] 未找到索引清单，执行全量重建")
+            return None
+        if manifest.embedding_model != self.embedding_model_id:
+            print(f"ℹ️ [KnowledgeBase] Embedding 模型已变更 ({manifest.embedding_model} → {self.embedding_model_id})，执行全量重建")
+            return None
+        if manifest.index_type != self.index_type:
+            print(f"ℹ️ [KnowledgeBase] 索引类型已变更 ({manifest.index_type} → {self.index_type})，执行全量重建")
+            return None
+        if manifest.chunker != self.chunker.signature:
+            print(f"ℹ️ [KnowledgeBase] 切分参数已变更 ({manifest.chunker or '字符切分'} → {self.chunker.signature})，执行全量重建")
+            return None
+        if manifest.dedup != self._dedup_signature:
+            print(f"ℹ️ [KnowledgeBase] 去重参数已变更 ({manifest.dedup or '未去重'} → {self._dedup_signature or '未去重'})，执行全量重建")
+            return None
+        index = getattr(self.vector_store, "index", None)
+        if index is None or not index_factory.supports_ids(index):
+            print("ℹ️ [KnowledgeBase] 当前索引不支持按 id 删除（旧版格式），执行全量重建")
+            return None
+        if index.ntotal != manifest.total_chunks:
+            print(f"⚠️ [KnowledgeBase] 索引向量数({index.ntotal})与清单({manifest.total_chunks})不一致，执行全量重建")
+            return None
+        return manifest
+
+    def _build_lexical_index(self, vector_store: FAISS) -> Optional[LexicalIndex]:
+        """由向量库的 docstore 全量构建关键词倒排索引"""
+        docs = list(iter_documents(vector_store.docstore))
+        if not all(isinstance(chunk_id, int) for chunk_id, _ in docs):
+            # 旧版索引以 uuid 为键，需重建索引后才能启用关键词检索
+            print("ℹ️ [KnowledgeBase] 当前索引为旧版格式，关键词检索暂不可用（重建索引后启用）")
+            return None
+        return LexicalIndex.build(
+            ((chunk_id, doc.page_content) for chunk_id, doc in docs),
+            k1=self.retrieval_config["bm25_k1"],
+            b=self.retrieval_config["bm25_b"]
+        )
+
+    def _load_lexical_index(self, vector_store: FAISS, version_dir: Path) -> Optional[LexicalIndex]:
+        """读取与向量库同版本的倒排索引，缺失或不一致时重新构建"""
+        lexical_index = LexicalIndex.load(version_dir)
+        if lexical_index is not None and len(lexical_index) == count_documents(vector_store.docstore):
+            return lexical_index
+        return self._build_lexical_index(vector_store)
+
+    def _apply_lexical_changes(
+        self,
+        base_store: Optional[FAISS],
+        new_store: FAISS,
+        removed_ids: List[int],
+        chunks: List[Document]
+    ) -> Optional[LexicalIndex]:
+        """与 _apply_index_changes 对应：增量模式只处理删除/新增的 chunk"""
+        if base_store is None or self.lexical_index is None:
+            return self._build_lexical_index(new_store)
+        return self.lexical_index.apply_changes(
+            self._removed_texts(base_store, removed_ids),
+            [(c.metadata["chunk_id"], c.page_content) for c in chunks]
+        )
+
+    @staticmethod
+    def _removed_texts(base_store: FAISS, removed_ids: List[int]) -> Dict[int, str]:
+        return {
+            chunk_id: doc.page_content
+            for chunk_id, doc in get_documents(base_store.docstore, removed_ids).items()
+        }
+
+    def _build_hs_code_index(self, vector_store: FAISS) -> Optional[HSCodeIndex]:
+        """由向量库的 docstore 全量抽取 HS 编码（旧版 uuid 索引同关键词检索，不启用）"""
+        docs = list(iter_documents(vector_store.docstore))
+        if not all(isinstance(chunk_id, int) for chunk_id, _ in docs):
+            return None
+        return HSCodeIndex.build((chunk_id, doc.page_content) for chunk_id, doc in docs)
+
+    def _load_hs_code_index(self, vector_store: FAISS, version_dir: Path) -> Optional[HSCodeIndex]:
+        """读取与向量库同版本的 HS 编码索引，缺失时（此前版本构建的索引）重新抽取"""
+        hs_code_index = HSCodeIndex.load(version_dir)
+        if hs_code_index is not None:
+            return hs_code_index
+        return self._build_hs_code_index(vector_store)
+
+    def _apply_hs_code_changes(
+        self,
+        base_store: Optional[FAISS],
+        new_store: FAISS,
+        removed_ids: List[int],
+        chunks: List[Document]
+    ) -> Optional[HSCodeIndex]:
+        """与 _apply_lexical_changes 对应"""
+        if base_store is None or self.hs_code_index is None:
+            return self._build_hs_code_index(new_store)
+        return self.hs_code_index.apply_changes(
+            self._removed_texts(base_store, removed_ids),
+            [(c.metadata["chunk_id"], c.page_content) for c in chunks]
+        )
 
     def _init_pdf_service_if_needed(self):
         """延迟初始化PDF服务"""
@@ -174,19 +858,92 @@ class KnowledgeBase:
                 print(f"[KnowledgeBase] PDF服务初始化失败，将跳过PDF处理: {e}")
                 self.process_pdfs = False
 
-    async def _process_pdfs(self) -> List[Document]:
+    async def _extract_pdf_texts(
+        self,
+        pdf_files: List[Path],
+        hashes: Optional[Dict[str, str]] = None
+    ) -> AsyncIterator[Tuple[Path, Optional[str], bool]]:
         """
-        处理所有PDF文件
+        读取 PDF 文本（重建索引与 _process_pdfs 共用）
 
-        流程：
-        1. 扫描data/knowledge/目录下的所有PDF
-        2. 对每个PDF：
-           a. 计算文件哈希
-           b. 查询SQLite缓存
-           c. 如果缓存有效 → 使用缓存
-           d. 如果缓存无效 → 调用Marker提取
-           e. 保存缓存
-        3. 返回Document列表
+        1. 一次查询批量命中 SQLite 提取缓存（按文件内容哈希）
+        2. 未命中的文件交给进程池并行提取（大文件按页段拆分），完成一个写回一个缓存
+
+        Args:
+            pdf_files: PDF 文件
+            hashes: 清单键 -> 内容哈希（重建时已计算，缺失的在此补算）
+
+        Yields:
+            (文件, 文本；提取失败为 None, 是否缓存命中)，缓存命中的先返回，其余按提取完成顺序
+        """
+        file_hashes = {}
+        for file_path in pdf_files:
+            key = IndexManifest.relative_key(file_path, self.data_path)
+            file_hashes[file_path] = (hashes or {}).get(key) or await asyncio.to_thread(
+                PDFService.calculate_file_hash, str(file_path)
+            )
+
+        cached = {}
+        if self.pdf_repo is not None:
+            try:
+                cached = await self.pdf_repo.get_many_by_hash(file_hashes.values())
+            except Exception as e:
+                print(f"⚠️ [KnowledgeBase] 读取PDF缓存失败，全部重新提取: {e}")
+
+        # 开启 OCR 兜底后，只经过文字层提取的旧缓存需要重新处理（其中的扫描页尚未 OCR）
+        extraction_config = self.config["pdf_extraction"]
+        ocr_fallback = extraction_config.get("ocr_fallback", False)
+        misses = []
+        for file_path, file_hash in file_hashes.items():
+            cached_doc = cached.get(file_hash)
+            if cached_doc is not None and cached_doc.is_valid and (
+                not ocr_fallback or cached_doc.marker_version == OCR_PIPELINE_VERSION
+            ):
+                yield file_path, cached_doc.processed_text, True
+            else:
+                misses.append(file_path)
+        if not misses:
+            return
+
+        if self.pdf_service is None:
+            self.pdf_service = PDFService()
+        if ocr_fallback and self.pdf_extractor is None:
+            self.pdf_extractor = AdaptivePDFExtractor(
+                self.pdf_service, self.pdf_repo, ocr_batch_pages=extraction_config.get("ocr_batch_pages", 8)
+            )
+        by_path = {str(file_path): file_path for file_path in misses}
+        async with aclosing(self.pdf_service.extract_many(
+            list(by_path),
+            max_workers=extraction_config["max_workers"],
+            pages_per_task=extraction_config["pages_per_task"]
+        )) as results:
+            async for result in results:
+                file_path = by_path[result.pdf_path]
+                text, processing_time, pipeline = result.text, result.processing_time, "pypdfium2"
+                if result.error is None and ocr_fallback:
+                    # 文字层不合格的页补 OCR；仍有页未能 OCR 时按纯文字层结果缓存，下次重试
+                    refined = await self.pdf_extractor.refine(file_path, file_hashes[file_path], result.pages)
+                    text, processing_time = refined.text, processing_time + refined.processing_time
+                    pipeline = OCR_PIPELINE_VERSION if refined.complete else pipeline
+                if result.error is None and self.pdf_repo is not None:
+                    try:
+                        await self.pdf_repo.save_cache(
+                            file_path=str(file_path.relative_to(self.base_dir)),
+                            file_name=file_path.name,
+                            file_hash=file_hashes[file_path],
+                            file_size=file_path.stat().st_size,
+                            processed_text=text,
+                            processing_time=processing_time,
+                            marker_version=pipeline,
+                            page_count=result.page_count
+                        )
+                    except Exception as e:
+                        print(f"⚠️ [KnowledgeBase] 保存PDF缓存失败: {file_path.name} - {e}")
+                yield file_path, text, False
+
+    async def _process_pdfs(self) -> List[Document]:
+        """
+        处理所有PDF文件：缓存批量命中，未命中的并行提取并写回缓存（见 _extract_pdf_texts）
 
         Returns:
             List[Document]: 包含所有PDF文本的Document对象列表
@@ -194,10 +951,6 @@ class KnowledgeBase:
         if not self.process_pdfs:
             return []
 
-        self._init_pdf_service_if_needed()
-        if not self.pdf_service:
-            return []
-
         # 扫描PDF文件
         pdf_files = list(self.data_path.glob("**/*.pdf"))
 
@@ -212,76 +965,22 @@ class KnowledgeBase:
         cache_misses = 0
         processing_errors = 0
 
-        for idx, pdf_path in enumerate(pdf_files, 1):
-            try:
-                # 相对路径 (用于存储)
-                rel_path = str(pdf_path.relative_to(self.base_dir))
-                file_name = pdf_path.name
-                file_size = pdf_path.stat().st_size
-
-                print(f"\n📄 [{idx}/{len(pdf_files)}] 处理: {file_name}")
-
-                # 1. 计算文件哈希
-                print(f"   计算 SHA256 哈希...")
-                file_hash = await asyncio.to_thread(
-                    PDFService.calculate_file_hash,
-                    str(pdf_path)
-                )
-
-                # 2. 查询缓存
-                print(f"   💾 查询缓存...")
-                cached_doc = await self.pdf_repo.get_by_hash(file_hash)
-
-                # 3. 判断缓存是否有效
-                if cached_doc and cached_doc.is_valid:
-                    print(f"   ✅ 缓存命中 ({cached_doc.char_count}字符)")
-                    cache_hits += 1
-                    markdown_text = cached_doc.processed_text
-                else:
-                    print(f"   ⚠️ 缓存未命中，调用Marker提取...")
-                    cache_misses += 1
-
-                    # 调用PDF服务提取
-                    try:
-                        markdown_text, processing_time = await self.pdf_service.extract_text_async(
-                            str(pdf_path),
-                            validate_quality=True
-                        )
-
-                        # 保存缓存
-                        await self.pdf_repo.save_cache(
-                            file_path=rel_path,
-                            file_name=file_name,
-                            file_hash=file_hash,
-                            file_size=file_size,
-                            processed_text=markdown_text,
-                            processing_time=processing_time,
-                            marker_version="0.3.2"
-                        )
-                        print(f"   💾 缓存已保存")
-
-                    except PDFProcessingError as e:
-                        print(f"   [PDF] 处理失败: {e}")
-                        processing_errors += 1
-                        continue
-
-                # 4. 创建Document对象
-                doc = Document(
+        async with aclosing(self._extract_pdf_texts(pdf_files)) as results:
+            async for pdf_path, markdown_text, cache_hit in results:
+                cache_hits += cache_hit
+                cache_misses += not cache_hit
+                if markdown_text is None:
+                    processing_errors += 1
+                    continue
+                documents.append(Document(
                     page_content=markdown_text,
                     metadata={
-                        "source": file_name,
-                        "file_path": rel_path,
+                        "source": pdf_path.name,
+                        "file_path": str(pdf_path.relative_to(self.base_dir)),
                         "file_type": "pdf",
-                        "char_count": len(markdown_text),
-                        "file_hash": file_hash
+                        "char_count": len(markdown_text)
                     }
-                )
-                documents.append(doc)
-
-            except Exception as e:
-                print(f"   ❌ 处理异常: {e}")
-                processing_errors += 1
-                continue
+                ))
 
         # 统计信息
         print(f"\n{'='*60}")
@@ -297,120 +996,434 @@ class KnowledgeBase:
         return documents
 
     async def _process_pdfs_background(self):
-        """后台异步处理PDF任务"""
+        """后台异步处理PDF任务（增量重建：只向量化新增/变更的文件）"""
         try:
             # 等待一段时间，让主服务先启动
             await asyncio.sleep(5)
 
-            print("⚙️ [KnowledgeBase] 后台任务: 开始处理PDF文件...")
-            pdf_docs = await self._process_pdfs()
-
-            if pdf_docs:
-                # 将PDF文档添加到现有索引
-                print(f"⚙️ [KnowledgeBase] 正在添加 {len(pdf_docs)} 个PDF文档到索引...")
-
-                # 切分PDF文本（优化分隔符，避免在分号处切分）
-                text_splitter = RecursiveCharacterTextSplitter(
-                    chunk_size=1500,
-                    chunk_overlap=150,
-                    separators=[
-                        "。\n", "！\n", "？\n",
-                        "\n\n\n", "\n\n", "\n",
-                        "。", "！", "？",
-                        "，", " ",
-                        # ❌ 移除"；\n"和"；"，避免在分号处切分产生无意义chunk
-                        ""
-                    ]
-                )
-                chunks = text_splitter.split_documents(pdf_docs)
-
-                # 🔥 过滤掉小于50字符的低质量chunk
-                original_count = len(chunks)
-                chunks = [c for c in chunks if len(c.page_content) >= 50]
-                print(f"📄 过滤: {original_count} → {len(chunks)} 个chunk（过滤了{original_count - len(chunks)}个小片段）")
-
-                # 向量化
-                new_vector_store = await asyncio.to_thread(
-                    FAISS.from_documents,
-                    chunks,
-                    self.embeddings
-                )
-
-                # 合并索引
-                self.vector_store.merge_from(new_vector_store)
-
-                # 保存索引
-                await asyncio.to_thread(
-                    self._save_index,
-                    self.vector_store
-                )
-                print(f"✅ [KnowledgeBase] PDF索引更新完成 ({len(chunks)}个片段)")
-            else:
-                print("ℹ️ [KnowledgeBase] 无PDF文件需要处理")
+            print("⚙️ [KnowledgeBase] 后台任务: 开始增量更新索引...")
+            async for event in self.rebuild_index_stream():
+                data = json.loads(event[len("data: "):])
+                if data["type"] in ("complete", "error", "cancelled"):
+                    print(f"ℹ️ [KnowledgeBase] 后台任务结束: {data.get('message')} {data.get('stats', '')}")
 
         except Exception as e:
             print(f"❌ [KnowledgeBase] PDF后台任务失败: {e}")
             import traceback
             traceback.print_exc()
 
-    def _save_index(self, vector_store):
-        """保存FAISS索引到本地"""
+    def _save_index(
+        self,
+        vector_store,
+        manifest: Optional[IndexManifest] = None,
+        lexical_index: Optional[LexicalIndex] = None,
+        hs_code_index: Optional[HSCodeIndex] = None
+    ) -> Optional[Path]:
+        """
+        保存FAISS索引（及索引清单、关键词倒排索引、HS 编码索引）为新版本并原子切换
+
+        Returns:
+            发布后的版本目录，失败返回 None（当前版本保持不变）
+        """
+        build_dir = None
         try:
-            # 定义临时目录
-            temp_dir_name = "temp_faiss_build"
-            temp_path = self.base_dir / temp_dir_name
+            # 写入独立的构建目录（清单、倒排索引与向量索引同版本）
+            build_dir = self.index_versions.new_build_dir()
+            if self.index_params.get("storage") == "mmap":
+                # mmap 模式只从 index.faiss（含 IDMap2 的 chunk id）与 chunks.db 加载，不写 index.pkl，避免文本存两份
+                faiss.write_index(vector_store.index, str(build_dir / "index.faiss"))
+                write_chunk_db(build_dir, iter_documents(vector_store.docstore))
+            else:
+                vector_store.save_local(str(build_dir))
+            if manifest is not None:
+                manifest.save(build_dir)
+            if lexical_index is not None:
+                lexical_index.save(build_dir)
+            if hs_code_index is not None:
+                hs_code_index.save(build_dir)
+
+            version_dir = self.index_versions.publish(build_dir, info={
+                "index_type": self.index_type,
+                "ntotal": vector_store.index.ntotal
+            })
+            print(f"💾 [KnowledgeBase] 索引已保存至: {version_dir}")
+            return version_dir
+        except Exception as e:
+            print(f"❌ [KnowledgeBase] 保存索引失败: {e}")
+            if build_dir is not None and build_dir.exists():
+                shutil.rmtree(build_dir, ignore_errors=True)
+            return None
+
+    def get_retriever(self, k: int = 3, expand: Optional[bool] = None, search_filter: Optional[SearchFilter] = None):
+        if expand is None:
+            expand = self.neighbor_config.get("enabled", True)
+        return KnowledgeBaseRetriever(kb=self, k=k, expand=expand, search_filter=search_filter)
+
+    def search(
+        self,
+        query: str,
+        k: int = 6,
+        mode: Optional[str] = None,
+        search_filter: Optional[SearchFilter] = None
+    ) -> List[Tuple[Document, float]]:
+        """
+        统一检索入口 (同步函数)
+
+        hybrid 模式下向量与 BM25 各召回 candidates 条，按 RRF 融合排序；
+        返回 [(Document, 余弦相似度)]，仅由关键词召回的 chunk 同样补算余弦相似度。
+
+        Args:
+            query: 查询文本
+            k: 返回条数
+            mode: "hybrid" / "vector"，默认取配置 retrieval.mode
+            search_filter: 按来源文件 / 文件类型 / 目录过滤（在检索内部按 chunk id 过滤，非检索后过滤）
+        """
+        return self.search_many([query], k=k, mode=mode, search_filter=search_filter)[0]
+
+    def search_many(
+        self,
+        queries: List[str],
+        k: int = 6,
+        mode: Optional[str] = None,
+        search_filter: Optional[SearchFilter] = None
+    ) -> List[List[Tuple[Document, float]]]:
+        """
+        批量检索 (同步函数)：全部查询一次前向计算向量、一次 index.search 矩阵检索
+
+        Returns:
+            与 queries 一一对应的 [(Document, 余弦相似度)] 列表，规则同 search()
+        """
+        with self._reading_index() as snapshot:
+            return self._search_snapshot(snapshot, queries, k, mode, search_filter)
+
+    def _filter_index(self, snapshot: IndexSnapshot) -> FilterIndex:
+        """版本的 文件 -> chunk id 映射（取自索引清单，旧版索引扫描 docstore），每个版本只构建一次"""
+        if snapshot.filter_index is None:
+            manifest = IndexManifest.load(snapshot.version_dir) if snapshot.version_dir else None
+            if manifest is not None:
+                snapshot.filter_index = FilterIndex.from_manifest(manifest)
+            else:
+                snapshot.filter_index = FilterIndex.from_docstore(
+                    snapshot.vector_store.docstore, snapshot.vector_store.index_to_docstore_id
+                )
+        return snapshot.filter_index
+
+    def _search_snapshot(
+        self,
+        snapshot: IndexSnapshot,
+        queries: List[str],
+        k: int,
+        mode: Optional[str],
+        search_filter: Optional[SearchFilter] = None
+    ):
+        vector_store, lexical_index = snapshot.vector_store, snapshot.lexical_index
+        if not vector_store or not queries:
+            return [[] for _ in queries]
+
+        mode = mode or self.retrieval_config["mode"]
+        hybrid = mode == "hybrid" and lexical_index is not None
+        n_candidates = max(k, self.retrieval_config["candidates"]) if hybrid else k
+
+        # 过滤条件换算为 chunk id 集合，下推到 FAISS（IDSelector）与 BM25（id 掩码）
+        allowed_ids, params = None, None
+        if search_filter is not None and not search_filter.is_empty:
+            allowed_ids, selector = self._filter_index(snapshot).allowed(search_filter)
+            if not len(allowed_ids):
+                return [[] for _ in queries]
+            params = index_factory.search_parameters(vector_store.index, selector)
+
+        query_vectors = self._embed_queries(queries)
+        raw_scores, labels = vector_store.index.search(query_vectors, n_candidates, params=params)
+
+        # 先只按 id 排序融合，最后一次性读取各查询 top-k 的文本
+        inner_product = index_factory.is_inner_product(vector_store.index)
+        id_map = vector_store.index_to_docstore_id
+        ranked_lists = []
+        for query, query_vector, row_scores, row_labels in zip(queries, query_vectors, raw_scores, labels):
+            dense = [
+                (id_map[label], index_factory.to_similarity(float(raw_score), inner_product))
+                for raw_score, label in zip(row_scores, row_labels)
+                if label != -1 and id_map.get(label) is not None
+            ]
+            if hybrid:
+                ranked_lists.append(
+                    self._fuse_results(
+                        query, query_vector, dense, k, vector_store, lexical_index, allowed_ids, snapshot.hs_code_index
+                    )
+                )
+            else:
+                ranked_lists.append(dense[:k])
 
-            if temp_path.exists():
-                shutil.rmtree(temp_path)
+        docs = get_documents(
+            vector_store.docstore,
+            list(dict.fromkeys(doc_id for ranked in ranked_lists for doc_id, _ in ranked))
+        )
+        return [
+            [(docs[doc_id], score) for doc_id, score in ranked if doc_id in docs]
+            for ranked in ranked_lists
+        ]
 
-            # 保存到临时目录
-            vector_store.save_local(str(temp_path))
+    def _fuse_results(
+        self,
+        query: str,
+        query_vector: np.ndarray,
+        dense: List[Tuple[Any, float]],
+        k: int,
+        vector_store: FAISS,
+        lexical_index: LexicalIndex,
+        allowed_ids: Optional[np.ndarray] = None,
+        hs_code_index: Optional[HSCodeIndex] = None
+    ) -> List[Tuple[Any, float]]:
+        """
+        向量结果与 BM25 结果按 RRF 融合，返回 [(chunk id, 余弦相似度)]
 
-            # 搬运
-            if self.vector_db_path.exists():
-                shutil.rmtree(self.vector_db_path)
-            self.vector_db_path.mkdir(parents=True, exist_ok=True)
+        查询含 HS 编码时，HS 编码索引的结果（同一税号 → 同一子目 → 同一税目）作为第三路参与融合，
+        权重为 retrieval.hs_code_weight
+        """
+        n_candidates = max(k, self.retrieval_config["candidates"])
+        lexical = lexical_index.search(query, k=n_candidates, allowed_ids=allowed_ids)
+        hs_codes = extract_query_codes(query) if hs_code_index is not None else ()
+        hs_matches = [
+            chunk_id
+            for code in sorted(hs_codes, key=len, reverse=True)
+            for chunk_id, _ in hs_code_index.lookup(code, limit=n_candidates, allowed_ids=allowed_ids)
+        ]
 
-            for file_name in os.listdir(temp_path):
-                shutil.move(str(temp_path / file_name), str(self.vector_db_path / file_name))
+        rrf_k = self.retrieval_config["rrf_k"]
+        fused: Dict[Any, float] = {}
+        for rank, (chunk_id, _) in enumerate(dense):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (rrf_k + rank + 1)
+        for rank, (chunk_id, _) in enumerate(lexical):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (rrf_k + rank + 1)
+        hs_weight = self.retrieval_config.get("hs_code_weight", 1.0)
+        for rank, chunk_id in enumerate(dict.fromkeys(hs_matches)):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + hs_weight / (rrf_k + rank + 1)
+        top_ids = sorted(fused, key=fused.get, reverse=True)[:k]
+
+        # 仅关键词召回的 chunk：从 FAISS 取回已存向量补算余弦相似度（向量均已归一化，不调用模型）
+        similarities = dict(dense)
+        lexical_only = [chunk_id for chunk_id in top_ids if chunk_id not in similarities]
+        if lexical_only:
+            vectors = index_factory.reconstruct_vectors(vector_store.index, lexical_only)
+            if vectors is not None:
+                for chunk_id, similarity in zip(lexical_only, vectors @ query_vector):
+                    similarities[chunk_id] = index_factory.to_similarity(float(similarity), True)
+            else:
+                # 取不回向量（旧版 uuid 键索引）：排序只看 RRF；未进入向量候选的 chunk
+                # 相似度不高于候选中的最低分，以此近似
+                floor = min((similarity for _, similarity in dense), default=0.0)
+                similarities.update((chunk_id, floor) for chunk_id in lexical_only)
 
-            shutil.rmtree(temp_path)
-            print(f"💾 [KnowledgeBase] 索引已保存至: {self.vector_db_path}")
-        except Exception as e:
-            print(f"❌ [KnowledgeBase] 保存索引失败: {e}")
+        return [(chunk_id, similarities[chunk_id]) for chunk_id in top_ids]
 
-    def get_retriever(self):
-        return self.vector_store.as_retriever(search_kwargs={"k": 3})
+    def _embed_queries(self, queries: List[str]) -> np.ndarray:
+        """查询向量 (n, dim)：未命中缓存的查询合并为一次模型调用"""
+        if self.query_cache is None:
+            vectors = self.embedding_model.embed_documents(list(queries))
+        else:
+            vectors = self.query_cache.get_or_compute_many(queries, self.embedding_model.embed_documents)
+        return np.asarray(vectors, dtype="float32")
 
     # 🔥🔥🔥 优化后的搜索方法 🔥🔥🔥
-    async def search_with_score(self, query: str, k: int = 6):
+    async def search_with_score(
+        self,
+        query: str,
+        k: int = 6,
+        mode: Optional[str] = None,
+        search_filter: Optional[SearchFilter] = None
+    ):
         """
-        异步执行向量检索并返回真实相似度分数
+        异步检索并返回 [(Document, 余弦相似度)]，检索方式与过滤条件见 search()
         """
         if not self.vector_store:
             return []
 
-        # ✅ 关键优化：将同步的 FAISS 搜索放入线程池，防止阻塞 FastAPI 主循环
+        # ✅ 关键优化：检索在线程池中执行，防止阻塞 FastAPI 主循环；并发请求经微批处理合并
         try:
-            results = await asyncio.to_thread(
-                self.vector_store.similarity_search_with_score, 
-                query, 
-                k=k
-            )
+            if self.retrieval_batcher is not None:
+                return await self.retrieval_batcher.submit(query, k, mode, search_filter)
+            return await asyncio.to_thread(self.search, query, k, mode, search_filter)
         except Exception as e:
             print(f"❌ [KnowledgeBase] 搜索出错: {e}")
             return []
 
-        import math
-        processed_results = []
-        for doc, squared_distance in results:
-            # FAISS L2 距离转换相似度算法
-            distance = math.sqrt(max(0, float(squared_distance)))
-            distance = min(distance, 2.0)
-            similarity = float((1 - distance / 2))
-            processed_results.append((doc, similarity))
+    async def search_many_with_score(
+        self,
+        queries: List[str],
+        k: int = 6,
+        mode: Optional[str] = None,
+        search_filter: Optional[SearchFilter] = None
+    ):
+        """
+        异步批量检索，返回与 queries 一一对应的 [(Document, 余弦相似度)] 列表
+        """
+        if not self.vector_store:
+            return [[] for _ in queries]
+
+        try:
+            return await asyncio.to_thread(self.search_many, queries, k, mode, search_filter)
+        except Exception as e:
+            print(f"❌ [KnowledgeBase] 批量搜索出错: {e}")
+            return [[] for _ in queries]
+
+    def expand_neighbors(
+        self,
+        results: List[Tuple[Document, float]],
+        max_chars: Optional[int] = None
+    ) -> List[Tuple[Document, float]]:
+        """
+        为检索结果拼接相邻 chunk (同步函数)，相邻或重叠的命中合并为一段
 
-        return processed_results
+        Args:
+            results: search() 的返回值
+            max_chars: 本次调用的总字数预算，默认取配置 neighbor_expansion.max_chars
+        """
+        if not results:
+            return results
+        with self._reading_index() as snapshot:
+            if not snapshot.vector_store:
+                return results
+            docstore = snapshot.vector_store.docstore
+            return stitch_neighbors(
+                results,
+                lambda chunk_ids: get_documents(docstore, chunk_ids),
+                max_chars=max_chars or self.neighbor_config["max_chars"],
+                max_neighbors=self.neighbor_config["max_neighbors"]
+            )
+
+    def lookup_tariff(self, code: str, limit: int = 20) -> List[dict]:
+        """
+        按 HS 编码查询申报目录的表格行 (同步函数)：商品名称与申报要素，见 TariffCatalog.lookup
+        """
+        if self.tariff_catalog is None:
+            return []
+        return self.tariff_catalog.lookup(code, limit=limit)
+
+    def _is_tariff_file(self, file_path: Path) -> bool:
+        return any(pattern in file_path.name for pattern in self.tariff_config["file_patterns"])
+
+    async def _read_catalog_text(self, file_path: Path, content_hash: str) -> str:
+        """读取未在本次重建中加载的目录文件：txt/md 直接读取，PDF 优先取提取缓存"""
+        if file_path.suffix.lower() != ".pdf":
+            return await asyncio.to_thread(file_path.read_text, encoding="utf-8")
+        if self.pdf_repo is not None:
+            cached_doc = await self.pdf_repo.get_by_hash(content_hash)
+            if cached_doc and cached_doc.is_valid:
+                return cached_doc.processed_text
+        if self.pdf_service is None:
+            self.pdf_service = PDFService()
+        text, _ = await asyncio.to_thread(self.pdf_service.extract_text, str(file_path))
+        return text
+
+    async def refresh_tariff_catalog(
+        self,
+        files: Optional[List[Path]] = None,
+        hashes: Optional[Dict[str, str]] = None,
+        file_documents: Optional[Dict[str, Tuple[Path, List[Document]]]] = None
+    ) -> Optional[dict]:
+        """
+        同步申报目录存储：新增、内容变化或解析规则变化的目录文件重新解析，已删除的文件移除
+
+        Args:
+            files: 知识库文件（默认重新扫描）
+            hashes: 清单键 -> 内容哈希（默认重新计算）
+            file_documents: 本次重建已加载的文本，避免重复提取
+
+        Returns:
+            {"parsed_files", "removed_files", "rows"}；未启用时返回 None
+        """
+        if self.tariff_catalog is None:
+            return None
+        if files is None:
+            files = [f for f in self._scan_knowledge_files() if self.process_pdfs or f.suffix.lower() != ".pdf"]
+        hashes = hashes or {}
+        file_documents = file_documents or {}
+        catalog_files = {
+            IndexManifest.relative_key(f, self.data_path): f for f in files if self._is_tariff_file(f)
+        }
+
+        stored = await asyncio.to_thread(self.tariff_catalog.files)
+        removed = await asyncio.to_thread(
+            self.tariff_catalog.remove_files, [key for key in stored if key not in catalog_files]
+        )
+        parsed = 0
+        for key, file_path in catalog_files.items():
+            try:
+                content_hash = hashes.get(key) or await asyncio.to_thread(
+                    PDFService.calculate_file_hash, str(file_path)
+                )
+                if stored.get(key) == (content_hash, PARSER_VERSION):
+                    continue
+                if key in file_documents:
+                    text = "\n".join(doc.page_content for doc in file_documents[key][1])
+                else:
+                    text = await self._read_catalog_text(file_path, content_hash)
+                rows = await asyncio.to_thread(parse_tariff_catalog, text)
+                await asyncio.to_thread(self.tariff_catalog.replace_file, key, content_hash, rows)
+                parsed += 1
+                print(f"📑 [KnowledgeBase] 申报目录 {file_path.name}: 解析出 {len(rows)} 行")
+            except Exception as e:
+                print(f"⚠️ [KnowledgeBase] 申报目录 {file_path.name} 解析失败: {e}")
+
+        return {
+            "parsed_files": parsed,
+            "removed_files": removed,
+            "rows": (await asyncio.to_thread(self.tariff_catalog.stats))["rows"]
+        }
+
+    def get_tariff_catalog_stats(self) -> Optional[dict]:
+        return self.tariff_catalog.stats() if self.tariff_catalog is not None else None
+
+    def lookup_hs_code(
+        self,
+        code: str,
+        k: int = 10,
+        search_filter: Optional[SearchFilter] = None
+    ) -> List[Tuple[Document, int]]:
+        """
+        按 HS 编码精确查找相关 chunk (同步函数，不经过向量计算)
+
+        Args:
+            code: "8542.31.00" / "85423100" / "8542" 等任意格式
+            k: 返回条数
+            search_filter: 按来源文件 / 文件类型 / 目录过滤
+
+        Returns:
+            [(Document, 匹配的编码位数)]：与编码完全一致的在前，其后依次为同一子目、同一税目的 chunk
+        """
+        with self._reading_index() as snapshot:
+            if snapshot.vector_store is None or snapshot.hs_code_index is None:
+                return []
+            allowed_ids = None
+            if search_filter is not None and not search_filter.is_empty:
+                allowed_ids, _ = self._filter_index(snapshot).allowed(search_filter)
+            matches = snapshot.hs_code_index.lookup(code, limit=k, allowed_ids=allowed_ids)
+            docs = get_documents(snapshot.vector_store.docstore, [chunk_id for chunk_id, _ in matches])
+            return [(docs[chunk_id], level) for chunk_id, level in matches if chunk_id in docs]
+
+    async def expand_neighbors_async(
+        self,
+        results: List[Tuple[Document, float]],
+        max_chars: Optional[int] = None
+    ) -> List[Tuple[Document, float]]:
+        """异步版 expand_neighbors，失败时返回原结果"""
+        try:
+            return await asyncio.to_thread(self.expand_neighbors, results, max_chars)
+        except Exception as e:
+            print(f"⚠️ [KnowledgeBase] 拼接相邻 chunk 失败: {e}")
+            return results
+
+    def get_retrieval_batcher_stats(self) -> Optional[dict]:
+        return self.retrieval_batcher.stats() if self.retrieval_batcher else None
+
+    def get_query_cache_stats(self) -> Optional[dict]:
+        return self.query_cache.stats() if self.query_cache else None
+
+    def get_lexical_index_stats(self) -> Optional[dict]:
+        return self.lexical_index.stats() if self.lexical_index else None
+
+    def get_hs_code_index_stats(self) -> Optional[dict]:
+        return self.hs_code_index.stats() if self.hs_code_index is not None else None
 
     # ==========================================
     # 索引管理功能 (手动重建索引)
@@ -427,10 +1440,16 @@ class KnowledgeBase:
             files = list(self.data_path.glob("**/*.txt")) + list(self.data_path.glob("**/*.md")) + list(self.data_path.glob("**/*.pdf"))
         return files
 
-    async def rebuild_index_stream(self) -> AsyncGenerator[str, None]:
+    async def rebuild_index_stream(self, full_rebuild: bool = False) -> AsyncGenerator[str, None]:
         """
         流式重建索引 (SSE响应)
 
+        默认增量重建：依据索引清单 (manifest.json) 只向量化新增/变更的文件，
+        并删除变更/已删除文件的旧向量；清单缺失或索引格式不兼容时自动退化为全量重建。
+
+        Args:
+            full_rebuild: 强制全量重建（忽略清单，重新向量化全部文件）
+
         Yields:
             str: SSE格式的JSON事件
         """
@@ -449,11 +1468,13 @@ class KnowledgeBase:
             # 1. 初始化事件
             yield self._format_sse({
                 "type": "init",
-                "message": "开始重建知识库索引"
+                "message": "开始全量重建知识库索引" if full_rebuild else "开始重建知识库索引"
             })
 
             # 2. 扫描文件
             files = self._scan_knowledge_files()
+            if not self.process_pdfs:
+                files = [f for f in files if f.suffix.lower() != '.pdf']
             total_files = len(files)
 
             if total_files == 0:
@@ -464,27 +1485,77 @@ class KnowledgeBase:
                 })
                 return
 
-            # 分类文件
-            pdf_files = [f for f in files if f.suffix.lower() == '.pdf']
-            txt_files = [f for f in files if f.suffix.lower() in ['.txt', '.md']]
-
-            self.progress["total"] = total_files
             self.file_count = total_files
 
             yield self._format_sse({
                 "type": "step",
-                "message": f"发现 {total_files} 个文件，开始处理...",
+                "message": f"发现 {total_files} 个文件，正在比对索引清单...",
                 "step": "scanning"
             })
 
-            # 3. 加载文档
+            # 3. 对比清单，确定需要重新向量化的文件
+            manifest = None if full_rebuild else self._load_manifest_for_incremental()
+            incremental = manifest is not None
+            if not incremental:
+                manifest = IndexManifest(
+                    embedding_model=self.embedding_model_id, index_type=self.index_type,
+                    chunker=self.chunker.signature, dedup=self._dedup_signature
+                )
+
+            diff = await asyncio.to_thread(self._diff_files, manifest, files)
+            to_embed = diff.to_embed
+
+            # 分类文件
+            pdf_files = [f for f in to_embed if f.suffix.lower() == '.pdf']
+            txt_files = [f for f in to_embed if f.suffix.lower() in ['.txt', '.md']]
+
+            yield self._format_sse({
+                "type": "step",
+                "message": (
+                    f"{'增量' if incremental else '全量'}模式：跳过 {len(diff.unchanged)} 个未变化文件，"
+                    f"重新向量化 {len(to_embed)} 个，移除 {len(diff.deleted)} 个已删除文件"
+                ),
+                "step": "diff",
+                "mode": "incremental" if incremental else "full",
+                "skipped_files": len(diff.unchanged),
+                "added_files": len(diff.added),
+                "changed_files": len(diff.changed),
+                "deleted_files": len(diff.deleted),
+                "hashing": diff.hashing_stats()
+            })
+
+            if incremental and not to_embed and not diff.deleted:
+                if diff.touched:
+                    # 仅文件状态变化：新状态写入附属文件，下次重建可走快速路径
+                    # （已发布版本的 manifest.json 受 version.json 校验，不能就地修改）
+                    await asyncio.to_thread(manifest.save_stat_sidecar, self.index_version)
+                tariff_stats = await self.refresh_tariff_catalog(files, diff.hashes)
+                yield self._format_sse({
+                    "type": "complete",
+                    "message": "知识库文件均未变化，索引无需更新",
+                    "stats": {
+                        "mode": "incremental",
+                        "total_files": total_files,
+                        "skipped_files": len(diff.unchanged),
+                        "reembedded_files": 0,
+                        "deleted_files": 0,
+                        "total_chunks": self.vector_store.index.ntotal,
+                        "hashing": diff.hashing_stats(),
+                        "tariff_catalog": tariff_stats
+                    }
+                })
+                return
+
+            self.progress["total"] = len(to_embed)
+
+            # 4. 加载文档（仅新增/变更的文件）
             yield self._format_sse({
                 "type": "step",
                 "message": "正在加载文档...",
                 "step": "loading"
             })
 
-            documents = []
+            file_documents: Dict[str, Tuple[Path, List[Document]]] = {}
 
             # 先处理txt/md文件
             for idx, file_path in enumerate(txt_files, 1):
@@ -500,44 +1571,45 @@ class KnowledgeBase:
                     # 更新进度
                     self.progress["current"] = idx
                     self.progress["current_file"] = file_path.name
-                    self.progress["percentage"] = round((idx / total_files) * 50, 1)  # txt文件占前50%
+                    self.progress["percentage"] = round((idx / len(to_embed)) * 50, 1)  # txt文件占前50%
 
                     yield self._format_sse({
                         "type": "progress",
                         "current": idx,
-                        "total": total_files,
+                        "total": len(to_embed),
                         "current_file": file_path.name,
                         "percentage": self.progress["percentage"]
                     })
 
                     # 加载文档
-                    loader = TextLoader(str(file_path), encoding="utf-8")
-                    docs = loader.load()
-                    documents.extend(docs)
+                    key = IndexManifest.relative_key(file_path, self.data_path)
+                    file_documents[key] = (file_path, self._load_text_file(file_path))
 
                 except Exception as e:
                     print(f"⚠️ [KnowledgeBase] 加载文件 {file_path.name} 失败: {e}")
                     continue
 
-            # 再处理PDF文件
-            if pdf_files and self.process_pdfs:
+            # 再处理PDF文件：批量命中提取缓存，未命中的由进程池并行提取
+            if pdf_files:
                 yield self._format_sse({
                     "type": "step",
                     "message": f"正在处理 {len(pdf_files)} 个PDF文件...",
                     "step": "processing_pdfs"
                 })
 
-                for idx, file_path in enumerate(pdf_files, 1):
-                    # 检查是否取消
-                    if self._rebuild_cancelled:
-                        yield self._format_sse({
-                            "type": "cancelled",
-                            "message": "索引重建已取消"
-                        })
-                        return
-
-                    try:
-                        # 更新进度（PDF文件占后50%）
+                async with aclosing(self._extract_pdf_texts(pdf_files, diff.hashes)) as pdf_results:
+                    idx = 0
+                    async for file_path, pdf_text, cache_hit in pdf_results:
+                        idx += 1
+                        # 检查是否取消（退出迭代时取消尚未开始的提取任务）
+                        if self._rebuild_cancelled:
+                            yield self._format_sse({
+                                "type": "cancelled",
+                                "message": "索引重建已取消"
+                            })
+                            return
+
+                        # 更新进度（PDF文件占后50%，按完成顺序）
                         pdf_progress = 50 + round((idx / len(pdf_files)) * 50, 1)
                         self.progress["current"] = len(txt_files) + idx
                         self.progress["current_file"] = file_path.name
@@ -546,79 +1618,99 @@ class KnowledgeBase:
                         yield self._format_sse({
                             "type": "progress",
                             "current": len(txt_files) + idx,
-                            "total": total_files,
+                            "total": len(to_embed),
                             "current_file": file_path.name,
-                            "percentage": pdf_progress
+                            "percentage": pdf_progress,
+                            "cached": cache_hit,
+                            "failed": pdf_text is None
                         })
 
-                        # 处理PDF
-                        if self.pdf_service is None:
-                            from src.services.pdf_service import PDFService
-                            self.pdf_service = PDFService()
+                        if pdf_text is None:
+                            print(f"⚠️ [KnowledgeBase] 处理PDF {file_path.name} 失败")
+                            continue
 
-                        pdf_text, _ = await asyncio.to_thread(
-                            self.pdf_service.extract_text,
-                            str(file_path)
-                        )
-
-                        if pdf_text and len(pdf_text.strip()) > 100:
-                            doc = Document(page_content=pdf_text, metadata={"source": file_path.name})
-                            documents.append(doc)
+                        # 文本过短（如扫描件）也记入清单，避免每次重建都重复提取
+                        docs = []
+                        if len(pdf_text.strip()) > 100:
+                            docs = [Document(page_content=pdf_text, metadata={"source": file_path.name})]
+                        key = IndexManifest.relative_key(file_path, self.data_path)
+                        file_documents[key] = (file_path, docs)
 
-                    except Exception as e:
-                        print(f"⚠️ [KnowledgeBase] 处理PDF {file_path.name} 失败: {e}")
-                        continue
-
-            if not documents:
+            # 申报目录解析为结构化表格行（与向量索引相互独立）
+            tariff_stats = await self.refresh_tariff_catalog(files, diff.hashes, file_documents)
+            if tariff_stats and tariff_stats["parsed_files"]:
                 yield self._format_sse({
-                    "type": "complete",
-                    "message": "未加载到有效文档",
-                    "stats": {"total_files": total_files, "total_chunks": 0}
+                    "type": "step",
+                    "message": f"已解析 {tariff_stats['parsed_files']} 个申报目录文件，共 {tariff_stats['rows']} 行",
+                    "step": "tariff_catalog",
+                    "tariff_catalog": tariff_stats
                 })
-                return
 
-            # 4. 切分文档
+            # 5. 切分文档（按文件切分并分配 chunk id）
             yield self._format_sse({
                 "type": "step",
-                "message": "正在切分文档...",
+                "message": "正在切分文档并去除近重复片段...",
                 "step": "splitting"
             })
 
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1500,
-                chunk_overlap=150,
-                separators=[
-                    "。\n", "！\n", "？\n",
-                    "\n\n\n", "\n\n", "\n",
-                    "。", "！", "？",
-                    "，", " ",
-                    ""
-                ]
+            # 变更/删除文件的旧向量需要移除，其文件名也从其他 chunk 的别名中移除
+            removed_ids = []
+            stale_alias_keys = set(diff.deleted)
+            for file_path in diff.changed:
+                key = IndexManifest.relative_key(file_path, self.data_path)
+                stale_alias_keys.add(key)
+                removed_ids.extend(manifest.remove(key))
+            for key in diff.deleted:
+                removed_ids.extend(manifest.remove(key))
+
+            # 向量库与其版本目录取自同一快照
+            base_snapshot = self._index
+            base_store = base_snapshot.vector_store if incremental else None
+            chunks, filtered_count, dedup_stats, alias_additions = await asyncio.to_thread(
+                self._chunk_files, manifest, file_documents, diff.hashes, base_store, removed_ids
             )
+            if dedup_stats.removed:
+                yield self._format_sse({
+                    "type": "step",
+                    "message": (
+                        f"去除 {dedup_stats.removed} 个近重复片段"
+                        f"（其中 {dedup_stats.cross_file} 个与其他文件重复）"
+                    ),
+                    "step": "dedup",
+                    "near_duplicates": dedup_stats.to_dict()
+                })
 
-            chunks = text_splitter.split_documents(documents)
-            original_count = len(chunks)
-            chunks = [c for c in chunks if len(c.page_content) >= 50]
-            filtered_count = original_count - len(chunks)
-
-            # 5. 向量化（手动实现以发送进度）
-            from langchain_community.docstore.in_memory import InMemoryDocstore
-            import faiss
+            if not incremental and not chunks:
+                yield self._format_sse({
+                    "type": "complete",
+                    "message": "未加载到有效文档",
+                    "stats": {"total_files": total_files, "total_chunks": 0}
+                })
+                return
 
-            # 计算embeddings
+            # 6. 向量化（手动实现以发送进度；命中缓存的 chunk 不再调用模型）
+            cache_before = self._embedding_cache_counters()
             batch_size = 100
             all_embeddings = []
             total_chunks = len(chunks)
             total_batches = (total_chunks + batch_size - 1) // batch_size
 
-            yield self._format_sse({
-                "type": "embedding_start",
-                "message": f"正在向量化 {len(chunks)} 个片段...",
-                "total_chunks": total_chunks,
-                "total_batches": total_batches
-            })
+            if total_chunks:
+                yield self._format_sse({
+                    "type": "embedding_start",
+                    "message": f"正在向量化 {len(chunks)} 个片段...",
+                    "total_chunks": total_chunks,
+                    "total_batches": total_batches
+                })
 
             for batch_num, i in enumerate(range(0, total_chunks, batch_size), 1):
+                if self._rebuild_cancelled:
+                    yield self._format_sse({
+                        "type": "cancelled",
+                        "message": "索引重建已取消"
+                    })
+                    return
+
                 batch = chunks[i:i + batch_size]
                 batch_texts = [doc.page_content for doc in batch]
 
@@ -638,51 +1730,73 @@ class KnowledgeBase:
                     "percentage": progress
                 })
 
-            # 创建FAISS索引
-            embedding_dim = len(all_embeddings[0])
-            index = faiss.IndexFlatL2(embedding_dim)
-            index.add(np.array(all_embeddings).astype('float32'))
-
-            # 创建docstore
-            docstore = InMemoryDocstore(
-                {i: doc for i, doc in enumerate(chunks)}
+            # 7. 生成新版本向量库（增量模式在当前索引副本上删除/追加）
+            vector_store = await asyncio.to_thread(
+                self._apply_index_changes,
+                base_store,
+                removed_ids,
+                chunks,
+                all_embeddings,
+                alias_additions,
+                stale_alias_keys,
+                base_snapshot.version_dir
             )
-            index_to_docstore_id = {i: i for i in range(len(chunks))}
-
-            # 创建VectorStore
-            vector_store = FAISS(
-                index=index,
-                docstore=docstore,
-                index_to_docstore_id=index_to_docstore_id,
-                embedding_function=self.embeddings.embed_query
+            lexical_index = await asyncio.to_thread(
+                self._apply_lexical_changes,
+                base_store,
+                vector_store,
+                removed_ids,
+                chunks
+            )
+            hs_code_index = await asyncio.to_thread(
+                self._apply_hs_code_changes,
+                base_store,
+                vector_store,
+                removed_ids,
+                chunks
             )
 
-            # 6. 保存索引
+            # 8. 保存索引
             yield self._format_sse({
                 "type": "step",
                 "message": "正在保存索引...",
                 "step": "saving"
             })
 
-            await asyncio.to_thread(
+            version_dir = await asyncio.to_thread(
                 self._save_index,
-                vector_store
+                vector_store,
+                manifest,
+                lexical_index,
+                hs_code_index
             )
 
-            # 更新当前向量库
-            self.vector_store = vector_store
+            # 切换到新版本（进行中的检索在旧版本上完成）
+            vector_store = await asyncio.to_thread(self._published_store, vector_store, version_dir)
+            self._swap_index(IndexSnapshot(vector_store, lexical_index, version_dir, hs_code_index=hs_code_index))
             self.last_rebuild_time = asyncio.get_event_loop().time()
 
-            # 7. 完成事件
+            # 9. 完成事件
             yield self._format_sse({
                 "type": "complete",
-                "message": "索引重建完成",
+                "message": "索引增量更新完成" if incremental else "索引重建完成",
                 "stats": {
+                    "mode": "incremental" if incremental else "full",
                     "total_files": total_files,
-                    "txt_files": len(txt_files),
-                    "pdf_files": len(pdf_files),
-                    "total_chunks": len(chunks),
-                    "filtered_chunks": filtered_count
+                    "txt_files": len([f for f in files if f.suffix.lower() in ['.txt', '.md']]),
+                    "pdf_files": len([f for f in files if f.suffix.lower() == '.pdf']),
+                    "skipped_files": len(diff.unchanged),
+                    "reembedded_files": len(file_documents),
+                    "deleted_files": len(diff.deleted),
+                    "added_chunks": len(chunks),
+                    "removed_chunks": len(removed_ids),
+                    "total_chunks": vector_store.index.ntotal,
+                    "filtered_chunks": filtered_count,
+                    "near_duplicates": dedup_stats.to_dict(),
+                    "hashing": diff.hashing_stats(),
+                    "tariff_catalog": tariff_stats,
+                    "embedding_cache": self._embedding_cache_counters(since=cache_before),
+                    "index_version": version_dir.name if version_dir else None
                 }
             })
 
@@ -699,6 +1813,36 @@ class KnowledgeBase:
                 self.is_rebuilding = False
                 self._rebuild_cancelled = False
 
+    def _embedding_cache_counters(self, since: Optional[dict] = None) -> dict:
+        """向量缓存命中/未命中计数（since 不为空时返回差值）"""
+        if not self.embedding_cache:
+            return {"hits": 0, "misses": 0}
+        counters = {"hits": self.embedding_cache.hits, "misses": self.embedding_cache.misses}
+        if since:
+            counters = {key: counters[key] - since[key] for key in counters}
+        return counters
+
+    def get_embedding_cache_stats(self) -> Optional[dict]:
+        """向量缓存统计（供 /index/status 展示）"""
+        return self.embedding_cache.stats() if self.embedding_cache else None
+
     def cancel_rebuild(self):
         """取消索引重建任务"""
-        self._rebuild_cancelled = True
\ No newline at end of file
+        self._rebuild_cancelled = True
+
+class KnowledgeBaseRetriever(BaseRetriever):
+    """
+    LangChain 检索器包装：每次调用都经 KnowledgeBase.search，
+    因此与 search_with_score 使用同一检索方式，且重建后自动使用新索引；
+    expand=True 时命中结果拼接相邻 chunk；search_filter 限定来源文件 / 文件类型 / 目录
+    """
+    kb: Any
+    k: int = 3
+    expand: bool = False
+    search_filter: Optional[Any] = None
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> List[Document]:
+        results = self.kb.search(query, k=self.k, search_filter=self.search_filter)
+        if self.expand:
+            results = self.kb.expand_neighbors(results)
+        return [doc for doc, _ in results]
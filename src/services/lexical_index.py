@@ -0,0 +1,228 @@
+"""
+关键词倒排索引 (BM25)
+与 FAISS 向量索引并行维护，弥补稠密检索对精确词项（HS 编码、条款号、商品名）的漏召回
+
+分词规则：
+- 中文：按字二元组 (bigram) 切分，单字片段保留为单字
+- 数字：连续数字为一个词项，带点号的编码（如 8542.31.00）同时生成去点版本（85423100）
+- 拉丁字母：按单词切分并转小写
+文本先经 NFKC 归一化（全角数字/字母转半角）。
+
+存储：每个词项一组按 chunk id 升序排列的倒排数组 (ids: int64, tfs: int32)，
+保存为索引目录下的 lexical.npz，与 index.faiss / manifest.json 同版本搬运。
+"""
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+LEXICAL_FILE = "lexical.npz"
+LEXICAL_VERSION = 1
+
+_TOKEN_PATTERN = re.compile(r"[\u4e00-\u9fff]+|\d+(?:\.\d+)*|[a-z]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """切分为检索词项（查询与文档使用同一规则）"""
+    tokens = []
+    for match in _TOKEN_PATTERN.finditer(unicodedata.normalize("NFKC", text).lower()):
+        token = match.group()
+        if "\u4e00" <= token[0] <= "\u9fff":
+            if len(token) == 1:
+                tokens.append(token)
+            else:
+                tokens.extend(token[i:i + 2] for i in range(len(token) - 1))
+        else:
+            tokens.append(token)
+            if "." in token:
+                tokens.append(token.replace(".", ""))
+    return tokens
+
+
+class LexicalIndex:
+    """
+    BM25 倒排索引（不可变更新：apply_changes 返回新实例，检索中的旧实例不受影响）
+    """
+
+    def __init__(
+        self,
+        postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = None,
+        doc_ids: np.ndarray = None,
+        doc_lens: np.ndarray = None,
+        k1: float = 1.2,
+        b: float = 0.75
+    ):
+        self.postings = postings or {}
+        self.doc_ids = doc_ids if doc_ids is not None else np.empty(0, dtype="int64")
+        self.doc_lens = doc_lens if doc_lens is not None else np.empty(0, dtype="int32")
+        self.k1 = k1
+        self.b = b
+        self.avg_len = float(self.doc_lens.mean()) if len(self.doc_lens) else 0.0
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    @classmethod
+    def build(cls, docs: Iterable[Tuple[int, str]], k1: float = 1.2, b: float = 0.75) -> "LexicalIndex":
+        return cls(k1=k1, b=b).apply_changes({}, docs)
+
+    def apply_changes(self, removed: Dict[int, str], added: Iterable[Tuple[int, str]]) -> "LexicalIndex":
+        """
+        删除 / 追加文档，返回新索引
+
+        Args:
+            removed: 需删除的 chunk id -> 原文（用原文定位受影响的词项，无需扫描全部倒排）
+            added: 新增的 (chunk id, 文本)
+        """
+        postings = dict(self.postings)
+
+        # 1. 删除
+        if removed:
+            removed_ids = np.fromiter(removed.keys(), dtype="int64")
+            affected = set()
+            for text in removed.values():
+                affected.update(tokenize(text))
+            for token in affected:
+                if token not in postings:
+                    continue
+                ids, tfs = postings[token]
+                keep = ~np.isin(ids, removed_ids)
+                if keep.all():
+                    continue
+                if keep.any():
+                    postings[token] = (ids[keep], tfs[keep])
+                else:
+                    del postings[token]
+            keep = ~np.isin(self.doc_ids, removed_ids)
+            doc_ids, doc_lens = self.doc_ids[keep], self.doc_lens[keep]
+        else:
+            doc_ids, doc_lens = self.doc_ids, self.doc_lens
+
+        # 2. 追加
+        new_postings = defaultdict(lambda: ([], []))
+        new_ids, new_lens = [], []
+        for chunk_id, text in added:
+            tokens = tokenize(text)
+            new_ids.append(chunk_id)
+            new_lens.append(len(tokens))
+            for token, tf in Counter(tokens).items():
+                ids, tfs = new_postings[token]
+                ids.append(chunk_id)
+                tfs.append(tf)
+
+        for token, (ids, tfs) in new_postings.items():
+            ids = np.array(ids, dtype="int64")
+            tfs = np.array(tfs, dtype="int32")
+            if token in postings:
+                old_ids, old_tfs = postings[token]
+                ids = np.concatenate([old_ids, ids])
+                tfs = np.concatenate([old_tfs, tfs])
+            postings[token] = self._sorted(ids, tfs)
+
+        if new_ids:
+            doc_ids, doc_lens = self._sorted(
+                np.concatenate([doc_ids, np.array(new_ids, dtype="int64")]),
+                np.concatenate([doc_lens, np.array(new_lens, dtype="int32")])
+            )
+
+        return LexicalIndex(postings, doc_ids, doc_lens, self.k1, self.b)
+
+    @staticmethod
+    def _sorted(ids: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # chunk id 单调分配，追加后通常已有序
+        if len(ids) > 1 and np.any(ids[1:] < ids[:-1]):
+            order = np.argsort(ids, kind="stable")
+            return ids[order], values[order]
+        return ids, values
+
+    def search(self, query: str, k: int = 20, allowed_ids: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """
+        BM25 检索，返回 [(chunk id, 分数)]，按分数降序
+
+        Args:
+            allowed_ids: 只在这些 chunk id（升序）中取 top-k（元数据过滤）
+        """
+        n_docs = len(self.doc_ids)
+        if n_docs == 0:
+            return []
+
+        all_ids, all_scores = [], []
+        for token in set(tokenize(query)):
+            posting = self.postings.get(token)
+            if posting is None:
+                continue
+            ids, tfs = posting
+            idf = math.log(1 + (n_docs - len(ids) + 0.5) / (len(ids) + 0.5))
+            lens = self.doc_lens[np.searchsorted(self.doc_ids, ids)]
+            tfs = tfs.astype("float32")
+            all_ids.append(ids)
+            all_scores.append(idf * tfs * (self.k1 + 1) / (tfs + self.k1 * (1 - self.b + self.b * lens / self.avg_len)))
+
+        if not all_ids:
+            return []
+
+        unique_ids, inverse = np.unique(np.concatenate(all_ids), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(all_scores))
+        if allowed_ids is not None:
+            positions = np.minimum(np.searchsorted(allowed_ids, unique_ids), max(len(allowed_ids) - 1, 0))
+            keep = allowed_ids[positions] == unique_ids if len(allowed_ids) else np.zeros(len(unique_ids), dtype=bool)
+            unique_ids, scores = unique_ids[keep], scores[keep]
+            if not len(unique_ids):
+                return []
+        if len(scores) > k:
+            top = np.argpartition(-scores, k)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        return [(int(unique_ids[i]), float(scores[i])) for i in top]
+
+    def stats(self) -> dict:
+        return {
+            "docs": len(self.doc_ids),
+            "terms": len(self.postings),
+            "postings": int(sum(len(ids) for ids, _ in self.postings.values()))
+        }
+
+    def save(self, index_dir: Path):
+        tokens = sorted(self.postings)
+        lengths = np.array([len(self.postings[t][0]) for t in tokens], dtype="int64")
+        offsets = np.concatenate([[0], np.cumsum(lengths)]).astype("int64")
+        empty_ids, empty_tfs = np.empty(0, dtype="int64"), np.empty(0, dtype="int32")
+        np.savez(
+            Path(index_dir) / LEXICAL_FILE,
+            version=np.array(LEXICAL_VERSION),
+            tokens=np.array(tokens, dtype="U"),
+            offsets=offsets,
+            ids=np.concatenate([self.postings[t][0] for t in tokens]) if tokens else empty_ids,
+            tfs=np.concatenate([self.postings[t][1] for t in tokens]) if tokens else empty_tfs,
+            doc_ids=self.doc_ids,
+            doc_lens=self.doc_lens,
+            params=np.array([self.k1, self.b], dtype="float64")
+        )
+
+    @classmethod
+    def load(cls, index_dir: Path) -> Optional["LexicalIndex"]:
+        """读取倒排索引，不存在或格式不兼容时返回 None"""
+        path = Path(index_dir) / LEXICAL_FILE
+        if not path.exists():
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if int(data["version"]) != LEXICAL_VERSION:
+                    return None
+                tokens, offsets = data["tokens"], data["offsets"]
+                ids, tfs = data["ids"], data["tfs"]
+                # 各词项的倒排数组是整块数组的切片视图，不额外复制
+                postings = {
+                    str(token): (ids[offsets[i]:offsets[i + 1]], tfs[offsets[i]:offsets[i + 1]])
+                    for i, token in enumerate(tokens)
+                }
+                k1, b = data["params"]
+                return cls(postings, data["doc_ids"], data["doc_lens"], float(k1), float(b))
+        except Exception as e:
+            print(f"⚠️ [LexicalIndex] 倒排索引读取失败，将重新构建: {e}")
+            return None
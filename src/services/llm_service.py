@@ -1,15 +1,18 @@
+import asyncio
 import json
 import re
 import requests
 import urllib3
 import time
-from typing import List, Tuple
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
 # 引入 OpenAI 兼容客户端 (支持 DeepSeek 和 Azure)
-from openai import AzureOpenAI, OpenAI, APITimeoutError, APIConnectionError
+from openai import AzureOpenAI, OpenAI, AsyncAzureOpenAI, AsyncOpenAI, APITimeoutError, APIConnectionError
 from src.config.loader import settings
+from src.services import http_pool
 
 # 禁用 SSL 警告
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -37,6 +40,13 @@ class LLMService:
         # 2. 确定配置来源 (用户 vs 系统)
         # ==========================================
         self.client = None
+        # 异步客户端（acall_llm）：参数与同步客户端相同，首次调用时在当前事件循环中创建，使用共享连接池
+        self._async_client_kwargs: Optional[dict] = None
+        self._async_client = None
+        self._async_loop = None
+        # 调用计数与 token 用量（calls / prompt_tokens / cached_tokens / completion_tokens，来自接口返回的 usage）
+        # cached_tokens 为命中厂商前缀缓存的 prompt token（计费折扣部分）
+        self.usage = Counter()
         self.model_name = settings.DEEPSEEK_MODEL
         self._config_source = "env"
         self.provider = "deepseek" # 默认为 deepseek
@@ -77,13 +87,14 @@ class LLMService:
                     raise ValueError("Azure 配置缺失 Endpoint 或 API Key")
 
                 print(f"[LLMService] 初始化 Azure OpenAI 客户端: {azure_endpoint}")
-                self.client = AzureOpenAI(
+                self._async_client_kwargs = dict(
                     api_key=api_key,
                     api_version=api_version,
                     azure_endpoint=azure_endpoint,
                     timeout=60.0,
                     max_retries=2
                 )
+                self.client = AzureOpenAI(**self._async_client_kwargs)
 
             else:
                 # --- OpenAI 兼容分支 (DeepSeek, SiliconFlow, Qwen, Custom) ---
@@ -94,12 +105,13 @@ class LLMService:
 
                 if self.provider != 'gemini':
                     print(f"[LLMService] 初始化 OpenAI 兼容客户端: {base_url}")
-                    self.client = OpenAI(
+                    self._async_client_kwargs = dict(
                         api_key=api_key,
                         base_url=base_url,
                         timeout=60.0,
                         max_retries=2
                     )
+                    self.client = OpenAI(**self._async_client_kwargs)
 
         except Exception as e:
             print(f"❌ [LLMService] 客户端初始化失败: {e}")
@@ -109,14 +121,12 @@ class LLMService:
         """
         核心 LLM 调用函数
         """
-        full_prompt = f"{system_prompt}\n\n{user_prompt}"
-
         # 1. Gemini 特殊处理 (REST API)
         if self.provider == 'gemini':
             try:
                 # 注意：Gemini 在 .env 中使用 GOOGLE_API_KEY，需要确保此处逻辑兼容
                 # 这里简化处理，假设 Gemini 总是走 _call_gemini
-                return self._parse_json_response(self._call_gemini(full_prompt)[0])
+                return self._parse_json_response(self._call_gemini(user_prompt, system_prompt)[0])
             except Exception as e:
                 return ["x", f"Gemini 调用失败: {str(e)[:50]}"]
 
@@ -125,48 +135,179 @@ class LLMService:
             return ["x", "系统错误：LLM 客户端未成功初始化，请检查配置"]
 
         try:
-            raw_text = self._call_standard_client(full_prompt)
+            raw_text = self._call_standard_client(user_prompt, system_prompt)
             return self._parse_json_response(raw_text)
         except Exception as e:
-            error_msg = str(e)
-            print(f"[LLM] 调用失败: {error_msg[:100]}...")
-            if "401" in error_msg:
-                return ["x", "认证失败：API Key 无效"]
-            if "404" in error_msg:
-                return ["x", "路径错误：Base URL 或 模型名称不正确"]
-            return ["x", f"AI服务调用异常: {error_msg[:30]}"]
-
-    def _call_standard_client(self, prompt: str) -> str:
-        """统一调用 Azure 或 OpenAI 兼容接口"""
-        response = self.client.chat.completions.create(
+            return self._error_result(e)
+
+    async def acall_llm(self, system_prompt: str, user_prompt: str, usage: Optional[Counter] = None) -> List[str]:
+        """
+        异步 LLM 调用（返回值与 call_llm 相同）
+
+        使用 AsyncOpenAI / AsyncAzureOpenAI 与 httpx 异步请求，连接来自进程共享的连接池（见 http_pool），
+        并发调用不占用线程池
+
+        Args:
+            usage: 可选，本次调用的 token 用量额外累加到该 Counter（按规则统计前缀缓存命中）
+        """
+        if self.provider == 'gemini':
+            try:
+                return self._parse_json_response((await self._acall_gemini(user_prompt, system_prompt, usage))[0])
+            except Exception as e:
+                return ["x", f"Gemini 调用失败: {str(e)[:50]}"]
+
+        if not self.client:
+            return ["x", "系统错误：LLM 客户端未成功初始化，请检查配置"]
+
+        try:
+            raw_text = await self._acall_standard_client(user_prompt, system_prompt, usage)
+            return self._parse_json_response(raw_text)
+        except Exception as e:
+            return self._error_result(e)
+
+    async def acall_llm_verdicts(
+        self, system_prompt: str, user_prompt: str, rule_ids: Sequence[str], usage: Optional[Counter] = None
+    ) -> Dict[str, List[str]]:
+        """
+        合并审查调用：一次请求返回多条规则的判定
+
+        Returns:
+            {rule_id: ["符号", "理由"]}，只包含解析成功的规则；调用失败时返回空字典，
+            由调用方对缺失的规则逐条重新审查
+        """
+        try:
+            if self.provider == 'gemini':
+                raw_text = (await self._acall_gemini(user_prompt, system_prompt, usage))[0]
+            elif not self.client:
+                print("[LLM] 合并审查跳过：LLM 客户端未成功初始化")
+                return {}
+            else:
+                raw_text = await self._acall_standard_client(user_prompt, system_prompt, usage)
+        except Exception as e:
+            print(f"[LLM] 合并审查调用失败: {str(e)[:100]}...")
+            return {}
+        return self._parse_verdicts(raw_text or "", rule_ids)
+
+    def _error_result(self, e: Exception) -> List[str]:
+        error_msg = str(e)
+        print(f"[LLM] 调用失败: {error_msg[:100]}...")
+        if "401" in error_msg:
+            return ["x", "认证失败：API Key 无效"]
+        if "404" in error_msg:
+            return ["x", "路径错误：Base URL 或 模型名称不正确"]
+        return ["x", f"AI服务调用异常: {error_msg[:30]}"]
+
+    def _completion_params(self, prompt: str, system_prompt: Optional[str] = None) -> dict:
+        # 系统提示词单独作为 system 消息：消息序列的开头在各次调用间保持字节一致，命中厂商的前缀缓存
+        messages = [{"role": "system", "content": system_prompt}] if system_prompt else []
+        messages.append({"role": "user", "content": prompt})
+        return dict(
             model=self.model_name,
-            messages=[{"role": "user", "content": prompt}],
+            messages=messages,
             max_tokens=8192,
             temperature=0.1,
             stream=False # 审单功能不需要流式
         )
+
+    def _call_standard_client(self, prompt: str, system_prompt: Optional[str] = None) -> str:
+        """统一调用 Azure 或 OpenAI 兼容接口"""
+        response = self.client.chat.completions.create(**self._completion_params(prompt, system_prompt))
+        self._record_usage(self._openai_usage(response.usage))
         return response.choices[0].message.content
 
-    def _call_gemini(self, prompt: str) -> Tuple[str, str]:
-        """Gemini REST API 调用"""
-        # 使用配置中的 Key 或者 .env 中的 Key
-        api_key = settings.GOOGLE_API_KEY
-        if self._config_source == 'user' and self.provider == 'gemini':
-            # 如果用户专门配置了 Gemini，尝试从用户配置获取 Key (虽然目前前端主要配 DeepSeek)
-            # 这里暂时保留使用 .env 的逻辑，除非架构大改支持 Gemini 用户配置
-            pass
-
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/{settings.MODEL_NAME}:generateContent?key={api_key}"
-        payload = {
-            "contents": [{"parts": [{"text": prompt}]}],
-            "generationConfig": {"temperature": 0.1}
-        }
+    @staticmethod
+    def _openai_usage(usage) -> Counter:
+        """
+        OpenAI 兼容接口的 usage -> Counter
+
+        缓存命中的 prompt token：OpenAI / Azure 在 prompt_tokens_details.cached_tokens，
+        DeepSeek 在 prompt_cache_hit_tokens
+        """
+        counts = Counter()
+        if usage is None:
+            return counts
+        counts["prompt_tokens"] = usage.prompt_tokens or 0
+        counts["completion_tokens"] = usage.completion_tokens or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None) if details is not None else None
+        if cached is None:
+            cached = getattr(usage, "prompt_cache_hit_tokens", None)
+        counts["cached_tokens"] = cached or 0
+        return counts
+
+    @staticmethod
+    def _gemini_usage(metadata: Optional[dict]) -> Counter:
+        """Gemini usageMetadata -> Counter（隐式缓存命中数在 cachedContentTokenCount）"""
+        metadata = metadata or {}
+        return Counter({
+            "prompt_tokens": metadata.get("promptTokenCount") or 0,
+            "completion_tokens": metadata.get("candidatesTokenCount") or 0,
+            "cached_tokens": metadata.get("cachedContentTokenCount") or 0
+        })
+
+    def _record_usage(self, counts: Counter, usage: Optional[Counter] = None):
+        """累计调用次数与 token 用量；usage 为调用方传入的额外统计 Counter"""
+        counts = counts + Counter(calls=1)
+        self.usage.update(counts)
+        if usage is not None:
+            usage.update(counts)
+
+    def _get_async_client(self):
+        """当前事件循环的异步 SDK 客户端（连接池与事件循环绑定，换循环时重建）"""
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            client_cls = AsyncAzureOpenAI if self.provider == 'azure' else AsyncOpenAI
+            self._async_client = client_cls(
+                **self._async_client_kwargs, http_client=http_pool.get_async_client()
+            )
+            self._async_loop = loop
+        return self._async_client
+
+    async def _acall_standard_client(
+        self, prompt: str, system_prompt: Optional[str] = None, usage: Optional[Counter] = None
+    ) -> str:
+        response = await self._get_async_client().chat.completions.create(
+            **self._completion_params(prompt, system_prompt)
+        )
+        self._record_usage(self._openai_usage(response.usage), usage)
+        return response.choices[0].message.content
 
+    def _call_gemini(self, prompt: str, system_prompt: Optional[str] = None) -> Tuple[str, str]:
+        """Gemini REST API 调用"""
+        url, payload = self._gemini_request(prompt, system_prompt)
         resp = self.session.post(url, json=payload, timeout=60, verify=False)
         if resp.status_code != 200:
             raise RuntimeError(f"Gemini {resp.status_code}: {resp.text}")
 
-        return resp.json()['candidates'][0]['content']['parts'][0]['text'], "Gemini"
+        data = resp.json()
+        self._record_usage(self._gemini_usage(data.get('usageMetadata')))
+        return data['candidates'][0]['content']['parts'][0]['text'], "Gemini"
+
+    async def _acall_gemini(
+        self, prompt: str, system_prompt: Optional[str] = None, usage: Optional[Counter] = None
+    ) -> Tuple[str, str]:
+        """Gemini REST API 异步调用（共享连接池，5xx 重试策略与同步会话一致）"""
+        url, payload = self._gemini_request(prompt, system_prompt)
+        resp = await http_pool.post_with_retry(http_pool.get_async_client(verify=False), url, json=payload)
+        if resp.status_code != 200:
+            raise RuntimeError(f"Gemini {resp.status_code}: {resp.text}")
+
+        data = resp.json()
+        self._record_usage(self._gemini_usage(data.get('usageMetadata')), usage)
+        return data['candidates'][0]['content']['parts'][0]['text'], "Gemini"
+
+    def _gemini_request(self, prompt: str, system_prompt: Optional[str] = None) -> Tuple[str, dict]:
+        # 使用 .env 中的 Key：用户配置目前主要面向 DeepSeek，暂不支持单独配置 Gemini Key
+        url = f"https://generativelanguage.googleapis.com/v1beta/models/{settings.MODEL_NAME}:generateContent?key={settings.GOOGLE_API_KEY}"
+        payload = {
+            "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+            "generationConfig": {"temperature": 0.1}
+        }
+        if system_prompt:
+            # 系统提示词走 systemInstruction：请求开头在各次调用间保持一致，命中 Gemini 的隐式前缀缓存
+            # （命中数见 usageMetadata.cachedContentTokenCount）
+            payload["systemInstruction"] = {"parts": [{"text": system_prompt}]}
+        return url, payload
 
     def _parse_json_response(self, raw_text: str) -> List[str]:
         """JSON 解析器 (保持原样)"""
@@ -188,6 +329,85 @@ class LLMService:
                 return ["√", clean_text.replace("√","").strip()]
             return ["x", "无法解析响应"]
 
+    # 判定符号的常见写法，统一为 √ / x（编排器按 "x" 判断风险）
+    _PASS_SYMBOLS = ("√", "✓", "✔", "pass", "通过", "đạt")
+    _RISK_SYMBOLS = ("x", "×", "✗", "✘", "fail", "风险", "rủi ro")
+
+    def _parse_verdicts(self, raw_text: str, rule_ids: Sequence[str]) -> Dict[str, List[str]]:
+        """
+        合并审查结果解析器，容忍以下情况：
+        - 代码块包裹、前后夹杂说明文字
+        - 对象数组 [{"rule_id", "symbol", "message"}]、三元组数组 [["R01", "√", "..."]]、
+          以 rule_id 为键的对象 {"R01": ["√", "..."]}，或包在 {"results": [...]} 中
+        - 整体 JSON 不合法（如输出被截断）时，逐个提取其中完整的 {...} 对象
+        符号无法识别、rule_id 不在本次规则中的条目丢弃；同一规则出现多次时取第一条
+        """
+        clean_text = raw_text.strip()
+        match_code = re.search(r'```(?:json)?\s*(.*?)\s*```', clean_text, re.DOTALL | re.IGNORECASE)
+        if match_code: clean_text = match_code.group(1)
+
+        ids_by_key = {rule_id.strip().upper(): rule_id for rule_id in rule_ids}
+        entries = []
+        starts = [i for i in (clean_text.find('['), clean_text.find('{')) if i >= 0]
+        ends = [i for i in (clean_text.rfind(']'), clean_text.rfind('}')) if i >= 0]
+        parsed = None
+        if starts and ends:
+            try:
+                parsed = json.loads(clean_text[min(starts):max(ends) + 1])
+            except ValueError:
+                parsed = None
+
+        if isinstance(parsed, dict) and ('rule_id' in parsed or 'id' in parsed):
+            parsed = [parsed]
+        if isinstance(parsed, dict):
+            nested = next((v for v in parsed.values() if isinstance(v, list)), None)
+            if nested is not None and not any(k.strip().upper() in ids_by_key for k in parsed):
+                parsed = nested
+            else:
+                entries = [(key, value) for key, value in parsed.items()]
+        if isinstance(parsed, list):
+            for item in parsed:
+                if isinstance(item, dict):
+                    entries.append((item.get('rule_id') or item.get('id'), item))
+                elif isinstance(item, list) and len(item) >= 3:
+                    entries.append((item[0], item[1:]))
+        elif parsed is None:
+            # 整体解析失败：逐个抢救完整的对象
+            for fragment in re.findall(r'\{[^{}]*\}', clean_text):
+                try:
+                    item = json.loads(fragment)
+                except ValueError:
+                    continue
+                if isinstance(item, dict):
+                    entries.append((item.get('rule_id') or item.get('id'), item))
+
+        verdicts: Dict[str, List[str]] = {}
+        for key, value in entries:
+            rule_id = ids_by_key.get(str(key).strip().upper()) if key is not None else None
+            if rule_id is None or rule_id in verdicts:
+                continue
+            if isinstance(value, dict):
+                symbol, message = value.get('symbol', value.get('status')), value.get('message', value.get('reason'))
+            elif isinstance(value, list) and len(value) >= 2:
+                symbol, message = value[0], value[1]
+            else:
+                continue
+            symbol = self._normalize_symbol(symbol)
+            if symbol is None or message is None:
+                continue
+            verdicts[rule_id] = [symbol, str(message)]
+        return verdicts
+
+    def _normalize_symbol(self, symbol) -> Optional[str]:
+        if not isinstance(symbol, str):
+            return None
+        value = symbol.strip().lower()
+        if value in self._PASS_SYMBOLS:
+            return "√"
+        if value in self._RISK_SYMBOLS:
+            return "x"
+        return None
+
 # --- 单元测试 ---
 if __name__ == "__main__":
     # 简单的运行测试
@@ -3,10 +3,15 @@ Marker PDF处理服务封装
 使用Marker库提取PDF文本内容
 """
 import hashlib
+import re
+import threading
 import time
 import asyncio
 from pathlib import Path
-from typing import Tuple, Optional
+from typing import Dict, List, Tuple, Optional
+
+# paginate_output 时 Marker 在每页前插入 "{页号}" + 48 个 "-"（页号为原 PDF 的页序号）
+_PAGE_SEPARATOR = re.compile(r"\n*\{(\d+)\}-{48}\n*")
 
 
 # 自定义异常
@@ -43,6 +48,8 @@ class MarkerService:
 
             self.model_dict = create_model_dict()
             self.converter = PdfConverter(artifact_dict=self.model_dict)
+            self._converter_cls = PdfConverter
+            self._lock = threading.Lock()  # 模型不支持并发推理
             print("✅ [Marker] Marker模型初始化完成")
         except ImportError as e:
             print(f"❌ [Marker] Marker未安装: {e}")
@@ -123,6 +130,48 @@ class MarkerService:
             print(f"❌ [Marker] 处理失败: {pdf_path_obj.name} - {e}")
             raise MarkerProcessingError(f"处理失败: {e}") from e
 
+    def extract_pages(self, pdf_path: str, page_indexes: List[int]) -> Dict[int, str]:
+        """
+        只对指定页运行 Marker（同步函数），多页合并为一次调用
+
+        Args:
+            pdf_path: PDF文件路径
+            page_indexes: 页序号（从 0 开始）
+
+        Returns:
+            {页序号: markdown文本}，未识别出内容的页不出现在结果中
+
+        Raises:
+            MarkerProcessingError: 处理失败
+        """
+        page_indexes = sorted(set(page_indexes))
+        if not page_indexes:
+            return {}
+        start_time = time.time()
+        try:
+            # 复用已加载的模型，仅按页范围新建转换器
+            converter = self._converter_cls(
+                artifact_dict=self.model_dict,
+                config={"page_range": page_indexes, "paginate_output": True}
+            )
+            with self._lock:
+                markdown_text = converter(str(pdf_path)).markdown
+        except Exception as e:
+            print(f"❌ [Marker] 页面处理失败: {Path(pdf_path).name} {page_indexes} - {e}")
+            raise MarkerProcessingError(f"页面处理失败: {e}") from e
+
+        parts = _PAGE_SEPARATOR.split(markdown_text)
+        if len(parts) == 1:
+            # 未分页输出（单页或旧版本 Marker）：只有单页时可以确定归属
+            pages = {page_indexes[0]: markdown_text.strip()} if len(page_indexes) == 1 else {}
+        else:
+            pages = {int(parts[i]): parts[i + 1].strip() for i in range(1, len(parts) - 1, 2)}
+        pages = {index: text for index, text in pages.items() if index in page_indexes and text}
+
+        print(f"✅ [Marker] OCR {Path(pdf_path).name} 第 {[i + 1 for i in page_indexes]} 页 "
+              f"({len(pages)} 页有内容, {time.time() - start_time:.1f}秒)")
+        return pages
+
     async def extract_text_async(
         self,
         pdf_path: str,
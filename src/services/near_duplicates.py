@@ -0,0 +1,158 @@
+"""
+近重复 chunk 检测（MinHash + LSH）
+
+知识库中同一文件的不同版本（如 2025 年版与旧版申报目录）切分后会产生大量内容几乎相同的 chunk，
+全部向量化既使索引翻倍，又让 top-k 检索结果被重复内容占满。建索引时按以下方式去重：
+1. 文本归一化：NFKC、转小写、去除空白与标点
+2. 以字符 3-gram 为 shingle 计算 MinHash 签名（num_perm 个乘移位哈希，numpy 向量化）
+3. LSH 分桶：签名分为 bands 段，任一段完全相同即为候选，再按签名一致比例估算 Jaccard 相似度
+4. 相似度不低于 threshold 且所含数字完全一致的 chunk 视为近重复：保留先加入者作为代表，其余丢弃
+   （申报目录等表格文本高度模板化，仅 HS 编码、税率不同的 chunk 文字相似度也很高，数字不同即不是重复）
+"""
+import hashlib
+import re
+import unicodedata
+from dataclasses import dataclass
+from typing import Dict, Hashable, List, Optional
+
+import numpy as np
+
+# 归一化时去除的字符：空白、标点与下划线（汉字、字母、数字保留）
+NON_CONTENT = re.compile(r"[\W_]+")
+NUMBER = re.compile(r"\d+(?:\.\d+)*")
+
+
+def normalize_text(text: str) -> str:
+    return NON_CONTENT.sub("", unicodedata.normalize("NFKC", text).lower())
+
+
+def number_key(text: str) -> int:
+    """
+    chunk 中依次出现的数字（HS 编码、税率、条款号等）的 64 位摘要
+
+    使用 blake2b 而非内置 hash()：后者随进程的哈希种子变化，跨进程（多 worker、重建前后）比较时不一致
+    """
+    numbers = "\x1f".join(NUMBER.findall(unicodedata.normalize("NFKC", text)))
+    return int.from_bytes(hashlib.blake2b(numbers.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def _mix64(values: np.ndarray) -> np.ndarray:
+    """splitmix64 末端混合，使相邻 shingle 的哈希分布均匀"""
+    values = values ^ (values >> np.uint64(30))
+    values = values * np.uint64(0xBF58476D1CE4E5B9)
+    values = values ^ (values >> np.uint64(27))
+    values = values * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+@dataclass
+class DedupStats:
+    """一次建索引的去重统计（写入重建 SSE complete 事件）"""
+    checked: int = 0        # 参与检测的新 chunk 数
+    removed: int = 0        # 作为近重复丢弃的 chunk 数
+    removed_chars: int = 0  # 丢弃 chunk 的总字数
+    cross_file: int = 0     # 其中代表 chunk 来自其他文件的数量
+
+    def to_dict(self) -> dict:
+        return {
+            "checked_chunks": self.checked,
+            "removed_chunks": self.removed,
+            "removed_chars": self.removed_chars,
+            "cross_file_chunks": self.cross_file,
+            "removed_ratio": round(self.removed / self.checked, 4) if self.checked else 0.0
+        }
+
+
+class NearDuplicateDetector:
+    """
+    Args:
+        threshold: 判定为近重复的 Jaccard 相似度下限
+        num_perm: MinHash 签名长度
+        bands: LSH 分段数（num_perm 需能被整除；每段行数越少，候选越多、漏检越少）
+        shingle_size: shingle 的字符数
+    """
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 64, bands: int = 16, shingle_size: int = 3,
+                 seed: int = 1):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) 必须能被 bands ({bands}) 整除")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle_size = shingle_size
+
+        rng = np.random.RandomState(seed)
+        # 乘移位哈希 h(x) = (a·x + b) mod 2^64 的高 32 位，a 取奇数
+        self._a = rng.randint(0, 2 ** 63, size=num_perm, dtype=np.int64).astype(np.uint64) * np.uint64(2) + np.uint64(1)
+        self._b = rng.randint(0, 2 ** 63, size=num_perm, dtype=np.int64).astype(np.uint64)
+
+        self._signatures: Dict[Hashable, np.ndarray] = {}
+        self._number_keys: Dict[Hashable, int] = {}
+        self._buckets: List[Dict[bytes, List[Hashable]]] = [{} for _ in range(bands)]
+
+    @property
+    def signature(self) -> str:
+        """去重参数标识（写入索引清单，参数变化后下次重建自动全量重建）"""
+        return f"minhash:{self.threshold}/{self.num_perm}/{self.bands}/{self.shingle_size}"
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def _shingle_hashes(self, text: str) -> np.ndarray:
+        normalized = normalize_text(text)
+        if not normalized:
+            return np.zeros(0, dtype=np.uint64)
+        code_points = np.frombuffer(normalized.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+        width = min(self.shingle_size, len(code_points))
+        hashes = code_points[:len(code_points) - width + 1].copy()
+        for offset in range(1, width):
+            hashes = hashes * np.uint64(0x100000001B3) ^ code_points[offset:len(code_points) - width + 1 + offset]
+        return np.unique(_mix64(hashes))
+
+    def minhash(self, text: str) -> np.ndarray:
+        """MinHash 签名 (num_perm,) uint32；归一化后为空的文本返回全 0xFFFFFFFF"""
+        hashes = self._shingle_hashes(text)
+        if not len(hashes):
+            return np.full(self.num_perm, 0xFFFFFFFF, dtype=np.uint32)
+        with np.errstate(over="ignore"):
+            permuted = (hashes[:, None] * self._a + self._b) >> np.uint64(32)
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [band.tobytes() for band in np.split(signature, self.bands)]
+
+    def find(self, signature: np.ndarray, numbers: int) -> Optional[Hashable]:
+        """返回与签名最相似（不低于阈值）且数字一致的已加入 key，没有则返回 None"""
+        candidates = dict.fromkeys(
+            key
+            for bucket, band_key in zip(self._buckets, self._band_keys(signature))
+            for key in bucket.get(band_key, ())
+        )
+        best, best_similarity = None, self.threshold
+        for key in candidates:
+            if self._number_keys[key] != numbers:
+                continue
+            similarity = float(np.mean(self._signatures[key] == signature))
+            if similarity >= best_similarity and (best is None or similarity > best_similarity):
+                best, best_similarity = key, similarity
+        return best
+
+    def insert(self, key: Hashable, signature: np.ndarray, numbers: int):
+        self._signatures[key] = signature
+        self._number_keys[key] = numbers
+        for bucket, band_key in zip(self._buckets, self._band_keys(signature)):
+            bucket.setdefault(band_key, []).append(key)
+
+    def add(self, key: Hashable, text: str) -> Optional[Hashable]:
+        """
+        检测并加入一个 chunk
+
+        Returns:
+            与已加入 chunk 近重复时返回其 key（本 chunk 不加入），否则加入并返回 None
+        """
+        signature = self.minhash(text)
+        numbers = number_key(text)
+        duplicate_of = self.find(signature, numbers)
+        if duplicate_of is None:
+            self.insert(key, signature, numbers)
+        return duplicate_of
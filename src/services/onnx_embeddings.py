@@ -0,0 +1,99 @@
+"""
+ONNX Runtime Embedding 后端
+
+运行由 export_onnx_model.py 导出的 bge-small-zh-v1.5（可选 int8 动态量化），
+不依赖 torch / sentence-transformers 推理，CPU 上吞吐更高、常驻内存更小。
+
+模型目录结构：
+models/bge-small-zh-v1.5-onnx/
+├── model.onnx              ← FP32 导出
+├── model_quantized.onnx    ← int8 动态量化
+└── tokenizer.json          ← HuggingFace fast tokenizer
+
+向量计算方式与 HuggingFaceEmbeddings(normalize_embeddings=True) 一致：
+取 [CLS] 位置的 last_hidden_state，再做 L2 归一化（bge 系列的 pooling 方式）。
+"""
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+try:
+    import onnxruntime as ort
+    from tokenizers import Tokenizer
+except ImportError:  # 可选依赖，仅 embedding.backend = "onnx" 时需要
+    ort = None
+    Tokenizer = None
+
+TOKENIZER_FILE = "tokenizer.json"
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    基于 onnxruntime 的 bge Embedding
+
+    Args:
+        model_dir: 导出目录（含 .onnx 与 tokenizer.json）
+        model_file: 使用的模型文件（model.onnx / model_quantized.onnx）
+        threads: 单次推理的算子内线程数 (intra_op_num_threads)，0 表示由 onnxruntime 自动决定
+        batch_size: 单次前向的最大文本数
+        max_length: 最大 token 数（超出截断，与 bge 的 512 一致）
+    """
+
+    def __init__(self, model_dir: Path, model_file: str = "model_quantized.onnx",
+                 threads: int = 4, batch_size: int = 32, max_length: int = 512):
+        if ort is None or Tokenizer is None:
+            raise ImportError("ONNX Embedding 后端需要 onnxruntime 与 tokenizers，请运行: pip install onnxruntime tokenizers")
+
+        self.model_dir = Path(model_dir)
+        self.model_path = self.model_dir / model_file
+        if not self.model_path.exists():
+            raise FileNotFoundError(f"ONNX 模型不存在: {self.model_path}（请先运行 python export_onnx_model.py）")
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(str(self.model_path), options, providers=["CPUExecutionProvider"])
+        self.input_names = {item.name for item in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(str(self.model_dir / TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length)
+        pad_id = self.tokenizer.token_to_id("[PAD]")
+        self.tokenizer.enable_padding(pad_id=pad_id if pad_id is not None else 0, pad_token="[PAD]")
+
+        self.threads = threads
+        self.batch_size = max(1, batch_size)
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        feeds = {
+            "input_ids": input_ids,
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+        }
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+
+        last_hidden_state = self.session.run(None, feeds)[0]
+        vectors = last_hidden_state[:, 0].astype(np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.clip(norms, 1e-12, None)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        # 按长度排序后分批，同批文本长度相近，减少 padding 带来的无效计算
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        result: List[List[float]] = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            vectors = self._encode_batch([texts[i] for i in batch])
+            for i, vector in zip(batch, vectors):
+                result[i] = vector.tolist()
+        return result
+
+    def embed_query(self, text: str) -> List[float]:
+        # bge-small-zh 的 HuggingFaceEmbeddings 用法未加查询指令，这里保持一致
+        return self._encode_batch([text])[0].tolist()
@@ -1,14 +1,27 @@
 """
 PDF处理服务封装
 使用pypdfium2提取PDF文本内容（快速可靠方案）
+
+多个文件的批量提取（extract_many）在进程池中执行：pdfium 不是线程安全的，
+多线程同时解析会互相阻塞甚至崩溃；大文件再按页段拆成多个任务，由多个进程并行提取。
+进程池随 PDFService 长期保留：spawn 启动的子进程会重新导入主模块（src/main.py 及其依赖），
+这一开销只在首次提取时支付，之后的重建复用同一批进程。
 """
 import hashlib
+import os
 import time
+import unicodedata
 import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Tuple, Optional
+from typing import AsyncIterator, List, Tuple, Optional
 import pypdfium2  # 已安装的快速PDF库
 
+# 计算文件哈希时每次读入的字节数
+HASH_BUFFER_SIZE = 1 << 20
+
 
 # 自定义异常
 class PDFProcessingError(Exception):
@@ -21,6 +34,72 @@ class PDFQualityError(Exception):
     pass
 
 
+def _page_texts(pdf, start: int, end: int) -> List[str]:
+    texts = []
+    for index in range(start, min(end, len(pdf))):
+        page = pdf[index]
+        text_page = page.get_textpage()
+        texts.append(text_page.get_text_range())
+        text_page.close()
+        page.close()
+    return texts
+
+
+def _count_pages(pdf_path: str) -> int:
+    """进程池任务：页数"""
+    pdf = pypdfium2.PdfDocument(pdf_path)
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+
+def _extract_page_range(pdf_path: str, start: int, end: int) -> List[str]:
+    """进程池任务：提取 [start, end) 页的文本"""
+    pdf = pypdfium2.PdfDocument(pdf_path)
+    try:
+        return _page_texts(pdf, start, end)
+    finally:
+        pdf.close()
+
+
+@dataclass
+class PDFExtraction:
+    """extract_many 的单个文件结果"""
+    pdf_path: str
+    text: Optional[str]
+    processing_time: float
+    page_count: int = 0
+    error: Optional[Exception] = None
+    pages: List[str] = field(default_factory=list)  # 逐页文本（text 为其以空行拼接）
+
+
+@dataclass
+class TextQuality:
+    """单页文本质量指标（见 PDFService.page_needs_ocr）"""
+    char_count: int        # 非空白字符数
+    chinese_ratio: float   # 中文字符占比
+    readable_ratio: float  # 中文、字母、数字占比
+    garbage_ratio: float   # 乱码占比（替换符、私用区、控制字符）
+
+
+def text_quality(text: str) -> TextQuality:
+    chars = [c for c in text if not c.isspace()]
+    if not chars:
+        return TextQuality(0, 0.0, 0.0, 0.0)
+    chinese = readable = garbage = 0
+    for c in chars:
+        if '\u4e00' <= c <= '\u9fff':
+            chinese += 1
+            readable += 1
+        elif c.isalnum():
+            readable += 1
+        elif c == '\ufffd' or unicodedata.category(c) in ('Co', 'Cc', 'Cs', 'Cn'):
+            garbage += 1
+    total = len(chars)
+    return TextQuality(total, chinese / total, readable / total, garbage / total)
+
+
 class PDFService:
     """
     PDF处理服务封装（使用pypdfium2）
@@ -35,10 +114,35 @@ class PDFService:
     MIN_CHAR_COUNT = 100  # 最少字符数（扫描件PDF可能只有少量文本）
     MIN_CHINESE_RATIO = 0.05  # 最少中文比例 (5%)
 
+    # 逐页阈值（不满足的页交给 OCR，见 adaptive_pdf）
+    PAGE_MIN_CHAR_COUNT = 20  # 扫描页的文字层通常为空或只有页码
+    PAGE_MAX_GARBAGE_RATIO = 0.1  # 字体缺少 ToUnicode 映射时文字层为乱码
+    PAGE_MIN_READABLE_RATIO = 0.5  # 中文比例过低时，至少一半应为字母数字（英文、编码表格）
+
     def __init__(self):
         """初始化PDF服务"""
         print("[PDF] 使用pypdfium2快速PDF处理引擎")
         # pypdfium2不需要初始化模型
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_workers = 0
+
+    def _get_executor(self, workers: int) -> ProcessPoolExecutor:
+        """长期保留的进程池；进程数变化时重建"""
+        if self._executor is not None and self._executor_workers != workers:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._executor is None:
+            # spawn 启动：服务进程中已有 torch/OpenMP、FAISS 与线程池的线程，fork 可能让子进程继承被持有的锁而死锁
+            # （工作函数 _count_pages / _extract_page_range 为模块级函数，子进程可重新导入）
+            self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            self._executor_workers = workers
+        return self._executor
+
+    def close(self) -> None:
+        """关闭进程池（服务退出时调用）"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
 
     @staticmethod
     def calculate_file_hash(file_path: str) -> str:
@@ -52,9 +156,12 @@ class PDFService:
             64位十六进制哈希字符串
         """
         sha256 = hashlib.sha256()
-        with open(file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(8192), b""):
-                sha256.update(chunk)
+        buffer = bytearray(HASH_BUFFER_SIZE)
+        view = memoryview(buffer)
+        with open(file_path, "rb", buffering=0) as f:
+            # 大块读入复用同一缓冲区；hashlib 处理大块数据时释放 GIL，可在多线程中并行
+            while size := f.readinto(buffer):
+                sha256.update(view[:size])
         return sha256.hexdigest()
 
     def extract_text(
@@ -86,13 +193,7 @@ class PDFService:
             pdf = pypdfium2.PdfDocument(str(pdf_path_obj))
 
             # 提取所有页面的文本
-            text_parts = []
-            for page in pdf:
-                text_page = page.get_textpage()
-                text = text_page.get_text_range()
-                text_parts.append(text)
-
-            markdown_text = "\n\n".join(text_parts)
+            markdown_text = "\n\n".join(_page_texts(pdf, 0, len(pdf)))
 
             # 清理
             pdf.close()
@@ -134,6 +235,87 @@ class PDFService:
             validate_quality
         )
 
+    async def extract_many(
+        self,
+        pdf_paths: List[str],
+        max_workers: int = 0,
+        pages_per_task: int = 40,
+        validate_quality: bool = True
+    ) -> AsyncIterator[PDFExtraction]:
+        """
+        并行提取多个 PDF（异步生成器），按完成顺序逐个返回
+
+        每个文件按 pages_per_task 页拆分为若干进程池任务，同时运行的任务数不超过 max_workers；
+        页段结果按页序拼接，与 extract_text 的输出完全一致。提前结束迭代时取消尚未开始的任务。
+        进程池在多次调用间复用（见 close）。
+
+        Args:
+            pdf_paths: PDF 文件路径
+            max_workers: 进程数，0 = min(4, CPU 核数)
+            pages_per_task: 每个任务提取的页数
+            validate_quality: 是否进行质量检查（不合格的文件以 error 返回）
+        """
+        if not pdf_paths:
+            return
+        loop = asyncio.get_running_loop()
+        workers = max_workers or min(4, os.cpu_count() or 1)
+        executor = self._get_executor(workers)
+
+        async def extract_file(pdf_path: str) -> PDFExtraction:
+            start_time = time.time()
+            try:
+                page_count = await loop.run_in_executor(executor, _count_pages, pdf_path)
+                ranges = [(start, min(start + pages_per_task, page_count)) for start in range(0, page_count, pages_per_task)]
+                parts = await asyncio.gather(*(
+                    loop.run_in_executor(executor, _extract_page_range, pdf_path, start, end)
+                    for start, end in ranges
+                ))
+                pages = [text for part in parts for text in part]
+                text = "\n\n".join(pages)
+                if validate_quality:
+                    self._validate_quality(text, Path(pdf_path).name)
+                return PDFExtraction(pdf_path, text, time.time() - start_time, page_count, pages=pages)
+            except Exception as e:
+                print(f"[PDF] 处理失败: {Path(pdf_path).name} - {e}")
+                return PDFExtraction(pdf_path, None, time.time() - start_time, error=PDFProcessingError(f"处理失败: {e}"))
+
+        print(f"[PDF] 并行处理 {len(pdf_paths)} 个文件（{workers} 进程，每任务 {pages_per_task} 页）")
+        tasks = [asyncio.ensure_future(extract_file(str(path))) for path in pdf_paths]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                if result.error is None:
+                    print(f"[PDF] 处理完成: {Path(result.pdf_path).name} "
+                          f"({len(result.text)}字符, {result.page_count}页, {result.processing_time:.1f}秒)")
+                yield result
+        finally:
+            # 取消 asyncio 任务会一并取消进程池中尚未开始的页段任务
+            for task in tasks:
+                task.cancel()
+
+    def extract_pages(self, pdf_path: str) -> List[str]:
+        """逐页提取文本层（同步函数，页序与 extract_text 一致）"""
+        pdf = pypdfium2.PdfDocument(str(pdf_path))
+        try:
+            return _page_texts(pdf, 0, len(pdf))
+        finally:
+            pdf.close()
+
+    @classmethod
+    def page_needs_ocr(cls, text: str) -> bool:
+        """
+        判断单页文字层是否不可用（需要 OCR）
+
+        检查项与 _validate_quality 相同（字数、中文比例），另加乱码比例；
+        中文比例低但以字母数字为主的页（英文条款、编码表格）视为合格
+        """
+        quality = text_quality(text)
+        if quality.char_count < cls.PAGE_MIN_CHAR_COUNT:
+            return True
+        if quality.garbage_ratio > cls.PAGE_MAX_GARBAGE_RATIO:
+            return True
+        return quality.chinese_ratio < cls.MIN_CHINESE_RATIO and quality.readable_ratio < cls.PAGE_MIN_READABLE_RATIO
+
     def _validate_quality(self, text: str, file_name: str) -> None:
         """
         验证输出质量
@@ -720,7 +720,13 @@ class ComplianceReporter:
 
             return should_continue, reason + " (规则降级)", "rule"
 
-    async def generate_stream(self, input_text: str, language: str = "zh", stream_chunks: bool = True) -> AsyncGenerator[str, None]:
+    async def generate_stream(
+        self,
+        input_text: str,
+        language: str = "zh",
+        stream_chunks: bool = True,
+        search_filter=None
+    ) -> AsyncGenerator[str, None]:
         """
         核心生成流
 
@@ -728,6 +734,7 @@ class ComplianceReporter:
             input_text: 输入文本
             language: 语言 (zh/vi)
             stream_chunks: 是否发送 report_chunk 事件（工具调用时应设为 False）
+            search_filter: 知识库检索过滤条件 (SearchFilter)，限定引用的来源文件 / 文件类型 / 目录
         """
         # 0. 立即握手
         engine_start = self._get_ui_text("engine_start", language)
@@ -839,8 +846,14 @@ class ComplianceReporter:
                                 # 安全调用，防止方法不存在
                                 search_func = getattr(self.kb, "search_with_score", None)
                                 if search_func:
-                                    results = await asyncio.wait_for(search_func(query, k=3), timeout=10.0)
+                                    results = await asyncio.wait_for(
+                                        search_func(query, k=3, search_filter=search_filter), timeout=10.0
+                                    )
                                     if results:
+                                        # 命中的小 chunk 拼接前后相邻 chunk，补足上下文
+                                        expand_func = getattr(self.kb, "expand_neighbors_async", None)
+                                        if expand_func:
+                                            results = await expand_func(results[:1])
                                         doc, similarity = results[0]
                                         snippet = doc.page_content
 
@@ -857,7 +870,7 @@ class ComplianceReporter:
                                 print(f"检索异常: {e}")
 
                         # 🔥 改进：返回完整的 RAG 匹配片段（而不是截断）
-                        # FAISS 返回的 page_content 已经是一个 chunk（约1500字符）
+                        # snippet 为命中 chunk 及其相邻 chunk 拼接后的段落（总长受 neighbor_expansion.max_chars 限制）
                         # 这些内容是与查询最相关的部分，应该完整展示
 
                         # 调试日志：查看实际发送的内容
@@ -0,0 +1,144 @@
+"""
+检索微批处理 (Micro-batching)
+
+并发的 search_with_score 请求先进入队列，在 window_ms 时间窗口内（或凑满 max_batch 条）
+合并为一次 KnowledgeBase.search_many 调用：一次线程池切换、一次模型前向、一次 FAISS 矩阵检索，
+再把各自的结果交还给调用方。
+"""
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+# 批大小直方图的分桶上界
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+
+@dataclass
+class _PendingSearch:
+    query: str
+    k: int
+    mode: Optional[str]
+    search_filter: Optional[Hashable]
+    future: asyncio.Future
+    enqueued_at: float
+
+
+class RetrievalBatcher:
+    """
+    检索请求合并器（每个事件循环一个后台收集任务，首次提交时启动）
+
+    Args:
+        search_many: 同步批量检索函数 (queries, k, mode, search_filter) -> 每个查询的结果列表
+        window_ms: 收集窗口（毫秒），第一条请求到达后最多等待这么久
+        max_batch: 单批最大请求数，凑满立即执行
+    """
+
+    def __init__(self, search_many: Callable, window_ms: float = 3.0, max_batch: int = 32):
+        self.search_many = search_many
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop = None
+        self._worker = None
+        self._running = set()  # 持有执行中批次的引用，防止任务被回收
+
+        # 统计（进程内累计）
+        self.requests = 0
+        self.batches = 0
+        self._batched_requests = 0
+        self.batch_size_histogram: Dict[str, int] = {self._bucket(size): 0 for size in BATCH_SIZE_BUCKETS}
+        self._wait_ms = deque(maxlen=1000)  # 最近请求在队列中的等待时间
+
+    @staticmethod
+    def _bucket(size: int) -> str:
+        for upper in BATCH_SIZE_BUCKETS:
+            if size <= upper:
+                return f"<={upper}"
+        return f">{BATCH_SIZE_BUCKETS[-1]}"
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._collect())
+
+    async def submit(self, query: str, k: int, mode: Optional[str] = None, search_filter: Optional[Hashable] = None):
+        """提交一次检索并等待结果"""
+        self._ensure_worker()
+        future = self._loop.create_future()
+        self.requests += 1
+        self._queue.put_nowait(_PendingSearch(query, k, mode, search_filter, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self):
+        queue = self._queue
+        while True:
+            batch = [await queue.get()]
+            deadline = time.perf_counter() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # 执行与收集解耦：上一批仍在计算时继续收集下一批
+            task = asyncio.create_task(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: List[_PendingSearch]):
+        started = time.perf_counter()
+        self.batches += 1
+        self._batched_requests += len(batch)
+        self.batch_size_histogram[self._bucket(len(batch))] += 1
+        self._wait_ms.extend((started - item.enqueued_at) * 1000 for item in batch)
+
+        # 检索方式、过滤条件或 k 不同的请求分开执行：混合检索的候选数、HNSW / IVF 的近似结果都随 k 变化，
+        # 合并执行不能改变任何一个请求的结果
+        groups: Dict[Tuple[Optional[str], Optional[Hashable], int], List[_PendingSearch]] = {}
+        for item in batch:
+            groups.setdefault((item.mode, item.search_filter, item.k), []).append(item)
+
+        for (mode, search_filter, k), items in groups.items():
+            try:
+                results = await asyncio.to_thread(
+                    self.search_many,
+                    [item.query for item in items],
+                    k,
+                    mode,
+                    search_filter
+                )
+            except Exception as e:
+                for item in items:
+                    if not item.future.done():
+                        item.future.set_exception(e)
+                continue
+            for item, result in zip(items, results):
+                if not item.future.done():
+                    item.future.set_result(result)
+
+    def stats(self) -> dict:
+        wait_ms = np.array(self._wait_ms) if self._wait_ms else None
+        return {
+            "window_ms": self.window * 1000,
+            "max_batch": self.max_batch,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "requests": self.requests,
+            "batches": self.batches,
+            "avg_batch_size": round(self._batched_requests / self.batches, 2) if self.batches else 0.0,
+            "batch_size_histogram": dict(self.batch_size_histogram),
+            "wait_ms": {
+                "avg": round(float(wait_ms.mean()), 3),
+                "p50": round(float(np.percentile(wait_ms, 50)), 3),
+                "p99": round(float(np.percentile(wait_ms, 99)), 3),
+                "max": round(float(wait_ms.max()), 3)
+            } if wait_ms is not None else None
+        }
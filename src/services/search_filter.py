@@ -0,0 +1,155 @@
+"""
+检索元数据过滤（按来源文件、文件类型、目录）
+
+过滤条件在检索前换算为 chunk id 集合，向量检索通过 FAISS IDSelector、关键词检索通过 id 掩码下推执行，
+不需要先多取再过滤，过滤检索的开销与不过滤基本相同。
+
+文件 -> chunk id 的映射取自索引清单（清单缺失的旧版索引扫描 docstore 的 metadata），
+近重复去除后并入其他文件代表 chunk 的文件（见 near_duplicates），其代表 chunk 同样计入该文件。
+"""
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import PurePosixPath
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from src.services.chunk_store import iter_documents
+
+# 过滤值可用逗号、顿号、分号或空白分隔多个关键词
+VALUE_SEPARATOR = re.compile(r"[,，、;；\s]+")
+
+
+def _as_tuple(value: Any) -> Tuple[str, ...]:
+    if not value:
+        return ()
+    if isinstance(value, str):
+        value = VALUE_SEPARATOR.split(value)
+    return tuple(sorted({str(item).strip() for item in value if str(item).strip()}))
+
+
+@dataclass(frozen=True)
+class SearchFilter:
+    """
+    检索过滤条件（各项之间为“且”，同一项的多个值之间为“或”；不可变，可作为缓存键）
+
+    Args:
+        sources: 文件名包含任一关键词（如 "凭祥"、"征税管理办法"）
+        exclude_sources: 排除文件名包含任一关键词的文件（如 "申报目录"）
+        file_types: 文件类型（pdf / txt / md）
+        path_prefixes: 相对 data/knowledge 的路径前缀（子目录）
+    """
+    sources: Tuple[str, ...] = ()
+    exclude_sources: Tuple[str, ...] = ()
+    file_types: Tuple[str, ...] = ()
+    path_prefixes: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> Optional["SearchFilter"]:
+        """由接口参数 / 工具参数构造，值可为列表或分隔的字符串；条件为空时返回 None"""
+        if not data:
+            return None
+        search_filter = cls(
+            sources=_as_tuple(data.get("sources")),
+            exclude_sources=_as_tuple(data.get("exclude_sources")),
+            file_types=tuple(item.lower().lstrip(".") for item in _as_tuple(data.get("file_types"))),
+            path_prefixes=tuple(item.strip("/") for item in _as_tuple(data.get("path_prefixes")))
+        )
+        return None if search_filter.is_empty else search_filter
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.sources or self.exclude_sources or self.file_types or self.path_prefixes)
+
+    def matches(self, file_key: str) -> bool:
+        """file_key 为清单中的相对路径（POSIX）"""
+        path = PurePosixPath(file_key)
+        name = path.name
+        if self.sources and not any(term in name for term in self.sources):
+            return False
+        if any(term in name for term in self.exclude_sources):
+            return False
+        if self.file_types and path.suffix.lower().lstrip(".") not in self.file_types:
+            return False
+        if self.path_prefixes and not any(
+            file_key == prefix or file_key.startswith(prefix + "/") for prefix in self.path_prefixes
+        ):
+            return False
+        return True
+
+    def to_dict(self) -> dict:
+        return {key: list(value) for key, value in self.__dict__.items() if value}
+
+
+class FilterIndex:
+    """
+    一个索引版本的 文件 -> chunk id 映射，按过滤条件求出允许的 id 集合与 FAISS IDSelector（LRU 缓存）
+
+    Args:
+        file_ids: 清单相对路径 -> 该文件的 chunk id（含近重复并入的代表 chunk）
+        max_cached: 缓存的过滤条件数
+    """
+
+    def __init__(self, file_ids: Dict[str, np.ndarray], max_cached: int = 64):
+        self.file_ids = file_ids
+        self.max_cached = max_cached
+        self._cache: "OrderedDict[SearchFilter, Tuple[np.ndarray, faiss.IDSelector]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_manifest(cls, manifest) -> "FilterIndex":
+        return cls({
+            key: np.unique(np.array(entry.chunk_ids + entry.duplicate_of, dtype="int64"))
+            for key, entry in manifest.files.items()
+        })
+
+    @classmethod
+    def from_docstore(cls, docstore, index_to_docstore_id=None) -> "FilterIndex":
+        """
+        旧版索引（无清单）：按 chunk metadata 的 file_path / source 分组
+
+        IDSelector 按 FAISS id 过滤：docstore 以整数 chunk id 为键时二者相同；
+        更早的索引以 uuid 为键，经 index_to_docstore_id 反查 FAISS id（向量在索引中的位置）
+        """
+        faiss_ids: Optional[Dict[Any, int]] = None
+        groups: Dict[str, list] = {}
+        for chunk_id, doc in iter_documents(docstore):
+            if not isinstance(chunk_id, (int, np.integer)):
+                if faiss_ids is None:
+                    if index_to_docstore_id is None:
+                        raise ValueError("当前索引为旧版格式（uuid 键）且缺少 FAISS id 映射，需重建索引后才能按条件过滤")
+                    faiss_ids = {doc_id: faiss_id for faiss_id, doc_id in index_to_docstore_id.items()}
+                chunk_id = faiss_ids.get(chunk_id)
+                if chunk_id is None:
+                    continue
+            key = doc.metadata.get("file_path") or PurePosixPath(str(doc.metadata.get("source", ""))).name
+            if key:
+                groups.setdefault(key, []).append(chunk_id)
+        return cls({key: np.unique(np.array(ids, dtype="int64")) for key, ids in groups.items()})
+
+    def files(self, search_filter: Optional[SearchFilter] = None) -> Iterable[str]:
+        return [key for key in sorted(self.file_ids) if search_filter is None or search_filter.matches(key)]
+
+    def allowed(self, search_filter: SearchFilter) -> Tuple[np.ndarray, faiss.IDSelector]:
+        """
+        Returns:
+            (允许的 chunk id，升序), FAISS IDSelector
+        """
+        with self._lock:
+            cached = self._cache.get(search_filter)
+            if cached is not None:
+                self._cache.move_to_end(search_filter)
+                return cached
+
+        arrays = [self.file_ids[key] for key in self.files(search_filter)]
+        ids = np.unique(np.concatenate(arrays)) if arrays else np.empty(0, dtype="int64")
+        result = (ids, faiss.IDSelectorBatch(ids))
+
+        with self._lock:
+            self._cache[search_filter] = result
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+        return result
@@ -0,0 +1,396 @@
+"""
+涉税规范申报目录结构化存储
+《进出口商品涉税规范申报目录》PDF 提取出的文本按行保留了表格结构（税则号列 / 商品名称 / 申报要素），
+按文本切分后只能靠向量检索去找 “某税号需要申报哪些要素”。这里把目录解析为逐条的表格行，
+存入 SQLite 并按 HS 编码建索引，查询一次即返回完整的申报要素，不经过向量检索与 LLM。
+
+解析规则（输入为 PDFService 提取的纯文本）：
+- 表头 “税则号列 / 申报要素 / 归类要素…” 之后进入表格，“第X章 / 第X类” 标题处退出（章注释不解析）
+- “01.01 马、驴、骡：” 为税目行；“0101.2100 --改良种用” 为税号行（名称可能在下一行）；
+  “-其他：”“--存储器：” 为分组行，短横数为层级
+- “1.是否改良种用” 起始的行为申报要素，其后不以编号开头的行是续行；要素属于其上方最近的税目 / 分组 / 税号行
+- 税号行的申报要素：自身列出的优先，否则取所在分组的，再否则取税目的
+
+存储：独立的 SQLite 文件（默认 data/tariff_catalog.db），按来源文件及其内容哈希记录，
+文件内容或解析规则变化时只重新解析该文件。
+"""
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.services.hs_code_index import normalize_code
+
+# 解析规则版本：规则变化后已入库的文件自动重新解析
+PARSER_VERSION = "catalog-v1"
+
+_HEADING_ROW = re.compile(r"^(\d{2})\.(\d{2})(?![\d.%。])\s*(.*)$")
+_ITEM_ROW = re.compile(r"^(\d{4}\.\d{4}(?:\.\d{2})?)(?![\d.])\s*(.*)$")
+_GROUP_ROW = re.compile(r"^(-+)\s*(?=[^\d\s-])(.*)$")
+_ELEMENT_START = re.compile(r"^1\.(?!\d)")
+_INLINE_ELEMENTS = re.compile(r"\s+(?=1\.(?!\d))")
+_ELEMENT_NUMBER = re.compile(r"(\d{1,2})\.(?!\d)")
+_TABLE_HEADER = re.compile(r"^(税则号列|申报要素|归类要素)")
+_SECTION_TITLE = re.compile(r"^第([一二三四五六七八九十百零〇\d]+)([章类])")
+_CHINESE_DIGITS = {"零": 0, "〇": 0, "一": 1, "二": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+
+
+@dataclass
+class TariffRow:
+    """申报目录中的一行（税目或税号）"""
+    code: str                   # 纯数字编码：税目 4 位，税号 8 / 10 位
+    code_display: str           # 目录中的原始写法（如 8542.3111）
+    name: str                   # 本行商品名称（如 “其他”）
+    full_name: str              # 含上级税目 / 分组的完整名称（“集成电路 > 存储器 > 其他”）
+    elements: List[str] = field(default_factory=list)  # 申报要素（已去除编号）
+    heading: str = ""           # 所属税目 4 位编码
+    level: str = "item"         # heading / item
+
+    def to_dict(self) -> dict:
+        return {
+            "code": self.code,
+            "code_display": self.code_display,
+            "name": self.name,
+            "full_name": self.full_name,
+            "elements": self.elements,
+            "heading": self.heading,
+            "level": self.level
+        }
+
+
+def _chapter_number(numeral: str) -> int:
+    """“八十五” -> 85"""
+    if numeral.isdigit():
+        return int(numeral)
+    if "十" not in numeral:
+        return _CHINESE_DIGITS.get(numeral, 0)
+    tens, _, ones = numeral.partition("十")
+    return (_CHINESE_DIGITS.get(tens, 0) if tens else 1) * 10 + (_CHINESE_DIGITS.get(ones, 0) if ones else 0)
+
+
+def _clean_name(text: str) -> str:
+    return text.strip().rstrip("：:").strip()
+
+
+def _split_inline(text: str) -> Tuple[str, str]:
+    """同一行中名称后紧跟的申报要素：“马、驴、骡： 1.是否改良种用” -> (名称, 要素)"""
+    parts = _INLINE_ELEMENTS.split(text, maxsplit=1)
+    return parts[0], parts[1] if len(parts) > 1 else ""
+
+
+def split_elements(text: str) -> List[str]:
+    """“1.品名；2.用途3.品牌” -> ["品名", "用途", "品牌"]；只在编号依次递增处切分，避免误切 “2.5 毫米”"""
+    parts, expected, start = [], 1, None
+    for match in _ELEMENT_NUMBER.finditer(text):
+        if int(match.group(1)) != expected:
+            continue
+        if start is not None:
+            parts.append(text[start:match.start()])
+        start = match.end()
+        expected += 1
+    if start is not None:
+        parts.append(text[start:])
+    return [element.strip(" ；;，,、") for element in parts if element.strip(" ；;，,、")]
+
+
+class _Node:
+    """解析过程中的税目 / 分组 / 税号行"""
+
+    def __init__(self, kind: str, name: str, depth: int, code: str = "", code_display: str = ""):
+        self.kind = kind
+        self.name = name
+        self.depth = depth
+        self.code = code
+        self.code_display = code_display
+        self.element_text = ""
+        self.parent: Optional["_Node"] = None
+
+    @property
+    def elements(self) -> List[str]:
+        return split_elements(self.element_text)
+
+    def inherited_elements(self) -> List[str]:
+        node = self
+        while node is not None:
+            elements = node.elements
+            if elements:
+                return elements
+            node = node.parent
+        return []
+
+    def path(self) -> List[str]:
+        names, node = [], self
+        while node is not None:
+            if node.name:
+                names.append(node.name)
+            node = node.parent
+        return names[::-1]
+
+
+def parse_tariff_catalog(text: str) -> List[TariffRow]:
+    """解析申报目录文本，返回按出现顺序排列的税目行与税号行"""
+    nodes: List[_Node] = []
+    in_table = False
+    heading: Optional[_Node] = None
+    chapter = ""                    # 当前章号（两位），税目须属于本章，否则是正文中对其他税目的引用
+    last_heading_code = ""          # 税目按编码递增出现
+    groups: List[_Node] = []        # 当前税目下的分组栈（按短横数递增）
+    owner: Optional[_Node] = None   # 最近一行（续行与申报要素归属于它）
+    in_elements = False
+
+    def attach(node: _Node):
+        while groups and groups[-1].depth >= node.depth:
+            groups.pop()
+        node.parent = groups[-1] if groups else heading
+
+    def add_elements(node: _Node, text: str):
+        node.element_text += text
+
+    for raw_line in unicodedata.normalize("NFKC", text).splitlines():
+        line = raw_line.strip()
+        if not line:
+            continue
+        match = _SECTION_TITLE.match(line)
+        if match:
+            in_table, heading, owner = False, None, None
+            if match.group(2) == "章":
+                chapter = f"{_chapter_number(match.group(1)):02d}"
+            continue
+        if _TABLE_HEADER.match(line):
+            in_table, owner, in_elements = True, None, False
+            continue
+        if not in_table or line.isdigit():
+            continue
+
+        match = _HEADING_ROW.match(line)
+        if match and match.group(1) == chapter and match.group(1) + match.group(2) > last_heading_code \
+                and not re.match(r"\s*[至及或和的、]", match.group(3)):
+            name, elements = _split_inline(match.group(3))
+            heading = _Node("heading", _clean_name(name), 0, match.group(1) + match.group(2),
+                            f"{match.group(1)}.{match.group(2)}")
+            last_heading_code = heading.code
+            groups = []
+            nodes.append(heading)
+            owner, in_elements = heading, False
+            if elements:
+                add_elements(heading, elements)
+                in_elements = True
+            continue
+
+        match = _ITEM_ROW.match(line)
+        # 不属于当前税目的编号是上一行名称的续行（如 “税号8702.1091及 / 8704.1090所列车辆用”）
+        if match and heading is not None and normalize_code(match.group(1))[:4] == heading.code:
+            rest = match.group(2)
+            group_match = _GROUP_ROW.match(rest)
+            depth = len(group_match.group(1)) if group_match else 0
+            body = group_match.group(2) if group_match else rest
+            name, elements = _split_inline(body)
+            item = _Node("item", _clean_name(name), depth, normalize_code(match.group(1)), match.group(1))
+            if depth:
+                attach(item)
+            else:
+                item.parent = groups[-1] if groups else heading
+            nodes.append(item)
+            owner, in_elements = item, False
+            if elements:
+                add_elements(item, elements)
+                in_elements = True
+            continue
+
+        match = _GROUP_ROW.match(line)
+        if match and heading is not None:
+            depth = len(match.group(1))
+            name, elements = _split_inline(match.group(2))
+            if owner is not None and owner.kind == "item" and not owner.name and not in_elements:
+                # 税号行的名称另起一行
+                owner.name, owner.depth = _clean_name(name), depth
+                attach(owner)
+            else:
+                group = _Node("group", _clean_name(name), depth)
+                attach(group)
+                groups.append(group)
+                owner = group
+            in_elements = False
+            if elements:
+                add_elements(owner, elements)
+                in_elements = True
+            continue
+
+        if owner is None:
+            continue
+        if _ELEMENT_START.match(line) and not in_elements:
+            in_elements = True
+            add_elements(owner, line)
+        elif in_elements:
+            add_elements(owner, line)
+        else:
+            owner.name = _clean_name(owner.name + line)
+
+    rows = []
+    for node in nodes:
+        if node.kind == "group":
+            continue
+        heading_code = node.code[:4]
+        rows.append(TariffRow(
+            code=node.code,
+            code_display=node.code_display,
+            name=node.name,
+            full_name=" > ".join(node.path()),
+            elements=node.elements if node.kind == "heading" else node.inherited_elements(),
+            heading=heading_code,
+            level="heading" if node.kind == "heading" else "item"
+        ))
+    return rows
+
+
+class TariffCatalog:
+    """
+    申报目录表格行的 SQLite 存储（WAL 模式，每个线程一个连接）
+
+    Args:
+        db_path: 数据库文件路径
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        conn = self._connection()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS tariff_files (
+                file_key TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                parser TEXT NOT NULL,
+                row_count INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS tariff_rows (
+                file_key TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                code TEXT NOT NULL,
+                code_display TEXT NOT NULL,
+                heading TEXT NOT NULL,
+                level TEXT NOT NULL,
+                name TEXT NOT NULL,
+                full_name TEXT NOT NULL,
+                elements TEXT NOT NULL,
+                PRIMARY KEY (file_key, seq)
+            );
+            CREATE INDEX IF NOT EXISTS idx_tariff_rows_code ON tariff_rows (code);
+        """)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def files(self) -> Dict[str, Tuple[str, str]]:
+        """已入库文件：file_key -> (内容哈希, 解析规则版本)"""
+        rows = self._connection().execute("SELECT file_key, content_hash, parser FROM tariff_files").fetchall()
+        return {key: (content_hash, parser) for key, content_hash, parser in rows}
+
+    def is_current(self, file_key: str, content_hash: str) -> bool:
+        return self.files().get(file_key) == (content_hash, PARSER_VERSION)
+
+    def replace_file(self, file_key: str, content_hash: str, rows: List[TariffRow]):
+        """以一个事务替换某个文件的全部表格行"""
+        with self._write_lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("DELETE FROM tariff_rows WHERE file_key = ?", (file_key,))
+                conn.executemany(
+                    "INSERT INTO tariff_rows (file_key, seq, code, code_display, heading, level, name, full_name, elements)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        (file_key, seq, row.code, row.code_display, row.heading, row.level, row.name, row.full_name,
+                         json.dumps(row.elements, ensure_ascii=False))
+                        for seq, row in enumerate(rows)
+                    )
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO tariff_files (file_key, content_hash, parser, row_count, updated_at)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (file_key, content_hash, PARSER_VERSION, len(rows), time.time())
+                )
+
+    def remove_files(self, file_keys: Iterable[str]) -> int:
+        file_keys = list(file_keys)
+        if not file_keys:
+            return 0
+        with self._write_lock:
+            conn = self._connection()
+            with conn:
+                for key in file_keys:
+                    conn.execute("DELETE FROM tariff_rows WHERE file_key = ?", (key,))
+                    conn.execute("DELETE FROM tariff_files WHERE file_key = ?", (key,))
+        return len(file_keys)
+
+    def lookup(self, code: str, limit: int = 20) -> List[dict]:
+        """
+        按 HS 编码查询
+
+        - 8 / 10 位税号有完全一致的行时返回这些行（多个目录文件各一行）
+        - 否则返回以该编码开头的行（如 “8542” 返回税目行及其下全部税号）
+        - 仍没有时逐级截短编码，返回最近的上级子目 / 税目下的行
+
+        Returns:
+            [{code, code_display, name, full_name, elements, heading, level, source}]，按编码与来源排序
+        """
+        code = normalize_code(code)
+        if len(code) < 2:
+            return []
+        conn = self._connection()
+        columns = "code, code_display, name, full_name, elements, heading, level, file_key"
+        rows = []
+        if len(code) >= 8:
+            rows = conn.execute(
+                f"SELECT {columns} FROM tariff_rows WHERE code = ? ORDER BY file_key, seq LIMIT ?", (code, limit)
+            ).fetchall()
+        prefix = code
+        while not rows and len(prefix) >= 4:
+            # 编码为纯数字，前缀范围查询可走 code 索引
+            rows = conn.execute(
+                f"SELECT {columns} FROM tariff_rows WHERE code >= ? AND code < ? ORDER BY code, file_key LIMIT ?",
+                (prefix, prefix + ":", limit)
+            ).fetchall()
+            prefix = prefix[:-2]
+        return [
+            {
+                "code": row[0],
+                "code_display": row[1],
+                "name": row[2],
+                "full_name": row[3],
+                "elements": json.loads(row[4]),
+                "heading": row[5],
+                "level": row[6],
+                "source": row[7]
+            }
+            for row in rows
+        ]
+
+    def stats(self) -> dict:
+        conn = self._connection()
+        files = conn.execute("SELECT file_key, row_count FROM tariff_files ORDER BY file_key").fetchall()
+        return {
+            "files": {key: count for key, count in files},
+            "rows": int(sum(count for _, count in files)),
+            "parser": PARSER_VERSION
+        }
+
+
+def format_rows(rows: List[dict]) -> str:
+    """供对话工具使用的紧凑文本"""
+    lines = []
+    for row in rows:
+        elements = "；".join(f"{i}.{element}" for i, element in enumerate(row["elements"], 1)) or "（未列出）"
+        lines.append(f"{row['code_display']} {row['full_name']}\n  申报要素：{elements}\n  来源：{Path(row['source']).name}")
+    return "\n".join(lines)
@@ -0,0 +1,304 @@
+"""
+中文文本切分（按 Embedding 模型的 token 数计长度）
+
+bge-small-zh 的输入上限为 512 token（含 [CLS] / [SEP]），超出部分在向量化时被截断。
+按字符数切分的 1500 字 chunk 大多超过该上限，尾部内容从未进入向量；
+这里改为用 Embedding 模型自己的 tokenizer 计长度，保证每个 chunk 都能完整向量化。
+
+切分流程（单遍线性扫描）：
+1. 按句子边界（。！？ 与换行）把全文切成句段，记录字符偏移
+2. 一次算出全文的 token 前缀和，各句段 token 数直接相减得到；
+   超长句段再按 ，、；空格 切开，仍超长则按 token 数硬切
+3. 顺序累加句段，超出 max_tokens 时在窗口后半段中选最强的边界断开
+   （强度：句末+换行 > 多个空行 > 空行 > 换行 > 句末，与原 RecursiveCharacterTextSplitter 的分隔符优先级一致），
+   下一个 chunk 从末尾回退 overlap_tokens 个 token 的句段开始
+4. 过滤少于 min_chars 字的碎片 chunk
+
+每个 chunk 的 metadata 记录 char_start / char_end：page_content == 原文[char_start:char_end]。
+"""
+import re
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+try:
+    from tokenizers import normalizers, pre_tokenizers
+except ImportError:  # 随 transformers 安装；缺失时 token_counter_for 退回近似计数
+    normalizers = pre_tokenizers = None
+
+# 句段边界：句末标点（可带换行）或换行
+SENTENCE_BOUNDARY = re.compile(r"[。！？]+\n*|\n+")
+# 超长句段的次级边界
+CLAUSE_BOUNDARY = re.compile(r"[，、；,; ]+")
+# 汉字之间的非空白片段（汉字范围与 BERT 分词 handle_chinese_chars 的常用部分一致，见 _cjk_mask）；
+# 句段 / 子句边界的标点在 BERT 分词中本身就是词边界，单独成段，使切点不会落在片段中间
+NON_CJK_RUN = re.compile(r"[^\s，、；,;。！？\u3400-\u9fff\uf900-\ufaff]+|[，、；,;。！？]")
+LATIN_WORD = re.compile(r"[A-Za-z0-9]+")
+
+# 句段末尾边界强度，越大越优先在此断开
+STRENGTH_SENTENCE_NEWLINE = 5  # 。\n
+STRENGTH_SECTION = 4           # \n\n\n
+STRENGTH_PARAGRAPH = 3         # \n\n
+STRENGTH_NEWLINE = 2           # \n
+STRENGTH_SENTENCE = 1          # 。！？
+STRENGTH_CLAUSE = 0            # ，、；空格 / 硬切
+
+
+def _code_points(text: str) -> np.ndarray:
+    return np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+
+
+def _cjk_mask(code_points: np.ndarray) -> np.ndarray:
+    """与 NON_CJK_RUN 排除的汉字范围相同"""
+    return ((code_points >= 0x3400) & (code_points <= 0x9FFF)) | ((code_points >= 0xF900) & (code_points <= 0xFAFF))
+
+
+class TokenCounter(ABC):
+    """
+    token 计数（不含 [CLS]/[SEP]）
+
+    prefix_sums 一次算出整篇文本的 token 前缀和，任意区间 [s, e) 的 token 数为 prefix[e] - prefix[s]，
+    切分时无需为每个句段单独分词。子类实现 _weights：从每个字符位置开始的 token 数。
+    """
+
+    @abstractmethod
+    def _weights(self, text: str) -> np.ndarray:
+        """每个字符位置开始的 token 数 (len(text),)"""
+
+    def prefix_sums(self, text: str) -> np.ndarray:
+        prefix = np.zeros(len(text) + 1, dtype=np.int64)
+        np.cumsum(self._weights(text), out=prefix[1:])
+        return prefix
+
+    def count(self, texts: Sequence[str]) -> List[int]:
+        return [int(self._weights(text).sum()) for text in texts]
+
+
+class ApproxTokenCounter(TokenCounter):
+    """无 tokenizer 时的近似计数：汉字 1 token，连续英文/数字按 4 字符 1 token，其余非空白字符 1 token"""
+
+    def _weights(self, text: str) -> np.ndarray:
+        weights = np.fromiter((not c.isspace() for c in text), dtype=np.int64, count=len(text))
+        for match in LATIN_WORD.finditer(text):
+            start, end = match.span()
+            weights[start:end] = 0
+            weights[start] = (end - start + 3) // 4
+        return weights
+
+
+class TokenizerCounter(TokenCounter):
+    """用 tokenizers.Tokenizer 对全文分词一次，按各 token 的起始偏移计数（精确，适用于任意 tokenizer）"""
+
+    def __init__(self, tokenizer):
+        # 复制一份再关闭截断 / 填充（ONNX 后端为推理开启了二者，计数时需要完整长度）
+        self.tokenizer = type(tokenizer).from_str(tokenizer.to_str())
+        self.tokenizer.no_truncation()
+        self.tokenizer.no_padding()
+
+    def _weights(self, text: str) -> np.ndarray:
+        weights = np.zeros(len(text), dtype=np.int64)
+        starts = [start for start, _ in self.tokenizer.encode(text, add_special_tokens=False).offsets]
+        if starts:
+            np.add.at(weights, np.minimum(starts, len(text) - 1), 1)
+        return weights
+
+    def count(self, texts: Sequence[str]) -> List[int]:
+        return [len(encoding.ids) for encoding in self.tokenizer.encode_batch(list(texts), add_special_tokens=False)]
+
+
+class BertTokenCounter(TokenizerCounter):
+    """
+    BERT 分词（bge 即是）的快速精确计数：每个汉字单独成为 1 个 token，且汉字与空白都是词边界，
+    因此只需对汉字之间的非空白片段（数字、字母、标点）分词；这类片段高度重复，按片段缓存结果
+    """
+
+    def __init__(self, tokenizer):
+        super().__init__(tokenizer)
+        self._run_tokens: Dict[str, int] = {}
+
+    def _weights(self, text: str) -> np.ndarray:
+        weights = _cjk_mask(_code_points(text)).astype(np.int64)
+        runs = [(match.start(), match.group()) for match in NON_CJK_RUN.finditer(text)]
+        unseen = list({run for _, run in runs if run not in self._run_tokens})
+        if unseen:
+            self._run_tokens.update(zip(unseen, super().count(unseen)))
+        if runs:
+            weights[[start for start, _ in runs]] += [self._run_tokens[run] for _, run in runs]
+        return weights
+
+    def count(self, texts: Sequence[str]) -> List[int]:
+        return TokenCounter.count(self, texts)
+
+
+def token_counter_for(embedding_model) -> TokenCounter:
+    """
+    取 Embedding 模型自带的 tokenizer 构造计数器：
+    OnnxEmbeddings.tokenizer 或 HuggingFaceEmbeddings 背后的 SentenceTransformer.tokenizer；
+    都取不到时退回近似计数
+    """
+    tokenizer = getattr(embedding_model, "tokenizer", None)
+    if tokenizer is None:
+        client = getattr(embedding_model, "_client", None)
+        tokenizer = getattr(client, "tokenizer", None)
+    # transformers 的 fast tokenizer 背后是 tokenizers.Tokenizer，直接使用以免逐条构造 BatchEncoding
+    backend = getattr(tokenizer, "backend_tokenizer", tokenizer)
+    if backend is None or normalizers is None or not hasattr(backend, "encode_batch"):
+        return ApproxTokenCounter()
+
+    if (isinstance(backend.normalizer, normalizers.BertNormalizer)
+            and backend.normalizer.handle_chinese_chars
+            and isinstance(backend.pre_tokenizer, pre_tokenizers.BertPreTokenizer)):
+        return BertTokenCounter(backend)
+    return TokenizerCounter(backend)
+
+
+@dataclass
+class _Piece:
+    start: int
+    end: int
+    tokens: int
+    strength: int
+
+
+class ChineseChunker:
+    """
+    Args:
+        token_counter: token 计数器（见 token_counter_for），默认近似计数
+        max_tokens: 单个 chunk 的最大 token 数（bge 上限 512，需为 [CLS]/[SEP] 留出余量）
+        overlap_tokens: 相邻 chunk 的重叠 token 数
+        min_chars: 少于该字数的 chunk 视为碎片丢弃
+    """
+
+    def __init__(self, token_counter: Optional[TokenCounter] = None, max_tokens: int = 500,
+                 overlap_tokens: int = 50, min_chars: int = 50):
+        self.token_counter = token_counter or ApproxTokenCounter()
+        self.max_tokens = max_tokens
+        self.overlap_tokens = min(overlap_tokens, max_tokens // 2)
+        self.min_chars = min_chars
+
+    @property
+    def signature(self) -> str:
+        """切分参数标识（写入索引清单，参数变化后下次重建自动全量重建）"""
+        return f"tokens:{self.max_tokens}/{self.overlap_tokens}/{self.min_chars}"
+
+    def split_documents(self, documents: List[Document]) -> Tuple[List[Document], int]:
+        """
+        Returns:
+            (有效chunk列表, 被过滤的chunk数量)
+        """
+        chunks = []
+        filtered = 0
+        for document in documents:
+            text = document.page_content
+            for start, end in self.split_offsets(text):
+                if end - start < self.min_chars:
+                    filtered += 1
+                    continue
+                metadata = dict(document.metadata)
+                metadata["char_start"] = start
+                metadata["char_end"] = end
+                chunks.append(Document(page_content=text[start:end], metadata=metadata))
+        return chunks, filtered
+
+    def split_offsets(self, text: str) -> List[Tuple[int, int]]:
+        """切分为 (char_start, char_end) 列表（已去除首尾空白）"""
+        pieces = self._pieces(text)
+        spans = []
+        i = 0
+        n = len(pieces)
+        while i < n:
+            # 从 i 开始累加到放不下为止
+            total = 0
+            j = i
+            while j < n and total + pieces[j].tokens <= self.max_tokens:
+                total += pieces[j].tokens
+                j += 1
+            if j == n:
+                spans.append((pieces[i].start, pieces[n - 1].end))
+                break
+            cut = self._best_cut(pieces, i, j)
+            spans.append((pieces[i].start, pieces[cut - 1].end))
+            i = self._overlap_start(pieces, i, cut)
+
+        result = []
+        for start, end in spans:
+            # 去除首尾空白，保证 page_content 与偏移一一对应
+            while start < end and text[start].isspace():
+                start += 1
+            while end > start and text[end - 1].isspace():
+                end -= 1
+            if end > start:
+                result.append((start, end))
+        return result
+
+    def _best_cut(self, pieces: List[_Piece], i: int, j: int) -> int:
+        """在 pieces[i:j] 的后半段（按 token）选边界最强的断点，同等强度取最靠后的"""
+        half = self.max_tokens // 2
+        best, best_strength = j, -1
+        total = 0
+        for k in range(i, j):
+            total += pieces[k].tokens
+            if total >= half and pieces[k].strength >= best_strength:
+                best, best_strength = k + 1, pieces[k].strength
+        return best
+
+    def _overlap_start(self, pieces: List[_Piece], i: int, cut: int) -> int:
+        """下一个 chunk 的起点：从断点回退不超过 overlap_tokens 的句段（至少前进一个句段）"""
+        start = cut
+        overlap = 0
+        while start - 1 > i and overlap + pieces[start - 1].tokens <= self.overlap_tokens:
+            start -= 1
+            overlap += pieces[start].tokens
+        return start
+
+    def _pieces(self, text: str) -> List[_Piece]:
+        prefix = self.token_counter.prefix_sums(text)
+        pieces = []
+        position = 0
+        for match in SENTENCE_BOUNDARY.finditer(text):
+            self._add_piece(pieces, text, prefix, position, match.end(), self._strength(match.group()))
+            position = match.end()
+        if position < len(text):
+            self._add_piece(pieces, text, prefix, position, len(text), STRENGTH_SENTENCE)
+        return pieces
+
+    def _add_piece(self, pieces: List[_Piece], text: str, prefix: np.ndarray, start: int, end: int, strength: int):
+        tokens = int(prefix[end] - prefix[start])
+        if tokens <= self.max_tokens:
+            pieces.append(_Piece(start, end, tokens, strength))
+            return
+
+        # 超长句段：先按次级边界切开，仍超长的部分按 token 数硬切
+        first = len(pieces)
+        position = start
+        for match in CLAUSE_BOUNDARY.finditer(text, start, end):
+            self._add_clause(pieces, prefix, position, match.end())
+            position = match.end()
+        if position < end:
+            self._add_clause(pieces, prefix, position, end)
+        if len(pieces) > first:
+            pieces[-1].strength = strength
+
+    def _add_clause(self, pieces: List[_Piece], prefix: np.ndarray, start: int, end: int):
+        while start < end:
+            tokens = int(prefix[end] - prefix[start])
+            if tokens <= self.max_tokens:
+                pieces.append(_Piece(start, end, tokens, STRENGTH_CLAUSE))
+                return
+            # 取 token 数不超过 max_tokens 的最长前缀
+            cut = int(np.searchsorted(prefix, prefix[start] + self.max_tokens, side="right")) - 1
+            cut = min(max(cut, start + 1), end)
+            pieces.append(_Piece(start, cut, int(prefix[cut] - prefix[start]), STRENGTH_CLAUSE))
+            start = cut
+
+    @staticmethod
+    def _strength(boundary: str) -> int:
+        newlines = boundary.count("\n")
+        if boundary[0] != "\n":
+            return STRENGTH_SENTENCE_NEWLINE if newlines else STRENGTH_SENTENCE
+        if newlines >= 3:
+            return STRENGTH_SECTION
+        return STRENGTH_PARAGRAPH if newlines == 2 else STRENGTH_NEWLINE
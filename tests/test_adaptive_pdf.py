@@ -0,0 +1,130 @@
+import asyncio
+from dataclasses import dataclass
+
+import pytest
+
+from src.services.adaptive_pdf import MARKER, TEXT_LAYER, AdaptivePDFExtractor
+from src.services.pdf_service import PDFService
+
+GOOD = "第一条 进口货物的收货人应当自运输工具申报进境之日起十四日内向海关申报。" * 2
+ENGLISH = "Integrated circuits, processors and controllers, whether or not combined with memories."
+SCANNED = "12"
+GARBLED = "�" * 30 + "报关"
+
+
+@dataclass
+class _Page:
+    text: str
+    backend: str
+    needs_ocr: bool
+
+
+class _Repository:
+    """内存中的逐页缓存（接口同 PDFRepository.get_pages / save_pages）"""
+
+    def __init__(self, pages=None):
+        self.pages = dict(pages or {})
+        self.saved = []
+
+    async def get_pages(self, file_hash):
+        return dict(self.pages)
+
+    async def save_pages(self, file_hash, pages):
+        pages = list(pages)
+        self.saved.append(pages)
+        for index, text, backend, needs_ocr in pages:
+            self.pages[index] = _Page(text, backend, needs_ocr)
+
+
+class _Ocr:
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+
+    def extract_pages(self, pdf_path, indexes):
+        self.calls.append(list(indexes))
+        if self.fail:
+            raise RuntimeError("marker failed")
+        return {index: f"OCR 第{index}页" for index in indexes}
+
+
+def _extractor(repository=None, ocr=None, batch=8):
+    extractor = AdaptivePDFExtractor(PDFService.__new__(PDFService), repository, ocr_batch_pages=batch)
+    if ocr is None:
+        extractor._ocr_unavailable = True
+    else:
+        extractor._ocr = ocr
+    return extractor
+
+
+def _refine(extractor, pages):
+    return asyncio.run(extractor.refine("a.pdf", "hash", pages))
+
+
+@pytest.mark.parametrize("text,needs_ocr", [
+    (GOOD, False), (ENGLISH, False), (SCANNED, True), ("", True), (GARBLED, True), ("※" * 40, True)
+])
+def test_page_needs_ocr(text, needs_ocr):
+    assert PDFService.page_needs_ocr(text) is needs_ocr
+
+
+def test_only_failing_pages_are_ocred_in_batches():
+    ocr, repository = _Ocr(), _Repository()
+    result = _refine(_extractor(repository, ocr, batch=2), [GOOD, SCANNED, GOOD, SCANNED, GARBLED])
+
+    assert ocr.calls == [[1, 3], [4]]
+    assert result.backends == {TEXT_LAYER: 2, MARKER: 3}
+    assert result.complete and result.cached_pages == 0
+    assert result.text.split("\n\n") == [GOOD, "OCR 第1页", GOOD, "OCR 第3页", "OCR 第4页"]
+    assert {index: page.needs_ocr for index, page in repository.pages.items()} == {i: False for i in range(5)}
+
+
+def test_cached_pages_are_reused_without_ocr():
+    repository = _Repository()
+    _refine(_extractor(repository, _Ocr()), [GOOD, SCANNED])
+
+    ocr = _Ocr()
+    result = _refine(_extractor(repository, ocr), [GOOD, SCANNED])
+
+    assert ocr.calls == []
+    assert result.cached_pages == 2
+    assert result.text.split("\n\n") == [GOOD, "OCR 第1页"]
+
+
+def test_pages_stay_pending_without_ocr_and_are_retried_later():
+    repository = _Repository()
+    result = _refine(_extractor(repository), [GOOD, SCANNED])
+
+    assert result.pending_ocr == 1 and not result.complete
+    assert result.text.split("\n\n") == [GOOD, SCANNED]
+    assert repository.pages[1].needs_ocr
+
+    # OCR 仍不可用：沿用缓存，不重复写入
+    repository.saved.clear()
+    result = _refine(_extractor(repository), [GOOD, SCANNED])
+    assert result.pending_ocr == 1 and result.cached_pages == 2
+    assert repository.saved == []
+
+    # OCR 可用后重试待处理的页
+    ocr = _Ocr()
+    result = _refine(_extractor(repository, ocr), [GOOD, SCANNED])
+    assert ocr.calls == [[1]]
+    assert result.complete
+    assert not repository.pages[1].needs_ocr
+
+
+def test_failed_ocr_batch_keeps_text_layer_and_marks_pending():
+    repository = _Repository()
+    result = _refine(_extractor(repository, _Ocr(fail=True)), [SCANNED, GOOD])
+
+    assert result.pending_ocr == 1
+    assert result.backends == {TEXT_LAYER: 2}
+    assert repository.pages[0].needs_ocr
+
+
+def test_ocr_is_not_loaded_when_every_page_passes():
+    extractor = AdaptivePDFExtractor(PDFService.__new__(PDFService), None)
+    result = _refine(extractor, [GOOD, ENGLISH])
+
+    assert extractor._ocr is None and not extractor._ocr_unavailable
+    assert result.complete and result.backends == {TEXT_LAYER: 2}
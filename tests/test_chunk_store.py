@@ -0,0 +1,70 @@
+import threading
+
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_core.documents import Document
+
+from src.services.chunk_store import (
+    IdentityIdMap, SQLiteDocstore, count_documents, get_documents, iter_documents, write_chunk_db
+)
+
+
+def _docs(count):
+    return {i: Document(page_content=f"第{i}条", metadata={"chunk_id": i, "source": "办法.txt"}) for i in range(count)}
+
+
+def _sqlite_store(tmp_path, docs):
+    write_chunk_db(tmp_path, docs.items())
+    return SQLiteDocstore(tmp_path / "chunks.db")
+
+
+def test_search_and_missing_id(tmp_path):
+    store = _sqlite_store(tmp_path, _docs(3))
+    doc = store.search(2)
+    assert doc.page_content == "第2条" and doc.metadata == {"chunk_id": 2, "source": "办法.txt"}
+    assert store.search(99) == "ID 99 not found."
+
+
+def test_mget_spans_query_batches(tmp_path):
+    docs = _docs(SQLiteDocstore.QUERY_BATCH * 2 + 7)
+    store = _sqlite_store(tmp_path, docs)
+    wanted = list(range(0, len(docs), 3)) + [len(docs) + 5]
+    result = store.mget(wanted)
+    assert sorted(result) == wanted[:-1]
+    assert all(result[i].page_content == docs[i].page_content for i in result)
+
+
+def test_helpers_behave_the_same_for_both_stores(tmp_path):
+    docs = _docs(5)
+    for store in (_sqlite_store(tmp_path, docs), InMemoryDocstore(dict(docs))):
+        assert count_documents(store) == 5
+        assert [i for i, _ in iter_documents(store)] == [0, 1, 2, 3, 4]
+        assert {i: d.page_content for i, d in get_documents(store, [4, 1, 42]).items()} == {4: "第4条", 1: "第1条"}
+
+
+def test_identity_id_map(tmp_path):
+    store = _sqlite_store(tmp_path, {i: d for i, d in _docs(6).items() if i % 2 == 0})
+    id_map = IdentityIdMap(store)
+    assert id_map[4] == 4 and id_map.get(-1) is None
+    assert list(id_map) == [0, 2, 4] and len(id_map) == 3
+
+
+def test_each_thread_uses_its_own_connection(tmp_path):
+    store = _sqlite_store(tmp_path, _docs(50))
+    errors, connections = [], set()
+    barrier = threading.Barrier(4)
+
+    def read():
+        try:
+            connections.add(id(store._connection()))
+            for i in range(50):
+                assert store.search(i).page_content == f"第{i}条"
+            barrier.wait(5)  # 所有线程的连接同时存活，id 不会被复用
+        except Exception as e:  # pragma: no cover - 失败时在主线程断言
+            errors.append(e)
+
+    threads = [threading.Thread(target=read) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors and len(connections) == 4
@@ -0,0 +1,97 @@
+from langchain_core.documents import Document
+
+from src.services.context_stitcher import stitch_neighbors, stitch_text
+
+TEXT = "".join(f"第{i}条规定的内容。" for i in range(40))
+
+
+def _chunks(file_path="a.txt", first_id=0, size=30, overlap=5, text=TEXT):
+    """按 KnowledgeBase._tag_chunks 的方式生成带偏移与相邻 id 的 chunk"""
+    spans = []
+    start = 0
+    while start < len(text):
+        end = min(start + size, len(text))
+        spans.append((start, end))
+        if end == len(text):
+            break
+        start = end - overlap
+    ids = list(range(first_id, first_id + len(spans)))
+    docs = {}
+    for position, (chunk_id, (start, end)) in enumerate(zip(ids, spans)):
+        docs[chunk_id] = Document(page_content=text[start:end], metadata={
+            "chunk_id": chunk_id, "file_path": file_path, "source": file_path,
+            "char_start": start, "char_end": end, "chunk_index": position,
+            "prev_id": ids[position - 1] if position > 0 else None,
+            "next_id": ids[position + 1] if position + 1 < len(ids) else None
+        })
+    return docs
+
+
+def _fetch(store, calls=None):
+    def fetch(chunk_ids):
+        if calls is not None:
+            calls.append(list(chunk_ids))
+        return {chunk_id: store[chunk_id] for chunk_id in chunk_ids if chunk_id in store}
+    return fetch
+
+
+def test_stitch_text_removes_overlap():
+    docs = _chunks()
+    assert stitch_text([docs[0], docs[1], docs[2]]) == TEXT[:docs[2].metadata["char_end"]]
+
+
+def test_stitch_text_joins_unrelated_chunks_with_newline():
+    a = Document(page_content="甲", metadata={"source": "a.txt", "char_start": 0, "char_end": 1})
+    b = Document(page_content="乙", metadata={"source": "b.txt", "char_start": 1, "char_end": 2})
+    assert stitch_text([a, b]) == "甲\n乙"
+
+
+def test_expands_hit_on_both_sides_and_matches_source_text():
+    docs = _chunks()
+    calls = []
+    [(doc, score)] = stitch_neighbors([(docs[5], 0.9)], _fetch(docs, calls), max_chars=10_000, max_neighbors=2)
+
+    assert doc.metadata["chunk_ids"] == [3, 4, 5, 6, 7]
+    assert doc.page_content == TEXT[doc.metadata["char_start"]:doc.metadata["char_end"]]
+    assert doc.metadata["chunk_id"] == 5 and score == 0.9
+    # 每一轮只批量读取一次
+    assert len(calls) == 2
+
+
+def test_adjacent_hits_merge_keeping_best_rank_and_score():
+    docs = _chunks()
+    results = stitch_neighbors([(docs[8], 0.5), (docs[7], 0.8)], _fetch(docs), max_chars=10_000, max_neighbors=0)
+
+    assert len(results) == 1
+    doc, score = results[0]
+    assert doc.metadata["chunk_ids"] == [7, 8]
+    assert doc.metadata["chunk_id"] == 8  # 排名最靠前的命中
+    assert score == 0.8
+
+
+def test_budget_limits_expansion_but_keeps_hits():
+    docs = _chunks()
+    results = stitch_neighbors([(docs[2], 0.9), (docs[10], 0.7)], _fetch(docs), max_chars=10, max_neighbors=2)
+
+    assert [doc.metadata["chunk_ids"] for doc, _ in results] == [[2], [10]]
+    assert [doc.page_content for doc, _ in results] == [docs[2].page_content, docs[10].page_content]
+
+
+def test_neighbors_from_other_files_are_rejected():
+    docs = _chunks()
+    other = _chunks(file_path="b.txt", first_id=1000)
+    # 索引版本切换后 next_id 指向了其他文件的 chunk
+    store = dict(docs)
+    store[1] = other[1001]
+    [(doc, _)] = stitch_neighbors([(docs[0], 1.0)], _fetch(store), max_chars=10_000, max_neighbors=2)
+
+    assert doc.metadata["chunk_ids"] == [0]
+
+
+def test_results_without_chunk_id_pass_through_in_rank_order():
+    docs = _chunks()
+    legacy = Document(page_content="旧版索引片段", metadata={"source": "old.txt"})
+    results = stitch_neighbors([(legacy, 0.9), (docs[5], 0.8)], _fetch(docs), max_chars=10_000, max_neighbors=1)
+
+    assert results[0] == (legacy, 0.9)
+    assert results[1][0].metadata["chunk_ids"] == [4, 5, 6]
@@ -0,0 +1,117 @@
+import multiprocessing
+import os
+import sqlite3
+
+import numpy as np
+import pytest
+
+from src.services.embedding_cache import CachedEmbeddings, EmbeddingCache
+
+DIM = 4
+
+
+def _vector(text):
+    seed = int(EmbeddingCache.text_hash(text)[:8], 16)
+    return np.random.default_rng(seed).standard_normal(DIM).astype("float32").tolist()
+
+
+class _CountingEmbeddings:
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [_vector(t) for t in texts]
+
+    def embed_query(self, text):
+        return _vector(text)
+
+
+def _cache(root, **kwargs):
+    return EmbeddingCache(root, "test-model", normalize=True, **kwargs)
+
+
+def test_put_then_get_round_trip(tmp_path):
+    cache = _cache(tmp_path)
+    cache.put_many(["甲", "乙"], [_vector("甲"), _vector("乙")])
+    got = cache.get_many(["乙", "丙", "甲"])
+    assert got[1] is None
+    assert np.allclose(got[0], _vector("乙")) and np.allclose(got[2], _vector("甲"))
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_cached_embeddings_only_computes_misses(tmp_path):
+    base = _CountingEmbeddings()
+    embeddings = CachedEmbeddings(base, _cache(tmp_path))
+    first = embeddings.embed_documents(["a", "b", "a"])
+    second = embeddings.embed_documents(["b", "c"])
+    assert base.calls == [["a", "b"], ["c"]]
+    assert np.allclose(first[2], _vector("a")) and np.allclose(second[0], _vector("b"))
+
+
+def test_reads_do_not_write_sqlite_until_next_put(tmp_path):
+    cache = _cache(tmp_path)
+    cache.put_many(["a"], [_vector("a")])
+    db = tmp_path / cache.cache_dir.name / "index.db"
+    before = sqlite3.connect(str(db)).execute("SELECT last_used FROM embeddings").fetchone()[0]
+
+    cache.get_many(["a"])
+    assert sqlite3.connect(str(db)).execute("SELECT last_used FROM embeddings").fetchone()[0] == before
+
+    cache.put_many(["b"], [_vector("b")])
+    after = dict(sqlite3.connect(str(db)).execute("SELECT text_hash, last_used FROM embeddings"))
+    assert after[EmbeddingCache.text_hash("a")] > before
+
+
+def test_partial_row_is_truncated_on_open(tmp_path):
+    cache = _cache(tmp_path)
+    cache.put_many(["a", "b"], [_vector("a"), _vector("b")])
+    with open(cache.vectors_path, "ab") as f:
+        f.write(b"\x00" * 6)  # 写入中途崩溃
+
+    reopened = _cache(tmp_path)
+    assert os.path.getsize(reopened.vectors_path) == 2 * DIM * 4
+    reopened.put_many(["c"], [_vector("c")])
+    got = reopened.get_many(["a", "b", "c"])
+    assert all(np.allclose(v, _vector(t)) for v, t in zip(got, "abc"))
+
+
+def test_eviction_keeps_recently_used_rows(tmp_path):
+    cache = _cache(tmp_path, max_entries=10)
+    texts = [f"t{i}" for i in range(10)]
+    cache.put_many(texts, [_vector(t) for t in texts])
+    cache.get_many(["t0"])  # t0 最近使用，不应被淘汰
+    cache.put_many(["new"], [_vector("new")])
+
+    got = dict(zip(texts + ["new"], cache.get_many(texts + ["new"])))
+    assert cache.evictions == 2
+    assert sum(v is None for v in got.values()) == 2
+    assert got["t0"] is not None and got["new"] is not None
+    assert all(np.allclose(v, _vector(t)) for t, v in got.items() if v is not None)
+
+
+def _worker(root, worker, rounds):
+    cache = _cache(root, max_entries=150)
+    for i in range(rounds):
+        texts = [f"w{worker}-{i}-{j}" for j in range(5)] + [f"shared-{i}"]
+        cache.put_many(texts, [_vector(t) for t in texts])
+        for text, vector in zip(texts, cache.get_many(texts)):
+            if vector is not None and not np.allclose(vector, _vector(text)):
+                raise AssertionError(f"错位的向量: {text}")
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="需要 fork")
+def test_concurrent_processes_share_cache(tmp_path):
+    # 多个进程同时追加、读取并触发淘汰压缩，向量不得错位，SQLite 不得报 database is locked
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=_worker, args=(tmp_path, worker, 40)) for worker in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+    assert [process.exitcode for process in processes] == [0, 0, 0, 0]
+
+    cache = _cache(tmp_path, max_entries=150)
+    texts = [f"shared-{i}" for i in range(40)]
+    got = cache.get_many(texts)
+    assert all(np.allclose(v, _vector(t)) for v, t in zip(got, texts) if v is not None)
@@ -0,0 +1,73 @@
+import numpy as np
+
+from src.services.hs_code_index import HSCodeIndex, extract_hs_codes, extract_query_codes, normalize_code
+
+DOCS = [
+    (1, "8542.31.00 处理器及控制器，申报要素：品名、用途"),
+    (2, "税号 85423900 其他集成电路"),
+    (3, "85.42 集成电路：按功能与封装形式归类"),
+    (4, "8541.10.00 二极管"),
+    (5, "本公告自20250101起施行，不涉及具体商品"),
+]
+
+
+def test_extract_hs_codes_formats():
+    assert extract_hs_codes("0101.2100 改良种用马") == {"01012100"}
+    assert extract_hs_codes("8542.31.00 与 8542.3100.10") == {"85423100", "8542310010"}
+    assert extract_hs_codes("子目 8542.31") == {"854231"}
+    assert extract_hs_codes("税目03.01 与 品目 85.42") == {"0301", "8542"}
+    assert extract_hs_codes("01.01 马、驴、骡") == {"0101"}
+    assert extract_hs_codes("８５４２３１００") == {"85423100"}
+
+
+def test_extract_hs_codes_rejects_dates_prices_and_invalid_chapters():
+    assert extract_hs_codes("自20250101起施行") == set()
+    assert extract_hs_codes("单价 12.50 美元，重量 2.5 千克") == set()
+    assert extract_hs_codes("9901.00.00") == set()
+    assert extract_hs_codes("编号 123456789012") == set()
+
+
+def test_extract_query_codes_accepts_short_prefixes():
+    assert extract_query_codes("税号 8542 需要申报哪些要素") == {"8542"}
+    assert extract_query_codes("HS编码：854231") == {"854231"}
+    assert extract_query_codes("8542 的申报要素") == set()
+
+
+def test_normalize_code():
+    assert normalize_code(" 8542.31.00 ") == "85423100"
+    assert normalize_code("８５４２.３１") == "854231"
+
+
+def test_lookup_orders_exact_then_broader_levels():
+    index = HSCodeIndex.build(DOCS)
+
+    assert index.lookup("8542.31.00") == [(1, 8), (2, 4), (3, 4)]
+    assert index.lookup("85423900") == [(2, 8), (1, 4), (3, 4)]
+    assert index.lookup("8542", limit=2) == [(1, 4), (2, 4)]
+    assert index.lookup("85", min_level=2) == [(1, 2), (2, 2), (3, 2), (4, 2)]
+    assert index.lookup("9") == []
+    assert len(index) == 4
+
+
+def test_lookup_respects_allowed_ids():
+    index = HSCodeIndex.build(DOCS)
+    assert index.lookup("8542.31.00", allowed_ids=np.array([2, 3])) == [(2, 4), (3, 4)]
+
+
+def test_apply_changes_returns_new_index():
+    index = HSCodeIndex.build(DOCS)
+    updated = index.apply_changes({1: DOCS[0][1]}, [(6, "8542.31.00 新版条文")])
+
+    assert updated.lookup("85423100") == [(6, 8), (2, 4), (3, 4)]
+    assert index.lookup("85423100")[0] == (1, 8)
+    assert len(updated) == len(index)
+
+
+def test_save_and_load_round_trip(tmp_path):
+    index = HSCodeIndex.build(DOCS)
+    index.save(tmp_path)
+    loaded = HSCodeIndex.load(tmp_path)
+
+    assert loaded.lookup("8542.31.00") == index.lookup("8542.31.00")
+    assert loaded.stats() == index.stats()
+    assert HSCodeIndex.load(tmp_path / "missing") is None
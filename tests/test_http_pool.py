@@ -0,0 +1,75 @@
+import asyncio
+
+import httpx
+import pytest
+
+from src.services import http_pool
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """记录退避等待时间，不真正等待"""
+    waited = []
+
+    async def sleep(delay):
+        waited.append(delay)
+
+    monkeypatch.setattr(http_pool.asyncio, "sleep", sleep)
+    return waited
+
+
+def _client(statuses):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(statuses[min(len(calls), len(statuses)) - 1])
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler)), calls
+
+
+def test_retries_5xx_with_exponential_backoff(sleeps):
+    client, calls = _client([502, 500, 200])
+    response = asyncio.run(http_pool.post_with_retry(client, "https://llm.test/v1", json={}))
+    assert response.status_code == 200 and len(calls) == 3
+    assert sleeps == [http_pool.STATUS_BACKOFF, http_pool.STATUS_BACKOFF * 2]
+
+
+def test_returns_last_response_when_retries_exhausted(sleeps):
+    client, calls = _client([504])
+    response = asyncio.run(http_pool.post_with_retry(client, "https://llm.test/v1"))
+    assert response.status_code == 504
+    assert len(calls) == http_pool.STATUS_RETRIES + 1
+    assert len(sleeps) == http_pool.STATUS_RETRIES
+
+
+@pytest.mark.parametrize("status", [200, 400, 429, 503])
+def test_other_statuses_are_not_retried(sleeps, status):
+    client, calls = _client([status, 200])
+    response = asyncio.run(http_pool.post_with_retry(client, "https://llm.test/v1"))
+    assert response.status_code == status and len(calls) == 1 and sleeps == []
+
+
+def test_transport_retries_connection_errors():
+    transport = http_pool._transport(verify=True, http2=False)
+    assert transport._pool._retries == http_pool.CONNECT_RETRIES
+
+
+def test_one_client_per_loop_and_verify_flag_with_explicit_proxies(monkeypatch):
+    monkeypatch.setattr(http_pool.settings, "HTTP_PROXY", None)
+    monkeypatch.setattr(http_pool.settings, "HTTPS_PROXY", "http://proxy.test:8080")
+    monkeypatch.setattr(http_pool.settings, "LLM_HTTP2", False)
+
+    async def clients():
+        first, again, insecure = http_pool.get_async_client(), http_pool.get_async_client(), http_pool.get_async_client(verify=False)
+        mounted = {pattern.pattern for pattern in first._mounts}
+        await http_pool.aclose_all()
+        return first, again, insecure, mounted
+
+    first, again, insecure, mounted = asyncio.run(clients())
+    assert first is again and first is not insecure
+    assert "https://" in mounted and "http://" not in mounted
+    assert first.is_closed and insecure.is_closed
+
+    other_loop_client, *_ = asyncio.run(clients())
+    assert other_loop_client is not first
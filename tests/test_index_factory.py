@@ -0,0 +1,33 @@
+import faiss
+import numpy as np
+import pytest
+
+from src.services import index_factory
+
+DIM = 16
+
+
+@pytest.fixture(scope="module")
+def vectors():
+    rng = np.random.default_rng(0)
+    return rng.standard_normal((500, DIM)).astype("float32")
+
+
+@pytest.mark.parametrize("index_type", ["flat_ip", "sq8", "hnsw", "ivf_flat"])
+def test_mmap_load_matches_plain_load(tmp_path, vectors, index_type):
+    index = index_factory.create_index(index_type, vectors, {"nlist": 8})
+    index.add_with_ids(vectors, np.arange(len(vectors), dtype="int64"))
+    path = str(tmp_path / "index.faiss")
+    faiss.write_index(index, path)
+
+    mapped = faiss.read_index(path, index_factory.mmap_read_flags(index_type))
+    plain = faiss.read_index(path)
+    assert mapped.ntotal == len(vectors)
+    assert (mapped.search(vectors[:5], 5)[1] == plain.search(vectors[:5], 5)[1]).all()
+
+
+def test_ivf_never_combines_mmap_and_ifc():
+    assert index_factory.mmap_read_flags("ivf_flat") == faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+    ifc = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+    if ifc is not None:
+        assert index_factory.mmap_read_flags("flat_ip") == ifc | faiss.IO_FLAG_READ_ONLY
@@ -0,0 +1,133 @@
+import os
+import time
+
+from src.services.index_manifest import IndexManifest, RACY_WINDOW_NS
+from src.services.pdf_service import PDFService
+
+# 早于 RACY_WINDOW_NS 的修改时间，record 时会记录 mtime_ns，走文件状态快速路径
+OLD_MTIME = time.time() - 3600
+
+
+def _write(path, text, mtime=OLD_MTIME):
+    path.write_text(text, encoding="utf-8")
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def _manifest(data_root, files, chunk_ids=None, duplicate_of=None):
+    """按文件当前内容生成清单（模拟上一次构建）"""
+    manifest = IndexManifest(embedding_model="m", index_type="flat_ip")
+    for name, path in files.items():
+        ids = (chunk_ids or {}).get(name) or manifest.allocate_ids(1)
+        manifest.record(
+            IndexManifest.relative_key(path, data_root), path,
+            PDFService.calculate_file_hash(str(path)), ids, (duplicate_of or {}).get(name, ())
+        )
+    return manifest
+
+
+def test_diff_classifies_added_changed_unchanged_deleted(tmp_path):
+    a = _write(tmp_path / "a.txt", "甲")
+    b = _write(tmp_path / "b.txt", "乙")
+    gone = _write(tmp_path / "gone.txt", "丙")
+    manifest = _manifest(tmp_path, {"a": a, "b": b, "gone": gone})
+
+    _write(b, "乙（修订）")
+    gone.unlink()
+    new = _write(tmp_path / "new.txt", "丁")
+
+    diff = manifest.diff([a, b, new], tmp_path)
+
+    assert diff.unchanged == [a]
+    assert diff.changed == [b]
+    assert diff.added == [new]
+    assert diff.deleted == ["gone.txt"]
+    assert diff.to_embed == [new, b]
+
+
+def test_stat_fast_path_skips_hashing_unchanged_files(tmp_path):
+    a = _write(tmp_path / "a.txt", "甲")
+    manifest = _manifest(tmp_path, {"a": a})
+
+    diff = manifest.diff([a], tmp_path)
+    assert (diff.stat_hits, diff.hashed_files) == (1, 0)
+
+    diff = manifest.diff([a], tmp_path, stat_fast_path=False)
+    assert (diff.stat_hits, diff.hashed_files) == (0, 1)
+    assert diff.unchanged == [a]
+
+
+def test_touched_file_is_rehashed_but_not_reembedded(tmp_path):
+    a = _write(tmp_path / "a.txt", "甲")
+    manifest = _manifest(tmp_path, {"a": a})
+    os.utime(a, (OLD_MTIME + 60, OLD_MTIME + 60))
+
+    diff = manifest.diff([a], tmp_path)
+
+    assert diff.hashed_files == 1
+    assert diff.unchanged == [a]
+    assert diff.touched == ["a.txt"]
+    # 清单中的文件状态已更新，下一次直接走快速路径
+    assert manifest.diff([a], tmp_path).stat_hits == 1
+
+
+def test_recently_modified_file_is_not_trusted_by_stat(tmp_path):
+    a = _write(tmp_path / "a.txt", "甲", mtime=time.time())
+    manifest = _manifest(tmp_path, {"a": a})
+
+    assert manifest.files["a.txt"].mtime_ns == 0
+    assert time.time_ns() - a.stat().st_mtime_ns < RACY_WINDOW_NS
+    assert manifest.diff([a], tmp_path).hashed_files == 1
+
+
+def test_files_with_duplicates_of_changed_files_are_reprocessed(tmp_path):
+    a = _write(tmp_path / "a.txt", "甲")
+    b = _write(tmp_path / "b.txt", "乙")
+    c = _write(tmp_path / "c.txt", "丙")
+    # b 的近重复 chunk 并入了 a 的 chunk 0，c 的并入了 b 的 chunk 1（间接依赖 a）
+    manifest = _manifest(
+        tmp_path, {"a": a, "b": b, "c": c},
+        chunk_ids={"a": [0], "b": [1], "c": [2]},
+        duplicate_of={"b": [0], "c": [1]}
+    )
+    assert manifest.dependents({"a.txt"}) == {"b.txt", "c.txt"}
+    assert manifest.dependents({"c.txt"}) == set()
+
+    _write(a, "甲（修订）")
+    diff = manifest.diff([a, b, c], tmp_path)
+
+    assert diff.changed == [a, b, c]
+    assert diff.unchanged == []
+
+
+def test_deleted_file_dependents_are_reprocessed(tmp_path):
+    a = _write(tmp_path / "a.txt", "甲")
+    b = _write(tmp_path / "b.txt", "乙")
+    manifest = _manifest(tmp_path, {"a": a, "b": b}, chunk_ids={"a": [0], "b": [1]}, duplicate_of={"b": [0]})
+    a.unlink()
+
+    diff = manifest.diff([b], tmp_path)
+
+    assert diff.deleted == ["a.txt"]
+    assert diff.changed == [b]
+
+
+def test_stat_sidecar_is_applied_only_for_matching_content(tmp_path):
+    a = _write(tmp_path / "a.txt", "甲")
+    index_dir = tmp_path / "index"
+    index_dir.mkdir()
+    manifest = _manifest(tmp_path, {"a": a})
+    manifest.save(index_dir)
+
+    os.utime(a, (OLD_MTIME + 60, OLD_MTIME + 60))
+    manifest.diff([a], tmp_path)
+    manifest.save_stat_sidecar(index_dir)
+
+    loaded = IndexManifest.load(index_dir)
+    assert loaded.diff([a], tmp_path).stat_hits == 1
+
+    _write(a, "甲（修订）", mtime=OLD_MTIME + 120)
+    changed = _manifest(tmp_path, {"a": a})
+    changed.save(index_dir)
+    # 附属文件中的状态对应旧内容，不能叠加到新记录上
+    assert IndexManifest.load(index_dir).files["a.txt"].mtime_ns == changed.files["a.txt"].mtime_ns
@@ -0,0 +1,123 @@
+import threading
+
+from src.services.index_versions import BUILDING_SUFFIX, IndexVersions
+from src.services.knowledge_base import IndexSnapshot, KnowledgeBase
+
+
+def _publish(versions, content=b"vectors", info=None):
+    build_dir = versions.new_build_dir()
+    (build_dir / "index.faiss").write_bytes(content)
+    (build_dir / "manifest.json").write_text("{}", encoding="utf-8")
+    return versions.publish(build_dir, info=info)
+
+
+def test_publish_switches_current_pointer(tmp_path):
+    versions = IndexVersions(tmp_path)
+    assert versions.current() is None and versions.pointer_stamp() is None
+
+    first = _publish(versions, info={"ntotal": 1})
+    stamp = versions.pointer_stamp()
+    second = _publish(versions, b"vectors-2")
+
+    assert not first.name.endswith(BUILDING_SUFFIX)
+    assert versions.current() == second
+    assert versions.pointer_stamp() != stamp
+    assert versions.candidates() == [second, first]
+
+
+def test_building_dirs_are_never_candidates(tmp_path):
+    versions = IndexVersions(tmp_path)
+    published = _publish(versions)
+    versions.new_build_dir()
+    assert versions.candidates() == [published]
+
+
+def test_verify_detects_changed_files(tmp_path):
+    versions = IndexVersions(tmp_path)
+    version_dir = _publish(versions, b"abcdef")
+    assert versions.verify(version_dir) and versions.verify(version_dir, deep=False)
+
+    (version_dir / "index.faiss").write_bytes(b"abcdeX")  # 大小不变，内容变化
+    assert versions.verify(version_dir, deep=False)
+    assert not versions.verify(version_dir)
+
+    (version_dir / "index.faiss").write_bytes(b"abc")
+    assert not versions.verify(version_dir, deep=False)
+
+
+def test_cleanup_keeps_current_and_recent_versions(tmp_path):
+    versions = IndexVersions(tmp_path, keep_versions=2)
+    published = [_publish(versions) for _ in range(4)]
+    remaining = sorted(p.name for p in versions.versions_dir.iterdir())
+    assert remaining == sorted(p.name for p in published[-2:])
+    assert versions.current() == published[-1]
+
+
+def test_legacy_flat_layout_is_loadable_until_first_publish(tmp_path):
+    (tmp_path / "index.faiss").write_bytes(b"legacy")
+    versions = IndexVersions(tmp_path)
+    assert versions.current() == tmp_path and versions.verify(tmp_path)
+
+    published = _publish(versions)
+    assert versions.current() == published
+    assert not (tmp_path / "index.faiss").exists()
+
+
+def _following_kb(root):
+    kb = KnowledgeBase.__new__(KnowledgeBase)
+    kb.index_versions = IndexVersions(root)
+    kb.init_state = "ready"
+    kb.is_rebuilding = False
+    kb._index_guard = threading.Lock()
+    kb._follow_lock = threading.Lock()
+    kb._pointer_stamp = None
+    kb._index = IndexSnapshot(None, None, version_dir=kb.index_versions.current())
+    kb.loads = []
+
+    def load_index():
+        kb.loads.append(kb.index_versions.current())
+        return IndexSnapshot(None, None, version_dir=kb.index_versions.current())
+
+    kb._load_index = load_index
+    return kb
+
+
+def test_reader_follows_version_published_by_another_process(tmp_path):
+    publisher = IndexVersions(tmp_path)
+    first = _publish(publisher)
+    kb = _following_kb(tmp_path)
+
+    with kb._reading_index() as snapshot:
+        assert snapshot.version_dir == first
+    assert kb.loads == []  # 指针未变化，不重新加载
+
+    second = _publish(publisher)
+    with kb._reading_index() as snapshot:
+        assert snapshot.version_dir == second
+    with kb._reading_index():
+        pass
+    assert kb.loads == [second]
+
+
+def test_reader_keeps_its_snapshot_during_swap(tmp_path):
+    publisher = IndexVersions(tmp_path)
+    first = _publish(publisher)
+    kb = _following_kb(tmp_path)
+
+    with kb._reading_index() as snapshot:
+        second = _publish(publisher)
+        with kb._reading_index() as newer:
+            assert newer.version_dir == second
+        assert snapshot.version_dir == first and snapshot.readers == 1
+    assert snapshot.readers == 0 and kb.index_version == second
+
+
+def test_no_follow_while_rebuilding(tmp_path):
+    publisher = IndexVersions(tmp_path)
+    first = _publish(publisher)
+    kb = _following_kb(tmp_path)
+    kb.is_rebuilding = True
+    _publish(publisher)
+    with kb._reading_index() as snapshot:
+        assert snapshot.version_dir == first
+    assert kb.loads == []
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from src.services import index_factory
+from src.services.chunk_store import SQLiteDocstore
+from src.services.index_versions import IndexVersions
+from src.services.knowledge_base import KnowledgeBase
+
+DIM = 8
+
+
+def _kb(tmp_path, storage):
+    kb = KnowledgeBase.__new__(KnowledgeBase)
+    kb.index_type = "flat_ip"
+    kb.index_params = {"storage": storage}
+    kb.index_versions = IndexVersions(tmp_path / "faiss_index_local")
+    kb._deferred_embeddings = DeterministicFakeEmbedding(size=DIM)
+    return kb
+
+
+def _store(count=20):
+    vectors = np.random.default_rng(0).standard_normal((count, DIM)).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    index = index_factory.create_index("flat_ip", vectors, {})
+    chunk_ids = np.arange(100, 100 + count, dtype="int64")
+    index.add_with_ids(vectors, chunk_ids)
+    docs = {int(i): Document(page_content=f"第{i}条", metadata={"chunk_id": int(i), "source": "a.txt"}) for i in chunk_ids}
+    return FAISS(
+        embedding_function=DeterministicFakeEmbedding(size=DIM),
+        index=index,
+        docstore=InMemoryDocstore(docs),
+        index_to_docstore_id={chunk_id: chunk_id for chunk_id in docs}
+    ), vectors
+
+
+def test_mmap_version_has_no_pickle_and_loads_both_ways(tmp_path):
+    store, vectors = _store()
+    version_dir = _kb(tmp_path, "mmap")._save_index(store)
+    assert not (version_dir / "index.pkl").exists()
+    assert (version_dir / "index.faiss").exists() and (version_dir / "chunks.db").exists()
+
+    mapped = _kb(tmp_path, "mmap")._load_vector_store(version_dir, "flat_ip")
+    assert isinstance(mapped.docstore, SQLiteDocstore)
+    in_memory = _kb(tmp_path, "memory")._load_vector_store(version_dir, "flat_ip")
+    assert isinstance(in_memory.docstore, InMemoryDocstore)
+
+    for loaded in (mapped, in_memory):
+        _, ids = loaded.index.search(vectors[:1], 1)
+        assert ids[0][0] == 100
+        assert loaded.docstore.search(int(ids[0][0])).page_content == "第100条"
+
+
+def test_memory_version_keeps_pickle_only(tmp_path):
+    store, _ = _store()
+    version_dir = _kb(tmp_path, "memory")._save_index(store)
+    assert (version_dir / "index.pkl").exists()
+    assert not (version_dir / "chunks.db").exists()
+    loaded = _kb(tmp_path, "memory")._load_vector_store(version_dir, "flat_ip")
+    assert loaded.docstore.search(105).page_content == "第105条"
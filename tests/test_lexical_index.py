@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from src.services.lexical_index import LexicalIndex, tokenize
+
+DOCS = [
+    (1, "集成电路 8542.31.00 处理器及控制器"),
+    (2, "二极管、晶体管及类似的半导体器件"),
+    (3, "集成电路的申报要素包括品牌类型与封装形式"),
+    (4, "Integrated circuits and processors"),
+]
+
+
+def test_tokenize_bigrams_numbers_and_latin():
+    assert tokenize("集成电路") == ["集成", "成电", "电路"]
+    assert tokenize("税 8542.31.00") == ["税", "8542.31.00", "85423100"]
+    assert tokenize("ＣＰＵ Processor") == ["cpu", "processor"]
+
+
+def test_search_ranks_matching_documents():
+    index = LexicalIndex.build(DOCS)
+    results = index.search("集成电路 处理器")
+
+    assert results[0][0] == 1
+    assert {chunk_id for chunk_id, _ in results} == {1, 3}
+    assert all(a[1] >= b[1] for a, b in zip(results, results[1:]))
+
+
+def test_search_matches_code_with_or_without_dots():
+    index = LexicalIndex.build(DOCS)
+    assert index.search("85423100")[0][0] == 1
+    assert index.search("8542.31.00")[0][0] == 1
+
+
+def test_search_k_and_allowed_ids():
+    index = LexicalIndex.build(DOCS)
+    assert len(index.search("集成电路", k=1)) == 1
+    assert [chunk_id for chunk_id, _ in index.search("集成电路", allowed_ids=np.array([3, 4]))] == [3]
+    assert index.search("集成电路", allowed_ids=np.array([2])) == []
+    assert index.search("集成电路", allowed_ids=np.empty(0, dtype="int64")) == []
+    assert index.search("无关词语") == []
+
+
+def test_apply_changes_matches_full_rebuild():
+    index = LexicalIndex.build(DOCS)
+    updated = index.apply_changes({1: DOCS[0][1], 4: DOCS[3][1]}, [(0, "集成电路存储器"), (5, "processors 8542.32")])
+    rebuilt = LexicalIndex.build([DOCS[1], DOCS[2], (0, "集成电路存储器"), (5, "processors 8542.32")])
+
+    assert updated.doc_ids.tolist() == [0, 2, 3, 5]
+    for query in ("集成电路", "processors", "85423200", "品牌类型"):
+        assert updated.search(query) == pytest.approx(rebuilt.search(query))
+    # 旧实例不受影响
+    assert len(index) == 4 and index.search("85423100")[0][0] == 1
+
+
+def test_save_and_load_round_trip(tmp_path):
+    index = LexicalIndex.build(DOCS, k1=1.5, b=0.6)
+    index.save(tmp_path)
+    loaded = LexicalIndex.load(tmp_path)
+
+    assert (loaded.k1, loaded.b) == (1.5, 0.6)
+    assert loaded.search("集成电路 处理器") == pytest.approx(index.search("集成电路 处理器"))
+    assert loaded.stats() == index.stats()
@@ -0,0 +1,69 @@
+import asyncio
+import json
+from collections import Counter
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from src.services import http_pool
+from src.services.llm_service import LLMService
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    """provider = gemini 的 LLMService，请求经 MockTransport 返回固定响应并记录请求体"""
+    service = LLMService.__new__(LLMService)
+    service.provider = "gemini"
+    service.usage = Counter()
+    requests = []
+
+    def handler(request):
+        requests.append(json.loads(request.content))
+        return httpx.Response(200, json={
+            "candidates": [{"content": {"parts": [{"text": '["x", "单价异常"]'}]}}],
+            "usageMetadata": {"promptTokenCount": 1200, "candidatesTokenCount": 30, "cachedContentTokenCount": 1024}
+        })
+
+    monkeypatch.setattr(http_pool, "get_async_client", lambda verify=True: httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    return service, requests
+
+
+def test_gemini_sends_system_prompt_as_system_instruction(gemini):
+    service, requests = gemini
+    usage = Counter()
+    result = asyncio.run(service.acall_llm("你是海关审单专家", "报关数据：电池", usage=usage))
+
+    assert result == ["x", "单价异常"]
+    assert requests[0]["systemInstruction"] == {"parts": [{"text": "你是海关审单专家"}]}
+    assert requests[0]["contents"] == [{"role": "user", "parts": [{"text": "报关数据：电池"}]}]
+    assert usage == Counter(calls=1, prompt_tokens=1200, completion_tokens=30, cached_tokens=1024)
+    assert service.usage == usage
+
+
+def test_gemini_combined_call_records_cached_tokens(gemini):
+    service, requests = gemini
+    usage = Counter()
+    asyncio.run(service.acall_llm_verdicts("系统", "全部规则", ["R01"], usage=usage))
+    assert "systemInstruction" in requests[0]
+    assert usage["cached_tokens"] == 1024
+
+
+def test_gemini_request_without_system_prompt():
+    _, payload = LLMService.__new__(LLMService)._gemini_request("only user")
+    assert "systemInstruction" not in payload
+
+
+def test_openai_usage_reads_provider_specific_cache_fields():
+    openai = SimpleNamespace(prompt_tokens=100, completion_tokens=5, prompt_tokens_details=SimpleNamespace(cached_tokens=64))
+    deepseek = SimpleNamespace(prompt_tokens=100, completion_tokens=5, prompt_tokens_details=None, prompt_cache_hit_tokens=80)
+    assert LLMService._openai_usage(openai)["cached_tokens"] == 64
+    assert LLMService._openai_usage(deepseek)["cached_tokens"] == 80
+    assert LLMService._openai_usage(None) == Counter()
+
+
+def test_completion_params_keep_system_message_first():
+    service = LLMService.__new__(LLMService)
+    service.model_name = "deepseek-chat"
+    messages = service._completion_params("用户", "系统")["messages"]
+    assert messages == [{"role": "system", "content": "系统"}, {"role": "user", "content": "用户"}]
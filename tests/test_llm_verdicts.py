@@ -0,0 +1,76 @@
+import pytest
+
+from src.services.llm_service import LLMService
+
+RULES = ["R01_BASIC_INFO", "R02_SENSITIVE_GOODS", "R03_PRICE_LOGIC"]
+
+
+@pytest.fixture
+def service():
+    # 解析器不依赖客户端配置，跳过 __init__ 以免创建 HTTP 会话与 SDK 客户端
+    return LLMService.__new__(LLMService)
+
+
+def test_object_array_in_code_block(service):
+    raw = """以下是审查结果：
+```json
+[
+  {"rule_id": "R01_BASIC_INFO", "symbol": "√", "message": "申报要素完整"},
+  {"rule_id": "R02_SENSITIVE_GOODS", "symbol": "x", "message": "涉及两用物项"}
+]
+```
+"""
+    assert service._parse_verdicts(raw, RULES) == {
+        "R01_BASIC_INFO": ["√", "申报要素完整"],
+        "R02_SENSITIVE_GOODS": ["x", "涉及两用物项"]
+    }
+
+
+def test_triples_and_keyed_object(service):
+    triples = '[["R01_BASIC_INFO", "✓", "完整"], ["r03_price_logic", "×", "疑似低报"]]'
+    assert service._parse_verdicts(triples, RULES) == {
+        "R01_BASIC_INFO": ["√", "完整"],
+        "R03_PRICE_LOGIC": ["x", "疑似低报"]
+    }
+
+    keyed = '{"R02_SENSITIVE_GOODS": ["pass", "非敏感商品"], "R03_PRICE_LOGIC": ["风险", "价格异常"]}'
+    assert service._parse_verdicts(keyed, RULES) == {
+        "R02_SENSITIVE_GOODS": ["√", "非敏感商品"],
+        "R03_PRICE_LOGIC": ["x", "价格异常"]
+    }
+
+
+def test_wrapped_results_and_alternate_field_names(service):
+    raw = '{"results": [{"id": "R01_BASIC_INFO", "status": "Đạt", "reason": "đầy đủ"}]}'
+    assert service._parse_verdicts(raw, RULES) == {"R01_BASIC_INFO": ["√", "đầy đủ"]}
+
+    single = '{"rule_id": "R02_SENSITIVE_GOODS", "symbol": "fail", "message": "需许可证"}'
+    assert service._parse_verdicts(single, RULES) == {"R02_SENSITIVE_GOODS": ["x", "需许可证"]}
+
+
+def test_truncated_output_salvages_complete_objects(service):
+    raw = (
+        '[{"rule_id": "R01_BASIC_INFO", "symbol": "√", "message": "完整"},\n'
+        ' {"rule_id": "R02_SENSITIVE_GOODS", "symbol": "x", "message": "涉及两用物项"},\n'
+        ' {"rule_id": "R03_PRICE_LOGIC", "symbol": "√", "mess'
+    )
+    assert service._parse_verdicts(raw, RULES) == {
+        "R01_BASIC_INFO": ["√", "完整"],
+        "R02_SENSITIVE_GOODS": ["x", "涉及两用物项"]
+    }
+
+
+def test_drops_unknown_rules_symbols_and_repeats(service):
+    raw = """[
+  {"rule_id": "R99_UNKNOWN", "symbol": "√", "message": "不在本次规则中"},
+  {"rule_id": "R01_BASIC_INFO", "symbol": "?", "message": "无法识别的符号"},
+  {"rule_id": "R02_SENSITIVE_GOODS", "symbol": "x", "message": "第一条"},
+  {"rule_id": "R02_SENSITIVE_GOODS", "symbol": "√", "message": "重复条目"},
+  {"rule_id": "R03_PRICE_LOGIC", "symbol": "√"}
+]"""
+    assert service._parse_verdicts(raw, RULES) == {"R02_SENSITIVE_GOODS": ["x", "第一条"]}
+
+
+@pytest.mark.parametrize("raw", ["", "模型拒绝回答", "[]", "{}", "```json\n```"])
+def test_unparseable_output_returns_empty(service, raw):
+    assert service._parse_verdicts(raw, RULES) == {}
@@ -0,0 +1,124 @@
+import os
+import subprocess
+import sys
+
+import pytest
+from langchain_core.documents import Document
+
+from src.services.context_stitcher import stitch_neighbors
+from src.services.index_manifest import IndexManifest
+from src.services.knowledge_base import KnowledgeBase
+from src.services.near_duplicates import NearDuplicateDetector, normalize_text, number_key
+
+BASE = (
+    "商品编码 8542.31.00 集成电路，申报要素：1.品名；2.品牌类型；3.出口享惠情况；4.用途；5.功能；"
+    "6.封装形式；7.品牌（中文或外文名称）；8.型号。进口时应如实申报，并提供相关证明材料。"
+)
+
+
+def test_identical_text_after_normalization_is_duplicate():
+    detector = NearDuplicateDetector()
+    assert detector.add("a", BASE) is None
+    # 全角 / 空白 / 标点差异在归一化后消失
+    variant = BASE.replace("，", ",").replace("；", "; ").replace("8542.31.00", "８５４２.３１.００")
+    assert detector.add("b", variant) == "a"
+    assert len(detector) == 1
+
+
+def test_lightly_edited_text_is_duplicate():
+    detector = NearDuplicateDetector(threshold=0.7)
+    detector.add("a", BASE)
+    assert detector.add("b", BASE.replace("并提供相关证明材料", "并提供证明材料")) == "a"
+
+
+def test_different_numbers_are_never_duplicates():
+    """模板化表格行只有 HS 编码 / 税率不同：文字几乎一致，但不是重复"""
+    detector = NearDuplicateDetector(threshold=0.5)
+    detector.add("a", BASE)
+
+    assert detector.add("b", BASE.replace("8542.31.00", "8542.32.00")) is None
+    # 数字相同但顺序不同同样视为不同
+    assert detector.add("c", BASE.replace("1.品名", "2.品名").replace("2.品牌类型", "1.品牌类型")) is None
+    assert len(detector) == 3
+
+
+def test_number_key_ignores_formatting_but_not_values():
+    assert number_key("税率 10%，编码 8542.31.00") == number_key("税率１０％ 编码 8542.31.00")
+    assert number_key("8542.31.00") != number_key("8542.31.10")
+    assert number_key("无数字") == number_key("也没有数字")
+    assert number_key("8542") != number_key("85 42")
+
+
+def test_number_key_is_stable_across_processes():
+    """不依赖进程的哈希种子：各 worker 与前后两次重建得到相同的 key"""
+    code = "from src.services.near_duplicates import number_key; print(number_key('税率 10%，编码 8542.31.00'))"
+    keys = {
+        subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True,
+            env={**os.environ, "PYTHONHASHSEED": seed}
+        ).stdout.strip()
+        for seed in ("1", "2")
+    }
+    assert keys == {str(number_key("税率 10%，编码 8542.31.00"))}
+
+
+def test_unrelated_text_is_not_duplicate():
+    detector = NearDuplicateDetector()
+    detector.add("a", BASE)
+    assert detector.add("b", "纳税义务人应当在货物进境之日起十四日内向海关申报，逾期按规定征收滞报金。") is None
+
+
+def test_duplicate_returns_most_similar_representative():
+    detector = NearDuplicateDetector(threshold=0.5)
+    # 直接 insert：两者彼此也是近重复，add 只会保留先加入的一个
+    for key, text in (("far", BASE + "附注：本条另有说明，适用于特定情形下的申报与查验安排。"), ("near", BASE + "附注。")):
+        detector.insert(key, detector.minhash(text), number_key(text))
+    assert detector.add("query", BASE) == "near"
+
+
+def test_normalize_text_strips_whitespace_and_punctuation():
+    assert normalize_text(" ＡＢＣ，中 文！\n") == "abc中文"
+
+
+def test_bands_must_divide_num_perm():
+    with pytest.raises(ValueError):
+        NearDuplicateDetector(num_perm=64, bands=10)
+
+
+class _Chunker:
+    """文档即 chunk，不再切分"""
+
+    def split_documents(self, docs):
+        return list(docs), 0
+
+
+def test_neighbors_skip_chunks_removed_as_duplicates(tmp_path):
+    kb = KnowledgeBase.__new__(KnowledgeBase)
+    kb.chunker = _Chunker()
+    kb.dedup_config = {"enabled": True, "threshold": 0.8, "num_perm": 64, "bands": 16, "shingle_size": 3}
+    texts = {
+        "a.txt": [f"{BASE}第{i}项附注。" for i in (1, 2, 3)],
+        # b.txt 第二段与 a.txt 第二段重复，去重后 b.txt 只剩首尾两段
+        "b.txt": ["纳税义务人应当在货物进境之日起十四日内向海关申报。" * 3, f"{BASE}第2项附注。", "逾期申报的，由海关按日加收进口货物完税价格万分之五的滞报金。" * 3],
+    }
+    file_documents = {}
+    for key, parts in texts.items():
+        (tmp_path / key).write_text("".join(parts), encoding="utf-8")
+        file_documents[key] = (tmp_path / key, [Document(page_content=part, metadata={"source": key}) for part in parts])
+
+    manifest = IndexManifest(embedding_model="fake", index_type="flat_ip")
+    chunks, _, stats, _ = kb._chunk_files(manifest, file_documents, {key: key for key in texts})
+    assert stats.removed == 1 and stats.cross_file == 1
+
+    store = {chunk.metadata["chunk_id"]: chunk for chunk in chunks}
+    first, last = [chunk for chunk in chunks if chunk.metadata["file_path"] == "b.txt"]
+    assert first.metadata["next_id"] == last.metadata["chunk_id"]
+    assert last.metadata["prev_id"] == first.metadata["chunk_id"]
+    for chunk in chunks:
+        for neighbor in (chunk.metadata["prev_id"], chunk.metadata["next_id"]):
+            assert neighbor is None or neighbor in store
+
+    fetch = lambda chunk_ids: {chunk_id: store[chunk_id] for chunk_id in chunk_ids if chunk_id in store}
+    [(doc, _)] = stitch_neighbors([(last, 1.0)], fetch, max_chars=10_000, max_neighbors=2)
+    assert doc.metadata["chunk_ids"] == [first.metadata["chunk_id"], last.metadata["chunk_id"]]
+    assert doc.page_content == first.page_content + "\n" + last.page_content
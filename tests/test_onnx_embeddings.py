@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+onnx = pytest.importorskip("onnx")
+pytest.importorskip("onnxruntime")
+from onnx import TensorProto, helper, numpy_helper  # noqa: E402
+from tokenizers import Tokenizer, models, pre_tokenizers  # noqa: E402
+
+from src.services.onnx_embeddings import OnnxEmbeddings  # noqa: E402
+
+VOCAB = {"[PAD]": 0, "[UNK]": 1, "[CLS]": 2, "进口": 3, "关税": 4, "申报": 5, "要素": 6}
+HIDDEN = 4
+
+
+@pytest.fixture(scope="module")
+def model_dir(tmp_path_factory):
+    """最小的 "BERT"：last_hidden_state = 词向量表[input_ids]，[CLS] 位置取首个 token 的词向量"""
+    root = tmp_path_factory.mktemp("onnx_model")
+    table = np.random.default_rng(0).standard_normal((len(VOCAB), HIDDEN)).astype(np.float32)
+    graph = helper.make_graph(
+        [helper.make_node("Gather", ["table", "input_ids"], ["last_hidden_state"])],
+        "tiny",
+        [
+            helper.make_tensor_value_info("input_ids", TensorProto.INT64, ["batch", "seq"]),
+            helper.make_tensor_value_info("attention_mask", TensorProto.INT64, ["batch", "seq"]),
+        ],
+        [helper.make_tensor_value_info("last_hidden_state", TensorProto.FLOAT, ["batch", "seq", HIDDEN])],
+        initializer=[numpy_helper.from_array(table, "table")],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    onnx.save(model, str(root / "model.onnx"))
+
+    tokenizer = Tokenizer(models.WordLevel(VOCAB, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    tokenizer.save(str(root / "tokenizer.json"))
+    return root, table
+
+
+def test_cls_pooling_is_normalized_and_order_preserved(model_dir):
+    root, table = model_dir
+    embeddings = OnnxEmbeddings(root, model_file="model.onnx", threads=1, batch_size=2)
+    texts = ["申报 要素 进口", "关税", "进口 关税", "要素"]
+    vectors = np.array(embeddings.embed_documents(texts))
+
+    first_tokens = [VOCAB[text.split()[0]] for text in texts]
+    expected = table[first_tokens] / np.linalg.norm(table[first_tokens], axis=1, keepdims=True)
+    assert np.allclose(vectors, expected, atol=1e-6)
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0)
+    assert np.allclose(embeddings.embed_query("关税"), vectors[1], atol=1e-6)
+
+
+def test_batch_size_does_not_change_vectors(model_dir):
+    root, _ = model_dir
+    texts = ["进口", "申报 要素 进口 关税", "关税 申报", "要素 要素"]
+    one = OnnxEmbeddings(root, model_file="model.onnx", batch_size=1).embed_documents(texts)
+    many = OnnxEmbeddings(root, model_file="model.onnx", batch_size=32).embed_documents(texts)
+    assert np.allclose(one, many, atol=1e-6)
+    assert OnnxEmbeddings(root, model_file="model.onnx").embed_documents([]) == []
+
+
+def test_missing_model_file_raises(model_dir):
+    root, _ = model_dir
+    with pytest.raises(FileNotFoundError):
+        OnnxEmbeddings(root, model_file="model_quantized.onnx")
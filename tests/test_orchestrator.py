@@ -0,0 +1,140 @@
+import asyncio
+import json
+
+import pytest
+
+from src.core import orchestrator as orchestrator_module
+from src.core.orchestrator import COMBINED, CONCURRENT, EXECUTION_MODES, PACED, RiskAnalysisOrchestrator
+
+RULES = [
+    {"id": rule_id, "display": {"title": f"规则{rule_id}", "icon": "i", "loading_text": f"检查{rule_id}"}}
+    for rule_id in ("R01", "R02", "R03")
+]
+
+
+class _PromptBuilder:
+    def build_system_prompt(self, language="zh"):
+        return "system"
+
+    def build_user_prompt(self, raw_data, rule, language="zh"):
+        return rule["id"]
+
+    def build_combined_user_prompt(self, raw_data, rules, language="zh"):
+        return ",".join(rule["id"] for rule in rules)
+
+
+class _LLM:
+    """按规则返回判定；delays 控制完成顺序，failing 中的规则抛出异常"""
+
+    def __init__(self, verdicts, delays=None, failing=(), combined=None, combined_error=None):
+        self.verdicts = verdicts
+        self.delays = delays or {}
+        self.failing = set(failing)
+        self.combined = combined
+        self.combined_error = combined_error
+        self.calls = []
+        self.running = self.max_running = 0
+
+    async def acall_llm(self, system_prompt, user_prompt, usage=None):
+        rule_id = user_prompt
+        self.calls.append(rule_id)
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(self.delays.get(rule_id, 0))
+            if rule_id in self.failing:
+                raise RuntimeError(f"{rule_id} timeout")
+            if usage is not None:
+                usage.update(calls=1, prompt_tokens=10)
+            return self.verdicts[rule_id]
+        finally:
+            self.running -= 1
+
+    async def acall_llm_verdicts(self, system_prompt, user_prompt, rule_ids, usage=None):
+        self.calls.append(user_prompt)
+        if self.combined_error is not None:
+            raise self.combined_error
+        return self.combined
+
+
+def _orchestrator(llm, max_concurrency=5):
+    orchestrator = RiskAnalysisOrchestrator.__new__(RiskAnalysisOrchestrator)
+    orchestrator.prompt_builder = _PromptBuilder()
+    orchestrator.llm_service = llm
+    orchestrator.active_rules = RULES
+    orchestrator.default_mode = PACED
+    orchestrator.max_concurrency = max_concurrency
+    return orchestrator
+
+
+def _events(orchestrator, mode):
+    async def collect():
+        return [json.loads(event[len("data: "):]) async for event in orchestrator.analyze_stream("货物：电池", mode=mode)]
+    return asyncio.run(collect())
+
+
+@pytest.fixture(autouse=True)
+def no_pacing(monkeypatch):
+    """逐条模式的演示停顿对结果没有影响，测试中跳过"""
+    real_sleep = asyncio.sleep
+
+    async def sleep(delay, *args, **kwargs):
+        await real_sleep(0 if delay >= 0.5 else delay)
+
+    monkeypatch.setattr(orchestrator_module.asyncio, "sleep", sleep)
+    orchestrator_module.usage_by_rule.clear()
+
+
+VERDICTS = {"R01": ["√", "正常"], "R02": ["x", "单价异常"], "R03": ["√", "正常"]}
+
+
+def _results(events):
+    return {e["rule_id"]: (e["status"], e["message"]) for e in events if e["type"] == "step_result"}
+
+
+@pytest.mark.parametrize("mode", EXECUTION_MODES)
+def test_failing_rule_is_a_risk_result_in_every_mode(mode):
+    combined = {"R01": VERDICTS["R01"], "R02": VERDICTS["R02"]}  # 合并结果缺 R03，回退逐条审查
+    events = _events(_orchestrator(_LLM(VERDICTS, failing={"R03"}, combined=combined)), mode)
+
+    assert _results(events) == {
+        "R01": ("pass", "正常"),
+        "R02": ("risk", "单价异常"),
+        "R03": ("risk", "规则执行异常: R03 timeout"),
+    }
+    complete = events[-1]
+    assert complete["type"] == "complete" and complete["final_status"] == "risk"
+    assert "共发现 2 项风险指标" in complete["summary"]
+
+
+def test_modes_agree_when_combined_call_fails():
+    summaries = set()
+    for mode, llm in [
+        (PACED, _LLM(VERDICTS, failing={"R01"})),
+        (CONCURRENT, _LLM(VERDICTS, failing={"R01"})),
+        (COMBINED, _LLM(VERDICTS, failing={"R01"}, combined_error=RuntimeError("bad json"))),
+    ]:
+        events = _events(_orchestrator(llm), mode)
+        summaries.add((tuple(sorted(_results(events).items())), events[-1]["summary"]))
+    assert len(summaries) == 1
+
+
+def test_concurrent_mode_streams_in_completion_order_within_limit():
+    llm = _LLM(VERDICTS, delays={"R01": 0.2, "R02": 0.1, "R03": 0.0})
+    events = _events(_orchestrator(llm, max_concurrency=2), CONCURRENT)
+
+    assert [e["rule_id"] for e in events if e["type"] == "step_result"] == ["R02", "R03", "R01"]
+    assert llm.max_running == 2
+    # 每条规则的 step_start 在其开始调用时推送，且先于自己的 step_result
+    order = [(e["type"], e.get("rule_id")) for e in events]
+    for rule in RULES:
+        assert order.index(("step_start", rule["id"])) < order.index(("step_result", rule["id"]))
+    assert orchestrator_module.usage_report()["total"]["calls"] == 3
+
+
+def test_combined_mode_uses_one_call_when_all_verdicts_present():
+    llm = _LLM(VERDICTS, combined=dict(VERDICTS))
+    events = _events(_orchestrator(llm), COMBINED)
+    assert llm.calls == ["R01,R02,R03"]
+    assert _results(events)["R02"] == ("risk", "单价异常")
+    assert [e["type"] for e in events[1:4]] == ["step_start"] * 3
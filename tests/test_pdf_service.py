@@ -0,0 +1,47 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from src.services.pdf_service import PDFService
+
+KNOWLEDGE_DIR = Path(__file__).resolve().parent.parent / "data" / "knowledge"
+PDFS = [KNOWLEDGE_DIR / "中华人民共和国海关进出口货物申报管理规定.pdf", KNOWLEDGE_DIR / "中华人民共和国进出境动植物检疫法.pdf"]
+
+pytestmark = pytest.mark.skipif(not all(path.exists() for path in PDFS), reason="示例 PDF 不存在")
+
+
+async def _extract_all(service, paths, **kwargs):
+    return {result.pdf_path: result async for result in service.extract_many([str(p) for p in paths], **kwargs)}
+
+
+def test_extract_many_matches_extract_text_and_reuses_pool():
+    service = PDFService()
+    try:
+        results = asyncio.run(_extract_all(service, PDFS, max_workers=2, pages_per_task=3, validate_quality=False))
+        executor = service._executor
+        for path in PDFS:
+            result = results[str(path)]
+            text, _ = service.extract_text(str(path), validate_quality=False)
+            assert result.error is None
+            assert result.page_count == len(result.pages) > 3
+            assert result.text == text
+            assert result.pages == service.extract_pages(str(path))
+
+        again = asyncio.run(_extract_all(service, PDFS[:1], max_workers=2, pages_per_task=3, validate_quality=False))
+        assert service._executor is executor
+        assert again[str(PDFS[0])].text == results[str(PDFS[0])].text
+    finally:
+        service.close()
+    assert service._executor is None
+
+
+def test_extract_many_reports_missing_file_without_failing_batch(tmp_path):
+    service = PDFService()
+    try:
+        missing = tmp_path / "missing.pdf"
+        results = asyncio.run(_extract_all(service, [PDFS[1], missing], max_workers=1, validate_quality=False))
+        assert results[str(missing)].error is not None
+        assert results[str(PDFS[1])].error is None
+    finally:
+        service.close()
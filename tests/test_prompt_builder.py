@@ -0,0 +1,83 @@
+import json
+import os
+
+import pytest
+
+from src.core import prompt_builder
+from src.core.prompt_builder import PromptBuilder
+
+RULE = {"id": "R01", "instruction": "核对申报要素", "rag_file": "rag_r01.txt"}
+
+
+@pytest.fixture
+def config_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(prompt_builder._file_cache, "interval", 0.0)
+    monkeypatch.setattr(prompt_builder._file_cache, "_entries", {})
+    monkeypatch.setattr(prompt_builder, "_user_prompt_frames", {})
+    (tmp_path / "risk_rules.json").write_text(json.dumps({"rules": [RULE]}, ensure_ascii=False), encoding="utf-8")
+    (tmp_path / "rag_r01.txt").write_text("指导文件第一版", encoding="utf-8")
+    return tmp_path
+
+
+def _builder(config_dir):
+    builder = PromptBuilder(rule_config_path=config_dir / "risk_rules.json")
+    builder.config_dir = config_dir
+    return builder
+
+
+def _rewrite(path, text):
+    """写入新内容并推进 mtime（同一时间戳内的修改也能被识别）"""
+    stat = path.stat()
+    path.write_text(text, encoding="utf-8")
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+
+def test_rule_config_is_parsed_once_and_shared(config_dir):
+    first, second = _builder(config_dir), _builder(config_dir)
+    assert first.config is second.config
+    assert first.config["rules"][0]["id"] == "R01"
+
+
+def test_rule_config_edit_is_picked_up_after_revalidation(config_dir, monkeypatch):
+    builder = _builder(config_dir)
+    _rewrite(config_dir / "risk_rules.json", json.dumps({"rules": [RULE, dict(RULE, id="R02")]}))
+    assert len(_builder(config_dir).config["rules"]) == 2
+
+    # 检查间隔内不访问磁盘，沿用缓存
+    monkeypatch.setattr(prompt_builder._file_cache, "interval", 3600.0)
+    _rewrite(config_dir / "risk_rules.json", json.dumps({"rules": []}))
+    assert len(_builder(config_dir).config["rules"]) == 2
+    assert builder.config["rules"][0]["id"] == "R01"
+
+
+def test_data_goes_last_and_prefix_is_stable(config_dir):
+    builder = _builder(config_dir)
+    first = builder.build_user_prompt("货物：电池", RULE)
+    second = builder.build_user_prompt("货物：轮胎，单价 0.1 美元", RULE)
+    prefix = first[:first.index("货物：电池")]
+    assert second.startswith(prefix)
+    assert "指导文件第一版" in prefix and "核对申报要素" in prefix
+    assert first.rstrip().endswith("END DATA ================")
+
+
+def test_rag_edit_replaces_frame_in_place(config_dir):
+    builder = _builder(config_dir)
+    builder.build_user_prompt("数据", RULE)
+    builder.build_user_prompt("数据", RULE, language="vi")
+    for version in range(2, 5):
+        _rewrite(config_dir / "rag_r01.txt", f"指导文件第{version}版")
+        assert f"指导文件第{version}版" in builder.build_user_prompt("数据", RULE)
+    assert set(prompt_builder._user_prompt_frames) == {("R01", "zh"), ("R01", "vi")}
+
+    edited = dict(RULE, instruction="核对原产地")
+    assert "核对原产地" in builder.build_user_prompt("数据", edited)
+    assert len(prompt_builder._user_prompt_frames) == 2
+
+
+def test_missing_rag_file_is_not_cached(config_dir):
+    builder = _builder(config_dir)
+    (config_dir / "rag_r01.txt").unlink()
+    assert "未找到对应的参考指导文件" in builder.build_user_prompt("数据", RULE)
+
+    (config_dir / "rag_r01.txt").write_text("补上的指导文件", encoding="utf-8")
+    assert "补上的指导文件" in builder.build_user_prompt("数据", RULE)
@@ -0,0 +1,91 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.services.embedding_cache import QueryEmbeddingCache
+
+
+def _embed(texts):
+    return [[float(len(t)), float(ord(t[0]))] for t in texts]
+
+
+def test_normalized_keys_share_one_entry():
+    cache = QueryEmbeddingCache()
+    calls = []
+
+    def compute(texts):
+        calls.append(list(texts))
+        return _embed(texts)
+
+    first = cache.get_or_compute_many(["  进口  关税 ", "进口 关税"], compute)
+    second = cache.get_or_compute("ｉｍｐｏｒｔ", lambda text: compute([text])[0])
+    third = cache.get_or_compute("import", lambda text: compute([text])[0])
+
+    assert calls == [["  进口  关税 "], ["ｉｍｐｏｒｔ"]]
+    assert first[0] == first[1]
+    assert second == third
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_model_receives_original_text():
+    cache = QueryEmbeddingCache()
+    seen = []
+    cache.get_or_compute("  原始\t查询 ", lambda text: seen.append(text) or [0.0])
+    assert seen == ["  原始\t查询 "]
+
+
+def test_lru_evicts_least_recently_used():
+    cache = QueryEmbeddingCache(max_entries=2)
+    cache.get_or_compute_many(["a", "b"], _embed)
+    cache.get_or_compute_many(["a"], _embed)  # a 变为最近使用
+    cache.get_or_compute_many(["c"], _embed)
+    assert list(cache._cache) == ["a", "c"]
+
+
+def test_concurrent_requests_compute_once():
+    cache = QueryEmbeddingCache()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow(texts):
+        calls.append(list(texts))
+        started.set()
+        release.wait(5)
+        return _embed(texts)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        owner = pool.submit(cache.get_or_compute_many, ["海关"], slow)
+        started.wait(5)
+        waiters = [pool.submit(cache.get_or_compute_many, ["海关 "], slow) for _ in range(3)]
+        time.sleep(0.05)
+        release.set()
+        results = [owner.result(5)] + [w.result(5) for w in waiters]
+
+    assert calls == [["海关"]]
+    assert all(r == results[0] for r in results)
+    assert cache.shared == 3 and cache.misses == 1
+
+
+def test_failed_compute_propagates_to_waiters_and_is_not_cached():
+    cache = QueryEmbeddingCache()
+    started, release = threading.Event(), threading.Event()
+
+    def failing(texts):
+        started.set()
+        release.wait(5)
+        raise RuntimeError("model down")
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        owner = pool.submit(cache.get_or_compute_many, ["q"], failing)
+        started.wait(5)
+        waiter = pool.submit(cache.get_or_compute_many, ["q"], failing)
+        time.sleep(0.05)
+        release.set()
+        for future in (owner, waiter):
+            with pytest.raises(RuntimeError):
+                future.result(5)
+
+    assert not cache._inflight and not cache._cache
+    assert cache.get_or_compute("q", lambda text: [1.0]) == [1.0]
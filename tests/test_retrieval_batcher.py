@@ -0,0 +1,84 @@
+import asyncio
+import threading
+
+from src.services.retrieval_batcher import RetrievalBatcher
+
+
+class _Recorder:
+    """记录每次 search_many 调用，结果为 [(查询, k, 序号)] * k"""
+
+    def __init__(self, fail_modes=()):
+        self.calls = []
+        self.fail_modes = set(fail_modes)
+        self.lock = threading.Lock()
+
+    def __call__(self, queries, k, mode, search_filter):
+        with self.lock:
+            self.calls.append((list(queries), k, mode, search_filter))
+        if mode in self.fail_modes:
+            raise RuntimeError(f"{mode} failed")
+        return [[(query, k, i) for i in range(k)] for query in queries]
+
+
+def _run(batcher, requests):
+    async def main():
+        return await asyncio.gather(
+            *(batcher.submit(*request) for request in requests), return_exceptions=True
+        )
+    return asyncio.run(main())
+
+
+def test_concurrent_requests_share_one_call():
+    recorder = _Recorder()
+    batcher = RetrievalBatcher(recorder, window_ms=20, max_batch=32)
+    results = _run(batcher, [(f"q{i}", 3) for i in range(5)])
+
+    assert recorder.calls == [([f"q{i}" for i in range(5)], 3, None, None)]
+    assert results[2] == [("q2", 3, 0), ("q2", 3, 1), ("q2", 3, 2)]
+    assert batcher.stats()["batches"] == 1 and batcher.stats()["avg_batch_size"] == 5
+
+
+def test_requests_grouped_by_mode_filter_and_k():
+    recorder = _Recorder()
+    batcher = RetrievalBatcher(recorder, window_ms=20)
+    results = _run(batcher, [
+        ("a", 3, "hybrid", None),
+        ("b", 5, "hybrid", None),
+        ("c", 3, "vector", None),
+        ("d", 3, "hybrid", ("sources", ("凭祥",))),
+        ("e", 3, "hybrid", None),
+    ])
+
+    assert sorted(recorder.calls, key=repr) == sorted([
+        (["a", "e"], 3, "hybrid", None),
+        (["b"], 5, "hybrid", None),
+        (["c"], 3, "vector", None),
+        (["d"], 3, "hybrid", ("sources", ("凭祥",))),
+    ], key=repr)
+    # 每个请求按自己的 k 检索，结果不被截断或补齐
+    assert [len(r) for r in results] == [3, 5, 3, 3, 3]
+    assert results[1][-1] == ("b", 5, 4)
+
+
+def test_max_batch_splits_batches():
+    recorder = _Recorder()
+    batcher = RetrievalBatcher(recorder, window_ms=20, max_batch=2)
+    _run(batcher, [(f"q{i}", 1) for i in range(5)])
+    assert sorted(len(queries) for queries, *_ in recorder.calls) == [1, 2, 2]
+
+
+def test_failure_only_affects_its_group():
+    recorder = _Recorder(fail_modes={"vector"})
+    batcher = RetrievalBatcher(recorder, window_ms=20)
+    results = _run(batcher, [("a", 2, "vector"), ("b", 2, "hybrid")])
+
+    assert isinstance(results[0], RuntimeError)
+    assert results[1] == [("b", 2, 0), ("b", 2, 1)]
+
+
+def test_worker_restarts_on_new_event_loop():
+    recorder = _Recorder()
+    batcher = RetrievalBatcher(recorder, window_ms=5)
+    assert _run(batcher, [("a", 1)]) == [[("a", 1, 0)]]
+    assert _run(batcher, [("b", 1)]) == [[("b", 1, 0)]]
+    assert batcher.stats()["requests"] == 2
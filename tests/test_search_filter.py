@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_core.documents import Document
+
+from src.services import index_factory
+from src.services.index_manifest import FileEntry, IndexManifest
+from src.services.search_filter import FilterIndex, SearchFilter
+
+FILE_IDS = {
+    "凭祥口岸办事指南.txt": [1, 2, 3],
+    "征税管理办法.pdf": [10, 11],
+    "口岸/东兴/通关须知.md": [20],
+    "涉税规范申报目录.pdf": [30, 31, 32],
+}
+
+
+def _filter_index():
+    return FilterIndex({key: np.array(ids, dtype="int64") for key, ids in FILE_IDS.items()})
+
+
+def test_from_dict_parses_separated_values_and_drops_empty_filters():
+    search_filter = SearchFilter.from_dict({"sources": "凭祥，征税管理办法", "file_types": [".PDF", "txt"], "path_prefixes": "/口岸/"})
+    assert search_filter.sources == ("凭祥", "征税管理办法")
+    assert search_filter.file_types == ("pdf", "txt")
+    assert search_filter.path_prefixes == ("口岸",)
+    assert SearchFilter.from_dict({"sources": " ", "file_types": []}) is None
+    assert SearchFilter.from_dict(None) is None
+    # 不可变、可哈希：同一条件为同一缓存键
+    assert hash(SearchFilter.from_dict({"sources": "b,a"})) == hash(SearchFilter.from_dict({"sources": ["a", "b"]}))
+
+
+@pytest.mark.parametrize("data,expected", [
+    ({"sources": "凭祥"}, ["凭祥口岸办事指南.txt"]),
+    ({"file_types": "pdf"}, ["征税管理办法.pdf", "涉税规范申报目录.pdf"]),
+    ({"file_types": "pdf", "exclude_sources": "申报目录"}, ["征税管理办法.pdf"]),
+    ({"path_prefixes": "口岸"}, ["口岸/东兴/通关须知.md"]),
+    ({"path_prefixes": "口岸/东"}, []),  # 前缀按目录层级匹配
+    ({"sources": "凭祥,通关", "file_types": "md"}, ["口岸/东兴/通关须知.md"]),
+])
+def test_matches(data, expected):
+    assert _filter_index().files(SearchFilter.from_dict(data)) == sorted(expected)
+
+
+def test_allowed_ids_are_cached_lru():
+    index = FilterIndex(_filter_index().file_ids, max_cached=2)
+    pdf, txt, md = (SearchFilter.from_dict({"file_types": t}) for t in ("pdf", "txt", "md"))
+    ids, _ = index.allowed(pdf)
+    assert ids.tolist() == [10, 11, 30, 31, 32]
+    assert index.allowed(pdf)[0] is ids
+    index.allowed(txt)
+    index.allowed(pdf)
+    index.allowed(md)
+    assert list(index._cache) == [pdf, md]
+    assert index.allowed(SearchFilter.from_dict({"sources": "不存在"}))[0].size == 0
+
+
+@pytest.mark.parametrize("index_type", ["flat_ip", "hnsw", "ivf_flat"])
+def test_selector_restricts_faiss_search(index_type):
+    rng = np.random.default_rng(0)
+    chunk_ids = np.array(sorted(i for ids in FILE_IDS.values() for i in ids), dtype="int64")
+    vectors = rng.standard_normal((len(chunk_ids), 8)).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    index = index_factory.create_index(index_type, vectors, {"nlist": 2})
+    index.add_with_ids(vectors, chunk_ids)
+    index_factory.apply_search_params(index, {"nprobe": 2, "ef_search": 64})
+
+    allowed, selector = _filter_index().allowed(SearchFilter.from_dict({"file_types": "pdf"}))
+    _, ids = index.search(vectors[:1], 5, params=index_factory.search_parameters(index, selector))
+    assert set(ids[0].tolist()) == set(allowed.tolist())
+
+
+def test_from_manifest_includes_duplicate_representatives():
+    manifest = IndexManifest(embedding_model="m", index_type="flat_ip")
+    manifest.files["a.txt"] = FileEntry(1, 0.0, "h", chunk_ids=[3, 1], duplicate_of=[7])
+    assert FilterIndex.from_manifest(manifest).file_ids["a.txt"].tolist() == [1, 3, 7]
+
+
+def test_from_docstore_handles_int_and_uuid_keys():
+    docs = {
+        1: Document(page_content="a", metadata={"file_path": "a.txt"}),
+        2: Document(page_content="b", metadata={"source": "/data/knowledge/b.pdf"}),
+    }
+    assert {k: v.tolist() for k, v in FilterIndex.from_docstore(InMemoryDocstore(docs)).file_ids.items()} == {
+        "a.txt": [1], "b.pdf": [2]
+    }
+
+    legacy = InMemoryDocstore({"uuid-a": docs[1], "uuid-b": docs[2]})
+    mapped = FilterIndex.from_docstore(legacy, {0: "uuid-a", 1: "uuid-b"})
+    assert mapped.file_ids["b.pdf"].tolist() == [1]
+    with pytest.raises(ValueError):
+        FilterIndex.from_docstore(legacy)
@@ -0,0 +1,111 @@
+from src.services.tariff_catalog import (
+    PARSER_VERSION, TariffCatalog, _chapter_number, parse_tariff_catalog, split_elements
+)
+
+CATALOG = """
+第八十五章 电机、电气设备及其零件
+注释：
+一、本章不包括：
+85.01 表头之前的注释文字，不是税目行
+税则号列 商品名称 申报要素
+85.41 二极管、晶体管及类似的半导体器件： 1.品名；2.用途；3.品牌
+8541.1000 -二极管，但光敏二极管或发光二极管除外
+85.42 集成电路：
+1.品名；2.品牌类型；3.出口享惠情况；
+4.功能；5.封装形式
+-处理器及控制器：
+8542.3111 --多元件集成电路
+1.品名；2.品牌类型；3.用途
+8542.3119 --其他
+-存储器：
+8542.3210
+--动态随机存取存储器
+8542.3900 -其他，
+用于税号8702.1091及
+8704.1090所列车辆用
+12
+第八十六章 铁道车辆
+86.01 标题之后、表头之前的行不解析
+"""
+
+HEADING_ELEMENTS = ["品名", "品牌类型", "出口享惠情况", "功能", "封装形式"]
+
+
+def _rows():
+    return {row.code: row for row in parse_tariff_catalog(CATALOG)}
+
+
+def test_parses_headings_and_items_in_table_only():
+    rows = parse_tariff_catalog(CATALOG)
+    assert [row.code for row in rows] == [
+        "8541", "85411000", "8542", "85423111", "85423119", "85423210", "85423900"
+    ]
+    assert [row.level for row in rows[:2]] == ["heading", "item"]
+    assert all(row.heading == row.code[:4] for row in rows)
+
+
+def test_inline_and_multiline_elements():
+    rows = _rows()
+    assert rows["8541"].elements == ["品名", "用途", "品牌"]
+    assert rows["8541"].name == "二极管、晶体管及类似的半导体器件"
+    assert rows["8542"].elements == HEADING_ELEMENTS
+
+
+def test_item_elements_prefer_own_then_inherit():
+    rows = _rows()
+    assert rows["85423111"].elements == ["品名", "品牌类型", "用途"]
+    assert rows["85423119"].elements == HEADING_ELEMENTS
+    assert rows["85411000"].elements == ["品名", "用途", "品牌"]
+
+
+def test_group_path_and_name_on_next_line():
+    rows = _rows()
+    assert rows["85423111"].full_name == "集成电路 > 处理器及控制器 > 多元件集成电路"
+    assert rows["85423210"].name == "动态随机存取存储器"
+    assert rows["85423210"].full_name == "集成电路 > 存储器 > 动态随机存取存储器"
+    assert rows["85423210"].code_display == "8542.3210"
+
+
+def test_codes_of_other_headings_are_name_continuations():
+    row = _rows()["85423900"]
+    assert row.name == "其他,用于税号8702.1091及8704.1090所列车辆用"
+    assert row.full_name == "集成电路 > " + row.name
+
+
+def test_split_elements_only_on_increasing_numbers():
+    assert split_elements("1.品名；2.用途3.品牌") == ["品名", "用途", "品牌"]
+    assert split_elements("1.品名；2.厚度（如2.5毫米）；3.用途") == ["品名", "厚度（如2.5毫米）", "用途"]
+    assert split_elements("无编号") == []
+
+
+def test_chapter_number():
+    assert _chapter_number("八十五") == 85
+    assert _chapter_number("十") == 10
+    assert _chapter_number("二十") == 20
+    assert _chapter_number("七") == 7
+    assert _chapter_number("85") == 85
+
+
+def test_catalog_lookup_exact_prefix_and_fallback(tmp_path):
+    catalog = TariffCatalog(tmp_path / "tariff.db")
+    catalog.replace_file("目录.pdf", "hash-1", parse_tariff_catalog(CATALOG))
+
+    assert catalog.is_current("目录.pdf", "hash-1")
+    assert not catalog.is_current("目录.pdf", "hash-2")
+    assert catalog.files() == {"目录.pdf": ("hash-1", PARSER_VERSION)}
+
+    exact = catalog.lookup("8542.31.11")
+    assert [row["code"] for row in exact] == ["85423111"]
+    assert exact[0]["source"] == "目录.pdf"
+
+    assert [row["code"] for row in catalog.lookup("8542")] == [
+        "8542", "85423111", "85423119", "85423210", "85423900"
+    ]
+    assert len(catalog.lookup("8542", limit=2)) == 2
+    # 没有的税号退回最近的上级子目
+    assert [row["code"] for row in catalog.lookup("85423190")] == ["85423111", "85423119"]
+    assert catalog.lookup("9") == []
+
+    catalog.replace_file("目录.pdf", "hash-2", [])
+    assert catalog.lookup("8542") == []
+    assert catalog.stats()["rows"] == 0
@@ -0,0 +1,86 @@
+import random
+
+import pytest
+from langchain_core.documents import Document
+
+from src.services.text_chunker import ApproxTokenCounter, ChineseChunker
+
+SENTENCES = [
+    "纳税义务人进口货物时应当如实申报商品名称、规格型号、用途及成分。",
+    "申报要素包括品牌类型、出口享惠情况、GTIN 与 CAS 编号等",
+    "集成电路（HS 8542.31.00）按功能与封装形式归类！",
+    "价格明显低于同类货物成交价格的，海关可以依法估价？",
+    "Integrated circuits, processors and controllers, whether or not combined with memories",
+]
+
+
+def _sample_text(seed: int) -> str:
+    rng = random.Random(seed)
+    parts = []
+    for _ in range(rng.randint(20, 80)):
+        choice = rng.random()
+        if choice < 0.05:
+            # 无任何边界的超长句段，只能硬切
+            parts.append("申" * rng.randint(300, 700))
+        elif choice < 0.1:
+            parts.append("，".join(["归类规则"] * rng.randint(50, 150)))
+        else:
+            parts.append(rng.choice(SENTENCES))
+        parts.append(rng.choice(["", "", "\n", "\n\n", "\n\n\n", " "]))
+    return "".join(parts)
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("max_tokens,overlap_tokens", [(64, 8), (256, 32), (500, 50)])
+def test_chunks_match_offsets_and_respect_token_limit(seed, max_tokens, overlap_tokens):
+    text = _sample_text(seed)
+    counter = ApproxTokenCounter()
+    chunker = ChineseChunker(counter, max_tokens=max_tokens, overlap_tokens=overlap_tokens, min_chars=0)
+
+    chunks, filtered = chunker.split_documents([Document(page_content=text, metadata={"source": "t.txt"})])
+
+    assert filtered == 0
+    assert chunks
+    for chunk in chunks:
+        start, end = chunk.metadata["char_start"], chunk.metadata["char_end"]
+        assert chunk.page_content == text[start:end]
+        assert chunk.page_content == chunk.page_content.strip()
+        assert chunk.metadata["source"] == "t.txt"
+    for tokens in counter.count([chunk.page_content for chunk in chunks]):
+        assert tokens <= max_tokens
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_chunks_cover_text_in_order(seed):
+    text = _sample_text(seed)
+    spans = ChineseChunker(max_tokens=128, overlap_tokens=16, min_chars=0).split_offsets(text)
+
+    covered = [False] * len(text)
+    for start, end in spans:
+        covered[start:end] = [True] * (end - start)
+    assert all(covered[i] for i, c in enumerate(text) if not c.isspace())
+    # 起点严格递增（重叠只回退到上一个 chunk 内部，不会原地打转）
+    assert all(a[0] < b[0] for a, b in zip(spans, spans[1:]))
+
+
+def test_prefers_paragraph_boundary_over_sentence_end():
+    first = "第一段句子。" * 20
+    second = "第二段句子。" * 20
+    text = first + "\n\n" + second
+    chunker = ChineseChunker(max_tokens=200, overlap_tokens=0, min_chars=0)
+
+    spans = chunker.split_offsets(text)
+
+    assert text[spans[0][0]:spans[0][1]] == first
+    assert text[spans[1][0]:spans[1][1]] == second
+
+
+def test_short_fragments_are_filtered():
+    chunker = ChineseChunker(max_tokens=40, overlap_tokens=0, min_chars=10)
+
+    chunks, filtered = chunker.split_documents([
+        Document(page_content="  短句。\n"), Document(page_content="较长的一段正文内容。" * 10)
+    ])
+
+    assert filtered == 1
+    assert chunks and all(len(chunk.page_content) >= 10 for chunk in chunks)
@@ -119,6 +119,8 @@ const translations = {
         index_error: '索引重建失败',
         total_files: '文件总数',
         total_chunks: '片段总数',
+        skipped_files: '跳过(未变化)',
+        reembedded_files: '重新向量化',
 
         // LLM 配置
         llm_config_title: 'LLM 模型配置',
@@ -258,6 +260,8 @@ const translations = {
         index_error: 'Xây dựng chỉ mục thất bại',
         total_files: 'Tổng số tệp',
         total_chunks: 'Tổng số đoạn',
+        skipped_files: 'Bỏ qua (không đổi)',
+        reembedded_files: 'Vector hóa lại',
 
         // LLM 配置
         llm_config_title: 'Cấu hình LLM',
@@ -180,6 +180,9 @@ function showCompleteUI(stats) {
         details += `, PDF: ${stats.pdf_files})`;
     }
     details += `, ${t('total_chunks')}: ${stats.total_chunks}`;
+    if (stats.skipped_files !== undefined) {
+        details += `, ${t('skipped_files')}: ${stats.skipped_files}, ${t('reembedded_files')}: ${stats.reembedded_files}`;
+    }
 
     completeMessage.textContent = `${t('index_complete')} (${details})`;
     completeMessage.className = 'text-xs text-green-400';